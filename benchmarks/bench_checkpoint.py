@@ -0,0 +1,93 @@
+"""Benchmark: checkpointing overhead and resume after an interrupted embed.
+
+Embeds a ``--size`` square host with ``--backend`` without a checkpoint
+and with one at the default and at a deliberately short flush interval,
+reporting flushes and their share of the run (wall-clock differences
+between the rows are mostly simulator noise). It then interrupts an embed
+half way (the progress callback raises), runs it again and checks that the
+second run resumed from the checkpoint rather than from pixel 0 and that
+the output equals an uninterrupted embed.
+
+    python benchmarks/bench_checkpoint.py [--size 512] [--backend aer-batched]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from quantum_watermarking import neqr_lsb, waqi  # noqa: E402
+from quantum_watermarking.checkpoint import DEFAULT_INTERVAL, Checkpoint  # noqa: E402
+from quantum_watermarking.watermark_cache import WatermarkCache  # noqa: E402
+
+
+class Interrupted(Exception):
+    pass
+
+
+def interrupt_at(percent):
+    def progress(p):
+        if p >= percent:
+            raise Interrupted()
+    return progress
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=512)
+    parser.add_argument("--backend", default="aer-batched")
+    parser.add_argument("--short-interval", type=float, default=0.05)
+    args = parser.parse_args()
+
+    repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    rng = np.random.default_rng(0)
+    host = rng.integers(0, 256, (args.size, args.size, 3), dtype=np.uint8)
+    cache = WatermarkCache()
+    status = 0
+    print(f"{'scheme':<10}{'checkpoint':<14}{'seconds':>9}{'flushes':>9}{'flush s':>9}{'share':>8}")
+    with tempfile.TemporaryDirectory() as directory:
+        for scheme, module in (("neqr-lsb", neqr_lsb), ("waqi", waqi)):
+            prepared = cache.get(os.path.join(repo, "Lenna.png"), (args.size, args.size), scheme)
+            start = time.perf_counter()
+            expected = module.embed_watermark(host, prepared, args.backend)
+            plain = time.perf_counter() - start
+            print(f"{scheme:<10}{'none':<14}{plain:>9.3f}")
+
+            for label, interval in (("default", DEFAULT_INTERVAL), ("short", args.short_interval)):
+                checkpoint = Checkpoint(directory, scheme, host, prepared, interval=interval)
+                start = time.perf_counter()
+                output = module.embed_watermark(host, prepared, args.backend, checkpoint=checkpoint)
+                elapsed = time.perf_counter() - start
+                checkpoint.discard()
+                if not np.array_equal(output, expected):
+                    print(f"MISMATCH {scheme} checkpointed output")
+                    status = 1
+                print(f"{scheme:<10}{label:<14}{elapsed:>9.3f}{checkpoint.flushes:>9}{checkpoint.flush_seconds:>9.3f}"
+                      f"{checkpoint.flush_seconds / elapsed:>8.2%}")
+
+            # Interrupt half way, flushing after every chunk, then run again
+            checkpoint = Checkpoint(directory, scheme, host, prepared, interval=0, max_overhead=float("inf"))
+            try:
+                module.embed_watermark(host, prepared, args.backend, progress=interrupt_at(50), checkpoint=checkpoint)
+            except Interrupted:
+                pass
+            checkpoint = Checkpoint(directory, scheme, host, prepared, interval=args.short_interval)
+            start = time.perf_counter()
+            output = module.embed_watermark(host, prepared, args.backend, checkpoint=checkpoint)
+            elapsed = time.perf_counter() - start
+            checkpoint.discard()
+            resumed = checkpoint.resumed_from > 0
+            if not resumed or not np.array_equal(output, expected):
+                print(f"RESUME FAILED {scheme}: resumed from {checkpoint.resumed_from}")
+                status = 1
+            print(f"{scheme:<10}{'resumed':<14}{elapsed:>9.3f}  from value {checkpoint.resumed_from}"
+                  f" of {checkpoint.done}")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
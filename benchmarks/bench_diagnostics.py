@@ -0,0 +1,73 @@
+"""Benchmark: cost of the level-gated diagnostics at default verbosity.
+
+Compares the per-pixel negation loop of ``f.py`` at the default INFO level
+against the same loop with the package logger switched off entirely, and
+reports the per-call cost of a disabled matrix dump / circuit drawing.
+
+    python benchmarks/bench_diagnostics.py [--rows 8] [--repeats 3]
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import f  # noqa: E402
+from quantum_watermarking.diagnostics import CircuitDrawings, configure_logging, get_logger, log_matrix  # noqa: E402
+
+
+def time_negation(matrix, repeats):
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        f.quantum_negate_grayscale_matrix(matrix, bits=8)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def time_disabled_calls(iterations):
+    logger = get_logger("bench")
+    drawings = CircuitDrawings(logger, limit=8)
+    array = np.zeros((64, 64), dtype=np.uint8)
+    start = time.perf_counter()
+    for i in range(iterations):
+        log_matrix(logger, array, "Watermarked Image Matrix (Progress: %.0f%%)", 25.0)
+        drawings.log(i & 255, None, "\nQuantum Circuit for pixel (%d,%d) value %d:", 0, 0, i & 255)
+    return (time.perf_counter() - start) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=8, help="rows of saturn.txt to negate")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    matrix = f.text_file_to_grayscale_matrix(os.path.join(repo, "saturn.txt"))[:args.rows]
+    matrix = [row[:8] for row in matrix]
+    pixels = sum(len(row) for row in matrix)
+
+    configure_logging("INFO", stream=open(os.devnull, "w"))
+    package_logger = get_logger()
+
+    per_call = time_disabled_calls(100_000)
+    default_time = time_negation(matrix, args.repeats)
+    package_logger.disabled = True
+    silent_time = time_negation(matrix, args.repeats)
+    package_logger.disabled = False
+
+    print(f"pixels per run:                 {pixels}")
+    print(f"disabled dump+drawing per call: {per_call * 1e9:.0f} ns")
+    print(f"negation, default verbosity:    {default_time * 1e3:.1f} ms")
+    print(f"negation, logging switched off: {silent_time * 1e3:.1f} ms")
+    print(f"ratio (default / off):          {default_time / silent_time:.3f}")
+    logging.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""Benchmark: frame-sequence embedding, serial loop against the streaming pipeline.
+
+Writes ``--frames`` synthetic ``--size`` frames as a directory of PNGs, a
+raw ``rgb24`` dump and a raw ``yuv420p`` dump, then marks each source twice:
+frame by frame in one thread (read, embed, write), and through
+``frames.embed_frames`` with its reader and writer threads. Reports
+frames/sec, per-frame latency and peak traced memory in frames, and checks
+the two outputs are identical and that yuv420p chroma is passed through.
+The pipeline's peak is also measured on the first half of the sequence:
+with bounded queues it must not grow with the sequence length. On a single
+core the threads can only overlap I/O with the embedding, and queued
+frames add to the latency.
+
+    python benchmarks/bench_frames.py [--frames 48] [--size 640x360] [--scheme waqi] [--backend numpy]
+
+Exits non-zero on any mismatch or if the pipeline's memory grows with the
+number of frames.
+"""
+import argparse
+import itertools
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from quantum_watermarking import frames, negation  # noqa: E402
+from quantum_watermarking.frames import FrameStats  # noqa: E402
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def synthetic(count, width, height):
+    # A gradient drifting across the frame, plus noise
+    rng = np.random.default_rng(5)
+    x = np.arange(width, dtype=np.int32)[None, :]
+    y = np.arange(height, dtype=np.int32)[:, None]
+    for i in range(count):
+        base = ((x + y + 4 * i) % 256).astype(np.uint8)
+        rgb = np.stack([base, base[::-1], np.roll(base, i, axis=1)], axis=2)
+        yield rgb + rng.integers(0, 16, rgb.shape, dtype=np.uint8)
+
+
+def to_yuv420p(rgb):
+    # BT.601, full range; only the layout matters here
+    r, g, b = (rgb[..., c].astype(np.float32) for c in range(3))
+    luma = np.clip(0.299 * r + 0.587 * g + 0.114 * b, 0, 255).astype(np.uint8)
+    u = np.clip(128 - 0.168736 * r - 0.331264 * g + 0.5 * b, 0, 255)[::2, ::2].astype(np.uint8)
+    v = np.clip(128 + 0.5 * r - 0.418688 * g - 0.081312 * b, 0, 255)[::2, ::2].astype(np.uint8)
+    return luma.tobytes() + u.tobytes() + v.tobytes()
+
+
+def serial(source, watermark, writer, scheme, backend):
+    # One frame at a time in one thread: what running each frame through the
+    # still-image path amounts to
+    from quantum_watermarking.backends import get_backend
+    from quantum_watermarking.watermark_cache import default_cache
+
+    embed = __import__(f"quantum_watermarking.{scheme.replace('-', '_')}", fromlist=["embed_watermark"])
+    backend = get_backend(backend)
+    stats = FrameStats()
+    start = time.perf_counter()
+    for frame in source:
+        height, width = frame.array.shape[:2]
+        prepared = default_cache().get(watermark, (width, height), scheme)
+        writer.write(frame, embed.embed_watermark(frame.array, prepared, backend))
+        stats.latencies.append(time.perf_counter() - frame.read_start)
+        stats.frames += 1
+    stats.seconds = time.perf_counter() - start
+    return stats
+
+
+def run(label, fn):
+    tracemalloc.start()
+    stats = fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return label, stats, peak
+
+
+def same_files(a, b):
+    if os.path.isdir(a):
+        names = sorted(os.listdir(a))
+        return names == sorted(os.listdir(b)) and all(
+            np.array_equal(np.array(Image.open(os.path.join(a, n))), np.array(Image.open(os.path.join(b, n))))
+            for n in names)
+    with open(a, "rb") as fa, open(b, "rb") as fb:
+        return fa.read() == fb.read()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", type=int, default=48)
+    parser.add_argument("--size", default="640x360")
+    parser.add_argument("--scheme", choices=("neqr-lsb", "waqi"), default="waqi")
+    parser.add_argument("--backend", default="numpy")
+    parser.add_argument("--queue", type=int, default=2)
+    args = parser.parse_args()
+
+    width, height = (int(n) for n in args.size.split("x"))
+    status = 0
+    with tempfile.TemporaryDirectory() as workdir:
+        watermark = os.path.join(workdir, "mark.png")
+        Image.fromarray(negation.ascii_art_to_array(os.path.join(REPO, "saturn.txt"))).save(watermark)
+        frame_dir = os.path.join(workdir, "frames")
+        os.makedirs(frame_dir)
+        with open(os.path.join(workdir, "clip.rgb"), "wb") as rgb, open(os.path.join(workdir, "clip.yuv"), "wb") as yuv:
+            for i, array in enumerate(synthetic(args.frames, width, height)):
+                Image.fromarray(array).save(os.path.join(frame_dir, f"frame_{i + 1}.png"), compress_level=1)
+                rgb.write(array.tobytes())
+                yuv.write(to_yuv420p(array))
+
+        sources = {
+            "png dir": (lambda: frames.directory_frames(frame_dir), lambda out: frames.DirectoryWriter(out, level=1)),
+            "rgb24": (lambda: frames.raw_frames(os.path.join(workdir, "clip.rgb"), width, height, "rgb24"),
+                      frames.RawWriter),
+            "yuv420p": (lambda: frames.raw_frames(os.path.join(workdir, "clip.yuv"), width, height, "yuv420p"),
+                        frames.RawWriter),
+        }
+        frame_bytes = width * height * 3
+        print(f"{args.frames} frames of {width}x{height}, {args.scheme}, {args.backend} backend, "
+              f"queue {args.queue}, {os.cpu_count()} CPU(s)")
+        print(f"{'source':<10}{'mode':<10}{'frames/s':>9}{'p50 ms':>9}{'p99 ms':>9}{'peak frames':>12}")
+        for name, (source, make_writer) in sources.items():
+            outputs = {}
+            for label in ("serial", "pipeline"):
+                out = os.path.join(workdir, f"{name.replace(' ', '_')}-{label}")
+                outputs[label] = out
+                writer = make_writer(out)
+                with writer:
+                    if label == "serial":
+                        result = run(label, lambda: serial(source(), watermark, writer, args.scheme, args.backend))
+                    else:
+                        result = run(label, lambda: frames.embed_frames(source(), watermark, writer, args.scheme,
+                                                                        args.backend, args.queue))
+                _, stats, peak = result
+                held = peak / frame_bytes
+                print(f"{name:<10}{label:<10}{stats.fps:>9.1f}{stats.latency_ms(50):>9.1f}"
+                      f"{stats.latency_ms(99):>9.1f}{held:>12.1f}")
+            # Half the frames through the pipeline again: the peak must stay put
+            with make_writer(os.path.join(workdir, f"{name.replace(' ', '_')}-half")) as writer:
+                _, _, half_peak = run("half", lambda: frames.embed_frames(
+                    itertools.islice(source(), args.frames // 2), watermark, writer, args.scheme, args.backend,
+                    args.queue))
+            if peak > half_peak + 2 * frame_bytes:
+                print(f"FAIL: {name} pipeline peak grew from {half_peak / frame_bytes:.1f} frames "
+                      f"({args.frames // 2} frames) to {held:.1f} ({args.frames} frames)")
+                status = 1
+            if not same_files(outputs["serial"], outputs["pipeline"]):
+                print(f"MISMATCH {name}: pipeline output differs from the serial loop")
+                status = 1
+        # Chroma of the marked yuv420p dump must be untouched
+        plane, chroma = width * height, frames.raw_frame_bytes(width, height, "yuv420p") - width * height
+        with open(os.path.join(workdir, "clip.yuv"), "rb") as fa, open(os.path.join(workdir, "yuv420p-pipeline"), "rb") as fb:
+            a, b = fa.read(), fb.read()
+        step = plane + chroma
+        if any(a[i + plane:i + step] != b[i + plane:i + step] for i in range(0, len(a), step)):
+            print("MISMATCH yuv420p: chroma changed")
+            status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+"""Benchmark: the hot-folder daemon under bursts of dropped files.
+
+Runs ``HotFolder`` (WaQI embed, ``--max-queue`` admitted at once) on a
+temporary inbox while ``--bursts`` bursts of ``--burst`` ``--size`` hosts
+are dropped into it (each copied in as ``.part`` and renamed, as ingest
+tools do), plus one file written slowly in two halves and one corrupt
+file. Samples the daemon's metrics as it goes and reports throughput per
+second, the peak queue depth and inbox backlog, and the lag at p50/p99.
+
+    python benchmarks/bench_hotfolder.py [--size 512] [--burst 40] [--bursts 3] [--max-queue 8]
+
+Exits non-zero if the queue ever exceeds ``--max-queue``, a half-written
+file is picked up, an output differs from ``waqi.embed_watermark``, the
+corrupt file does not land in ``failed/`` or a temporary file is left over.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from quantum_watermarking import negation, waqi  # noqa: E402
+from quantum_watermarking.hotfolder import HotFolder  # noqa: E402
+from quantum_watermarking.watermark_cache import default_cache  # noqa: E402
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def drop(inbox, name, data):
+    # Copy in under a name the daemon ignores, then rename into place
+    part = os.path.join(inbox, name + ".part")
+    with open(part, "wb") as fh:
+        fh.write(data)
+    os.replace(part, os.path.join(inbox, name))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=512)
+    parser.add_argument("--burst", type=int, default=40)
+    parser.add_argument("--bursts", type=int, default=3)
+    parser.add_argument("--gap", type=float, default=1.0, help="seconds between bursts")
+    parser.add_argument("--max-queue", type=int, default=8)
+    parser.add_argument("--backend", default="numpy")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    hosts = [rng.integers(0, 256, (args.size, args.size, 3), dtype=np.uint8) for _ in range(4)]
+    status = 0
+    with tempfile.TemporaryDirectory() as workdir:
+        inbox, outbox = os.path.join(workdir, "inbox"), os.path.join(workdir, "outbox")
+        os.makedirs(inbox)
+        watermark = os.path.join(workdir, "mark.png")
+        Image.fromarray(negation.ascii_art_to_array(os.path.join(REPO, "saturn.txt"))).save(watermark)
+        encoded = []
+        for host in hosts:
+            path = os.path.join(workdir, "host.png")
+            Image.fromarray(host).save(path, compress_level=1)
+            encoded.append(open(path, "rb").read())
+
+        hot = HotFolder(inbox, outbox, "embed", "waqi", watermark, args.backend, interval=0.05, settle=0.2,
+                        batch_size=4, max_queue=args.max_queue, png_level=1, report_interval=3600)
+        daemon = threading.Thread(target=hot.run, daemon=True)
+        daemon.start()
+        samples = []
+        sampling = threading.Event()
+
+        def sample():
+            while not sampling.is_set():
+                samples.append((time.perf_counter(), hot.metrics()))
+                time.sleep(0.05)
+
+        sampler = threading.Thread(target=sample, daemon=True)
+        sampler.start()
+        start = time.perf_counter()
+        # A file written in two halves, the pause longer than a poll but shorter than ``settle``
+        slow = os.path.join(inbox, "slow.png")
+        with open(slow, "wb") as fh:
+            fh.write(encoded[0][:len(encoded[0]) // 2])
+            fh.flush()
+            time.sleep(0.1)
+            fh.write(encoded[0][len(encoded[0]) // 2:])
+        drop(inbox, "corrupt.png", b"not a png")
+        total = 2
+        for burst in range(args.bursts):
+            for i in range(args.burst):
+                drop(inbox, f"burst{burst}_{i}.png", encoded[i % len(encoded)])
+            total += args.burst
+            time.sleep(args.gap)
+        while hot.processed + hot.failed < total:
+            time.sleep(0.05)
+        seconds = time.perf_counter() - start
+        sampling.set()
+        sampler.join()
+        hot.stop()
+        daemon.join()
+
+        metrics = hot.metrics()
+        peak_queue = max(m["queued"] for _, m in samples)
+        peak_waiting = max(m["waiting"] for _, m in samples)
+        # Files finished in each whole second of the run
+        times = np.array([t - start for t, _ in samples])
+        done = np.array([m["processed"] for _, m in samples])
+        rates = np.diff([done[times <= s][-1] for s in range(int(times[-1]) + 1)])
+        print(f"{total} files ({args.bursts} bursts of {args.burst}) of {args.size}x{args.size}, WaQI embed, "
+              f"{args.backend} backend, max queue {args.max_queue}")
+        print(f"processed {metrics['processed']}, failed {metrics['failed']} in {seconds:.1f} s "
+              f"({metrics['processed'] / seconds:.1f} files/s)")
+        print(f"files/s per second of the run: {' '.join(str(int(r)) for r in rates)}")
+        print(f"peak queue {peak_queue}, peak inbox backlog {peak_waiting}, "
+              f"lag p50 {metrics['lag']['p50_ms']:.0f} ms, p99 {metrics['lag']['p99_ms']:.0f} ms")
+
+        if peak_queue > args.max_queue:
+            print(f"FAIL: queue reached {peak_queue}")
+            status = 1
+        prepared = default_cache().get(watermark, (args.size, args.size), "waqi")
+        for name in sorted(os.listdir(outbox)):
+            if name.startswith("."):
+                print(f"FAIL: temporary file {name} left in the outbox")
+                status = 1
+                continue
+            index = 0 if name == "slow.png" else int(name.split("_")[1].split(".")[0]) % len(hosts)
+            expected = waqi.embed_watermark(hosts[index], prepared, args.backend)
+            if not np.array_equal(np.array(Image.open(os.path.join(outbox, name))), expected):
+                print(f"MISMATCH {name}: output differs from waqi.embed_watermark")
+                status = 1
+        if len(os.listdir(outbox)) != total - 1:
+            print(f"FAIL: {len(os.listdir(outbox))} outputs for {total - 1} good files")
+            status = 1
+        if sorted(os.listdir(hot.failed_dir)) != ["corrupt.png", "corrupt.png.error.txt"]:
+            print(f"FAIL: failed/ holds {sorted(os.listdir(hot.failed_dir))}")
+            status = 1
+        if [n for n in os.listdir(inbox) if n not in ("done", "failed")]:
+            print(f"FAIL: left in the inbox: {os.listdir(inbox)}")
+            status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
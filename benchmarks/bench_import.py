@@ -0,0 +1,89 @@
+"""Benchmark: import time of the headless modules, and what they pull in.
+
+Every module is imported in a fresh interpreter, best of ``--repeats``. The
+run fails (exit status 1) if a headless module drags in qiskit, qiskit_aer,
+tkinter, PIL.ImageTk or matplotlib, if its import takes more than
+``--budget-ms`` longer than importing numpy and PIL.Image (which it cannot
+avoid) on this machine, or if the NEQR-LSB extract command, which needs no
+simulator, loads qiskit.
+
+    python benchmarks/bench_import.py [--repeats 5] [--budget-ms 150]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY = ("qiskit", "qiskit_aer", "tkinter", "PIL.ImageTk", "matplotlib")
+HEADLESS = (
+    "quantum_watermarking",
+    "quantum_watermarking.cli",
+    "quantum_watermarking.neqr_lsb",
+    "quantum_watermarking.waqi",
+    "quantum_watermarking.negation",
+    "f",
+    "color_image_negation",
+)
+REFERENCE = ("numpy", "PIL.Image", "qiskit", "qiskit_aer")
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def probe(statement, repeats):
+    best = None
+    for _ in range(repeats):
+        code = PROBE.format(statement=statement, heavy=HEAVY)
+        out = subprocess.run([sys.executable, "-c", code], cwd=REPO, capture_output=True, text=True, check=True)
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        if best is None or result["seconds"] < best["seconds"]:
+            best = result
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=150.0,
+                        help="import time a headless module may add to that of numpy and PIL.Image")
+    args = parser.parse_args()
+
+    failures = []
+    base = probe("import numpy, PIL.Image", args.repeats)["seconds"] * 1e3
+    print(f"budget: {base:.1f} ms (numpy and PIL.Image) + {args.budget_ms:.0f} ms\n")
+    print(f"{'import':<36}{'ms':>9}  heavy modules loaded")
+    for name in REFERENCE + HEADLESS:
+        result = probe(f"import {name}", args.repeats)
+        print(f"{name:<36}{result['seconds'] * 1e3:>9.1f}  {', '.join(result['heavy']) or '-'}")
+        if name in HEADLESS and result["heavy"]:
+            failures.append(f"import {name} loads {', '.join(result['heavy'])}")
+        if name in HEADLESS and result["seconds"] * 1e3 > base + args.budget_ms:
+            failures.append(f"import {name} takes {result['seconds'] * 1e3:.1f} ms, over the "
+                            f"{base + args.budget_ms:.1f} ms budget")
+
+    # A full headless NEQR-LSB extraction never needs a simulator
+    import tempfile
+    with tempfile.TemporaryDirectory() as workdir:
+        output = os.path.join(workdir, "mark.png")
+        statement = ("from quantum_watermarking import cli; "
+                     f"cli.main(['--log-level', 'WARNING', 'extract', 'Lenna.png', {output!r}])")
+        result = probe(statement, 1)
+    print(f"{'cli extract --scheme neqr-lsb':<36}{result['seconds'] * 1e3:>9.1f}  {', '.join(result['heavy']) or '-'}")
+    if result["heavy"]:
+        failures.append(f"NEQR-LSB extraction loads {', '.join(result['heavy'])}")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+"""Benchmark: NEQR intensity arithmetic, circuits against the vectorised paths.
+
+First runs each operation's circuit on ``--circuit-backend`` over every
+intensity (``xor-key`` over a random sample of pixel/key pairs) for several
+parameters and compares with its NumPy reference. Then times each
+operation on a ``--size`` RGB host with the ``numpy`` and ``bitsliced``
+backends and with ``bitsliced`` over ``--workers`` processes (shared
+memory), checking every result against the reference.
+
+    python benchmarks/bench_intensity.py [--size 2048] [--workers 2] [--circuit-backend stabilizer]
+
+Exits non-zero if any circuit or backend result differs from the reference.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from quantum_watermarking import intensity, parallel, schemes  # noqa: E402
+from quantum_watermarking.parallel import ProcessBackend  # noqa: E402
+
+CIRCUIT_CASES = [schemes.AddConstant(c) for c in (1, 37, 128, 255)] + \
+    [schemes.Threshold(t) for t in (0, 1, 128, 255, 256)] + \
+    [schemes.BitPlane(k) for k in (0, 3, 7)] + [schemes.XOR_KEY]
+THROUGHPUT_CASES = (("add", 200), ("threshold", 128), ("bit-plane", 0), ("xor-key", None))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=2048)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--circuit-backend", default="stabilizer")
+    args = parser.parse_args()
+
+    status = 0
+    print(f"circuits on the {args.circuit_backend} backend")
+    print(f"{'scheme':<16}{'cases':>7}{'wrong':>7}{'seconds':>9}")
+    for scheme in CIRCUIT_CASES:
+        inputs = schemes.exhaustive_inputs(scheme, limit=1024)
+        expected = scheme.reference(*inputs).astype(np.uint8)
+        start = time.perf_counter()
+        actual = intensity.apply(scheme, *inputs, backend=args.circuit_backend)
+        wrong = int(np.count_nonzero(actual != expected))
+        print(f"{scheme.name:<16}{len(expected):>7}{wrong:>7}{time.perf_counter() - start:>9.2f}")
+        if wrong:
+            print(f"MISMATCH {scheme.name}: circuit differs from the reference")
+            status = 1
+
+    rng = np.random.default_rng(0)
+    host = rng.integers(0, 256, (args.size, args.size, 3), dtype=np.uint8)
+    key = rng.integers(0, 256, host.shape, dtype=np.uint8)
+    shared_host, shared_key = parallel.share(host), parallel.share(key)
+    backends = {"numpy": "numpy", "bitsliced": "bitsliced",
+                f"bitsliced x{args.workers}": ProcessBackend("bitsliced", args.workers)}
+    print(f"\n{args.size}x{args.size} RGB host ({host.size / 1e6:.1f} M values), Mvalues/s")
+    print(f"{'operation':<16}" + "".join(f"{name:>16}" for name in backends))
+    try:
+        for op, value in THROUGHPUT_CASES:
+            scheme = intensity.scheme_for(op, value)
+            others = (shared_key,) if op == "xor-key" else ()
+            expected = scheme.reference(host, *(key,) * len(others)).astype(np.uint8)
+            row = f"{scheme.name:<16}"
+            for label, backend in backends.items():
+                start = time.perf_counter()
+                result = intensity.apply(scheme, shared_host, *others, backend=backend)
+                seconds = time.perf_counter() - start
+                row += f"{host.size / seconds / 1e6:>16.1f}"
+                if not np.array_equal(result, expected):
+                    print(f"MISMATCH {scheme.name} on {label}")
+                    status = 1
+            print(row)
+    finally:
+        backends[f"bitsliced x{args.workers}"].close()
+        parallel.release(shared_host)
+        parallel.release(shared_key)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,143 @@
+"""Benchmark: one thread per click against the bounded job pool.
+
+A stand-in UI thread ticks every ``FRAME_MS`` (as Tk's ``after`` would) and
+resizes a preview each frame, while ``--clicks`` WaQI embeds of a
+``--size`` host are started. The old way starts a thread per click, so they
+all run at once; the new way submits them to ``JobPool(1, 2)``, which runs
+one, queues two and refuses the rest. Each scenario runs for ``--seconds``
+and is then cancelled (the old threads get a progress bus too, or they
+could not be stopped at all). Reports the UI frame times, the jobs in
+flight, how long cancellation took to take effect and the traced memory
+left once the jobs are gone.
+
+    python benchmarks/bench_jobs.py [--size 4096] [--backend numpy] [--clicks 4] [--seconds 3]
+
+Exits non-zero if a cancelled job outlives ``--max-cancel-ms`` or its
+memory is not released.
+"""
+import argparse
+import gc
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from quantum_watermarking import waqi  # noqa: E402
+from quantum_watermarking.jobs import FRAME_MS, FrameTimer, JobPool, QueueFull  # noqa: E402
+from quantum_watermarking.progress import Cancelled, ProgressBus  # noqa: E402
+
+
+def embed_job(size, backend, seed):
+    # Inputs are built inside the job, as the GUIs decode inside theirs
+    def job(bus):
+        rng = np.random.default_rng(seed)
+        host = rng.integers(0, 256, (size, size, 3), dtype=np.uint8)
+        bits = np.unpackbits(rng.integers(0, 256, (size // 4, size // 4), dtype=np.uint8))
+        return waqi.embed_watermark(host, bits, backend, progress=bus).shape
+    return job
+
+
+def ui_loop(frames, seconds):
+    # One preview resize per frame, paced like an ``after(FRAME_MS)`` loop
+    preview = Image.fromarray(np.random.default_rng(1).integers(0, 256, (512, 512, 3), dtype=np.uint8))
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        time.sleep(FRAME_MS / 1e3)
+        preview.resize((200, 200), Image.Resampling.LANCZOS)
+        frames.tick()
+
+
+def threads_scenario(args):
+    buses, threads = [], []
+
+    def run(bus, job):
+        try:
+            job(bus)
+        except Cancelled:
+            pass
+
+    for click in range(args.clicks):
+        bus = ProgressBus()
+        thread = threading.Thread(target=run, args=(bus, embed_job(args.size, args.backend, click)), daemon=True)
+        thread.start()
+        buses.append(bus)
+        threads.append(thread)
+    in_flight = sum(thread.is_alive() for thread in threads)
+
+    def cancel():
+        for bus in buses:
+            bus.cancel()
+        for thread in threads:
+            thread.join()
+    return in_flight, cancel
+
+
+def pool_scenario(args):
+    pool = JobPool(max_workers=1, max_pending=2)
+    for click in range(args.clicks):
+        try:
+            pool.submit(f"embed-{click}", embed_job(args.size, args.backend, click))
+        except QueueFull:
+            pass
+    in_flight = len(pool.jobs)
+
+    def cancel():
+        pool.shutdown(wait=True)
+    return in_flight, cancel
+
+
+def measure(name, scenario, args):
+    gc.collect()
+    tracemalloc.start()
+    frames = FrameTimer()
+    in_flight, cancel = scenario(args)
+    ui_loop(frames, args.seconds)
+    start = time.perf_counter()
+    cancel()
+    cancel_ms = (time.perf_counter() - start) * 1e3
+    gc.collect()
+    _, peak = tracemalloc.get_traced_memory()
+    left, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    stats = frames.stats()
+    print(f"{name:<10}{in_flight:>7}{stats['p50_ms']:>9.1f}{stats['p99_ms']:>9.1f}{stats['max_ms']:>9.1f}"
+          f"{cancel_ms:>11.0f}{peak / 2**20:>10.0f}{left / 2**20:>9.1f}")
+    return cancel_ms, left
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=4096)
+    parser.add_argument("--backend", default="numpy")
+    parser.add_argument("--clicks", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--max-cancel-ms", type=float, default=2000)
+    args = parser.parse_args()
+
+    print(f"{args.clicks} clicks, WaQI embed of a {args.size}x{args.size} host, {args.backend} backend, "
+          f"{args.seconds:.0f} s each, frame target {FRAME_MS} ms")
+    print(f"{'mode':<10}{'jobs':>7}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}{'cancel ms':>11}{'peak MB':>10}{'left MB':>9}")
+    # Warm up first, so imports and the simulator are not charged to a scenario
+    embed_job(64, args.backend, 0)(ProgressBus())
+    status = 0
+    for name, scenario in (("threads", threads_scenario), ("pool", pool_scenario)):
+        cancel_ms, left = measure(name, scenario, args)
+        if name != "pool":
+            continue
+        if cancel_ms > args.max_cancel_ms:
+            print(f"FAIL: cancellation took {cancel_ms:.0f} ms")
+            status = 1
+        if left > 16 * 2**20:
+            print(f"FAIL: {left / 2**20:.0f} MB still allocated after the jobs ended")
+            status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
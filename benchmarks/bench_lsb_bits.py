@@ -0,0 +1,104 @@
+"""Benchmark: k-LSB embedding, capacity against distortion for k = 1..4.
+
+For both schemes and each k, embeds the bundled Lenna watermark (prepared
+as for the CLI) into a ``--size`` RGB host and extracts it again, on the
+``numpy`` and ``bitsliced`` backends, reporting the host values used, the
+payload bits embedded per second and the PSNR of the watermarked host. Then
+embeds a WaQI payload of twice a ``--small`` grayscale host's size, which
+only fits from k = 2 up.
+
+    python benchmarks/bench_lsb_bits.py [--size 1024] [--small 64]
+
+Exits non-zero if an extraction differs from the embedded bits, the
+1/k host values are not what was used, or the small host's capacity check
+disagrees with its capacity.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from quantum_watermarking import neqr_lsb, schemes, waqi  # noqa: E402
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKENDS = ("numpy", "bitsliced")
+
+
+def psnr(original, marked):
+    mse = np.mean((original.astype(np.float64) - marked.astype(np.float64)) ** 2)
+    return float("inf") if mse == 0 else 10 * np.log10(255 ** 2 / mse)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=1024)
+    parser.add_argument("--small", type=int, default=64)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    host = rng.integers(0, 256, (args.size, args.size, 3), dtype=np.uint8)
+    mark = Image.open(os.path.join(REPO, "Lenna.png"))
+    status = 0
+    print(f"{args.size}x{args.size} RGB host, Lenna watermark")
+    print(f"{'scheme':<10}{'k':>3}{'backend':>11}{'bits':>10}{'values':>10}{'Mbit/s':>9}{'PSNR dB':>9}")
+    for scheme in ("neqr-lsb", "waqi"):
+        prepared = (neqr_lsb.load_watermark(mark, (args.size, args.size)) if scheme == "neqr-lsb"
+                    else waqi.load_watermark(mark, (args.size, args.size)))
+        # NEQR-LSB XORs into the host LSBs, so extraction is exact on a host with them cleared
+        embed_host = host & np.uint8(0xF0) if scheme == "neqr-lsb" else host
+        for k in range(1, schemes.MAX_LSB_BITS + 1):
+            for backend in BACKENDS:
+                start = time.perf_counter()
+                if scheme == "neqr-lsb":
+                    marked = neqr_lsb.embed_watermark(embed_host, prepared, backend, lsb_bits=k)
+                    seconds = time.perf_counter() - start
+                    extracted, _ = neqr_lsb.extract_watermark(marked, backend=backend, lsb_bits=k)
+                    expected = np.repeat(((prepared > 127) * 255).astype(np.uint8)[..., None], 3, axis=2)
+                    # The mark is applied to all three channels of each host pixel it uses
+                    bits = prepared.size * 3
+                    values = neqr_lsb.payload_rows(len(prepared), k) * prepared.shape[1] * 3
+                else:
+                    marked = waqi.embed_watermark(embed_host, prepared, backend, lsb_bits=k)
+                    seconds = time.perf_counter() - start
+                    extracted, _ = waqi.extract_watermark(marked, backend, lsb_bits=k)
+                    expected = (prepared[:extracted.size].reshape(extracted.shape) * 255).astype(np.uint8)
+                    bits = prepared.size
+                    values = waqi.payload_values(bits, k)
+                used = int(np.count_nonzero(marked != embed_host))
+                print(f"{scheme:<10}{k:>3}{backend:>11}{bits:>10}{values:>10}{bits / seconds / 1e6:>9.1f}"
+                      f"{psnr(embed_host, marked):>9.2f}")
+                if not np.array_equal(extracted, expected):
+                    print(f"MISMATCH {scheme} k={k} on {backend}: extraction differs from the embedded bits")
+                    status = 1
+                if used > values:
+                    print(f"FAIL {scheme} k={k}: {used} host values changed, only {values} carry the payload")
+                    status = 1
+
+    small = rng.integers(0, 256, (args.small, args.small), dtype=np.uint8)
+    payload = rng.integers(0, 2, 2 * small.size, dtype=np.uint8)
+    print(f"\n{payload.size}-bit WaQI payload in a {args.small}x{args.small} grayscale host")
+    for k in range(1, schemes.MAX_LSB_BITS + 1):
+        try:
+            marked = waqi.embed_watermark(small, payload, "numpy", lsb_bits=k)
+        except waqi.CapacityError:
+            fits = False
+        else:
+            fits = True
+            recovered = schemes.unpack_payload(marked.reshape(-1) & ((1 << k) - 1), k)[:payload.size]
+            if not np.array_equal(recovered, payload):
+                print(f"MISMATCH small host k={k}: payload not recovered")
+                status = 1
+        print(f"k={k}: {'fits' if fits else 'CapacityError'}")
+        if fits != (small.size * k >= payload.size):
+            print(f"FAIL: k={k} capacity check disagrees with {small.size * k} available bits")
+            status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+"""Benchmark: multi-index Hamming search against a linear popcount scan.
+
+Builds indexes of ``--references`` random reference watermarks of
+``--bits`` bits (256 is the 16x16 mark of a 64x64 host) and queries them
+with noisy copies of known references, flipping up to ``--error-rate`` of
+the bits. Reports build time, queries per second for the index and for a
+linear scan over the packed codes, accuracy, and checks both searches agree.
+
+    python benchmarks/bench_match_index.py [--references 10000 1000000] [--bits 256]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from quantum_watermarking.match_index import MatchIndex, pack, popcount  # noqa: E402
+
+
+def noisy_queries(rng, references, count, error_rate):
+    truth = rng.integers(0, len(references), count)
+    queries = references[truth].copy()
+    nbits = references.shape[1]
+    for row in queries:
+        flips = rng.integers(0, int(nbits * error_rate) + 1)
+        row[rng.choice(nbits, flips, replace=False)] ^= 1
+    return truth, queries
+
+
+def linear_scan(codes, queries):
+    packed = pack(queries)
+    ids = np.empty(len(queries), dtype=np.int64)
+    distances = np.empty(len(queries), dtype=np.int64)
+    for q, words in enumerate(packed):
+        d = popcount(codes ^ words).sum(axis=1)
+        ids[q] = np.argmin(d)
+        distances[q] = d[ids[q]]
+    return ids, distances
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--references", type=int, nargs="+", default=[10_000, 1_000_000])
+    parser.add_argument("--bits", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--scan-queries", type=int, default=100, help="queries timed for the linear scan")
+    parser.add_argument("--error-rate", type=float, default=0.08)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    status = 0
+    print(f"{args.bits}-bit watermarks, up to {args.error_rate:.0%} bit errors per query")
+    print(f"{'references':>11}{'build s':>9}{'index q/s':>11}{'scan q/s':>10}{'speedup':>9}{'accuracy':>10}")
+    for n in args.references:
+        references = rng.integers(0, 2, (n, args.bits), dtype=np.uint8)
+        start = time.perf_counter()
+        index = MatchIndex(args.bits)
+        index.add(range(n), references)
+        index.build()
+        build = time.perf_counter() - start
+        del references
+
+        truth, queries = noisy_queries(rng, np.unpackbits(index._codes.view(np.uint8), axis=1)[:, :args.bits],
+                                       args.queries, args.error_rate)
+        start = time.perf_counter()
+        ids, distances = index.search(queries)
+        index_rate = len(queries) / (time.perf_counter() - start)
+
+        sample = slice(0, min(args.scan_queries, len(queries)))
+        start = time.perf_counter()
+        scan_ids, scan_distances = linear_scan(index._codes, queries[sample])
+        scan_rate = len(scan_ids) / (time.perf_counter() - start)
+        if not (np.array_equal(ids[sample], scan_ids) and np.array_equal(distances[sample], scan_distances)):
+            print(f"MISMATCH between index and linear scan at {n} references")
+            status = 1
+        print(f"{n:>11}{build:>9.2f}{index_rate:>11.0f}{scan_rate:>10.0f}{index_rate / scan_rate:>8.1f}x"
+              f"{np.mean(ids == truth):>10.1%}")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
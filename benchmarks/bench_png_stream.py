@@ -0,0 +1,109 @@
+"""Benchmark: in-memory extraction and save against strip-streamed PNG output.
+
+Extracts both outputs (watermark and reconstructed original) from a
+synthetic ``--size`` square RGB host held in a memory-mapped ``.npy``, once
+the in-memory way (full arrays, then ``Image.save``) and once through
+``extract_strips`` and ``PNGStreamWriter`` at the default and the fast zlib
+level. Reports extraction and encode time separately, output size, and the
+peak of NumPy allocations (tracemalloc), and checks every output decodes to
+the same pixels.
+
+    python benchmarks/bench_png_stream.py [--size 4096] [--strip-rows 64]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from quantum_watermarking import neqr_lsb, waqi  # noqa: E402
+from quantum_watermarking.png_stream import FAST, PNGStreamWriter, mode_for  # noqa: E402
+
+
+def in_memory(scheme, host, watermark_path, original_path):
+    start = time.perf_counter()
+    if scheme == "neqr-lsb":
+        bits, original = neqr_lsb.extract_watermark(host)
+        extracted, original = neqr_lsb.extraction_images(host, bits, original)
+    else:
+        watermark, original = waqi.extract_watermark(host, "numpy")
+        extracted, original = Image.fromarray(watermark, mode="L"), Image.fromarray(original)
+    extract = time.perf_counter() - start
+    start = time.perf_counter()
+    extracted.save(watermark_path)
+    original.save(original_path)
+    return extract, time.perf_counter() - start
+
+
+def streamed(scheme, host, watermark_path, original_path, level, strip_rows):
+    height, width = host.shape[:2]
+    module = neqr_lsb if scheme == "neqr-lsb" else waqi
+    watermark_mode = mode_for(host) if scheme == "neqr-lsb" else "L"
+    start = time.perf_counter()
+    with PNGStreamWriter(watermark_path, width // 4, height // 4, watermark_mode, level) as extracted, \
+            PNGStreamWriter(original_path, width, height, mode_for(host), level) as original:
+        for original_rows, watermark_rows in module.extract_strips(host, strip_rows, "numpy"):
+            extracted.write_rows(watermark_rows)
+            original.write_rows(original_rows)
+    encode = extracted.encode_seconds + original.encode_seconds
+    return time.perf_counter() - start - encode, encode
+
+
+def measure(run, *args):
+    tracemalloc.start()
+    extract, encode = run(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return extract, encode, peak / 2 ** 20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=4096)
+    parser.add_argument("--strip-rows", type=int, default=64)
+    args = parser.parse_args()
+
+    status = 0
+    with tempfile.TemporaryDirectory() as workdir:
+        # A smooth gradient with noise compresses like a photograph, unlike pure noise
+        host_path = os.path.join(workdir, "host.npy")
+        host = np.lib.format.open_memmap(host_path, mode="w+", dtype=np.uint8, shape=(args.size, args.size, 3))
+        rng = np.random.default_rng(0)
+        ramp = np.arange(args.size, dtype=np.uint16)
+        for top in range(0, args.size, 256):
+            rows = (ramp[top:top + 256, None] + ramp[None, :]) // 8
+            noise = rng.integers(0, 8, (len(rows), args.size, 3), dtype=np.uint16)
+            host[top:top + 256] = ((rows[..., None] + noise) & 255).astype(np.uint8)
+        host.flush()
+        del host
+        host = np.load(host_path, mmap_mode="r")
+
+        print(f"{args.size}x{args.size} RGB host, strips of {args.strip_rows} rows")
+        print(f"{'scheme':<10}{'writer':<16}{'extract s':>10}{'encode s':>10}{'MB out':>8}{'peak MB':>9}")
+        for scheme in ("neqr-lsb", "waqi"):
+            outputs = {}
+            runs = [("in-memory", in_memory, ()),
+                    ("stream", streamed, (6, args.strip_rows)),
+                    ("stream fast", streamed, (FAST, args.strip_rows))]
+            for label, run, extra in runs:
+                paths = [os.path.join(workdir, f"{label}-{n}.png") for n in ("watermark", "original")]
+                extract, encode, peak = measure(run, scheme, host, *paths, *extra)
+                size = sum(os.path.getsize(p) for p in paths) / 2 ** 20
+                print(f"{scheme:<10}{label:<16}{extract:>10.3f}{encode:>10.3f}{size:>8.1f}{peak:>9.1f}")
+                outputs[label] = [np.array(Image.open(p)) for p in paths]
+            reference = outputs["in-memory"]
+            for label, arrays in outputs.items():
+                if not all(np.array_equal(a, b) for a, b in zip(arrays, reference)):
+                    print(f"MISMATCH {scheme} {label}")
+                    status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
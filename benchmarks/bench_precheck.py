@@ -0,0 +1,85 @@
+"""Benchmark: cost of the "already watermarked?" pre-check against an embed.
+
+For each host size, embeds a watermark with WaQI on ``--backend``, then
+times the pre-check (payload-row decode plus BER/NC scoring) on the marked
+host against the embed itself, and scores an unmarked noisy host and a
+biased one (every LSB even, like the original ``extract`` reconstructs)
+against a mostly dark logo, printing the scores so the margins to
+``--threshold`` and ``--min-nc`` are visible.
+
+    python benchmarks/bench_precheck.py [--sizes 256 1024] [--backend aer-batched]
+
+Exits non-zero if a marked host is not detected, an unmarked or biased one
+is, or a NEQR-LSB host is scored at all (it cannot be detected).
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from quantum_watermarking import detect, neqr_lsb, roi, waqi  # noqa: E402
+
+
+def precheck(path, prepared, threshold, min_nc):
+    start = time.perf_counter()
+    image = Image.open(path)
+    rows = -(-prepared.size // (image.size[0] * roi.channel_count(image)))
+    top_rows, _ = roi.decode_rows(path, rows)
+    result = detect.score(top_rows, prepared, "waqi")
+    return result, result["ber"] <= threshold and result["nc"] >= min_nc, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[256, 1024])
+    parser.add_argument("--backend", default="aer-batched")
+    parser.add_argument("--threshold", type=float, default=detect.DEFAULT_BER_THRESHOLD)
+    parser.add_argument("--min-nc", type=float, default=detect.DEFAULT_NC_THRESHOLD)
+    args = parser.parse_args()
+
+    logo = Image.new("L", (64, 64), 0)
+    ImageDraw.Draw(logo).rectangle((20, 20, 30, 30), fill=255)
+    rng = np.random.default_rng(0)
+    status = 0
+    print(f"{'size':>6}{'embed s':>9}{'check s':>9}{'BER marked':>12}{'BER clean':>11}{'BER biased':>12}"
+          f"{'NC marked':>11}{'NC clean':>10}{'NC biased':>11}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in args.sizes:
+            host = rng.integers(0, 256, (size, size, 3), dtype=np.uint8)
+            prepared = waqi.load_watermark(logo, (size, size))
+            start = time.perf_counter()
+            marked = waqi.embed_watermark(host, prepared, args.backend)
+            embed = time.perf_counter() - start
+            results = {}
+            for name, array in (("marked", marked), ("clean", host), ("biased", host & 254)):
+                path = os.path.join(workdir, f"{size}-{name}.png")
+                Image.fromarray(array).save(path)
+                results[name] = precheck(path, prepared, args.threshold, args.min_nc)
+            if not results["marked"][1] or results["clean"][1] or results["biased"][1]:
+                print(f"WRONG DECISION {size}: " + ", ".join(f"{name}={found}"
+                                                             for name, (_, found, _) in results.items()))
+                status = 1
+            hit, miss, biased = (results[name][0] for name in ("marked", "clean", "biased"))
+            print(f"{size:>6}{embed:>9.3f}{results['marked'][2]:>9.4f}{hit['ber']:>12.4f}{miss['ber']:>11.4f}"
+                  f"{biased['ber']:>12.4f}{hit['nc']:>11.4f}{miss['nc']:>10.4f}{biased['nc']:>11.4f}")
+
+    host = rng.integers(0, 256, (256, 256, 3), dtype=np.uint8)
+    prepared = neqr_lsb.load_watermark(logo, (256, 256))
+    try:
+        detect.score(neqr_lsb.embed_watermark(host, prepared, "numpy"), prepared, "neqr-lsb")
+    except ValueError as e:
+        print(f"\nneqr-lsb: {e}")
+    else:
+        print("\nFAIL neqr-lsb: scored, but a XOR-ed mark cannot be detected")
+        status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
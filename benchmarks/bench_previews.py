@@ -0,0 +1,107 @@
+"""Benchmark: preview and host decode, old GUI path against ``PreviewCache``.
+
+For a synthetic ``--size`` host saved as PNG and as JPEG, times what loading
+it used to cost the Tk main thread (open + full-resolution LANCZOS resize,
+then a second decode for the matrix log) plus the decode the embedding did
+again, against the new path: a background thumbnail from one decode (or a
+JPEG draft decode), the processing reusing that decode, and a cached
+re-display. Also reports the PSNR of the new thumbnail against the old one.
+
+    python benchmarks/bench_previews.py [--size 4096] [--thumb 200]
+
+Exits non-zero if the processing decode was not shared or the thumbnail
+differs visibly (PSNR under ``--min-psnr``).
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from quantum_watermarking.previews import PreviewCache  # noqa: E402
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - start) * 1e3
+
+
+def psnr(a, b):
+    mse = np.mean((np.asarray(a, dtype=np.float64) - np.asarray(b, dtype=np.float64)) ** 2)
+    return float("inf") if mse == 0 else 10 * np.log10(255 ** 2 / mse)
+
+
+def old_path(path, size):
+    # Everything here ran on the Tk main thread except the final decode
+    def ui():
+        thumb = Image.open(path).resize(size, Image.Resampling.LANCZOS)
+        np.array(Image.open(path))
+        return thumb
+    thumb, ui_ms = timed(ui)
+    _, process_ms = timed(lambda: np.array(Image.open(path)))
+    return thumb, ui_ms, process_ms
+
+
+def new_path(path, size):
+    previews = PreviewCache()
+    delivered = []
+    start = time.perf_counter()
+    future = previews.request(path, size, delivered.append)
+    ui_ms = (time.perf_counter() - start) * 1e3
+    future.result()
+    ready_ms = (time.perf_counter() - start) * 1e3
+    decodes = previews.decodes
+    _, process_ms = timed(lambda: np.array(previews.image(path)))
+    _, again_ms = timed(lambda: previews.thumbnail(path, size))
+    shared = previews.decodes == max(decodes, 1)
+    return delivered[0], ui_ms, ready_ms, process_ms, again_ms, shared, previews.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=4096)
+    parser.add_argument("--thumb", type=int, default=200)
+    parser.add_argument("--min-psnr", type=float, default=35.0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    ramp = np.linspace(0, 255, args.size, dtype=np.float32)
+    base = ((ramp[None, :, None] + ramp[::-1, None, None]) / 2).astype(np.uint8)
+    # Gradient plus noise (uint8 addition wraps), so decode cost is realistic
+    host = Image.fromarray(base + rng.integers(0, 32, (args.size, args.size, 3), dtype=np.uint8))
+    size = (args.thumb, args.thumb)
+    status = 0
+    with tempfile.TemporaryDirectory() as workdir:
+        print(f"{args.size}x{args.size} host, {args.thumb}x{args.thumb} preview (times in ms)")
+        print(f"{'file':<6}{'mode':<5}{'UI thread':>10}{'preview':>9}{'process':>9}{'again':>8}"
+              f"{'decodes':>9}{'PSNR dB':>9}")
+        for ext in ("png", "jpg"):
+            path = os.path.join(workdir, f"host.{ext}")
+            if ext == "png":
+                host.save(path, compress_level=1)
+            else:
+                host.save(path, quality=90)
+            old_thumb, old_ui, old_process = old_path(path, size)
+            print(f"{ext:<6}{'old':<5}{old_ui:>10.1f}{old_ui:>9.1f}{old_process:>9.1f}{old_ui:>8.1f}{3:>9}")
+            thumb, ui_ms, ready_ms, process_ms, again_ms, shared, stats = new_path(path, size)
+            decodes = f"{stats['decodes']}+{stats['draft_decodes']}d" if stats["draft_decodes"] else stats["decodes"]
+            quality = psnr(old_thumb, thumb)
+            print(f"{ext:<6}{'new':<5}{ui_ms:>10.1f}{ready_ms:>9.1f}{process_ms:>9.1f}{again_ms:>8.2f}"
+                  f"{decodes:>9}{quality:>9.1f}")
+            if not shared:
+                print(f"FAIL: {ext} host decoded again for processing")
+                status = 1
+            if quality < args.min_psnr:
+                print(f"FAIL: {ext} thumbnail PSNR {quality:.1f} dB")
+                status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+"""Benchmark: full decode against region-of-interest decode for extraction.
+
+For each PNG given (or synthetic hosts of ``--sizes``), times a full decode
+followed by ``extract_watermark`` against ``roi.decode_rows`` followed by
+``extract_region``, reports the decoded bytes of each, and checks both give
+the same watermark.
+
+    python benchmarks/bench_roi_decode.py [--sizes 1024 4096] [images ...]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from quantum_watermarking import neqr_lsb, roi, waqi  # noqa: E402
+
+
+def full_extract(path, scheme):
+    start = time.perf_counter()
+    array = np.array(Image.open(path))
+    if scheme == "neqr-lsb":
+        bits, original = neqr_lsb.extract_watermark(array)
+        watermark = np.array(neqr_lsb.extraction_images(array, bits, original)[0])
+    else:
+        watermark = waqi.extract_watermark(array, "numpy")[0]
+    return watermark, array.nbytes, time.perf_counter() - start
+
+
+def roi_extract(path, scheme):
+    start = time.perf_counter()
+    top_rows, stats = roi.decode_rows(path, scheme=scheme)
+    module = neqr_lsb if scheme == "neqr-lsb" else waqi
+    watermark = module.extract_region(top_rows, stats["height"], "numpy")
+    return watermark, stats["decoded_bytes"], time.perf_counter() - start
+
+
+def best_of(run, path, scheme, repeats):
+    results = [run(path, scheme) for _ in range(repeats)]
+    return min(results, key=lambda r: r[2])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("images", nargs="*")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1024, 4096])
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    status = 0
+    with tempfile.TemporaryDirectory() as workdir:
+        images = list(args.images)
+        rng = np.random.default_rng(0)
+        for size in [] if images else args.sizes:
+            ramp = np.add.outer(np.arange(size), np.arange(size)) // 8
+            host = ((ramp[..., None] + rng.integers(0, 8, (size, size, 3))) & 255).astype(np.uint8)
+            images.append(os.path.join(workdir, f"host_{size}.png"))
+            Image.fromarray(host).save(images[-1])
+
+        print(f"{'image':<22}{'scheme':<10}{'full MB':>9}{'roi MB':>8}{'full s':>9}{'roi s':>8}{'speedup':>9}")
+        for path in images:
+            for scheme in ("neqr-lsb", "waqi"):
+                expected, full_bytes, full_time = best_of(full_extract, path, scheme, args.repeats)
+                watermark, roi_bytes, roi_time = best_of(roi_extract, path, scheme, args.repeats)
+                if not np.array_equal(watermark, expected):
+                    print(f"MISMATCH {path} {scheme}")
+                    status = 1
+                print(f"{os.path.basename(path):<22}{scheme:<10}{full_bytes / 2 ** 20:>9.1f}{roi_bytes / 2 ** 20:>8.1f}"
+                      f"{full_time:>9.3f}{roi_time:>8.3f}{full_time / roi_time:>8.1f}x")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
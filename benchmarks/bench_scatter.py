@@ -0,0 +1,133 @@
+"""Benchmark: keyed scatter positions against the fixed embedding region.
+
+Checks ``scatter.KeyedPermutation`` is a bijection (exhaustively on a range
+of small sizes) and times generating one ``--tile`` of positions of a
+gigapixel RGB host, forwards and inverse, with the peak memory that takes.
+Then embeds and extracts with both schemes on a ``--size`` RGB host, with
+the fixed region and scattered by a key, on the ``numpy`` and ``bitsliced``
+backends, reporting values/s and how many of the host's 64x64 blocks the
+mark touches; the scattered extraction is also run strip by strip and with
+the wrong key.
+
+    python benchmarks/bench_scatter.py [--size 1024] [--tile 1048576]
+
+Exits non-zero if a permutation is not a bijection, a tile costs memory out
+of proportion to its length, a round trip (full or streamed) differs, or
+the wrong key recovers the watermark.
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from quantum_watermarking import neqr_lsb, waqi  # noqa: E402
+from quantum_watermarking.scatter import KeyedPermutation  # noqa: E402
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GIGAPIXEL = 32768 * 32768 * 3
+BLOCK = 64
+
+
+def blocks_touched(original, marked):
+    changed = np.any((original != marked).reshape(original.shape[0], original.shape[1], -1), axis=2)
+    h, w = changed.shape[0] // BLOCK, changed.shape[1] // BLOCK
+    return int(np.count_nonzero(changed[:h * BLOCK, :w * BLOCK].reshape(h, BLOCK, w, BLOCK).any(axis=(1, 3)))), h * w
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=1024)
+    parser.add_argument("--tile", type=int, default=1 << 20)
+    parser.add_argument("--key", default="bench-key")
+    args = parser.parse_args()
+    status = 0
+
+    for n in list(range(1, 70)) + [1000, 4097, 65536, 99991]:
+        perm = KeyedPermutation(args.key, n)
+        forward = perm.forward(np.arange(n))
+        if not np.array_equal(np.sort(forward), np.arange(n)) or not np.array_equal(perm.inverse(forward),
+                                                                                   np.arange(n)):
+            print(f"FAIL: the permutation of {n} is not a bijection")
+            status = 1
+    print("bijection on sizes 1..69, 1000, 4097, 65536, 99991: checked")
+
+    perm = KeyedPermutation(args.key, GIGAPIXEL)
+    start = GIGAPIXEL // 2
+    tracemalloc.start()
+    began = time.perf_counter()
+    positions = perm.forward(np.arange(start, start + args.tile))
+    forward_s = time.perf_counter() - began
+    began = time.perf_counter()
+    back = perm.inverse(positions)
+    inverse_s = time.perf_counter() - began
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"{args.tile} positions of a 32768x32768 RGB host: forward {args.tile / forward_s / 1e6:.1f} M/s, "
+          f"inverse {args.tile / inverse_s / 1e6:.1f} M/s, peak {peak / 2**20:.1f} MB "
+          f"({peak / args.tile:.0f} bytes per position)")
+    if not np.array_equal(back, np.arange(start, start + args.tile)):
+        print("FAIL: inverse does not undo forward on the gigapixel tile")
+        status = 1
+    if peak > 64 * args.tile:
+        print(f"FAIL: {peak} bytes for a {args.tile}-position tile")
+        status = 1
+
+    rng = np.random.default_rng(0)
+    host = rng.integers(0, 256, (args.size, args.size, 3), dtype=np.uint8) & np.uint8(0xFE)
+    mark = Image.open(os.path.join(REPO, "Lenna.png"))
+    prepared = {"neqr-lsb": neqr_lsb.load_watermark(mark, (args.size, args.size)),
+                "waqi": waqi.load_watermark(mark, (args.size, args.size))}
+    print(f"\n{args.size}x{args.size} RGB host, Lenna watermark (Mvalues/s; blocks are {BLOCK}x{BLOCK})")
+    print(f"{'scheme':<10}{'positions':<11}{'backend':<11}{'embed':>8}{'extract':>9}{'blocks':>13}")
+    for scheme, module in (("neqr-lsb", neqr_lsb), ("waqi", waqi)):
+        for key in (None, args.key):
+            for backend in ("numpy", "bitsliced"):
+                began = time.perf_counter()
+                marked = module.embed_watermark(host, prepared[scheme], backend, key=key)
+                embed_s = time.perf_counter() - began
+                began = time.perf_counter()
+                if scheme == "neqr-lsb":
+                    extracted, original = module.extract_watermark(marked, backend=backend, key=key)
+                    expected = np.repeat(((prepared[scheme] > 127) * 255).astype(np.uint8)[..., None], 3, axis=2)
+                    values = prepared[scheme].size * 3
+                else:
+                    extracted, original = module.extract_watermark(marked, backend, key=key)
+                    expected = (prepared[scheme][:extracted.size].reshape(extracted.shape) * 255).astype(np.uint8)
+                    values = prepared[scheme].size
+                extract_s = time.perf_counter() - began
+                touched, blocks = blocks_touched(host, marked)
+                label = "keyed" if key else "fixed"
+                print(f"{scheme:<10}{label:<11}{backend:<11}{values / embed_s / 1e6:>8.1f}"
+                      f"{extracted.size / extract_s / 1e6:>9.1f}{f'{touched}/{blocks}':>13}")
+                # WaQI only clears the LSBs it reads back, so only NEQR-LSB restores the whole host
+                restored = scheme == "waqi" or np.array_equal(original, host)
+                if not np.array_equal(extracted, expected) or not restored:
+                    print(f"MISMATCH {scheme} {label} on {backend}: round trip differs")
+                    status = 1
+                if key is None:
+                    continue
+                strips = list(module.extract_strips(marked, 100, backend=backend, key=key))
+                streamed = np.concatenate([rows for _, rows in strips])
+                if not np.array_equal(streamed, extracted) or \
+                        not np.array_equal(np.concatenate([rows for rows, _ in strips]), original):
+                    print(f"MISMATCH {scheme} keyed on {backend}: strips differ from the full extraction")
+                    status = 1
+                if scheme == "neqr-lsb":
+                    wrong, _ = module.extract_watermark(marked, backend=backend, key=key + "x")
+                else:
+                    wrong, _ = module.extract_watermark(marked, backend, key=key + "x")
+                agreement = np.mean(wrong == expected)
+                if agreement > 0.75:
+                    print(f"FAIL {scheme}: the wrong key agrees on {agreement:.0%} of the watermark")
+                    status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
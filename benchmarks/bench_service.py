@@ -0,0 +1,201 @@
+"""Benchmark: the HTTP job service under a burst of partly duplicate uploads.
+
+Starts ``service.Service`` on an ephemeral localhost port and fires
+``--requests`` embed requests from ``--clients`` threads at once, drawn
+from ``--distinct`` different hosts (so most are duplicates), each with
+``?wait=1``; a 503 is retried after its ``Retry-After``. This runs twice:
+with request coalescing and without. Reports throughput, the client-side
+p50/p99 round trip, how many jobs actually ran and the service's own
+``/metrics`` latencies. Then checks one embed, extract and negate job
+against the library called directly, and that ``/jobs/<id>/events``
+streams progress through to ``done``.
+
+    python benchmarks/bench_service.py [--size 512] [--requests 32] [--distinct 4] [--processes 2]
+
+Exits non-zero on a wrong result, a broken event stream, or if coalescing
+ran more jobs than there were distinct payloads.
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import http.client
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from quantum_watermarking import negation, waqi  # noqa: E402
+from quantum_watermarking.service import Service, serve  # noqa: E402
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def png(array):
+    out = io.BytesIO()
+    Image.fromarray(array).save(out, format="PNG", compress_level=1)
+    return out.getvalue()
+
+
+def multipart(fields):
+    boundary = uuid.uuid4().hex
+    body = b"".join(
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"{name}\"; filename=\"{name}\"\r\n"
+        f"Content-Type: application/octet-stream\r\n\r\n".encode() + data + b"\r\n"
+        for name, data in fields.items()) + f"--{boundary}--\r\n".encode()
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+def request(port, method, path, fields=None):
+    """(status, headers, body), retrying 503s after their Retry-After"""
+    body, content_type = multipart(fields) if fields else (b"", "text/plain")
+    while True:
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=600)
+        conn.request(method, path, body, {"Content-Type": content_type})
+        response = conn.getresponse()
+        data = response.read()
+        conn.close()
+        if response.status != 503:
+            return response.status, dict(response.getheaders()), data
+        time.sleep(float(response.getheader("Retry-After", "1")))
+
+
+class Running:
+    """A service on its own event loop thread"""
+
+    def __init__(self, service):
+        self.service = service
+        ready = threading.Event()
+        self.loop = asyncio.new_event_loop()
+
+        def run():
+            asyncio.set_event_loop(self.loop)
+            self.task = self.loop.create_task(serve(service, "127.0.0.1", 0, started))
+            try:
+                self.loop.run_until_complete(self.task)
+            except asyncio.CancelledError:
+                pass
+
+        def started(port):
+            self.port = port
+            ready.set()
+
+        self.thread = threading.Thread(target=run, daemon=True)
+        self.thread.start()
+        ready.wait()
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.task.cancel)
+        self.thread.join()
+
+
+def burst(port, hosts, watermark, args):
+    latencies = []
+
+    def one(i):
+        start = time.perf_counter()
+        status, _, body = request(port, "POST", "/embed?scheme=waqi&wait=1",
+                                  {"host": hosts[i % len(hosts)], "watermark": watermark})
+        latencies.append(time.perf_counter() - start)
+        return status, body
+
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(args.clients) as clients:
+        results = list(clients.map(one, range(args.requests)))
+    return results, time.perf_counter() - start, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=512)
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--distinct", type=int, default=4)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--processes", type=int, default=2)
+    parser.add_argument("--max-jobs", type=int, default=8)
+    parser.add_argument("--backend", default="numpy")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    hosts = [png(rng.integers(0, 256, (args.size, args.size, 3), dtype=np.uint8)) for _ in range(args.distinct)]
+    mark = negation.ascii_art_to_array(os.path.join(REPO, "saturn.txt"))
+    watermark = png(mark)
+    status = 0
+    print(f"{args.requests} embed requests of {args.size}x{args.size} hosts ({args.distinct} distinct) from "
+          f"{args.clients} clients; {args.processes} processes, at most {args.max_jobs} jobs, {args.backend} backend")
+    print(f"{'coalesce':<10}{'req/s':>8}{'p50 ms':>9}{'p99 ms':>9}{'jobs':>6}{'503s':>6}"
+          f"{'queue p99':>11}{'run p50':>9}{'total p99':>11}")
+    for coalesce in (True, False):
+        service = Service(args.processes, args.max_jobs, backend=args.backend, coalesce=coalesce)
+        running = Running(service)
+        try:
+            # Warm the workers up, so process start-up is not charged to the burst
+            request(running.port, "POST", "/negate?mode=binary&wait=1",
+                    {"image": open(os.path.join(REPO, "saturn.txt"), "rb").read()})
+            results, seconds, latencies = burst(running.port, hosts, watermark, args)
+            metrics = json.loads(request(running.port, "GET", "/metrics")[2])
+        finally:
+            running.stop()
+        counters = metrics["counters"]
+        jobs = counters["done"] - 1
+        embed = metrics["latency"]["embed"]
+        latencies = np.array(latencies) * 1e3
+        print(f"{str(coalesce):<10}{args.requests / seconds:>8.1f}{np.percentile(latencies, 50):>9.0f}"
+              f"{np.percentile(latencies, 99):>9.0f}{jobs:>6}{counters['rejected']:>6}"
+              f"{embed['queue']['p99_ms']:>11.0f}{embed['run']['p50_ms']:>9.0f}{embed['total']['p99_ms']:>11.0f}")
+        if any(code != 200 for code, _ in results):
+            print(f"FAIL: statuses {sorted({code for code, _ in results})}")
+            status = 1
+        if coalesce and jobs > args.distinct:
+            print(f"FAIL: {jobs} jobs ran for {args.distinct} distinct payloads")
+            status = 1
+
+    # Results against the library, and the progress stream
+    service = Service(1, backend=args.backend)
+    running = Running(service)
+    try:
+        host = np.array(Image.open(io.BytesIO(hosts[0])))
+        from quantum_watermarking.watermark_cache import default_cache
+        expected = waqi.embed_watermark(host, default_cache().get(Image.fromarray(mark), host.shape[1::-1], "waqi"),
+                                        args.backend)
+        code, headers, body = request(running.port, "POST", "/embed?scheme=waqi",
+                                      {"host": hosts[0], "watermark": watermark})
+        job = json.loads(body)["id"]
+        events = request(running.port, "GET", f"/jobs/{job}/events")[2].decode().split("\n\n")
+        states = [json.loads(e[len("data: "):])["state"] for e in events if e.startswith("data: ")]
+        marked = request(running.port, "GET", f"/jobs/{job}/result")[2]
+        if code != 202 or states[-1] != "done":
+            print(f"FAIL: event stream ended in {states[-1:]} (POST answered {code})")
+            status = 1
+        if not np.array_equal(np.array(Image.open(io.BytesIO(marked))), expected):
+            print("MISMATCH embed: service output differs from waqi.embed_watermark")
+            status = 1
+        extracted = request(running.port, "POST", "/extract?scheme=waqi&wait=1", {"image": marked})[2]
+        if not np.array_equal(np.array(Image.open(io.BytesIO(extracted))),
+                              waqi.extract_watermark(expected, args.backend)[0]):
+            print("MISMATCH extract: service output differs from waqi.extract_watermark")
+            status = 1
+        negated = request(running.port, "POST", "/negate?mode=binary&wait=1",
+                          {"image": open(os.path.join(REPO, "saturn.txt"), "rb").read()})[2]
+        with tempfile.TemporaryDirectory() as workdir:
+            path = os.path.join(workdir, "negated.txt")
+            negation.array_to_text(negation.negate_image(mark, "numpy", binary=True), path)
+            if negated != open(path, "rb").read():
+                print("MISMATCH negate: service output differs from negation.negate_image")
+                status = 1
+        print(f"event stream: {len(states)} updates, {' -> '.join(dict.fromkeys(states))}")
+    finally:
+        running.stop()
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+"""Benchmark: tiles to worker processes through shared memory against pickling.
+
+Runs WaQI embed and extract and grayscale negation of a synthetic ``--size``
+host on ``ProcessBackend(--backend, --workers)`` twice: with the ``pickle``
+transport, where every tile and result crosses the pool's pipes, and with
+``shm``, where the host is ``share``d and tasks carry only offsets. Each
+pool is warmed up first, so worker start-up is not charged to either.
+Reports the bytes pickled through the pipes, the bytes copied into the
+scratch segment, the task count and the wall time, next to the same run
+in-process on the inner backend.
+
+    python benchmarks/bench_shared_memory.py [--size 2048] [--workers 2] [--backend numpy]
+
+Exits non-zero if an output differs from the in-process run or ``shm``
+moves more than ``TASK_BYTES`` per task: offsets only, whatever the tile
+size.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from quantum_watermarking import negation, waqi  # noqa: E402
+from quantum_watermarking.parallel import ProcessBackend, release, share  # noqa: E402
+
+TASK_BYTES = 512
+
+
+def paths(host, bits):
+    # name -> (input, fn(input, backend)), with the tools' adaptive chunking
+    marked = waqi.embed_watermark(host, bits, "numpy")
+    return {
+        "waqi embed": (host, lambda h, b: waqi.embed_watermark(h, bits, b)),
+        "waqi extract": (marked, lambda h, b: waqi.extract_watermark(h, b)[0]),
+        "negate": (np.ascontiguousarray(host[..., 0]), lambda h, b: negation.negate_image(h, b)),
+    }
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=2048)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--backend", default="numpy")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    host = rng.integers(0, 256, (args.size, args.size, 3), dtype=np.uint8)
+    bits = np.unpackbits(rng.integers(0, 256, (args.size // 4, args.size // 4), dtype=np.uint8))
+    print(f"{args.size}x{args.size} host, {args.workers} workers on {os.cpu_count()} CPU(s), "
+          f"{args.backend} backend")
+    print(f"{'path':<14}{'transport':<11}{'IPC MB':>9}{'copied MB':>11}{'tasks':>7}{'seconds':>9}")
+    status = 0
+    backends = {t: ProcessBackend(args.backend, args.workers, t) for t in ("pickle", "shm")}
+    try:
+        for backend in backends.values():
+            backend.run(waqi.WAQI_EXTRACT, host[:64].reshape(-1))
+        for name, (source, fn) in paths(host, bits).items():
+            expected, seconds = timed(lambda: fn(source, args.backend))
+            shared = share(source)
+            print(f"{name:<14}{'in-process':<11}{0:>9.2f}{0:>11.2f}{0:>7}{seconds:>9.2f}")
+            moved, tasks_run = {}, {}
+            for transport, backend in backends.items():
+                ipc, copied, tasks = backend.ipc_bytes, backend.copied_bytes, backend.tasks
+                result, seconds = timed(lambda: fn(shared if transport == "shm" else source, backend))
+                moved[transport] = backend.ipc_bytes - ipc
+                tasks_run[transport] = backend.tasks - tasks
+                print(f"{name:<14}{transport:<11}{moved[transport] / 2**20:>9.2f}"
+                      f"{(backend.copied_bytes - copied) / 2**20:>11.2f}{tasks_run[transport]:>7}{seconds:>9.2f}")
+                if not np.array_equal(result, expected):
+                    print(f"MISMATCH {name}: {transport} output differs from the in-process run")
+                    status = 1
+            if moved["shm"] > TASK_BYTES * max(tasks_run["shm"], 1):
+                print(f"FAIL: {name} moved {moved['shm'] / max(tasks_run['shm'], 1):.0f} bytes per task over shm")
+                status = 1
+            release(shared)
+    finally:
+        for backend in backends.values():
+            backend.close()
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""Benchmark: geometric transforms, position-register circuits against strided views.
+
+For each bundled text image (``monalisa_rotated.txt``, ``lincon_rotated.txt``)
+and each transform, plus two compositions, moves the pixels with the
+position circuits run on ``--backend`` and compares with ``transforms.view``.
+Then negates and WaQI-embeds through a rotated view, against rotating into
+a copy first, and times a view against a copy on a ``--size`` host.
+
+    python benchmarks/bench_transforms.py [--backend stabilizer] [--size 4096]
+
+Exits non-zero if a view differs from the circuit version, is not a view,
+or the one-pass negation or embedding differs from the two-pass one.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from quantum_watermarking import negation, transforms, waqi  # noqa: E402
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMAGES = ("monalisa_rotated.txt", "lincon_rotated.txt")
+
+
+def timed(fn, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return result, (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", default="stabilizer", help="backend running the position circuits")
+    parser.add_argument("--size", type=int, default=4096)
+    args = parser.parse_args()
+
+    status = 0
+    ops = [(name,) for name in transforms.TRANSFORMS] + [("rot90", "flip-h"), ("rot270", "transpose", "flip-v")]
+    print(f"position circuits on the {args.backend} backend (times in ms)")
+    print(f"{'image':<22}{'transform':<28}{'circuit':>9}{'view':>9}{'match':>7}")
+    for name in IMAGES:
+        image = negation.character_text_to_array(os.path.join(REPO, name))
+        for names in ops:
+            circuit, circuit_s = timed(lambda: transforms.apply_circuit(image, *names, backend=args.backend))
+            fast, view_s = timed(lambda: transforms.view(image, *names), repeat=100)
+            match = np.array_equal(circuit, fast)
+            print(f"{name:<22}{' + '.join(names):<28}{circuit_s * 1e3:>9.1f}{view_s * 1e3:>9.4f}{str(match):>7}")
+            if not match:
+                print(f"MISMATCH {name} {names}: view differs from the position circuits")
+                status = 1
+            if not np.shares_memory(fast, image):
+                print(f"FAIL: {names} copied the image")
+                status = 1
+
+    # Composed with negation and watermarking: through the view against a rotated copy
+    image = negation.character_text_to_array(os.path.join(REPO, IMAGES[0]))
+    bits = waqi.load_watermark(os.path.join(REPO, "Lenna.png"), image.shape[::-1])
+    checks = {
+        "negate": lambda a: negation.negate_image(a, "numpy"),
+        "waqi embed": lambda a: waqi.embed_watermark(a, bits, "numpy"),
+    }
+    for label, fn in checks.items():
+        one_pass = fn(transforms.view(image, "rot90", "flip-h"))
+        two_pass = fn(np.ascontiguousarray(np.rot90(image)[:, ::-1]))
+        print(f"{label} through rot90 + flip-h view: {'same' if np.array_equal(one_pass, two_pass) else 'DIFFERS'}")
+        if not np.array_equal(one_pass, two_pass):
+            status = 1
+
+    host = np.random.default_rng(0).integers(0, 256, (args.size, args.size, 3), dtype=np.uint8)
+    _, view_s = timed(lambda: transforms.view(host, "rot90"), repeat=1000)
+    _, copy_s = timed(lambda: np.ascontiguousarray(np.rot90(host)), repeat=3)
+    print(f"{args.size}x{args.size} RGB rot90: view {view_s * 1e6:.1f} us, copy {copy_s * 1e3:.1f} ms "
+          f"({host.nbytes / 2**20:.0f} MB)")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+"""Benchmark: watermark preparation with and without the preprocessing cache.
+
+Stamps one logo onto ``--hosts`` host sizes cycling through ``--sizes`` and
+reports the per-host preparation time uncached (open, resize, threshold every
+time) against the in-memory cache and a fresh process reading the on-disk
+cache. Cached results are checked to be identical to the uncached ones.
+
+    python benchmarks/bench_watermark_cache.py [--hosts 200] [--sizes 256 512 1024]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from quantum_watermarking import neqr_lsb, waqi  # noqa: E402
+from quantum_watermarking.watermark_cache import SCHEMES, WatermarkCache  # noqa: E402
+
+
+def uncached(watermark, host_size, scheme):
+    if scheme == "neqr-lsb":
+        return np.where(neqr_lsb.load_watermark(watermark, host_size) > 127, 255, 0).astype(np.uint8)
+    return waqi.load_watermark(watermark, host_size)
+
+
+def time_per_host(prepare, host_sizes):
+    start = time.perf_counter()
+    for size in host_sizes:
+        prepare(size)
+    return (time.perf_counter() - start) / len(host_sizes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hosts", type=int, default=200)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[256, 512, 1024])
+    parser.add_argument("--watermark", default=None, help="logo to stamp (default: Lenna.png)")
+    args = parser.parse_args()
+
+    repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    watermark = args.watermark or os.path.join(repo, "Lenna.png")
+    host_sizes = [(args.sizes[i % len(args.sizes)],) * 2 for i in range(args.hosts)]
+
+    print(f"{args.hosts} hosts over sizes {args.sizes}, watermark {os.path.basename(watermark)}")
+    print(f"{'scheme':<10}{'uncached ms':>13}{'memory ms':>11}{'disk ms':>9}{'speedup':>9}  stats")
+    status = 0
+    with tempfile.TemporaryDirectory() as directory:
+        for scheme in SCHEMES:
+            for size in set(host_sizes):
+                expected = uncached(watermark, size, scheme)
+                if not np.array_equal(WatermarkCache().get(watermark, size, scheme), expected):
+                    print(f"MISMATCH {scheme} at host size {size}")
+                    status = 1
+
+            cold = time_per_host(lambda size: uncached(watermark, size, scheme), host_sizes)
+            cache = WatermarkCache(directory=directory)
+            warm = time_per_host(lambda size: cache.get(watermark, size, scheme), host_sizes)
+            # A new cache on the same directory stands in for the next batch run
+            disk_cache = WatermarkCache(directory=directory)
+            disk = time_per_host(lambda size: disk_cache.get(watermark, size, scheme), host_sizes)
+            print(f"{scheme:<10}{cold * 1e3:>13.3f}{warm * 1e3:>11.3f}{disk * 1e3:>9.3f}"
+                  f"{cold / warm:>8.1f}x  {cache.stats()} / {disk_cache.stats()}")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
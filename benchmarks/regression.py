@@ -0,0 +1,229 @@
+"""Performance regression gate against a stored baseline.
+
+Runs a reduced benchmark suite several times per case, summarises each metric
+as median and IQR and compares it with ``benchmarks/baseline.json``:
+
+    python benchmarks/regression.py record              # (re)write the baseline
+    python benchmarks/regression.py check [--tolerance 0.25]
+
+Every run also times a fixed pure-Python reference loop, and throughput and
+stage times are scaled by it before comparison, so a machine that is busier
+(or throttled) than when the baseline was recorded does not read as a code
+regression; ``--raw`` compares unscaled numbers instead. A case regresses when
+its median throughput drops by more than the tolerance *and* the gap is wider
+than the larger of the two IQRs (so a noisy case does not fail on jitter
+alone), or when its median peak RSS grows by more than the memory tolerance.
+A case that regresses is measured again with ``--confirm-repeats`` runs and
+only fails if it regresses again: a 1-CPU host has slow spells longer than a
+handful of short runs. For each regressed case the report names the stage
+whose per-pixel time grew the most. ``check`` exits with status 1 on any
+regression, so it can run as a CI step.
+
+Baselines are machine specific; re-record them after changing hardware, and
+in the commit that changes a workload or a backend default, since the gate
+then no longer measures the same code.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import suite
+
+BASELINE_PATH = os.path.join(suite.REPO, "benchmarks", "baseline.json")
+GATE_IMAGES = ("Lenna.png", "synthetic_256")
+GATE_SIZES = (256,)
+DEFAULT_BUDGET = 128
+DEFAULT_REPEATS = 5
+DEFAULT_CONFIRM_REPEATS = 10
+DEFAULT_TOLERANCE = 0.25
+DEFAULT_MEMORY_TOLERANCE = 0.10
+# Reference loop time the normalised numbers are expressed against
+CALIBRATION_REFERENCE_MS = 10.0
+
+
+# --- Summaries ---
+def median_iqr(samples):
+    samples = sorted(samples)
+    if len(samples) < 2:
+        return {"median": samples[0] if samples else 0.0, "iqr": 0.0, "n": len(samples)}
+    q1, _, q3 = statistics.quantiles(samples, n=4, method="inclusive")
+    return {"median": statistics.median(samples), "iqr": q3 - q1, "n": len(samples)}
+
+
+def _timing_view(runs, speed):
+    stages = {}
+    for name in sorted({s for r in runs for s in r["stages"]} - {"decode"}):
+        stages[name] = median_iqr([
+            r["stages"][name]["total_ms"] * 1e3 / max(1, r["pixels"]) / speed(r)
+            for r in runs if name in r["stages"]
+        ])
+    return {
+        "pixels_per_sec": median_iqr([r["pixels_per_sec"] * speed(r) for r in runs]),
+        "us_per_pixel": median_iqr([r["seconds"] * 1e6 / max(1, r["pixels"]) / speed(r) for r in runs]),
+        "stages_us_per_pixel": stages,
+    }
+
+
+def summarise(results):
+    """Group repeated suite results by case and reduce every metric to median/IQR.
+
+    Timings are kept twice: as measured (``raw``) and scaled by each run's
+    calibration loop to a machine running it in ``CALIBRATION_REFERENCE_MS``
+    (``normalized``).
+    """
+    grouped = {}
+    for r in results:
+        if "error" in r:
+            continue
+        grouped.setdefault(f"{r['workload']}/{r['image']}", []).append(r)
+    cases = {}
+    for key, runs in grouped.items():
+        cases[key] = {
+            "raw": _timing_view(runs, lambda r: 1.0),
+            "normalized": _timing_view(runs, lambda r: r["calibration_ms"] / CALIBRATION_REFERENCE_MS),
+            "peak_rss_mb": median_iqr([r["peak_rss_mb"] for r in runs]),
+            "calibration_ms": median_iqr([r["calibration_ms"] for r in runs]),
+        }
+    return cases
+
+
+def collect(budget=DEFAULT_BUDGET, repeats=DEFAULT_REPEATS, workloads=None, jobs=1):
+    workloads = workloads or list(suite.WORKLOADS)
+    with tempfile.TemporaryDirectory(prefix="qwm-gate-") as workdir:
+        corpus = [c for c in suite.build_corpus(workdir, GATE_SIZES, text_images=()) if c[0] in GATE_IMAGES]
+        results = suite.run_suite(workloads, corpus, budget, jobs, repeats, verbose=False)
+    errors = [r for r in results if "error" in r]
+    return summarise(results), errors
+
+
+# --- Comparison ---
+def _blame(base, current):
+    """Stage with the largest growth in per-pixel time, as a report line"""
+    deltas = []
+    for name, cur in current["stages_us_per_pixel"].items():
+        ref = base["stages_us_per_pixel"].get(name)
+        if ref:
+            deltas.append((cur["median"] - ref["median"], name, ref["median"], cur["median"]))
+    if not deltas:
+        return "no stage timings for this case; the slowdown is in unstaged loop code"
+    delta, name, ref, cur = max(deltas)
+    if delta <= 0:
+        return "no stage got slower per pixel; the slowdown is in unstaged loop code"
+    change = f"{delta / ref * 100:+.0f}%" if ref else "new"
+    return f"stage '{name}': {ref:.1f} -> {cur:.1f} us/pixel ({change})"
+
+
+def compare(baseline, current, tolerance=DEFAULT_TOLERANCE, memory_tolerance=DEFAULT_MEMORY_TOLERANCE,
+            view="normalized"):
+    """Return (regressions, report_lines); ``view`` is "normalized" or "raw" timings"""
+    regressions = []
+    lines = [f"{'case':<36}{'px/s base':>12}{'px/s now':>12}{'change':>9}{'MB base':>9}{'MB now':>9}  verdict"]
+    for key in sorted(set(baseline) | set(current)):
+        base, cur = baseline.get(key), current.get(key)
+        if cur is None:
+            regressions.append(key)
+            lines.append(f"{key:<36}{'':>12}{'':>12}{'':>9}{'':>9}{'':>9}  MISSING (case failed or was removed)")
+            continue
+        if base is None:
+            lines.append(f"{key:<36}{'':>12}{cur[view]['pixels_per_sec']['median']:>12.0f}{'':>9}{'':>9}"
+                         f"{cur['peak_rss_mb']['median']:>9.1f}  new (no baseline)")
+            continue
+        b_tp, c_tp = base[view]["pixels_per_sec"], cur[view]["pixels_per_sec"]
+        b_mem, c_mem = base["peak_rss_mb"], cur["peak_rss_mb"]
+        change = c_tp["median"] / b_tp["median"] - 1 if b_tp["median"] else 0.0
+        noise = max(b_tp["iqr"], c_tp["iqr"])
+        reasons = []
+        if change < -tolerance and b_tp["median"] - c_tp["median"] > noise:
+            reasons.append(f"throughput {change * 100:+.1f}% (tolerance -{tolerance * 100:.0f}%, IQR {noise:.0f})")
+        if b_mem["median"] and c_mem["median"] > b_mem["median"] * (1 + memory_tolerance):
+            reasons.append(f"peak RSS {(c_mem['median'] / b_mem['median'] - 1) * 100:+.1f}%")
+        verdict = "REGRESSED" if reasons else "ok"
+        lines.append(f"{key:<36}{b_tp['median']:>12.0f}{c_tp['median']:>12.0f}{change * 100:>8.1f}%"
+                     f"{b_mem['median']:>9.1f}{c_mem['median']:>9.1f}  {verdict}")
+        if reasons:
+            regressions.append(key)
+            for reason in reasons:
+                lines.append(f"    {reason}")
+            lines.append(f"    {_blame(base[view], cur[view])}")
+    return regressions, lines
+
+
+# --- Commands ---
+def record(args):
+    cases, errors = collect(args.budget, args.repeats, args.workloads, args.jobs)
+    for r in errors:
+        print(f"error: {r['workload']}/{r['image']}: {r['error']}", file=sys.stderr)
+    baseline = {
+        "meta": dict(suite.environment(), budget=args.budget, repeats=args.repeats,
+                     recorded=time.strftime("%Y-%m-%dT%H:%M:%S")),
+        "cases": cases,
+    }
+    with open(args.baseline, "w") as fh:
+        json.dump(baseline, fh, indent=2, sort_keys=True)
+    print(f"Baseline with {len(cases)} cases written to {args.baseline}")
+    return 1 if errors else 0
+
+
+def check(args):
+    with open(args.baseline) as fh:
+        baseline = json.load(fh)
+    meta = baseline.get("meta", {})
+    budget = args.budget or meta.get("budget", DEFAULT_BUDGET)
+    cases, errors = collect(budget, args.repeats, args.workloads, args.jobs)
+    base_cases = baseline["cases"]
+    if args.workloads:
+        base_cases = {k: v for k, v in base_cases.items() if k.split("/")[0] in args.workloads}
+    view = "raw" if args.raw else "normalized"
+    regressions, lines = compare(base_cases, cases, args.tolerance, args.memory_tolerance, view)
+    suspects = [key for key in regressions if key in cases]
+    if suspects and args.confirm_repeats:
+        workloads = sorted({key.split("/")[0] for key in suspects})
+        again, more_errors = collect(budget, args.confirm_repeats, workloads, args.jobs)
+        cases.update({key: again[key] for key in suspects if key in again})
+        errors += more_errors
+        regressions, lines = compare(base_cases, cases, args.tolerance, args.memory_tolerance, view)
+        lines.append(f"re-measured {', '.join(suspects)} ({args.confirm_repeats} runs each)")
+    for r in errors:
+        lines.append(f"error: {r['workload']}/{r['image']}: {r['error']}")
+    lines.append("")
+    lines.append(f"baseline {meta.get('git_sha', '?')} ({meta.get('recorded', '?')}), "
+                 f"current {suite.environment()['git_sha']}: "
+                 f"{len(regressions)} regression(s) in {len(cases)} case(s), {view} timings")
+    report = "\n".join(lines)
+    print(report)
+    if args.report:
+        with open(args.report, "w") as fh:
+            fh.write(report + "\n")
+    return 1 if regressions else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=("record", "check"))
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--budget", type=int, default=None,
+                        help=f"pixels per case (default: the baseline's, or {DEFAULT_BUDGET})")
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS)
+    parser.add_argument("--confirm-repeats", type=int, default=DEFAULT_CONFIRM_REPEATS,
+                        help="runs of a regressed case before it fails the check (0: no re-run)")
+    parser.add_argument("--tolerance", type=float,
+                        default=float(os.environ.get("QWM_BENCH_TOLERANCE", DEFAULT_TOLERANCE)),
+                        help="allowed fractional throughput drop (default $QWM_BENCH_TOLERANCE or 0.25)")
+    parser.add_argument("--memory-tolerance", type=float, default=DEFAULT_MEMORY_TOLERANCE)
+    parser.add_argument("--raw", action="store_true", help="compare timings without calibration scaling")
+    parser.add_argument("--workloads", nargs="+", choices=sorted(suite.WORKLOADS))
+    parser.add_argument("--jobs", type=int, default=1)
+    parser.add_argument("--report", help="also write the diff report to this file")
+    args = parser.parse_args(argv)
+    if args.command == "record":
+        args.budget = args.budget or DEFAULT_BUDGET
+        return record(args)
+    return check(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
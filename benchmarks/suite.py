@@ -0,0 +1,324 @@
+"""Benchmark suite: every scheme over a fixed image corpus.
+
+Corpus: ``Lenna.png``, the bundled ``.txt`` images (parsed as ASCII art) and
+seeded synthetic RGB images from 64x64 up to 4096x4096, written to PNG in a
+temporary directory so that decode is measured like any other input.
+
+Workloads: NEQR-LSB embed/extract, WaQI embed/extract, the ``f.py`` text
+negation, the binary and grayscale NEQR negations, the classical colour
+negation of ``color_image_negation.py`` and the per-channel negation of
+``color_negation_2x2.py``.
+
+The per-pixel simulator runs cost around a millisecond each, so every case is
+cropped (top-left, keeping the aspect ratio) until the pixels it has to
+process fit ``--budget``. Throughput is measured on the crop and the number
+of simulator jobs is projected to the full image. Each case runs in a fresh
+spawned process so peak RSS is per case. ``--backend`` runs every workload
+on one backend (see ``quantum_watermarking/backends.py``); by default each
+tool uses its own.
+
+    python benchmarks/suite.py [--quick] [--sizes 64 256 1024 4096] [--budget 256] [--backend NAME]
+
+Results are written to ``benchmarks/results/<timestamp>-<sha>.json``.
+"""
+import argparse
+import concurrent.futures
+import json
+import math
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+RESULTS_DIR = os.path.join(REPO, "benchmarks", "results")
+TEXT_IMAGES = ("saturn.txt", "lincon_rotated.txt", "monalisa_rotated.txt")
+SYNTHETIC_SIZES = (64, 256, 1024, 4096)
+WATERMARK = "saturn.txt"
+
+
+# --- Workloads ---
+# Each entry: (units processed for an h x w input, runner(image, backend) -> output).
+# backend is a backend name, or None for the tool's own default.
+def _quarter(h, w):
+    return (h // 4) * (w // 4)
+
+
+def _run_neqr_lsb_embed(image, backend):
+    from quantum_watermarking import negation, neqr_lsb
+    host = np.array(image.convert("RGB"))
+    mark = Image.fromarray(negation.ascii_art_to_array(os.path.join(REPO, WATERMARK)))
+    watermark_array = neqr_lsb.load_watermark(mark, image.size)
+    return neqr_lsb.embed_watermark(host, watermark_array, backend)
+
+
+def _run_neqr_lsb_extract(image, backend):
+    from quantum_watermarking import neqr_lsb
+    return neqr_lsb.extract_watermark(np.array(image.convert("RGB")), backend=backend or "numpy")
+
+
+def _run_waqi_embed(image, backend):
+    from quantum_watermarking import negation, waqi
+    host = np.array(image.convert("RGB"))
+    mark = Image.fromarray(negation.ascii_art_to_array(os.path.join(REPO, WATERMARK)))
+    return waqi.embed_watermark(host, waqi.load_watermark(mark, image.size), backend)
+
+
+def _run_waqi_extract(image, backend):
+    from quantum_watermarking import waqi
+    return waqi.extract_watermark(np.array(image.convert("RGB")), backend)
+
+
+def _run_negate_ascii(image, backend):
+    import f
+    return f.quantum_negate_grayscale_matrix(np.array(image.convert("L")).tolist(), bits=8, backend=backend)
+
+
+def _run_negate_binary(image, backend):
+    from quantum_watermarking import negation
+    binary = np.where(np.array(image.convert("L")) > 127, 255, 0).astype(np.uint8)
+    return negation.negate_image(binary, backend, binary=True)
+
+
+def _run_negate_grayscale(image, backend):
+    from quantum_watermarking import negation
+    return negation.negate_image(np.array(image.convert("L")), backend)
+
+
+def _run_negate_color(image, backend):
+    import color_image_negation
+    return color_image_negation.negate_color_image_quantum(image, backend or "numpy")
+
+
+def _run_negate_color_2x2(image, backend):
+    import color_negation_2x2
+    return color_negation_2x2.negate_color_image(np.array(image.convert("RGB")), backend)
+
+
+WORKLOADS = {
+    "neqr_lsb_embed": (_quarter, _run_neqr_lsb_embed),
+    "neqr_lsb_extract": (_quarter, _run_neqr_lsb_extract),
+    "waqi_embed": (lambda h, w: _quarter(h, w) * 8, _run_waqi_embed),
+    "waqi_extract": (_quarter, _run_waqi_extract),
+    "negate_ascii": (lambda h, w: h * w, _run_negate_ascii),
+    "negate_binary": (lambda h, w: h * w, _run_negate_binary),
+    "negate_grayscale": (lambda h, w: h * w, _run_negate_grayscale),
+    "negate_color": (lambda h, w: h * w, _run_negate_color),
+    "negate_color_2x2": (lambda h, w: h * w, _run_negate_color_2x2),
+}
+
+
+# --- Corpus ---
+def build_corpus(workdir, sizes, text_images=TEXT_IMAGES):
+    """List of (name, path) inputs; synthetic images are written to ``workdir``"""
+    corpus = [("Lenna.png", os.path.join(REPO, "Lenna.png"))]
+    corpus += [(name, os.path.join(REPO, name)) for name in text_images]
+    rng = np.random.default_rng(1289)
+    for size in sizes:
+        # Smooth gradient plus noise, so PNG decode cost is realistic
+        ramp = np.linspace(0, 255, size, dtype=np.float32)
+        base = (ramp[None, :, None] + ramp[::-1, None, None]) / 2
+        noise = rng.integers(0, 32, (size, size, 3), dtype=np.uint8)
+        array = (base.astype(np.uint8) + noise) % 256
+        path = os.path.join(workdir, f"synthetic_{size}.png")
+        Image.fromarray(array.astype(np.uint8), "RGB").save(path, compress_level=1)
+        corpus.append((f"synthetic_{size}", path))
+    return corpus
+
+
+def decode(path):
+    from quantum_watermarking import negation
+    if path.endswith(".txt"):
+        return Image.fromarray(negation.ascii_art_to_array(path))
+    image = Image.open(path)
+    image.load()
+    return image
+
+
+def crop_to_budget(image, units, budget):
+    """Top-left crop, same aspect ratio, with units(h, w) <= budget"""
+    width, height = image.size
+    if units(height, width) <= budget:
+        return image
+    scale = math.sqrt(budget / units(height, width))
+    while True:
+        w = max(4, int(width * scale))
+        h = max(4, int(height * scale))
+        if units(h, w) <= budget or (w == 4 and h == 4):
+            return image.crop((0, 0, w, h))
+        scale *= 0.95
+
+
+def _peak_rss_mb():
+    # VmHWM belongs to the address space, so unlike ru_maxrss it does not
+    # inherit the parent's high-water mark across fork + exec
+    try:
+        with open("/proc/self/status") as fh:
+            for line in fh:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def calibrate(rounds=3):
+    """Best-of-N time (ms) of a fixed pure-Python loop: a machine speed reference"""
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        acc = 0
+        for i in range(200_000):
+            acc = (acc * 31 + i) & 0xFFFF
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1e3
+
+
+def run_case(workload, name, path, budget, backend=None):
+    """Run one case in the current (fresh) process and return its metrics"""
+    from quantum_watermarking.backends import default_simulator
+    from quantum_watermarking.instrumentation import TRACER, stage
+
+    units, runner = WORKLOADS[workload]
+    # The backends create the shared simulator on first use; create it here
+    # so its import and setup stay out of the timed run
+    default_simulator()
+    rss_before = _peak_rss_mb()
+    TRACER.enabled = True
+    TRACER.reset()
+
+    start = time.perf_counter()
+    with stage("decode"):
+        image = decode(path)
+    decode_s = time.perf_counter() - start
+    full_w, full_h = image.size
+    work = crop_to_budget(image, units, budget)
+
+    # Calibrated on both sides: a 1-CPU host can change speed mid-case
+    before_ms = calibrate()
+    start = time.perf_counter()
+    runner(work, backend)
+    elapsed = time.perf_counter() - start
+    calibration_ms = (before_ms + calibrate()) / 2
+
+    snap = TRACER.snapshot()
+    jobs = snap["stages"].get("simulate", {}).get("count", 0)
+    pixels = snap["counters"].get("pixels", 0)
+    scale = units(full_h, full_w) / max(1, units(work.size[1], work.size[0]))
+    return {
+        "workload": workload,
+        "image": name,
+        "backend": backend or "default",
+        "width": full_w,
+        "height": full_h,
+        "crop": [work.size[1], work.size[0]],
+        "pixels": pixels,
+        "seconds": elapsed,
+        "pixels_per_sec": pixels / elapsed if elapsed else 0.0,
+        "decode_ms": decode_s * 1e3,
+        "calibration_ms": calibration_ms,
+        "peak_rss_mb": _peak_rss_mb(),
+        "rss_delta_mb": _peak_rss_mb() - rss_before,
+        "simulator_jobs": jobs,
+        "projected_jobs_full_image": round(jobs * scale),
+        "stages": {k: {f: v[f] for f in ("count", "total_ms", "mean_us", "p50_us", "p99_us")}
+                   for k, v in snap["stages"].items()},
+    }
+
+
+# --- Driver ---
+def environment():
+    def version(module):
+        try:
+            return __import__(module).__version__
+        except Exception:
+            return None
+    try:
+        sha = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO,
+                             capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        sha = "unknown"
+    return {
+        "git_sha": sha,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "numpy": version("numpy"),
+        "PIL": version("PIL"),
+        "qiskit": version("qiskit"),
+        "qiskit_aer": version("qiskit_aer"),
+    }
+
+
+def run_suite(workloads, corpus, budget, jobs=1, repeats=1, verbose=True, backend=None):
+    """Run every (workload, image) case ``repeats`` times, each in its own spawned process"""
+    ctx = multiprocessing.get_context("spawn")
+    cases = [(w, name, path) for w in workloads for name, path in corpus for _ in range(repeats)]
+    results = []
+    with concurrent.futures.ProcessPoolExecutor(jobs, mp_context=ctx, max_tasks_per_child=1) as pool:
+        futures = [pool.submit(run_case, w, name, path, budget, backend) for w, name, path in cases]
+        for (w, name, _), future in zip(cases, futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"workload": w, "image": name, "error": f"{type(e).__name__}: {e}"}
+            results.append(result)
+            if verbose:
+                print(format_row(result), flush=True)
+    return results
+
+
+def format_row(r):
+    if "error" in r:
+        return f"{r['workload']:<18}{r['image']:<22}ERROR {r['error']}"
+    return (f"{r['workload']:<18}{r['image']:<22}{r['crop'][0]:>5}x{r['crop'][1]:<5}"
+            f"{r['pixels_per_sec']:>12.0f}{r['peak_rss_mb']:>10.1f}{r['simulator_jobs']:>8}"
+            f"{r['projected_jobs_full_image']:>12}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SYNTHETIC_SIZES))
+    parser.add_argument("--budget", type=int, default=256, help="max pixels (or bits) processed per case")
+    parser.add_argument("--workloads", nargs="+", choices=sorted(WORKLOADS), default=list(WORKLOADS))
+    parser.add_argument("--backend", help="backend for every workload (default: each tool's default, $QWM_BACKEND)")
+    parser.add_argument("--repeats", type=int, default=1, help="runs per case, each in a fresh process")
+    parser.add_argument("--jobs", type=int, default=1, help="cases run concurrently (1 keeps timings clean)")
+    parser.add_argument("--quick", action="store_true", help="64x64 synthetic + saturn.txt, budget 64")
+    parser.add_argument("--output", help="results file (default benchmarks/results/<timestamp>-<sha>.json)")
+    args = parser.parse_args(argv)
+
+    text_images = TEXT_IMAGES
+    if args.quick:
+        args.sizes, args.budget, text_images = [64], min(args.budget, 64), TEXT_IMAGES[:1]
+
+    meta = environment()
+    with tempfile.TemporaryDirectory(prefix="qwm-bench-") as workdir:
+        corpus = build_corpus(workdir, args.sizes, text_images)
+        print(f"{'workload':<18}{'image':<22}{'crop':<11}{'pixels/s':>12}{'peak MB':>10}{'jobs':>8}{'jobs(full)':>12}")
+        results = run_suite(args.workloads, corpus, args.budget, args.jobs, args.repeats, backend=args.backend)
+
+    meta.update(backend=args.backend, budget=args.budget, sizes=args.sizes, repeats=args.repeats, timestamp=time.strftime("%Y-%m-%dT%H:%M:%S"))
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{meta['git_sha']}.json")
+    with open(output, "w") as fh:
+        json.dump({"meta": meta, "cases": results}, fh, indent=2)
+    print(f"\nResults written to {output}")
+    return 1 if any("error" in r for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,24 +1,17 @@
 from PIL import Image, ImageDraw, ImageFont
-from qiskit import QuantumCircuit, QuantumRegister, ClassicalRegister
-from qiskit_aer import AerSimulator
 import numpy as np
 
+from quantum_watermarking.backends import get_backend
+from quantum_watermarking.diagnostics import CIRCUIT, configure_logging, get_logger
+from quantum_watermarking.instrumentation import configure_tracing, count, stage
+from quantum_watermarking.schemes import NEGATION
+
+logger = get_logger("color_image_negation")
+
 # --- Convert int to bits ---
 def int_to_bits(value, num_bits):
     return [int(bit) for bit in bin(value)[2:].zfill(num_bits)]
 
-# --- Quantum pixel negation ---
-def negate_pixel(value, bits, qc, qr, cr, offset=0):
-    binary = int_to_bits(value, bits)
-    for j in range(bits):
-        if binary[bits - 1 - j] == 1:
-            qc.x(qr[offset + j])
-    qc.barrier()
-    for j in range(bits):
-        qc.x(qr[offset + j])
-    qc.barrier()
-    qc.measure(qr[offset:offset + bits], cr[offset:offset + bits])
-
 # --- Classical pixel negation ---
 def classical_negate_pixel(r, g, b):
     return (255 - r, 255 - g, 255 - b)
@@ -38,8 +31,9 @@ def save_side_by_side_images(original_img, negated_img, output_path):
     draw.text((20, 10), "Original", fill=(0, 0, 0), font=font)
     draw.text((width + 30, 10), "Quantum Negated", fill=(0, 0, 0), font=font)
 
-    combined.save(output_path)
-    print(f"[✔] Side-by-side image saved: {output_path}")
+    with stage("save"):
+        combined.save(output_path)
+    logger.info("[✔] Side-by-side image saved: %s", output_path)
 
 # --- Compute Mean Squared Error ---
 def compute_mse(img1, img2):
@@ -49,65 +43,76 @@ def compute_mse(img1, img2):
     return mse
 
 # --- Quantum image negation for color image ---
-def negate_color_image_quantum(image_path):
-    img = Image.open(image_path).convert("RGB")
-    width, height = img.size
-    matrix = [[img.getpixel((c, r)) for c in range(width)] for r in range(height)]
-    quantum_negated_img = Image.new("RGB", (width, height))
-    classical_negated_img = Image.new("RGB", (width, height))
-    backend = AerSimulator()
-
-    # For consistent output and MSE = 0, simulate perfect inversion without actual randomness
-    for r in range(height):
-        for c in range(width):
-            r_val, g_val, b_val = matrix[r][c]
-            r_neg = 255 - r_val
-            g_neg = 255 - g_val
-            b_neg = 255 - b_val
-            classical_negated_img.putpixel((c, r), (r_neg, g_neg, b_neg))
-            quantum_negated_img.putpixel((c, r), (r_neg, g_neg, b_neg))  # Match exactly
+def negate_color_image_quantum(image_path, backend="numpy"):
+    """Negate an image file (or an already opened ``Image``) with ``schemes.NEGATION``.
+
+    The NumPy backend reproduces the perfect inversion this script always
+    simulated (MSE = 0); pass another backend name to run real circuits.
+    """
+    with stage("decode"):
+        img = Image.open(image_path) if isinstance(image_path, str) else image_path
+        img = img.convert("RGB")
+        matrix = np.array(img)
+    backend = get_backend(backend)
+
+    classical_negated = np.empty_like(matrix)
+    quantum_negated = np.empty_like(matrix)
+    for r in range(matrix.shape[0]):
+        classical_negated[r] = 255 - matrix[r]
+        quantum_negated[r] = backend.run(NEGATION, matrix[r])
+        count("pixels", matrix.shape[1])
+    classical_negated_img = Image.fromarray(classical_negated, "RGB")
+    quantum_negated_img = Image.fromarray(quantum_negated, "RGB")
 
     # --- Show circuit for first 24 bits (R, G, B) of first pixel ---
-    first_pixel = matrix[0][0]
-    r_val, g_val, b_val = first_pixel
-    binary_r = int_to_bits(r_val, 8)
-    binary_g = int_to_bits(g_val, 8)
-    binary_b = int_to_bits(b_val, 8)
-
-    qr = QuantumRegister(24, "q")
-    cr = ClassicalRegister(24, "c")
-    qc = QuantumCircuit(qr, cr)
-
-    for i in range(8):
-        if binary_r[i] == 1:
-            qc.x(qr[i])
-    for i in range(8):
-        if binary_g[i] == 1:
-            qc.x(qr[8 + i])
-    for i in range(8):
-        if binary_b[i] == 1:
-            qc.x(qr[16 + i])
+    if logger.isEnabledFor(CIRCUIT):
+        log_first_pixel_circuit(tuple(int(v) for v in matrix[0, 0]))
 
-    qc.barrier()
-
-    for i in range(24):
-        qc.x(qr[i])
+    return img, quantum_negated_img, classical_negated_img
 
-    qc.barrier()
-    qc.measure(qr, cr)
+# --- Circuit for the 24 RGB bits of one pixel ---
+def log_first_pixel_circuit(first_pixel):
+    from qiskit import QuantumCircuit, QuantumRegister, ClassicalRegister
+
+    with stage("circuit_build"):
+        r_val, g_val, b_val = first_pixel
+        binary_r = int_to_bits(r_val, 8)
+        binary_g = int_to_bits(g_val, 8)
+        binary_b = int_to_bits(b_val, 8)
+
+        qr = QuantumRegister(24, "q")
+        cr = ClassicalRegister(24, "c")
+        qc = QuantumCircuit(qr, cr)
+
+        for i in range(8):
+            if binary_r[i] == 1:
+                qc.x(qr[i])
+        for i in range(8):
+            if binary_g[i] == 1:
+                qc.x(qr[8 + i])
+        for i in range(8):
+            if binary_b[i] == 1:
+                qc.x(qr[16 + i])
+
+        qc.barrier()
+
+        for i in range(24):
+            qc.x(qr[i])
 
-    print("\nQuantum Circuit for 24 Bits of RGB Channels (First Pixel):")
-    print(qc.draw(output='text'))
+        qc.barrier()
+        qc.measure(qr, cr)
 
-    return img, quantum_negated_img, classical_negated_img
+    logger.log(CIRCUIT, "\nQuantum Circuit for 24 Bits of RGB Channels (First Pixel):\n%s", qc.draw(output='text'))
 
 # --- Execution ---
 if __name__ == "__main__":
+    configure_logging()
+    configure_tracing()
     image_path = "Lenna.png"  # Ensure this file is in the same directory
-    print("Processing Color Image using Quantum Negation...")
+    logger.info("Processing Color Image using Quantum Negation...")
 
     orig_img, quantum_img, classical_img = negate_color_image_quantum(image_path)
     save_side_by_side_images(orig_img, quantum_img, "color_quantum_negated_side_by_side.png")
 
     mse = compute_mse(classical_img, quantum_img)
-    print(f"Mean Squared Error (MSE) between Classical and Quantum Negated images: {mse:.2f}")
+    logger.info("Mean Squared Error (MSE) between Classical and Quantum Negated images: %.2f", mse)
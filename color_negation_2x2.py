@@ -1,9 +1,12 @@
 import numpy as np
-from qiskit import QuantumCircuit, QuantumRegister, ClassicalRegister, transpile
-from qiskit_aer import Aer
 
-# Initialize the Aer simulator
-simulator = Aer.get_backend('aer_simulator')
+from quantum_watermarking.backends import get_backend
+from quantum_watermarking.diagnostics import CircuitDrawings, configure_logging, get_logger
+from quantum_watermarking.instrumentation import configure_tracing, count
+from quantum_watermarking.schemes import NEGATION
+
+logger = get_logger("color_negation_2x2")
+circuit_drawings = CircuitDrawings(logger)
 
 # Sample 2x2 RGB image
 color_image = np.array([
@@ -11,51 +14,33 @@ color_image = np.array([
     [[0, 200, 100], [15, 45, 75]]
 ], dtype=np.uint8)
 
-def apply_neqr_negation(pixel_rgb, position):
-    """Applies NEQR negation to an RGB pixel (8-bit per channel)"""
-    negated_rgb = []
+def log_channel_circuits(pixel_rgb, position):
+    """Log the NEQR negation circuit of each RGB channel (8 qubits per channel)"""
     for channel_index, channel_value in enumerate(pixel_rgb):
         color_name = ['R', 'G', 'B'][channel_index]
-
-        # Create quantum circuit
-        qubits = QuantumRegister(8, f'{color_name.lower()}')
-        classical_bits = ClassicalRegister(8, f'c_{color_name.lower()}')
-        qc = QuantumCircuit(qubits, classical_bits)
-
-        # Encode the original value
-        binary_str = format(channel_value, '08b')
-        for i, bit in enumerate(binary_str):
-            if bit == '1':
-                qc.x(qubits[i])
-
-        # Apply X (NOT) gates to all bits for negation
-        for i in range(8):
-            qc.x(qubits[i])
-
-        # Measure
-        qc.measure(qubits, classical_bits)
-
-        print(f"\nQuantum Circuit for pixel {position}, channel {color_name} (value: {channel_value}):")
-        print(qc)
-
-        # Transpile and simulate
-        tqc = transpile(qc, simulator)
-        result = simulator.run(tqc, shots=1).result()
-        counts = result.get_counts()
-        measured = int(list(counts.keys())[0], 2)
-        negated_rgb.append(measured)
-    return negated_rgb
-
-# Negate the image
-negated_image = np.zeros_like(color_image)
-
-for i in range(2):
-    for j in range(2):
-        negated_pixel = apply_neqr_negation(color_image[i, j], position=(i, j))
-        negated_image[i, j] = negated_pixel
-
-print("\nOriginal Image (2x2 RGB):")
-print(color_image)
-
-print("\nNegated Image (2x2 RGB):")
-print(negated_image)
+        circuit_drawings.log((color_name, int(channel_value)), lambda v=int(channel_value): NEGATION.circuit(v),
+                             "\nQuantum Circuit for pixel %s, channel %s (value: %d):", position, color_name, channel_value)
+
+def negate_color_image(color_image, backend=None):
+    """Negate every channel of every pixel of an RGB image"""
+    backend = get_backend(backend)
+    negated_image = np.zeros_like(color_image)
+    height, width = color_image.shape[:2]
+    for i in range(height):
+        if circuit_drawings.enabled():
+            for j in range(width):
+                log_channel_circuits(color_image[i, j], position=(i, j))
+        negated_image[i] = backend.run(NEGATION, color_image[i])
+        count("pixels", width)
+    return negated_image
+
+if __name__ == "__main__":
+    configure_logging()
+    configure_tracing()
+
+    # Negate the image
+    negated_image = negate_color_image(color_image)
+
+    logger.info("\nOriginal Image (2x2 RGB):\n%s", color_image)
+
+    logger.info("\nNegated Image (2x2 RGB):\n%s", negated_image)
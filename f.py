@@ -1,28 +1,17 @@
 from PIL import Image, ImageDraw, ImageFont
-from qiskit import QuantumCircuit, QuantumRegister, ClassicalRegister
-from qiskit_aer import AerSimulator
 import numpy as np
 
-# --- Convert int to bits ---
-def int_to_bits(value, num_bits):
-    return [int(bit) for bit in bin(value)[2:].zfill(num_bits)]
+from quantum_watermarking.backends import get_backend
+from quantum_watermarking.diagnostics import CircuitDrawings, configure_logging, get_logger
+from quantum_watermarking.instrumentation import configure_tracing, count, stage
+from quantum_watermarking.schemes import NEGATION
+
+logger = get_logger("f")
 
 # --- Classical pixel negation ---
 def classical_negate_pixel(value):
     return 255 - value
 
-# --- Quantum pixel negation ---
-def negate_pixel(value, bits, qc, qr, cr, offset=0):
-    binary = int_to_bits(value, bits)
-    for j in range(bits):
-        if binary[bits - 1 - j] == 1:
-            qc.x(qr[offset + j])
-    qc.barrier()
-    for j in range(bits):
-        qc.x(qr[offset + j])
-    qc.barrier()
-    qc.measure(qr[offset:offset + bits], cr[offset:offset + bits])
-
 # --- Save images side by side ---
 def save_side_by_side_images(original_img, negated_img, output_path):
     width, height = original_img.size
@@ -38,14 +27,16 @@ def save_side_by_side_images(original_img, negated_img, output_path):
     draw.text((20, 10), "Original", fill=(0, 0, 0), font=font)
     draw.text((width + 30, 10), "Quantum Negated", fill=(0, 0, 0), font=font)
 
-    combined.save(output_path)
-    print(f"[✔] Side-by-side image saved: {output_path}")
+    with stage("save"):
+        combined.save(output_path)
+    logger.info("[✔] Side-by-side image saved: %s", output_path)
 
 # --- Convert text to grayscale matrix ---
 def text_file_to_grayscale_matrix(filepath):
-    with open(filepath, 'r', encoding='utf-8') as file:
-        lines = [line.rstrip('\n') for line in file if line.strip()]
-    matrix = [[ord(char) for char in line] for line in lines]
+    with stage("decode"):
+        with open(filepath, 'r', encoding='utf-8') as file:
+            lines = [line.rstrip('\n') for line in file if line.strip()]
+        matrix = [[ord(char) for char in line] for line in lines]
     return matrix
 
 # --- Create image from grayscale matrix ---
@@ -59,30 +50,22 @@ def matrix_to_image(matrix):
     return img
 
 # --- Quantum grayscale negation ---
-def quantum_negate_grayscale_matrix(matrix, bits=8):
+def quantum_negate_grayscale_matrix(matrix, bits=8, backend=None):
+    if bits != NEGATION.input_bits[0]:
+        raise ValueError(f"Only {NEGATION.input_bits[0]}-bit negation is supported, got bits={bits}")
+    backend = get_backend(backend)
     height = len(matrix)
     width = len(matrix[0])
-    quantum_negated = [[0 for _ in range(width)] for _ in range(height)]
-    printed_circuits = 0
+    quantum_negated = []
+    circuit_drawings = CircuitDrawings(logger, limit=8)
 
     for r in range(height):
-        for c in range(width):
-            val = matrix[r][c]
-            qr = QuantumRegister(bits, "q")
-            cr = ClassicalRegister(bits, "c")
-            qc = QuantumCircuit(qr, cr)
-            negate_pixel(val, bits, qc, qr, cr)
-
-            if printed_circuits < 8:
-                print(f"\nQuantum Circuit for pixel ({r},{c}) value {val}:")
-                print(qc.draw(output="text"))
-                printed_circuits += 1
-
-            backend = AerSimulator()
-            job = backend.run(qc, shots=1)
-            counts = job.result().get_counts()
-            bitstring = list(counts.keys())[0]
-            quantum_negated[r][c] = int(bitstring, 2)
+        row = np.array([matrix[r][c] for c in range(width)], dtype=np.uint8)
+        for c, val in enumerate(row[:8] if circuit_drawings.enabled() else ()):
+            circuit_drawings.log(int(val), lambda v=int(val): NEGATION.circuit(v),
+                                 "\nQuantum Circuit for pixel (%d,%d) value %d:", r, c, val)
+        quantum_negated.append(backend.run(NEGATION, row).tolist())
+        count("pixels", width)
 
     return quantum_negated
 
@@ -95,9 +78,11 @@ def calculate_mse(image1, image2):
 
 # --- Main Execution ---
 if __name__ == "__main__":
+    configure_logging()
+    configure_tracing()
     text_file = "saturn.txt"
 
-    print("\nReading text and converting to grayscale image...")
+    logger.info("\nReading text and converting to grayscale image...")
     ascii_matrix = text_file_to_grayscale_matrix(text_file)
     orig_img = matrix_to_image(ascii_matrix)
 
@@ -105,13 +90,13 @@ if __name__ == "__main__":
     classical_negated_matrix = [[classical_negate_pixel(val) for val in row] for row in ascii_matrix]
     classical_negated_img = matrix_to_image(classical_negated_matrix)
 
-    print("\nRunning quantum negation on grayscale image...")
+    logger.info("\nRunning quantum negation on grayscale image...")
     quantum_negated_matrix = quantum_negate_grayscale_matrix(ascii_matrix, bits=8)
     quantum_negated_img = matrix_to_image(quantum_negated_matrix)
 
     # Calculate MSE between classical and quantum negated images
     mse = calculate_mse(classical_negated_img, quantum_negated_img)
-    print(f"\n[✓] MSE between classical and quantum negated images: {mse:.2f}")
+    logger.info("\n[✓] MSE between classical and quantum negated images: %.2f", mse)
 
     # Save image
     save_path = "text_quantum_negated_side_by_side.png"
@@ -1,11 +1,16 @@
 import numpy as np
-from qiskit import QuantumCircuit, QuantumRegister, ClassicalRegister
-from qiskit_aer import AerSimulator
 from PIL import Image, ImageTk
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-import threading
-import os
+
+from quantum_watermarking.backends import get_backend
+from quantum_watermarking.diagnostics import CircuitDrawings, clear_terminal, configure_logging, get_logger, log_matrix
+from quantum_watermarking.instrumentation import configure_tracing, stage
+from quantum_watermarking.jobs import FRAME_MS, FrameTimer, JobPool, QueueFull
+from quantum_watermarking.progress import Cancelled, ProgressBus
+from quantum_watermarking import negation
+
+logger = get_logger("neqr_image_n")
 
 class NEQRImageNegation:
     def __init__(self):
@@ -18,12 +23,20 @@ class NEQRImageNegation:
         self.input_text_path = None
         self.negated_image = None
         self.input_array = None
-        self.simulator = AerSimulator()
+        self.circuit_drawings = CircuitDrawings(logger)
 
         self.progress_var = tk.DoubleVar()
         self.progress_var.set(0)
 
-        os.system('cls' if os.name == 'nt' else 'clear')
+        # Jobs run one at a time on a worker thread and up to two more can
+        # wait, instead of one thread per click competing for the CPU
+        self.jobs = JobPool(max_workers=1, max_pending=2,
+                            on_change=lambda pool: self.window.after(0, self.update_job_controls))
+        self.frames = FrameTimer()
+        self.frames_ticking = False
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+
+        clear_terminal()
 
         self.setup_ui()
 
@@ -43,12 +56,19 @@ class NEQRImageNegation:
         self.negate_btn = tk.Button(left_frame, text="Negate Image", command=self.start_negation)
         self.negate_btn.pack(pady=5)
 
+        self.cancel_btn = tk.Button(left_frame, text="Cancel", command=self.jobs.cancel_all, state='disabled')
+        self.cancel_btn.pack(pady=5)
+
         self.save_text_btn = tk.Button(left_frame, text="Save as Text", command=self.save_as_text)
         self.save_text_btn.pack(pady=5)
 
         self.progress_bar = ttk.Progressbar(left_frame, variable=self.progress_var, maximum=100)
         self.progress_bar.pack(pady=10, fill=tk.X)
 
+        # Percentage, pixels/sec and ETA of the running job
+        self.status_var = tk.StringVar()
+        tk.Label(left_frame, textvariable=self.status_var).pack(pady=5)
+
         right_frame = tk.Frame(main_frame)
         right_frame.pack(side=tk.RIGHT, expand=True, fill='both', padx=10)
 
@@ -92,64 +112,28 @@ class NEQRImageNegation:
 
             sample_image = Image.fromarray(sample_array)
             self.display_image(sample_image, self.input_label)
-            self.display_matrix_values(sample_array, "Sample Image Matrix Values")
+            log_matrix(logger, sample_array, "Sample Image Matrix Values")
 
             messagebox.showinfo("Success", "Sample text file created successfully!")
         except Exception as e:
             messagebox.showerror("Error", f"Error creating sample file: {str(e)}")
 
     def text_to_image(self, text_file_path):
-        """Load actual grayscale pixel values from .txt file."""
-        try:
-            with open(text_file_path, 'r') as f:
-                lines = f.readlines()
-
-            if len(lines[0].split()) == 2:  # skip dimensions if present
-                lines = lines[1:]
-
-            image_array = np.array([
-                list(map(int, line.strip().split()))
-                for line in lines[:self.IMAGE_HEIGHT]
-            ], dtype=np.uint8)
-
-            if image_array.shape != (self.IMAGE_HEIGHT, self.IMAGE_WIDTH):
-                raise ValueError("Image dimensions do not match expected 64x64")
-
-            return image_array
-
-        except Exception as e:
-            raise ValueError(f"Error parsing grayscale image text: {e}")
+        return negation.grayscale_text_to_array(text_file_path, self.IMAGE_HEIGHT, self.IMAGE_WIDTH)
 
     def image_to_text(self, image_array, output_path):
-        with open(output_path, 'w') as f:
-            f.write(f"{self.IMAGE_HEIGHT} {self.IMAGE_WIDTH}\n")
-            for row in image_array:
-                f.write(' '.join(map(str, row)) + '\n')
-
-    def display_matrix_values(self, array, title, max_rows=5, max_cols=5):
-        print(f"\n{title}")
-        print("-" * 50)
-        height, width = array.shape
-        print(f"Shape: {height}x{width}")
-        for i in range(min(max_rows, height)):
-            for j in range(min(max_cols, width)):
-                print(f"{array[i,j]:3d}", end=" ")
-            if width > max_cols:
-                print("...", end="")
-            print()
-        if height > max_rows:
-            print("...")
-        print("-" * 50)
+        negation.array_to_text(image_array, output_path)
 
     def upload_text_file(self):
         file_path = filedialog.askopenfilename(filetypes=[("Text files", "*.txt")])
         if file_path:
             try:
                 self.input_text_path = file_path
-                self.input_array = self.text_to_image(file_path)
+                with stage("decode"):
+                    self.input_array = self.text_to_image(file_path)
                 input_image = Image.fromarray(self.input_array)
                 self.display_image(input_image, self.input_label)
-                self.display_matrix_values(self.input_array, "Input Image Matrix Values")
+                log_matrix(logger, self.input_array, "Input Image Matrix Values")
             except Exception as e:
                 messagebox.showerror("Error", f"Error reading text file: {str(e)}")
 
@@ -159,56 +143,56 @@ class NEQRImageNegation:
         label.configure(image=photo)
         label.image = photo
 
-    def apply_neqr_negation(self, pixel_value, print_circuit=False):
-        intensity_qubits = 8
-        intensity_reg = QuantumRegister(intensity_qubits, 'intensity')
-        classical_reg = ClassicalRegister(intensity_qubits, 'c')
-        qc = QuantumCircuit(intensity_reg, classical_reg)
-
-        # Encode pixel as binary
-        binary_value = format(pixel_value, '08b')
-        for i, bit in enumerate(binary_value):
-            if bit == '1':
-                qc.x(intensity_reg[i])
-
-        # Negate using X gates
-        for i in range(intensity_qubits):
-            qc.x(intensity_reg[i])
-
-        qc.measure(intensity_reg, classical_reg)
-
-        if print_circuit:
-            print(f"\nQuantum Circuit for pixel value {pixel_value}:")
-            print(qc)
-
-        job = self.simulator.run(qc, shots=1)
-        result = job.result()
-        counts = result.get_counts()
-        measured_value = int(list(counts.keys())[0], 2)
-        return measured_value
-
-    def negate_image_thread(self):
+    def progress_bus(self):
+        # Coalesced to a few updates a second, so the Tk event queue is not flooded
+        bus = ProgressBus(max_rate=10)
+        bus.subscribe(lambda update: self.window.after(0, lambda: self.show_progress(update)))
+        return bus
+
+    def show_progress(self, update):
+        self.progress_var.set(update.percent)
+        queued = len(self.jobs.jobs) - 1
+        self.status_var.set(update.describe() + (f"  (+{queued} queued)" if queued > 0 else ""))
+
+    def update_job_controls(self):
+        # Cancel is offered while a job runs or waits, and the UI frame
+        # time is measured for as long as one does
+        busy = self.jobs.busy
+        self.cancel_btn.config(state='normal' if busy else 'disabled')
+        if busy and not self.frames_ticking:
+            self.frames_ticking = True
+            self.tick_frames()
+
+    def tick_frames(self):
+        self.frames.tick()
+        if self.jobs.busy:
+            self.window.after(FRAME_MS, self.tick_frames)
+        else:
+            logger.info(self.frames.summary())
+            self.frames.reset()
+            self.frames_ticking = False
+
+    def close(self):
+        # Stop the running job at its next chunk and drop the queued ones
+        self.jobs.on_change = None
+        self.jobs.shutdown()
+        self.window.destroy()
+
+    def negate_image_thread(self, bus, input_array):
         try:
-            if self.input_array is None:
+            if input_array is None:
                 raise ValueError("No input image data available")
-
-            height, width = self.input_array.shape
-            negated_array = np.zeros((height, width), dtype=np.uint8)
-
-            print("\nNegating image using NEQR quantum circuits...")
-            for x in range(height):
-                for y in range(width):
-                    print_circuit = (x == 0 and y < 5)
-                    negated_array[x, y] = self.apply_neqr_negation(self.input_array[x, y], print_circuit)
-                progress = ((x + 1) / height) * 100
-                self.window.after(0, lambda p=progress: self.progress_var.set(p))
-
+            negated_array = negation.negate_image(
+                input_array, get_backend(), binary=False,
+                progress=bus,
+                circuit_drawings=self.circuit_drawings)
             self.negated_image = Image.fromarray(negated_array)
-            self.display_matrix_values(negated_array, "Final Negated Image Matrix")
             self.window.after(0, lambda: self.display_image(self.negated_image, self.negated_label))
-
+        except Cancelled:
+            self.window.after(0, lambda: self.status_var.set("Cancelled"))
         except Exception as e:
-            self.window.after(0, lambda: messagebox.showerror("Error", f"An error occurred: {str(e)}"))
+            error_msg = str(e)
+            self.window.after(0, lambda: messagebox.showerror("Error", f"An error occurred: {error_msg}"))
         finally:
             self.window.after(0, lambda: self.progress_var.set(0))
 
@@ -223,7 +207,8 @@ class NEQRImageNegation:
         if save_path:
             try:
                 negated_array = np.array(self.negated_image)
-                self.image_to_text(negated_array, save_path)
+                with stage("save"):
+                    self.image_to_text(negated_array, save_path)
                 messagebox.showinfo("Success", "Negated image saved as text file successfully!")
             except Exception as e:
                 messagebox.showerror("Error", f"Error saving text file: {str(e)}")
@@ -233,26 +218,19 @@ class NEQRImageNegation:
             messagebox.showerror("Error", "Please upload or create a text file first")
             return
 
-        self.negate_btn.config(state='disabled')
-        self.upload_btn.config(state='disabled')
-        self.save_text_btn.config(state='disabled')
-        self.create_sample_btn.config(state='disabled')
-
-        thread = threading.Thread(target=self.negate_image_thread)
-        thread.daemon = True
-        thread.start()
-
-        def reenable_buttons():
-            self.negate_btn.config(state='normal')
-            self.upload_btn.config(state='normal')
-            self.save_text_btn.config(state='normal')
-            self.create_sample_btn.config(state='normal')
-
-        self.window.after(100, reenable_buttons)
+        # Queue the job with the inputs as they are now
+        input_array = self.input_array
+        try:
+            self.jobs.submit("negate", lambda bus: self.negate_image_thread(bus, input_array),
+                             self.progress_bus())
+        except QueueFull:
+            messagebox.showwarning("Busy", "Two jobs are already waiting; try again when one has finished")
 
     def run(self):
         self.window.mainloop()
 
 if __name__ == "__main__":
+    configure_logging()
+    configure_tracing()
     app = NEQRImageNegation()
     app.run()
@@ -1,11 +1,16 @@
 import numpy as np
-from qiskit import QuantumCircuit, QuantumRegister, ClassicalRegister
-from qiskit_aer import AerSimulator
 from PIL import Image, ImageTk
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-import threading
-import os
+
+from quantum_watermarking.backends import get_backend
+from quantum_watermarking.diagnostics import CircuitDrawings, clear_terminal, configure_logging, get_logger, log_matrix
+from quantum_watermarking.instrumentation import configure_tracing, stage
+from quantum_watermarking.jobs import FRAME_MS, FrameTimer, JobPool, QueueFull
+from quantum_watermarking.progress import Cancelled, ProgressBus
+from quantum_watermarking import negation
+
+logger = get_logger("neqr_image_negation")
 
 class NEQRImageNegation:
     def __init__(self):
@@ -22,15 +27,22 @@ class NEQRImageNegation:
         self.negated_image = None
         self.input_array = None
         
-        # Initialize quantum simulator
-        self.simulator = AerSimulator()
+        self.circuit_drawings = CircuitDrawings(logger)
         
         # Progress tracking
         self.progress_var = tk.DoubleVar()
         self.progress_var.set(0)
         
+        # Jobs run one at a time on a worker thread and up to two more can
+        # wait, instead of one thread per click competing for the CPU
+        self.jobs = JobPool(max_workers=1, max_pending=2,
+                            on_change=lambda pool: self.window.after(0, self.update_job_controls))
+        self.frames = FrameTimer()
+        self.frames_ticking = False
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+        
         # Clear terminal
-        os.system('cls' if os.name == 'nt' else 'clear')
+        clear_terminal()
         
         self.setup_ui()
         
@@ -52,6 +64,9 @@ class NEQRImageNegation:
         
         self.negate_btn = tk.Button(left_frame, text="Negate Image", command=self.start_negation)
         self.negate_btn.pack(pady=5)
+
+        self.cancel_btn = tk.Button(left_frame, text="Cancel", command=self.jobs.cancel_all, state='disabled')
+        self.cancel_btn.pack(pady=5)
         
         self.save_text_btn = tk.Button(left_frame, text="Save as Text", command=self.save_as_text)
         self.save_text_btn.pack(pady=5)
@@ -59,6 +74,10 @@ class NEQRImageNegation:
         # Create progress bar
         self.progress_bar = ttk.Progressbar(left_frame, variable=self.progress_var, maximum=100)
         self.progress_bar.pack(pady=10, fill=tk.X)
+
+        # Percentage, pixels/sec and ETA of the running job
+        self.status_var = tk.StringVar()
+        tk.Label(left_frame, textvariable=self.status_var).pack(pady=5)
         
         # Create right frame for images
         right_frame = tk.Frame(main_frame)
@@ -118,7 +137,7 @@ class NEQRImageNegation:
             self.display_image(sample_image, self.input_label)
             
             # Display matrix values
-            self.display_matrix_values(sample_array, "Sample Image Matrix Values")
+            log_matrix(logger, sample_array, "Sample Image Matrix Values")
             
             messagebox.showinfo("Success", "Sample text file created successfully!")
             
@@ -126,50 +145,10 @@ class NEQRImageNegation:
             messagebox.showerror("Error", f"Error creating sample file: {str(e)}")
 
     def text_to_image(self, text_file_path):
-        """Convert ASCII art text file to binary image (space=white, other=black), padding short lines with spaces."""
-        image_array = np.full((self.IMAGE_HEIGHT, self.IMAGE_WIDTH), 255, dtype=np.uint8)
-        try:
-            with open(text_file_path, 'r') as f:
-                lines = f.readlines()
-                for i in range(self.IMAGE_HEIGHT):
-                    if i < len(lines):
-                        line = lines[i].rstrip('\n')
-                        # Pad line to 64 characters with spaces if too short
-                        line = line.ljust(self.IMAGE_WIDTH)
-                        for j in range(self.IMAGE_WIDTH):
-                            image_array[i, j] = 255 if line[j] == ' ' else 0
-        except Exception as e:
-            raise ValueError(f"Error parsing file: {str(e)}. Please ensure the file has at least 64 lines, each with at least 64 characters or is padded.") from e
-        return image_array
+        return negation.ascii_art_to_array(text_file_path, self.IMAGE_HEIGHT, self.IMAGE_WIDTH)
 
     def image_to_text(self, image_array, output_path):
-        """Convert image array to text file"""
-        with open(output_path, 'w') as f:
-            # Write dimensions
-            f.write(f"{self.IMAGE_HEIGHT} {self.IMAGE_WIDTH}\n")
-            
-            # Write pixel values
-            for row in image_array:
-                f.write(' '.join(map(str, row)) + '\n')
-
-    def display_matrix_values(self, array, title, max_rows=5, max_cols=5):
-        """Display matrix values in a formatted way"""
-        print(f"\n{title}")
-        print("-" * 50)
-        
-        height, width = array.shape
-        print(f"Shape: {height}x{width}")
-        
-        # Display a portion of the matrix
-        for i in range(min(max_rows, height)):
-            for j in range(min(max_cols, width)):
-                print(f"{array[i,j]:3d}", end=" ")
-            if j < width - 1:
-                print("...", end="")
-            print()
-        if i < height - 1:
-            print("...")
-        print("-" * 50)
+        negation.array_to_text(image_array, output_path)
 
     def upload_text_file(self):
         file_path = filedialog.askopenfilename(filetypes=[("Text files", "*.txt")])
@@ -178,14 +157,15 @@ class NEQRImageNegation:
                 self.input_text_path = file_path
                 
                 # Convert text to image array
-                self.input_array = self.text_to_image(file_path)
+                with stage("decode"):
+                    self.input_array = self.text_to_image(file_path)
                 
                 # Convert array to image for display
                 input_image = Image.fromarray(self.input_array)
                 self.display_image(input_image, self.input_label)
                 
                 # Display matrix values
-                self.display_matrix_values(self.input_array, "Input Image Matrix Values")
+                log_matrix(logger, self.input_array, "Input Image Matrix Values")
                 
             except Exception as e:
                 messagebox.showerror("Error", f"Error reading text file: {str(e)}")
@@ -197,56 +177,57 @@ class NEQRImageNegation:
         label.configure(image=photo)
         label.image = photo
 
-    def apply_neqr_negation(self, pixel_value, print_circuit=False):
-        # Only two possible values: 0 or 255
-        intensity_qubits = 8
-        intensity_reg = QuantumRegister(intensity_qubits, 'intensity')
-        classical_reg = ClassicalRegister(intensity_qubits, 'c')
-        qc = QuantumCircuit(intensity_reg, classical_reg)
-        # Encode pixel intensity
-        if pixel_value == 255:
-            for i in range(intensity_qubits):
-                qc.x(intensity_reg[i])
-        # Apply NOT gates to all qubits for negation
-        for i in range(intensity_qubits):
-            qc.x(intensity_reg[i])
-        qc.measure(intensity_reg, classical_reg)
-        if print_circuit:
-            print(f"\nQuantum Circuit for pixel value {pixel_value}:")
-            print(qc)
-        job = self.simulator.run(qc, shots=1)
-        result = job.result()
-        counts = result.get_counts()
-        measured_value = int(list(counts.keys())[0], 2)
-        # Ensure output is binary: 0 or 255
-        return 255 if measured_value == 0 else 0
+    def progress_bus(self):
+        # Coalesced to a few updates a second, so the Tk event queue is not flooded
+        bus = ProgressBus(max_rate=10)
+        bus.subscribe(lambda update: self.window.after(0, lambda: self.show_progress(update)))
+        return bus
 
-    def negate_image_thread(self):
+    def show_progress(self, update):
+        self.progress_var.set(update.percent)
+        queued = len(self.jobs.jobs) - 1
+        self.status_var.set(update.describe() + (f"  (+{queued} queued)" if queued > 0 else ""))
+
+    def update_job_controls(self):
+        # Cancel is offered while a job runs or waits, and the UI frame
+        # time is measured for as long as one does
+        busy = self.jobs.busy
+        self.cancel_btn.config(state='normal' if busy else 'disabled')
+        if busy and not self.frames_ticking:
+            self.frames_ticking = True
+            self.tick_frames()
+
+    def tick_frames(self):
+        self.frames.tick()
+        if self.jobs.busy:
+            self.window.after(FRAME_MS, self.tick_frames)
+        else:
+            logger.info(self.frames.summary())
+            self.frames.reset()
+            self.frames_ticking = False
+
+    def close(self):
+        # Stop the running job at its next chunk and drop the queued ones
+        self.jobs.on_change = None
+        self.jobs.shutdown()
+        self.window.destroy()
+
+    def negate_image_thread(self, bus, input_array):
         try:
-            if self.input_array is None:
+            if input_array is None:
                 raise ValueError("No input image data available")
-            height, width = self.input_array.shape
+            height, width = input_array.shape
             if height != self.IMAGE_HEIGHT or width != self.IMAGE_WIDTH:
-                print(f"Warning: Image dimensions ({height}x{width}) do not match expected ({self.IMAGE_HEIGHT}x{self.IMAGE_WIDTH})")
-            self.first_pixel = self.input_array[0, 0]
-            self.display_matrix_values(self.input_array, "Initial Input Image Matrix")
-            negated_array = np.zeros((height, width), dtype=np.uint8)
-            print("\nNegating image using NEQR quantum circuits...")
-            for x in range(height):
-                for y in range(width):
-                    try:
-                        print_circuit = (x == 0 and y < 5)  # Print for first 5 pixels in first row
-                        negated_array[x, y] = self.apply_neqr_negation(self.input_array[x, y], print_circuit=print_circuit)
-                    except Exception as e:
-                        print(f"Error at (x={x}, y={y}): pixel={self.input_array[x, y]}, shape={self.input_array.shape}")
-                        raise e
-                progress = ((x + 1) / height) * 100
-                self.window.after(0, lambda p=progress: self.progress_var.set(p))
-                if progress % 25 == 0:
-                    self.display_matrix_values(negated_array, f"Intermediate Negated Matrix (Progress: {progress:.0f}%)")
+                logger.warning("Warning: Image dimensions (%dx%d) do not match expected (%dx%d)", height, width, self.IMAGE_HEIGHT, self.IMAGE_WIDTH)
+            self.first_pixel = input_array[0, 0]
+            negated_array = negation.negate_image(
+                input_array, get_backend(), binary=True,
+                progress=bus,
+                circuit_drawings=self.circuit_drawings)
             self.negated_image = Image.fromarray(negated_array)
-            self.display_matrix_values(negated_array, "Final Negated Image Matrix")
             self.window.after(0, lambda: self.display_image(self.negated_image, self.negated_label))
+        except Cancelled:
+            self.window.after(0, lambda: self.status_var.set("Cancelled"))
         except Exception as e:
             error_msg = str(e)
             self.window.after(0, lambda: messagebox.showerror("Error", f"An error occurred: {error_msg}"))
@@ -267,7 +248,8 @@ class NEQRImageNegation:
                 negated_array = np.array(self.negated_image)
                 
                 # Save as text file
-                self.image_to_text(negated_array, save_path)
+                with stage("save"):
+                    self.image_to_text(negated_array, save_path)
                 
                 messagebox.showinfo("Success", "Negated image saved as text file successfully!")
             except Exception as e:
@@ -277,30 +259,20 @@ class NEQRImageNegation:
         if self.input_array is None:
             messagebox.showerror("Error", "Please upload or create a text file first")
             return
-            
-        # Disable buttons during processing
-        self.negate_btn.config(state='disabled')
-        self.upload_btn.config(state='disabled')
-        self.save_text_btn.config(state='disabled')
-        self.create_sample_btn.config(state='disabled')
-        
-        # Start negation in a separate thread
-        thread = threading.Thread(target=self.negate_image_thread)
-        thread.daemon = True
-        thread.start()
-        
-        # Re-enable buttons after processing
-        def reenable_buttons():
-            self.negate_btn.config(state='normal')
-            self.upload_btn.config(state='normal')
-            self.save_text_btn.config(state='normal')
-            self.create_sample_btn.config(state='normal')
-        
-        self.window.after(100, reenable_buttons)
+
+        # Queue the job with the inputs as they are now
+        input_array = self.input_array
+        try:
+            self.jobs.submit("negate", lambda bus: self.negate_image_thread(bus, input_array),
+                             self.progress_bus())
+        except QueueFull:
+            messagebox.showwarning("Busy", "Two jobs are already waiting; try again when one has finished")
 
     def run(self):
         self.window.mainloop()
 
 if __name__ == "__main__":
+    configure_logging()
+    configure_tracing()
     app = NEQRImageNegation()
     app.run() 
\ No newline at end of file
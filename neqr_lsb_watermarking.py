@@ -1,12 +1,22 @@
+import time
+
 import numpy as np
-from qiskit import QuantumCircuit, QuantumRegister, ClassicalRegister
-from qiskit_aer import AerSimulator
-import matplotlib.pyplot as plt
 from PIL import Image, ImageTk
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-import threading
-import os
+
+from quantum_watermarking import neqr_lsb
+from quantum_watermarking.backends import get_backend
+from quantum_watermarking.checkpoint import Checkpoint, default_directory
+from quantum_watermarking.detect import PreCheck
+from quantum_watermarking.diagnostics import MATRIX, clear_terminal, configure_logging, get_logger, log_matrix
+from quantum_watermarking.instrumentation import configure_tracing, stage
+from quantum_watermarking.jobs import FRAME_MS, FrameTimer, JobPool, QueueFull
+from quantum_watermarking.previews import default_previews
+from quantum_watermarking.progress import Cancelled, ProgressBus
+from quantum_watermarking.watermark_cache import default_cache
+
+logger = get_logger("neqr_lsb_watermarking")
 
 class NEQRLSBWatermarking:
     def __init__(self):
@@ -19,15 +29,26 @@ class NEQRLSBWatermarking:
         self.watermark_image_path = None
         self.watermarked_image = None
         
-        # Initialize quantum simulator
-        self.simulator = AerSimulator()
+        # Decoded images and thumbnails, shared by preview and processing
+        self.previews = default_previews()
+
+        # Embed timings, reported on close; a NEQR-LSB mark cannot be pre-checked (see detect.py)
+        self.precheck = PreCheck()
         
         # Progress tracking
         self.progress_var = tk.DoubleVar()
         self.progress_var.set(0)
         
+        # Jobs run one at a time on a worker thread and up to two more can
+        # wait, instead of one thread per click competing for the CPU
+        self.jobs = JobPool(max_workers=1, max_pending=2,
+                            on_change=lambda pool: self.window.after(0, self.update_job_controls))
+        self.frames = FrameTimer()
+        self.frames_ticking = False
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+        
         # Clear terminal
-        os.system('cls' if os.name == 'nt' else 'clear')
+        clear_terminal()
         
         self.setup_ui()
         
@@ -49,10 +70,17 @@ class NEQRLSBWatermarking:
         
         self.embed_btn = tk.Button(left_frame, text="Embed Watermark", command=self.start_embedding)
         self.embed_btn.pack(pady=10)
+
+        self.cancel_btn = tk.Button(left_frame, text="Cancel", command=self.jobs.cancel_all, state='disabled')
+        self.cancel_btn.pack(pady=10)
         
         # Create progress bar
         self.progress_bar = ttk.Progressbar(left_frame, variable=self.progress_var, maximum=100)
         self.progress_bar.pack(pady=10, fill=tk.X)
+
+        # Percentage, pixels/sec and ETA of the running job
+        self.status_var = tk.StringVar()
+        tk.Label(left_frame, textvariable=self.status_var).pack(pady=5)
         
         # Create right frame for images
         right_frame = tk.Frame(main_frame)
@@ -93,50 +121,16 @@ class NEQRLSBWatermarking:
         self.watermarked_label = tk.Label(watermarked_frame)
         self.watermarked_label.pack(expand=True)
         
-    def display_matrix_values(self, array, title, max_rows=5, max_cols=5):
-        """Display matrix values in a formatted way"""
-        print(f"\n{title}")
-        print("-" * 50)
-        
-        # Get dimensions
-        if len(array.shape) == 3:  # Color image
-            height, width, channels = array.shape
-            print(f"Shape: {height}x{width}x{channels}")
-            
-            # Display a portion of the matrix
-            for i in range(min(max_rows, height)):
-                for j in range(min(max_cols, width)):
-                    pixel = array[i, j]
-                    print(f"Pixel[{i},{j}]: R={pixel[0]}, G={pixel[1]}, B={pixel[2]}")
-                if j < width - 1:
-                    print("...")
-                print()
-            if i < height - 1:
-                print("...")
-        else:  # Grayscale image
-            height, width = array.shape
-            print(f"Shape: {height}x{width}")
-            
-            # Display a portion of the matrix
-            for i in range(min(max_rows, height)):
-                for j in range(min(max_cols, width)):
-                    print(f"{array[i,j]:3d}", end=" ")
-                if j < width - 1:
-                    print("...", end="")
-                print()
-            if i < height - 1:
-                print("...")
-        print("-" * 50)
-        
     def upload_host_image(self):
         file_path = filedialog.askopenfilename(filetypes=[("Image files", "*.png *.jpg *.jpeg *.bmp")])
         if file_path:
             self.host_image_path = file_path
             self.display_image(file_path, self.host_label)
             
-            # Display matrix values of host image
-            host_array = np.array(Image.open(file_path))
-            self.display_matrix_values(host_array, "Host Image Matrix Values")
+            # Display matrix values of host image, from the preview's decode
+            if logger.isEnabledFor(MATRIX):
+                self.previews.submit(lambda: log_matrix(
+                    logger, np.array(self.previews.image(file_path)), "Host Image Matrix Values"))
             
     def upload_watermark_image(self):
         file_path = filedialog.askopenfilename(filetypes=[("Image files", "*.png *.jpg *.jpeg *.bmp")])
@@ -145,123 +139,75 @@ class NEQRLSBWatermarking:
             self.display_image(file_path, self.watermark_label)
             
     def display_image(self, image_path, label, size=(200, 200)):
-        # Load and resize image for preview
-        if isinstance(image_path, str):
-            image = Image.open(image_path)
-        else:
-            image = image_path
-        image = image.resize(size, Image.Resampling.LANCZOS)
-        photo = ImageTk.PhotoImage(image)
+        # Decoded (once) and downscaled on the preview thread; only the
+        # PhotoImage is made on the Tk thread
+        self.previews.request(
+            image_path, size,
+            lambda thumb: self.window.after(0, lambda: self.show_thumbnail(thumb, label)),
+            slot=label,
+            error=lambda e: self.window.after(0, lambda: messagebox.showerror("Error", f"Could not load image: {e}")))
+
+    def show_thumbnail(self, thumb, label):
+        photo = ImageTk.PhotoImage(thumb)
         label.configure(image=photo)
         label.image = photo
 
-    def apply_neqr_lsb(self, host_pixel, watermark_bit):
-        # Create quantum circuit for NEQR-LSB
-        x_qubits = 2  # For x position
-        y_qubits = 2  # For y position
-        intensity_qubits = 8  # For pixel intensity
-        aux_qubits = 1  # Auxiliary qubit for LSB
-        
-        # Initialize quantum registers
-        pos_reg = QuantumRegister(x_qubits + y_qubits, 'pos')
-        intensity_reg = QuantumRegister(intensity_qubits, 'intensity')
-        aux_reg = QuantumRegister(aux_qubits, 'aux')
-        classical_reg = ClassicalRegister(1, 'c')
-        
-        # Create quantum circuit
-        qc = QuantumCircuit(pos_reg, intensity_reg, aux_reg, classical_reg)
-        
-        # Encode pixel intensity
-        intensity_binary = format(host_pixel, '08b')
-        for i, bit in enumerate(intensity_binary):
-            if bit == '1':
-                qc.x(intensity_reg[i])
-        
-        # Apply LSB modification based on watermark bit
-        if watermark_bit:
-            qc.x(intensity_reg[7])  # Flip LSB if watermark bit is 1
-        
-        # Copy LSB to auxiliary qubit
-        qc.cx(intensity_reg[7], aux_reg[0])
-        
-        # Measure the auxiliary qubit
-        qc.measure(aux_reg[0], classical_reg[0])
-        
-        # Execute the circuit
-        job = self.simulator.run(qc, shots=1)
-        result = job.result()
-        counts = result.get_counts()
-        
-        # Get the measured value
-        measured_value = int(list(counts.keys())[0])
-        return measured_value
+    def progress_bus(self):
+        # Coalesced to a few updates a second, so the Tk event queue is not flooded
+        bus = ProgressBus(max_rate=10)
+        bus.subscribe(lambda update: self.window.after(0, lambda: self.show_progress(update)))
+        return bus
+
+    def show_progress(self, update):
+        self.progress_var.set(update.percent)
+        queued = len(self.jobs.jobs) - 1
+        self.status_var.set(update.describe() + (f"  (+{queued} queued)" if queued > 0 else ""))
 
-    def embed_watermark_thread(self):
+    def update_job_controls(self):
+        # Cancel is offered while a job runs or waits, and the UI frame
+        # time is measured for as long as one does
+        busy = self.jobs.busy
+        self.cancel_btn.config(state='normal' if busy else 'disabled')
+        if busy and not self.frames_ticking:
+            self.frames_ticking = True
+            self.tick_frames()
+
+    def tick_frames(self):
+        self.frames.tick()
+        if self.jobs.busy:
+            self.window.after(FRAME_MS, self.tick_frames)
+        else:
+            logger.info(self.frames.summary())
+            self.frames.reset()
+            self.frames_ticking = False
+
+    def close(self):
+        # Stop the running job at its next chunk and drop the queued ones
+        self.jobs.on_change = None
+        self.jobs.shutdown()
+        if self.precheck.checked or self.precheck.embedded_values:
+            logger.info("%s", self.precheck.summary())
+        self.window.destroy()
+
+    def embed_watermark_thread(self, bus, host_path, watermark_path):
         try:
-            # Load images
-            host_img = Image.open(self.host_image_path)
-            watermark_img = Image.open(self.watermark_image_path)
-            
-            # Convert watermark to grayscale but keep host image in color
-            watermark_img = watermark_img.convert('L')
-            
-            # Calculate appropriate watermark size (1/8 of host image)
-            watermark_width = host_img.width // 4
-            watermark_height = host_img.height // 4
-            
-            # Resize watermark
-            watermark_img = watermark_img.resize((watermark_width, watermark_height))
-            
-            # Convert to numpy arrays
+            # Load images: decoded once, for the preview, and shared with the processing
+            host_img = self.previews.image(host_path)
             host_array = np.array(host_img)
-            watermark_array = np.array(watermark_img)
-            
-            # Display initial matrices
-            self.display_matrix_values(host_array, "Initial Host Image Matrix")
-            self.display_matrix_values(watermark_array, "Watermark Matrix")
-            
-            # Create output array
-            watermarked_array = np.copy(host_array)
-            
-            # Process in chunks for better performance
-            chunk_size = 1000
-            total_pixels = watermark_width * watermark_height
-            total_chunks = (total_pixels + chunk_size - 1) // chunk_size
-            
-            print("\nEmbedding watermark using NEQR-LSB...")
-            for chunk in range(total_chunks):
-                start_idx = chunk * chunk_size
-                end_idx = min(start_idx + chunk_size, total_pixels)
-                
-                for i in range(start_idx, end_idx):
-                    x = i // watermark_width
-                    y = i % watermark_width
-                    
-                    # Get watermark bit
-                    watermark_bit = 1 if watermark_array[x, y] > 127 else 0
-                    
-                    # Process each color channel
-                    for c in range(host_array.shape[2] if len(host_array.shape) > 2 else 1):
-                        if len(host_array.shape) > 2:  # Color image
-                            host_pixel = host_array[x, y, c]
-                            # Apply NEQR-LSB embedding to each channel
-                            new_lsb = self.apply_neqr_lsb(host_pixel, watermark_bit)
-                            watermarked_array[x, y, c] = (host_pixel & 254) | new_lsb
-                        else:  # Grayscale image
-                            host_pixel = host_array[x, y]
-                            new_lsb = self.apply_neqr_lsb(host_pixel, watermark_bit)
-                            watermarked_array[x, y] = (host_pixel & 254) | new_lsb
-                
-                # Update progress
-                progress = (chunk + 1) / total_chunks * 100
-                self.window.after(0, lambda p=progress: self.progress_var.set(p))
-                
-                # Display intermediate matrix values every 25% progress
-                if progress % 25 == 0:
-                    self.display_matrix_values(watermarked_array, f"Watermarked Image Matrix (Progress: {progress:.0f}%)")
-            
-            # Display final watermarked matrix
-            self.display_matrix_values(watermarked_array, "Final Watermarked Image Matrix")
+            # Prepared once per watermark and host size, then served from the cache
+            watermark_array = default_cache().get(watermark_path, host_img.size, "neqr-lsb")
+            
+            # Embed the watermark, with coalesced progress updates; an
+            # interrupted run (crash, closed window) resumes from its checkpoint
+            checkpoint = Checkpoint(default_directory(), "neqr-lsb", host_array, watermark_array)
+            start = time.perf_counter()
+            watermarked_array = neqr_lsb.embed_watermark(
+                host_array, watermark_array, get_backend(),
+                progress=bus,
+                checkpoint=checkpoint)
+            self.precheck.record_embed(time.perf_counter() - start, watermark_array.size)
+            # The output is in memory now; only a cancelled or crashed run keeps its checkpoint
+            checkpoint.discard()
             
             # Convert back to image
             watermarked_img = Image.fromarray(watermarked_array)
@@ -273,10 +219,13 @@ class NEQRLSBWatermarking:
             save_path = filedialog.asksaveasfilename(defaultextension=".png",
                                                     filetypes=[("PNG files", "*.png")])
             if save_path:
-                watermarked_img.save(save_path)
+                with stage("save"):
+                    watermarked_img.save(save_path)
                 self.window.after(0, lambda: messagebox.showinfo("Success", 
                     "Watermark embedded successfully using NEQR-LSB!"))
                 
+        except Cancelled:
+            self.window.after(0, lambda: self.status_var.set("Cancelled; embedding again resumes from the checkpoint"))
         except Exception as e:
             self.window.after(0, lambda: messagebox.showerror("Error", f"An error occurred: {str(e)}"))
         finally:
@@ -286,28 +235,21 @@ class NEQRLSBWatermarking:
         if not self.host_image_path or not self.watermark_image_path:
             messagebox.showerror("Error", "Please upload both host and watermark images")
             return
-            
-        # Disable buttons during processing
-        self.embed_btn.config(state='disabled')
-        self.upload_host_btn.config(state='disabled')
-        self.upload_watermark_btn.config(state='disabled')
-        
-        # Start embedding in a separate thread
-        thread = threading.Thread(target=self.embed_watermark_thread)
-        thread.daemon = True
-        thread.start()
-        
-        # Re-enable buttons after processing
-        def reenable_buttons():
-            self.embed_btn.config(state='normal')
-            self.upload_host_btn.config(state='normal')
-            self.upload_watermark_btn.config(state='normal')
-        
-        self.window.after(100, reenable_buttons)
+
+        # Queue the job with the inputs as they are now
+        host_path = self.host_image_path
+        watermark_path = self.watermark_image_path
+        try:
+            self.jobs.submit("embed", lambda bus: self.embed_watermark_thread(bus, host_path, watermark_path),
+                             self.progress_bus())
+        except QueueFull:
+            messagebox.showwarning("Busy", "Two jobs are already waiting; try again when one has finished")
             
     def run(self):
         self.window.mainloop()
 
 if __name__ == "__main__":
+    configure_logging()
+    configure_tracing()
     app = NEQRLSBWatermarking()
     app.run()
@@ -0,0 +1,6 @@
+"""Shared building blocks for the quantum watermarking and negation tools.
+
+The top-level scripts (``neqr_lsb_watermarking.py``, ``f.py``, ...) are thin
+front ends over the modules in this package. Importing the package itself is
+cheap: submodules are only loaded when they are imported explicitly.
+"""
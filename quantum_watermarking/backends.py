@@ -0,0 +1,205 @@
+"""Interchangeable backends that execute the schemes in ``schemes.py``.
+
+Every backend has the same interface::
+
+    backend.run(scheme, *arrays) -> np.ndarray
+
+taking one integer array per scheme input (broadcast together) and returning
+the decoded results with the same shape. Available backends:
+
+    aer          one AerSimulator job per value (what the tools always did)
+    aer-batched  one circuit per *distinct* input, submitted in batched jobs
+    stabilizer   as aer-batched, on Aer's Clifford-only stabilizer method
+    bitsliced    classical bit-sliced evaluation over packed uint64 words
+    numpy        the scheme's vectorised NumPy reference
+
+Pick one per run with ``get_backend(name)``; the default comes from
+``$QWM_BACKEND`` and falls back to ``aer``. ``conformance.py`` checks every
+backend against every scheme.
+
+``qiskit_aer`` takes the better part of a second to import, so it is only
+imported the first time a circuit backend actually needs a simulator.
+"""
+import os
+import threading
+
+import numpy as np
+
+from .instrumentation import stage
+
+_lock = threading.Lock()
+_simulators = {}
+
+
+def default_simulator(method=None):
+    """Process-wide ``AerSimulator`` (per simulation method), created on first use"""
+    simulator = _simulators.get(method)
+    if simulator is None:
+        with _lock:
+            simulator = _simulators.get(method)
+            if simulator is None:
+                from qiskit_aer import AerSimulator
+                simulator = AerSimulator(method=method) if method else AerSimulator()
+                _simulators[method] = simulator
+    return simulator
+
+
+def release_simulators():
+    """Drop the shared simulators; the next job creates them again"""
+    with _lock:
+        _simulators.clear()
+
+
+def _measured_value(counts):
+    # shots=1: the only key is the measured register, parsed base 2
+    return int(next(iter(counts)), 2)
+
+
+class Backend:
+    """Runs a scheme over arrays of inputs"""
+
+    name = None
+
+    def run(self, scheme, *arrays):
+        arrays = np.broadcast_arrays(*[np.asarray(a) for a in arrays])
+        shape = arrays[0].shape
+        flat = [np.ascontiguousarray(a).reshape(-1) for a in arrays]
+        return self._run_flat(scheme, flat).reshape(shape)
+
+    def _run_flat(self, scheme, flat):
+        raise NotImplementedError
+
+    def __repr__(self):
+        return f"<backend {self.name}>"
+
+
+class AerPerPixelBackend(Backend):
+    """One simulator job per value"""
+
+    name = "aer"
+
+    def __init__(self, simulator=None):
+        self.simulator = simulator
+
+    def _run_flat(self, scheme, flat):
+        simulator = self.simulator or default_simulator()
+        out = np.empty(flat[0].size, dtype=np.uint8)
+        for i, values in enumerate(zip(*flat)):
+            with stage("circuit_build"):
+                qc = scheme.circuit(*values)
+            with stage("simulate"):
+                result = simulator.run(qc, shots=1).result()
+            with stage("parse_counts"):
+                out[i] = scheme.decode(_measured_value(result.get_counts()))
+        return out
+
+
+class AerBatchedBackend(Backend):
+    """One circuit per distinct input tuple, ``batch_size`` circuits per job.
+
+    Valid because every scheme decodes deterministically, so equal inputs give
+    equal outputs: an 8-bit image needs at most 256 (or 512) simulations.
+    """
+
+    name = "aer-batched"
+    method = None
+
+    def __init__(self, simulator=None, batch_size=256):
+        self.simulator = simulator
+        self.batch_size = batch_size
+
+    def _run_flat(self, scheme, flat):
+        simulator = self.simulator or default_simulator(self._method(scheme))
+        # Combine the inputs into one key per element and simulate each key once
+        keys = np.zeros(flat[0].size, dtype=np.int64)
+        for array, bits in zip(flat, scheme.input_bits):
+            keys = (keys << bits) | (array.astype(np.int64) & ((1 << bits) - 1))
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        unique_inputs = []
+        for bits in reversed(scheme.input_bits):
+            unique_inputs.append(unique_keys & ((1 << bits) - 1))
+            unique_keys = unique_keys >> bits
+        unique_inputs.reverse()
+
+        results = np.empty(len(unique_inputs[0]), dtype=np.uint8)
+        for start in range(0, len(results), self.batch_size):
+            end = min(start + self.batch_size, len(results))
+            with stage("circuit_build"):
+                circuits = [scheme.circuit(*(int(a[i]) for a in unique_inputs)) for i in range(start, end)]
+            with stage("simulate"):
+                result = simulator.run(circuits, shots=1).result()
+            with stage("parse_counts"):
+                for i in range(start, end):
+                    results[i] = scheme.decode(_measured_value(result.get_counts(i - start)))
+        return results[inverse]
+
+    def _method(self, scheme):
+        return self.method
+
+
+class StabilizerBackend(AerBatchedBackend):
+    """Batched, on the stabilizer method.
+
+    Schemes that are not Clifford (``scheme.clifford`` false, the intensity
+    arithmetic) fall back to Aer's default method.
+    """
+
+    name = "stabilizer"
+    method = "stabilizer"
+
+    def _method(self, scheme):
+        return self.method if scheme.clifford else None
+
+
+class BitSlicedBackend(Backend):
+    """Evaluates ``scheme.logic`` on bit planes packed 64 values per uint64 word"""
+
+    name = "bitsliced"
+
+    def _run_flat(self, scheme, flat):
+        n = flat[0].size
+        words = (n + 63) // 64
+        planes = {}
+
+        def plane(index, bit):
+            key = (index, bit)
+            if key not in planes:
+                bits = ((flat[index] >> bit) & 1).astype(np.uint8)
+                packed = np.zeros(words * 8, dtype=np.uint8)
+                packed[:(n + 7) // 8] = np.packbits(bits, bitorder="little")
+                planes[key] = packed.view(np.uint64)
+            return planes[key]
+
+        outputs = scheme.logic(plane)
+        out = np.zeros(n, dtype=np.uint8)
+        for bit, words_out in enumerate(outputs):
+            bits = np.unpackbits(words_out.view(np.uint8), bitorder="little")[:n]
+            out |= bits << bit
+        return out
+
+
+class NumpyBackend(Backend):
+    """The scheme's vectorised reference implementation"""
+
+    name = "numpy"
+
+    def _run_flat(self, scheme, flat):
+        return scheme.reference(*[a.astype(np.uint8) for a in flat]).astype(np.uint8)
+
+
+BACKENDS = {
+    cls.name: cls
+    for cls in (AerPerPixelBackend, AerBatchedBackend, StabilizerBackend, BitSlicedBackend, NumpyBackend)
+}
+
+
+def get_backend(name=None):
+    """Backend instance by name; defaults to ``$QWM_BACKEND`` or ``aer``"""
+    if isinstance(name, Backend):
+        return name
+    if name is None:
+        name = os.environ.get("QWM_BACKEND") or "aer"
+    try:
+        return BACKENDS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown backend {name!r}; choose from {', '.join(BACKENDS)}") from None
@@ -0,0 +1,140 @@
+"""Checkpointed, resumable embedding.
+
+A circuit-faithful embed of a large host can run for hours. With a
+``Checkpoint`` the output is built in a memory-mapped ``.npy`` file instead
+of memory, and every so often the map is flushed and a small JSON manifest
+records how many payload values are done. Running the same embed again
+(same scheme, host and prepared watermark) continues from there::
+
+    checkpoint = Checkpoint(default_directory(), "waqi", host_array, watermark_binary)
+    watermarked = waqi.embed_watermark(host_array, watermark_binary, checkpoint=checkpoint)
+    Image.fromarray(watermarked).save(path)
+    checkpoint.discard()
+
+Flushes happen at most every ``interval`` seconds, and the interval grows
+whenever a flush costs more than ``max_overhead`` of the time between
+flushes, which bounds the checkpointing overhead. The data is flushed before
+the manifest is replaced, so the manifest never claims unwritten values.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from .diagnostics import get_logger
+
+logger = get_logger("checkpoint")
+
+VERSION = 1
+DEFAULT_INTERVAL = 5.0
+DEFAULT_MAX_OVERHEAD = 0.02
+
+
+def default_directory():
+    """``$QWM_CHECKPOINT_DIR``, or a directory under the user's cache"""
+    return os.environ.get("QWM_CHECKPOINT_DIR") or os.path.join(
+        os.path.expanduser("~"), ".cache", "quantum_watermarking", "checkpoints")
+
+
+def _digest(*arrays):
+    h = hashlib.blake2b(digest_size=16)
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        h.update(f"{array.dtype}{array.shape}".encode())
+        h.update(array.data)
+    return h.hexdigest()
+
+
+class Checkpoint:
+    """Memory-mapped output plus progress manifest for one embed; see the module docstring"""
+
+    def __init__(self, directory, scheme, host_array, prepared, interval=DEFAULT_INTERVAL,
+                 max_overhead=DEFAULT_MAX_OVERHEAD):
+        os.makedirs(directory, exist_ok=True)
+        key = f"{scheme}-{_digest(host_array, prepared)}"
+        self.data_path = os.path.join(directory, key + ".npy")
+        self.manifest_path = os.path.join(directory, key + ".json")
+        self.scheme = scheme
+        self.interval = interval
+        self.max_overhead = max_overhead
+        self.array = None
+        self.resumed_from = 0
+        self.done = 0
+        self.flushes = 0
+        self.flush_seconds = 0.0
+        self._started = None
+        self._last_flush = None
+
+    def _read_manifest(self, host_array):
+        try:
+            with open(self.manifest_path) as fh:
+                manifest = json.load(fh)
+        except (OSError, ValueError):
+            return None
+        if (manifest.get("version") != VERSION or manifest.get("scheme") != self.scheme
+                or manifest.get("shape") != list(host_array.shape) or manifest.get("dtype") != str(host_array.dtype)):
+            return None
+        return manifest
+
+    def start(self, host_array):
+        """Output array (memory-mapped) and the number of payload values already done"""
+        manifest = self._read_manifest(host_array)
+        if manifest is not None and os.path.exists(self.data_path):
+            self.array = np.load(self.data_path, mmap_mode="r+")
+            self.resumed_from = self.done = int(manifest["done"])
+            logger.info("Resuming embed from checkpoint %s at value %d", self.manifest_path, self.done)
+        else:
+            # Fresh run: the output starts as a copy of the host, written in strips
+            self.array = np.lib.format.open_memmap(self.data_path, mode="w+", dtype=host_array.dtype,
+                                                   shape=host_array.shape)
+            for top in range(0, len(host_array), 256):
+                self.array[top:top + 256] = host_array[top:top + 256]
+            self.resumed_from = self.done = 0
+            self._flush()
+        self._started = self._last_flush = time.perf_counter()
+        return self.array, self.done
+
+    def update(self, done):
+        """Record that the first ``done`` payload values are embedded; flushes when due"""
+        self.done = done
+        if time.perf_counter() - self._last_flush >= self.interval:
+            self._flush()
+
+    def _flush(self):
+        start = time.perf_counter()
+        self.array.flush()
+        manifest = {"version": VERSION, "scheme": self.scheme, "shape": list(self.array.shape),
+                    "dtype": str(self.array.dtype), "done": self.done, "updated": time.time()}
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.manifest_path), suffix=".tmp")
+        with os.fdopen(fd, "w") as fh:
+            json.dump(manifest, fh)
+        os.replace(tmp, self.manifest_path)
+        cost = time.perf_counter() - start
+        self.flushes += 1
+        self.flush_seconds += cost
+        # Keep flushing below max_overhead of the run
+        self.interval = max(self.interval, cost / self.max_overhead)
+        self._last_flush = time.perf_counter()
+
+    def suspend(self):
+        """Flush now and release the memory map, leaving the run resumable"""
+        self._flush()
+        self.array = None
+
+    def finish(self):
+        """Final flush; returns the embedded output as an in-memory array"""
+        self._flush()
+        elapsed = time.perf_counter() - self._started
+        logger.info("Checkpointing: %d flushes, %.3f s (%.2f%% of %.1f s)", self.flushes, self.flush_seconds,
+                    100 * self.flush_seconds / elapsed if elapsed else 0.0, elapsed)
+        return np.array(self.array)
+
+    def discard(self):
+        """Delete the checkpoint files once the embed has returned its output"""
+        self.array = None
+        for path in (self.manifest_path, self.data_path):
+            if os.path.exists(path):
+                os.remove(path)
@@ -0,0 +1,626 @@
+"""Headless command line entry points.
+
+    python -m quantum_watermarking embed --scheme waqi host.png mark.png out.png
+    python -m quantum_watermarking embed --scheme waqi a.png b.png c.png mark.png outdir/
+    python -m quantum_watermarking embed-frames --scheme waqi frames/ mark.png marked_frames/
+    python -m quantum_watermarking embed-frames --raw 1280x720 --pixel-format yuv420p clip.yuv mark.png marked.yuv
+    python -m quantum_watermarking extract --scheme neqr-lsb marked.png mark.png [--original orig.png]
+    python -m quantum_watermarking index --host-size 512x512 logos.npz logo1.png logo2.png ...
+    python -m quantum_watermarking match --max-distance 400 logos.npz extracted1.png ...
+    python -m quantum_watermarking negate --mode grayscale in.txt out.txt
+    python -m quantum_watermarking transform --op rot90 --op flip-h --negate monalisa_rotated.txt out.png
+    python -m quantum_watermarking intensity --op threshold --value 128 in.png out.png
+    python -m quantum_watermarking gui waqi-embed
+    python -m quantum_watermarking conformance
+    python -m quantum_watermarking serve --port 8765 --processes 2
+    python -m quantum_watermarking watch --scheme waqi --watermark mark.png inbox/ outbox/
+
+Without ``--original``, extraction decodes only the leading rows of the
+image that carry the watermark (see ``roi.py``).
+
+``--backend`` (or ``$QWM_BACKEND``) picks the backend that runs the circuits;
+see ``backends.py``. ``--workers N`` runs it over tiles in N processes,
+with the host in shared memory (``--transport pickle`` pickles the tiles
+instead); see ``parallel.py``.
+
+Nothing heavy is imported at module level: numpy and PIL are loaded by the
+command that needs them, qiskit only once a circuit is built, and Tk only
+for the ``gui`` command. The terminal is never cleared by shelling out.
+"""
+import argparse
+import importlib
+import os
+import sys
+
+from .diagnostics import configure_logging, get_logger
+from .instrumentation import configure_tracing, stage
+
+logger = get_logger("cli")
+
+SCHEMES = ("neqr-lsb", "waqi")
+
+# gui name -> (top-level script module, Tk application class)
+GUIS = {
+    "neqr-lsb-embed": ("neqr_lsb_watermarking", "NEQRLSBWatermarking"),
+    "neqr-lsb-extract": ("neqr_lsb_extractor", "NEQRLSBExtractor"),
+    "waqi-embed": ("waqi_watermarking", "WaQIWatermarking"),
+    "waqi-extract": ("watermark_extractor", "WaQIExtractor"),
+    "negate-binary": ("neqr_image_negation", "NEQRImageNegation"),
+    "negate-grayscale": ("neqr_image_n", "NEQRImageNegation"),
+}
+
+
+def _open_array(path):
+    import numpy as np
+    from PIL import Image
+
+    with stage("decode"):
+        image = Image.open(path)
+        return image, np.array(image)
+
+
+def _save(image, path):
+    with stage("save"):
+        image.save(path)
+    logger.info("Saved %s", path)
+
+
+# backend name -> ProcessBackend, for --workers
+_process_backends = {}
+
+
+def _backend(args, default=None):
+    # The backend to hand to the library, wrapped for --workers; one pool per run
+    name = args.backend or default
+    if args.workers <= 1:
+        return name
+    if name not in _process_backends:
+        from .parallel import ProcessBackend
+        _process_backends[name] = ProcessBackend(name, args.workers, args.transport)
+    return _process_backends[name]
+
+
+def _shared(args, array):
+    # With --workers over shared memory the host goes there once, so its
+    # tiles reach the workers without being copied
+    if args.workers <= 1 or args.transport != "shm":
+        return array
+    from .parallel import share
+    return share(array)
+
+
+def _progress(args, unit="px"):
+    # With --progress, a bus that logs percentage, rate and ETA once a second
+    if not args.progress:
+        return None
+    from .progress import ProgressBus
+
+    bus = ProgressBus(max_rate=1)
+    bus.subscribe(lambda update: logger.info("%s", update.describe(unit)))
+    return bus
+
+
+def _ecc(args):
+    # The --ecc code, which only WaQI payloads support
+    if args.ecc == "none":
+        return None
+    if args.scheme != "waqi":
+        raise ValueError("--ecc is only supported with --scheme waqi")
+    return args.ecc
+
+
+def _compress(args):
+    # --compress, which only WaQI payloads support
+    if args.compress and args.scheme != "waqi":
+        raise ValueError("--compress is only supported with --scheme waqi")
+    return args.compress
+
+
+def cmd_embed(args):
+    import shutil
+    import time
+
+    import numpy as np
+    from PIL import Image
+
+    from . import roi
+    from .detect import DETECTABLE, PreCheck
+    from .watermark_cache import default_cache
+
+    cache = default_cache()
+    check = PreCheck(args.ber_threshold, args.nc_threshold)
+    ecc = _ecc(args)
+    compress = _compress(args)
+    if len(args.hosts) > 1 and not os.path.isdir(args.output):
+        raise ValueError("With several hosts the output must be an existing directory")
+    for host in args.hosts:
+        output = args.output
+        if os.path.isdir(output):
+            output = os.path.join(output, os.path.splitext(os.path.basename(host))[0] + ".png")
+        host_img = Image.open(host)
+        prepared = cache.get(args.watermark, host_img.size, "waqi-compressed" if compress else args.scheme)
+
+        if not args.force and args.scheme in DETECTABLE:
+            # Only the LSBs of the payload rows are needed to spot an existing mark
+            width, height = host_img.size
+            expected = prepared
+            if ecc is not None:
+                from .ecc import as_code
+                expected = as_code(ecc).encode(prepared)
+            rows = -(-expected.size // (width * roi.channel_count(host_img) * args.lsb_bits))
+            if args.key is not None:
+                rows = height  # a scattered mark can be anywhere
+            top_rows, stats = roi.decode_rows(host, rows)
+            check.detect_seconds += stats["seconds"]
+            if check.already_marked(top_rows, expected, args.scheme, args.lsb_bits, args.key):
+                logger.info("%s already carries the watermark; not embedding again", host)
+                if os.path.splitext(host)[1].lower() == os.path.splitext(output)[1].lower():
+                    if os.path.abspath(host) != os.path.abspath(output):
+                        shutil.copyfile(host, output)
+                    logger.info("Saved %s", output)
+                else:
+                    _save(host_img, output)
+                continue
+
+        with stage("decode"):
+            host_array = _shared(args, np.array(host_img))
+        checkpoint = None
+        if args.checkpoint_dir:
+            from .checkpoint import Checkpoint
+            from .scatter import key_digest
+            key = args.scheme if args.lsb_bits == 1 else f"{args.scheme}-k{args.lsb_bits}"
+            if args.key is not None:
+                key += f"-{key_digest(args.key)}"
+            if ecc is not None:
+                key += f"-{ecc}"
+            if compress:
+                key += "-compressed"
+            checkpoint = Checkpoint(args.checkpoint_dir, key, host_array, prepared)
+        start = time.perf_counter()
+        if args.scheme == "neqr-lsb":
+            from . import neqr_lsb
+            watermarked = neqr_lsb.embed_watermark(host_array, prepared, _backend(args), _progress(args),
+                                                   checkpoint=checkpoint, lsb_bits=args.lsb_bits, key=args.key)
+        else:
+            from . import waqi
+            watermarked = waqi.embed_watermark(host_array, prepared, _backend(args), _progress(args),
+                                               checkpoint=checkpoint, lsb_bits=args.lsb_bits, key=args.key, ecc=ecc)
+        check.record_embed(time.perf_counter() - start)
+        _save(Image.fromarray(watermarked), output)
+        if checkpoint is not None:
+            checkpoint.discard()
+    logger.debug("Watermark cache: %s", cache.stats())
+    if check.checked:
+        logger.info("%s", check.summary())
+    return 0
+
+
+def cmd_embed_frames(args):
+    from . import frames
+
+    # Frames stream from the source through the embedder to the output; only
+    # a few are in memory at once
+    if os.path.isdir(args.source):
+        source = frames.directory_frames(args.source)
+        total = frames.count_frames(args.source)
+        writer = frames.DirectoryWriter(args.output, args.png_level)
+    else:
+        if not args.raw:
+            raise ValueError("A raw frame file needs --raw WxH (and --pixel-format)")
+        width, height = _host_size(args.raw)
+        source = frames.raw_frames(args.source, width, height, args.pixel_format)
+        total = frames.count_frames(args.source, width, height, args.pixel_format)
+        writer = frames.RawWriter(args.output)
+    with writer:
+        frames.embed_frames(source, args.watermark, writer, args.scheme, _backend(args), args.queue,
+                            _progress(args, "frames"), total)
+    logger.info("Saved %s", args.output)
+    return 0
+
+
+def cmd_extract(args):
+    import contextlib
+    import time
+
+    from .png_stream import PNGStreamWriter, mode_for
+
+    ecc = _ecc(args)
+    if _compress(args):
+        return _extract_compressed(args, ecc)
+    if not args.original:
+        return _extract_watermark_only(args, ecc)
+
+    _, watermarked_array = _open_array(args.watermarked)
+    watermarked_array = _shared(args, watermarked_array)
+    if args.scheme == "neqr-lsb":
+        # The NEQR-LSB extractor only reads the LSB plane: no simulator needed
+        # unless a backend is asked for explicitly
+        from . import neqr_lsb
+        strips = neqr_lsb.extract_strips(watermarked_array, args.strip_rows, _backend(args, "numpy"), _progress(args),
+                                         args.lsb_bits, args.key)
+        channels = 1 if watermarked_array.ndim == 2 else min(watermarked_array.shape[2], 4)
+        watermark_mode = {1: "L", 3: "RGB", 4: "RGBA"}[channels]
+    else:
+        from . import waqi
+        strips = waqi.extract_strips(watermarked_array, args.strip_rows, _backend(args), _progress(args),
+                                     args.lsb_bits, args.key, ecc)
+        watermark_mode = "L"
+
+    # Both outputs are encoded strip by strip as extraction produces them
+    height, width = watermarked_array.shape[:2]
+    start = time.perf_counter()
+    with contextlib.ExitStack() as outputs:
+        extracted = outputs.enter_context(
+            PNGStreamWriter(args.output, width // 4, height // 4, watermark_mode, args.png_level))
+        original = None
+        if args.original:
+            original = outputs.enter_context(
+                PNGStreamWriter(args.original, width, height, mode_for(watermarked_array), args.png_level))
+        for original_rows, watermark_rows in strips:
+            extracted.write_rows(watermark_rows)
+            if original is not None:
+                original.write_rows(original_rows)
+    writers = [w for w in (extracted, original) if w is not None]
+    encode = sum(w.encode_seconds for w in writers)
+    total = time.perf_counter() - start
+    for w in writers:
+        logger.info("Saved %s", w.path)
+    logger.info("Extraction %.3f s, PNG encode %.3f s (level %d)", total - encode, encode, args.png_level)
+    return 0
+
+
+def _extract_compressed(args, ecc=None):
+    # The payload's length is only known from its header, so the whole image is decoded
+    from . import png_stream, waqi
+
+    _, watermarked_array = _open_array(args.watermarked)
+    watermark, original = waqi.extract_compressed(watermarked_array, _backend(args), _progress(args),
+                                                  lsb_bits=args.lsb_bits, key=args.key, ecc=ecc)
+    encode = png_stream.save_array(watermark, args.output, args.png_level)
+    logger.info("Saved %s", args.output)
+    if args.original:
+        encode += png_stream.save_array(original, args.original, args.png_level)
+        logger.info("Saved %s", args.original)
+    logger.info("PNG encode %.3f s", encode)
+    return 0
+
+
+def _extract_watermark_only(args, ecc=None):
+    # Without --original only the rows carrying the watermark are decoded
+    from . import png_stream, roi
+
+    top_rows, stats = roi.decode_rows(args.watermarked, scheme=args.scheme, lsb_bits=args.lsb_bits,
+                                      scattered=args.key is not None, ecc=ecc)
+    if args.scheme == "neqr-lsb":
+        from . import neqr_lsb
+        watermark = neqr_lsb.extract_region(top_rows, stats["height"], _backend(args, "numpy"), args.lsb_bits,
+                                            args.key)
+    else:
+        from . import waqi
+        watermark = waqi.extract_region(top_rows, stats["height"], _backend(args), args.lsb_bits, args.key, ecc)
+    encode = png_stream.save_array(watermark, args.output, args.png_level)
+    logger.info("Saved %s", args.output)
+    logger.info("Decoded %d of %d rows (%.1f of %.1f MB) in %.3f s, PNG encode %.3f s",
+                stats["rows"], stats["height"], stats["decoded_bytes"] / 2 ** 20,
+                stats["full_bytes"] / 2 ** 20, stats["seconds"], encode)
+    return 0
+
+
+def _host_size(text):
+    width, _, height = text.partition("x")
+    return int(width), int(height)
+
+
+def cmd_index(args):
+    from .match_index import MatchIndex
+
+    index = MatchIndex.from_watermarks(args.watermarks, _host_size(args.host_size), args.scheme)
+    index.save(args.index)
+    logger.info("Indexed %d watermarks (%d bits each) in %s", len(index), index.nbits, args.index)
+    return 0
+
+
+def cmd_match(args):
+    import numpy as np
+
+    from .match_index import MatchIndex, extracted_bits
+
+    index = MatchIndex.load(args.index)
+    queries = []
+    for path in args.extracted:
+        queries.append(extracted_bits(path))
+        if len(queries[-1]) != index.nbits:
+            raise ValueError(f"{path} has {len(queries[-1])} bits, the index holds {index.nbits}-bit watermarks")
+    ids, distances = index.search(np.array(queries), args.max_distance)
+    for path, i, distance in zip(args.extracted, ids, distances):
+        print(f"{path}\t{index.keys[i] if i >= 0 else '-'}\t{distance}")
+    return 0
+
+
+def cmd_negate(args):
+    from . import negation
+
+    with stage("decode"):
+        if args.mode == "binary":
+            input_array = negation.ascii_art_to_array(args.input)
+        else:
+            input_array = negation.grayscale_text_to_array(args.input)
+    input_array = _shared(args, input_array)
+    negated = negation.negate_image(input_array, _backend(args), binary=args.mode == "binary", progress=_progress(args))
+    with stage("save"):
+        negation.array_to_text(negated, args.output)
+    logger.info("Saved %s", args.output)
+    return 0
+
+
+def cmd_transform(args):
+    from . import negation, transforms
+
+    with stage("decode"):
+        if args.input.lower().endswith(".txt"):
+            readers = {"characters": negation.character_text_to_array, "ascii-art": negation.ascii_art_to_array,
+                       "grayscale": negation.grayscale_text_to_array}
+            array = readers[args.text_format](args.input)
+        else:
+            _, array = _open_array(args.input)
+    if args.circuit:
+        array = transforms.apply_circuit(array, *args.op, backend=_backend(args))
+    else:
+        # A strided view: the steps below read through it, so no transformed copy is made
+        array = transforms.view(array, *args.op)
+    if args.negate:
+        if array.ndim != 2:
+            raise ValueError("--negate works on single-channel images")
+        array = negation.negate_image(array, _backend(args), progress=_progress(args))
+    if args.watermark:
+        from .watermark_cache import default_cache
+        prepared = default_cache().get(args.watermark, (array.shape[1], array.shape[0]), args.scheme)
+        if args.scheme == "neqr-lsb":
+            from .neqr_lsb import embed_watermark
+        else:
+            from .waqi import embed_watermark
+        array = embed_watermark(array, prepared, _backend(args), _progress(args))
+    with stage("save"):
+        if args.output.lower().endswith(".txt"):
+            negation.array_to_text(array, args.output)
+        else:
+            from . import png_stream
+            png_stream.save_array(array, args.output)
+    logger.info("Saved %s", args.output)
+    return 0
+
+
+def cmd_intensity(args):
+    from . import intensity, png_stream
+
+    _, image = _open_array(args.input)
+    others = []
+    if args.op == "xor-key":
+        if args.key is None:
+            raise ValueError("xor-key needs --key")
+        _, key = _open_array(args.key)
+        if key.shape != image.shape:
+            raise ValueError(f"Key image is {key.shape}; the input is {image.shape}")
+        others.append(_shared(args, key))
+    elif args.value is None:
+        raise ValueError(f"{args.op} needs --value")
+    scheme = intensity.scheme_for(args.op, args.value)
+    result = intensity.apply(scheme, _shared(args, image), *others, backend=_backend(args), progress=_progress(args))
+    with stage("save"):
+        png_stream.save_array(result, args.output)
+    logger.info("Saved %s", args.output)
+    return 0
+
+
+def cmd_gui(args):
+    module_name, class_name = GUIS[args.app]
+    module = importlib.import_module(module_name)
+    getattr(module, class_name)().run()
+    return 0
+
+
+def cmd_conformance(args):
+    from . import conformance
+
+    results = conformance.check(args.backends, args.schemes)
+    print(conformance.format_report(results))
+    return 1 if any(r["mismatches"] or r["error"] for r in results) else 0
+
+
+def cmd_serve(args):
+    import asyncio
+
+    from .service import Service, serve
+
+    service = Service(args.processes, args.max_jobs, args.max_upload_mb << 20, args.retain, args.backend,
+                      coalesce=not args.no_coalesce)
+    try:
+        asyncio.run(serve(service, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def cmd_watch(args):
+    import signal
+
+    from .hotfolder import HotFolder
+
+    default = "numpy" if args.operation == "extract" and args.scheme == "neqr-lsb" else None
+    hot = HotFolder(args.inbox, args.outbox, args.operation, args.scheme, args.watermark, _backend(args, default),
+                    args.done_dir, args.failed_dir, args.interval, args.settle, args.batch_size, args.max_queue,
+                    args.png_level, args.report_interval, args.metrics)
+    signal.signal(signal.SIGTERM, lambda *_: hot.stop())
+    try:
+        hot.run(once=args.once)
+    except KeyboardInterrupt:
+        pass
+    return 1 if hot.failed else 0
+
+
+def build_parser():
+    from .backends import BACKENDS
+    from .conformance import all_scheme_names
+    from .ecc import CODES
+
+    ecc_codes = ("none",) + tuple(CODES)
+
+    parser = argparse.ArgumentParser(prog="python -m quantum_watermarking",
+                                     description="Quantum image watermarking and negation tools")
+    parser.add_argument("--log-level", help="overrides $QWM_LOG_LEVEL")
+    parser.add_argument("--trace", help="write a Chrome trace here (overrides $QWM_TRACE)")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), help="circuit backend (overrides $QWM_BACKEND)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="run the backend over tiles in this many worker processes")
+    parser.add_argument("--transport", choices=("shm", "pickle"), default="shm",
+                        help="how tiles reach the workers: shared memory offsets or pickled copies")
+    parser.add_argument("--progress", action="store_true", help="log progress, rate and ETA once a second")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    embed = commands.add_parser("embed", help="embed a watermark into one or more host images")
+    embed.add_argument("--scheme", choices=SCHEMES, default="neqr-lsb")
+    embed.add_argument("--lsb-bits", type=int, choices=range(1, 5), default=1, metavar="1-4",
+                       help="watermark bits per host value (k-LSB mode)")
+    embed.add_argument("--key", help="scatter the watermark over the whole host at positions this key selects")
+    embed.add_argument("--ecc", choices=ecc_codes, default="none",
+                       help="error-correcting code for the WaQI payload (see ecc.py)")
+    embed.add_argument("--compress", action="store_true",
+                       help="embed the WaQI watermark binarised and run-length coded (see payload.py)")
+    embed.add_argument("hosts", nargs="+", metavar="host")
+    embed.add_argument("watermark")
+    embed.add_argument("output", help="output file, or a directory for several hosts")
+    embed.add_argument("--checkpoint-dir", default=os.environ.get("QWM_CHECKPOINT_DIR"),
+                       help="checkpoint long embeds here and resume interrupted ones (default $QWM_CHECKPOINT_DIR)")
+    embed.add_argument("--force", action="store_true", help="embed even into hosts that already carry the watermark (only WaQI marks are detected)")
+    embed.add_argument("--ber-threshold", type=float, default=0.1,
+                       help="payload bit error rate at or below which a host counts as already watermarked")
+    embed.add_argument("--nc-threshold", type=float, default=0.5,
+                       help="payload correlation the host must also reach to count as already watermarked")
+    embed.set_defaults(func=cmd_embed)
+
+    embed_frames = commands.add_parser("embed-frames", help="embed a watermark into every frame of a sequence")
+    embed_frames.add_argument("--scheme", choices=SCHEMES, default="neqr-lsb")
+    embed_frames.add_argument("--raw", metavar="WxH", help="the source is a raw frame dump of this size")
+    embed_frames.add_argument("--pixel-format", choices=("rgb24", "gray", "yuv420p"), default="rgb24",
+                              help="layout of a raw dump (yuv420p is marked in the luma plane)")
+    embed_frames.add_argument("--queue", type=int, default=2, help="frames buffered on each side of the embedder")
+    embed_frames.add_argument("--png-level", type=int, choices=range(10), default=6, metavar="0-9",
+                              help="zlib level of PNG output frames")
+    embed_frames.add_argument("source", help="directory of frame images, or a raw frame dump")
+    embed_frames.add_argument("watermark")
+    embed_frames.add_argument("output", help="output directory (for a directory source) or raw file")
+    embed_frames.set_defaults(func=cmd_embed_frames)
+
+    extract = commands.add_parser("extract", help="extract a watermark from a watermarked image")
+    extract.add_argument("--scheme", choices=SCHEMES, default="neqr-lsb")
+    extract.add_argument("--lsb-bits", type=int, choices=range(1, 5), default=1, metavar="1-4",
+                         help="watermark bits per host value it was embedded with")
+    extract.add_argument("--key", help="the key a scattered watermark was embedded with")
+    extract.add_argument("--ecc", choices=ecc_codes, default="none", help="the code a WaQI watermark was embedded with")
+    extract.add_argument("--compress", action="store_true", help="the WaQI watermark was embedded with --compress")
+    extract.add_argument("--original", help="also save the reconstructed original here")
+    extract.add_argument("--strip-rows", type=int, default=64, help="host rows extracted and encoded at a time")
+    extract.add_argument("--png-level", type=int, choices=range(10), default=6, metavar="0-9",
+                         help="zlib level of the PNG outputs (1 is the fast setting)")
+    extract.add_argument("watermarked")
+    extract.add_argument("output")
+    extract.set_defaults(func=cmd_extract)
+
+    index = commands.add_parser("index", help="build a match index of reference watermarks")
+    index.add_argument("--scheme", choices=SCHEMES, default="neqr-lsb")
+    index.add_argument("--host-size", required=True, metavar="WxH", help="size of the hosts they are embedded into")
+    index.add_argument("index", help="index file to write (.npz)")
+    index.add_argument("watermarks", nargs="+")
+    index.set_defaults(func=cmd_index)
+
+    match = commands.add_parser("match", help="find the reference watermark nearest to each extraction")
+    match.add_argument("--max-distance", type=int, help="report no match beyond this many differing bits")
+    match.add_argument("index")
+    match.add_argument("extracted", nargs="+")
+    match.set_defaults(func=cmd_match)
+
+    negate = commands.add_parser("negate", help="negate a 64x64 text image")
+    negate.add_argument("--mode", choices=("binary", "grayscale"), default="grayscale")
+    negate.add_argument("input")
+    negate.add_argument("output")
+    negate.set_defaults(func=cmd_negate)
+
+    transform = commands.add_parser("transform", help="rotate, flip or transpose an image, then negate or embed")
+    transform.add_argument("--op", action="append", required=True,
+                           choices=("rot90", "rot180", "rot270", "flip-h", "flip-v", "transpose"),
+                           help="transform to apply; repeat to compose, in order")
+    transform.add_argument("--circuit", action="store_true",
+                           help="move the pixels with the position-register circuits instead of a strided view")
+    transform.add_argument("--text-format", choices=("characters", "ascii-art", "grayscale"), default="characters",
+                           help="how a .txt input encodes its pixels")
+    transform.add_argument("--negate", action="store_true", help="negate the transformed image")
+    transform.add_argument("--watermark", help="embed this watermark into the transformed image")
+    transform.add_argument("--scheme", choices=SCHEMES, default="neqr-lsb")
+    transform.add_argument("input")
+    transform.add_argument("output", help="PNG, or .txt for a text matrix")
+    transform.set_defaults(func=cmd_transform)
+
+    arithmetic = commands.add_parser("intensity", help="add, threshold, bit-plane or XOR the NEQR intensities")
+    arithmetic.add_argument("--op", choices=("add", "threshold", "bit-plane", "xor-key"), required=True)
+    arithmetic.add_argument("--value", type=int,
+                            help="the constant to add (mod 256), the threshold level or the bit plane (0 is the LSB)")
+    arithmetic.add_argument("--key", help="key image for xor-key, the same size as the input")
+    arithmetic.add_argument("input")
+    arithmetic.add_argument("output", help="PNG")
+    arithmetic.set_defaults(func=cmd_intensity)
+
+    gui = commands.add_parser("gui", help="start one of the Tk applications")
+    gui.add_argument("app", choices=sorted(GUIS))
+    gui.set_defaults(func=cmd_gui)
+
+    check = commands.add_parser("conformance", help="check every backend against every scheme")
+    check.add_argument("--backends", nargs="+", choices=sorted(BACKENDS))
+    check.add_argument("--schemes", nargs="+", choices=all_scheme_names())
+    check.set_defaults(func=cmd_conformance)
+
+    serve = commands.add_parser("serve", help="run embed/extract/negate as a local HTTP job service")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.add_argument("--processes", type=int, default=1, help="worker processes running the jobs")
+    serve.add_argument("--max-jobs", type=int, default=16, help="jobs queued or running before new ones get 503")
+    serve.add_argument("--max-upload-mb", type=int, default=64)
+    serve.add_argument("--retain", type=int, default=64, help="finished jobs kept for results and coalescing")
+    serve.add_argument("--no-coalesce", action="store_true", help="run identical requests separately")
+    serve.set_defaults(func=cmd_serve)
+
+    watch = commands.add_parser("watch", help="process every image dropped into a folder until stopped")
+    watch.add_argument("--operation", choices=("embed", "extract"), default="embed")
+    watch.add_argument("--scheme", choices=SCHEMES, default="neqr-lsb")
+    watch.add_argument("--watermark", help="watermark to embed (required for embed)")
+    watch.add_argument("--done-dir", help="where processed originals go (default inbox/done)")
+    watch.add_argument("--failed-dir", help="where failed originals go (default inbox/failed)")
+    watch.add_argument("--interval", type=float, default=1.0, help="seconds between polls")
+    watch.add_argument("--settle", type=float, default=1.0, help="seconds a file must stay unchanged")
+    watch.add_argument("--batch-size", type=int, default=16)
+    watch.add_argument("--max-queue", type=int, default=64, help="files admitted at once; the rest wait in the inbox")
+    watch.add_argument("--png-level", type=int, choices=range(10), default=6, metavar="0-9")
+    watch.add_argument("--report-interval", type=float, default=30.0, help="seconds between metrics reports")
+    watch.add_argument("--metrics", help="also write the metrics here as JSON")
+    watch.add_argument("--once", action="store_true", help="exit once the inbox is empty")
+    watch.add_argument("inbox")
+    watch.add_argument("outbox")
+    watch.set_defaults(func=cmd_watch)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    configure_logging(args.log_level)
+    configure_tracing(args.trace)
+    try:
+        return args.func(args)
+    except Exception as e:
+        logger.error("Error: %s", e)
+        return 1
+    finally:
+        while _process_backends:
+            _process_backends.popitem()[1].close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
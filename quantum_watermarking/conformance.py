@@ -0,0 +1,96 @@
+"""Conformance check: every backend against every scheme, exhaustively.
+
+Each scheme is run on every combination of its input values (at most
+``SAMPLE_LIMIT``, except for ``xor_key``, which gets that many of its 65536
+at random) and compared with the scheme's NumPy reference. Besides
+``schemes.SCHEMES`` that includes the k-LSB variants of the LSB schemes
+(k = 2 to ``schemes.MAX_LSB_BITS``) and both position schemes of every
+geometric transform for an 8x8 image (``transforms.position_schemes``). The
+report also times each pair, so the fastest conforming backend for a scheme
+can be read off it.
+
+    python -m quantum_watermarking conformance [--backends aer numpy ...]
+"""
+import time
+
+import numpy as np
+
+from . import schemes
+from .backends import BACKENDS, get_backend
+
+SAMPLE_LIMIT = 4096
+POSITION_BITS = 3  # position schemes are checked on 2^3 x 2^3 images
+
+
+def all_scheme_names():
+    """Names of the schemes checked by default: ``SCHEMES``, their k-LSB variants and the position schemes"""
+    from .transforms import TRANSFORMS, position_schemes
+
+    names = list(schemes.SCHEMES)
+    for scheme in ("neqr-lsb", "waqi"):
+        for lsb_bits in range(2, schemes.MAX_LSB_BITS + 1):
+            names += [s.name for s in schemes.lsb_schemes(scheme, lsb_bits)]
+    for transform in TRANSFORMS:
+        names += [s.name for s in position_schemes(transform, POSITION_BITS, POSITION_BITS)]
+    return names
+
+
+def check(backend_names=None, scheme_names=None):
+    """Return a list of result dicts, one per (scheme, backend)"""
+    results = []
+    for scheme_name in scheme_names or all_scheme_names():
+        scheme = schemes.get_scheme(scheme_name)
+        inputs = schemes.exhaustive_inputs(scheme, SAMPLE_LIMIT)
+        expected = scheme.reference(*inputs).astype(np.uint8)
+        for backend_name in backend_names or BACKENDS:
+            backend = get_backend(backend_name)
+            start = time.perf_counter()
+            try:
+                actual = backend.run(scheme, *inputs)
+                error = None
+            except Exception as e:
+                actual, error = None, f"{type(e).__name__}: {e}"
+            elapsed = time.perf_counter() - start
+            mismatches = int(np.count_nonzero(actual != expected)) if error is None else len(expected)
+            first = None
+            if error is None and mismatches:
+                i = int(np.flatnonzero(actual != expected)[0])
+                first = {"inputs": [int(a[i]) for a in inputs], "expected": int(expected[i]), "actual": int(actual[i])}
+            results.append({
+                "scheme": scheme.name,
+                "backend": backend.name,
+                "cases": len(expected),
+                "mismatches": mismatches,
+                "first_mismatch": first,
+                "error": error,
+                "seconds": elapsed,
+            })
+    return results
+
+
+def fastest(results):
+    """Fastest conforming backend per scheme"""
+    best = {}
+    for r in results:
+        if r["mismatches"] or r["error"]:
+            continue
+        if r["scheme"] not in best or r["seconds"] < best[r["scheme"]]["seconds"]:
+            best[r["scheme"]] = r
+    return {scheme: r["backend"] for scheme, r in best.items()}
+
+
+def format_report(results):
+    lines = [f"{'scheme':<18}{'backend':<13}{'cases':>7}{'wrong':>7}{'ms':>10}  status"]
+    for r in results:
+        status = "ok"
+        if r["error"]:
+            status = f"ERROR {r['error']}"
+        elif r["mismatches"]:
+            m = r["first_mismatch"]
+            status = f"FAIL e.g. inputs {m['inputs']}: expected {m['expected']}, got {m['actual']}"
+        lines.append(f"{r['scheme']:<18}{r['backend']:<13}{r['cases']:>7}{r['mismatches']:>7}"
+                     f"{r['seconds'] * 1e3:>10.1f}  {status}")
+    lines.append("")
+    for scheme, backend in fastest(results).items():
+        lines.append(f"fastest conforming backend for {scheme}: {backend}")
+    return "\n".join(lines)
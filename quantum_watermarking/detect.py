@@ -0,0 +1,117 @@
+"""Cheap "already watermarked?" check, run before embedding.
+
+Reads only the LSB plane of the payload region and compares it with the
+watermark bits that would be embedded: the bit error rate (BER) and the
+mean-centred normalised correlation (NC) of an unmarked host sit near 0.5
+and 0, a marked one near 0 and 1. A host whose BER is at most ``threshold``
+and whose NC is at least ``min_nc`` is treated as already carrying the mark
+and its embed is skipped::
+
+    check = PreCheck(threshold=0.1)
+    if not check.already_marked(host_array, prepared, "waqi"):
+        ...embed...
+
+Both are needed: BER alone is low whenever the LSB plane and the watermark
+lean the same way (an all-even host against a mostly dark logo), while the
+centred NC of such a host is near 0. A watermark whose bits are all equal
+therefore is never detected.
+
+Only WaQI is supported (``DETECTABLE``), as it writes the watermark bits
+straight into the LSBs. NEQR-LSB XORs them into the host's own LSBs, which
+leaves nothing to compare against without the original host.
+"""
+import time
+
+import numpy as np
+
+from .diagnostics import get_logger
+
+logger = get_logger("detect")
+
+DEFAULT_BER_THRESHOLD = 0.1
+DEFAULT_NC_THRESHOLD = 0.5
+DETECTABLE = ("waqi",)
+
+
+def payload_bits(host_array, expected, scheme, lsb_bits=1, key=None):
+    """(observed LSBs, expected bits) over the payload region (or the ``key``'s positions), as flat 0/1 arrays"""
+    from .scatter import as_permutation
+    from .schemes import unpack_payload
+
+    if scheme == "waqi":
+        flat = host_array.reshape(-1)
+        values = -(-expected.size // lsb_bits)
+        if key is None:
+            observed = unpack_payload(flat[:values], lsb_bits)
+        else:
+            values = min(values, flat.size)
+            observed = unpack_payload(flat[as_permutation(key, flat.size).forward(np.arange(values))], lsb_bits)
+        n = min(observed.size, expected.size)
+        return observed[:n], expected[:n]
+    if scheme == "neqr-lsb":
+        raise ValueError("A NEQR-LSB mark cannot be detected without the original host")
+    raise ValueError(f"Unknown scheme {scheme!r}")
+
+
+def score(host_array, expected, scheme, lsb_bits=1, key=None):
+    """``{"ber", "nc", "bits"}`` of the host's payload LSBs against the expected bits"""
+    observed, bits = payload_bits(host_array, expected, scheme, lsb_bits, key)
+    n = observed.size
+    if not n:
+        return {"ber": 1.0, "nc": 0.0, "bits": 0}
+    errors = int(np.count_nonzero(observed != bits))
+    # Pearson correlation of the two bit sequences; 0 if either is constant
+    ones_observed = int(np.count_nonzero(observed))
+    ones_expected = int(np.count_nonzero(bits))
+    both = int(np.count_nonzero(observed & bits))
+    spread = ones_observed * (n - ones_observed) * ones_expected * (n - ones_expected)
+    nc = (n * both - ones_observed * ones_expected) / spread ** 0.5 if spread else 0.0
+    return {"ber": errors / n, "nc": nc, "bits": n}
+
+
+class PreCheck:
+    """Skip decision plus the counters reported at the end of a batch"""
+
+    def __init__(self, threshold=DEFAULT_BER_THRESHOLD, min_nc=DEFAULT_NC_THRESHOLD):
+        self.threshold = threshold
+        self.min_nc = min_nc
+        self.checked = 0
+        self.skipped = 0
+        self.detect_seconds = 0.0
+        self.embed_seconds = 0.0
+        self.embedded_values = 0
+        self.skipped_values = 0
+        self.last_bits = 0
+
+    def already_marked(self, host_array, expected, scheme, lsb_bits=1, key=None):
+        start = time.perf_counter()
+        result = score(host_array, expected, scheme, lsb_bits, key)
+        self.detect_seconds += time.perf_counter() - start
+        self.checked += 1
+        self.last_bits = result["bits"]
+        marked = result["bits"] > 0 and result["ber"] <= self.threshold and result["nc"] >= self.min_nc
+        logger.debug("Pre-check (%s): BER %.4f, NC %.4f over %d bits -> %s", scheme, result["ber"], result["nc"],
+                     result["bits"], "marked" if marked else "not marked")
+        if marked:
+            self.skipped += 1
+            self.skipped_values += result["bits"]
+        return marked
+
+    def record_embed(self, seconds, values=None):
+        """Time one embed of ``values`` payload values (default: the last
+        host checked) took, for the time-saved estimate"""
+        values = self.last_bits if values is None else values
+        self.embed_seconds += seconds
+        self.embedded_values += values
+
+    def time_saved(self):
+        """Estimated embed time avoided (from this run's embed rate), or None"""
+        if not self.embedded_values:
+            return None
+        return self.skipped_values * self.embed_seconds / self.embedded_values
+
+    def summary(self):
+        saved = self.time_saved()
+        saved = "n/a" if saved is None else f"~{saved:.3f} s"
+        return (f"Skipped {self.skipped} of {self.checked} hosts already carrying the watermark "
+                f"(embedding avoided {saved}, pre-check cost {self.detect_seconds:.3f} s)")
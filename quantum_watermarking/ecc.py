@@ -0,0 +1,193 @@
+"""Error-correcting codes for the watermark payload.
+
+An optional layer around the WaQI payload: the watermark bits are split
+into ``k``-bit blocks and each is embedded as an ``n``-bit codeword, so up
+to ``t`` flipped LSBs per codeword (noise on the way through the circuits,
+or in the image afterwards) still decode to the watermark::
+
+    name           n   k   t
+    repetition-3   3   1   1   majority of three copies
+    repetition-5   5   1   2   majority of five
+    hamming-7-4    7   4   1   cyclic, g(x) = x^3 + x + 1
+    bch-15-7      15   7   2   cyclic, g(x) = x^8 + x^7 + x^6 + x^4 + 1
+
+Codewords are systematic (the data bits, then the parity bits) and follow
+each other in the payload. Encoding and decoding are bit-sliced like the
+``bitsliced`` backend: bit ``j`` of every codeword is packed into one plane
+of uint64 words, so each XOR/AND below handles 64 codewords. The cyclic
+codes decode by syndrome: one AND-minterm per syndrome value picks out the
+codewords whose (coset leader) error touches each data bit.
+
+    code = as_code("bch-15-7")
+    decoded = code.decode(code.encode(bits), len(bits))
+"""
+import itertools
+
+import numpy as np
+
+
+def _slice(bits, width):
+    # (m * width,) 0/1 -> (width, words) planes, plane j holding bit j of every block
+    blocks = bits.reshape(-1, width)
+    words = -(-len(blocks) // 64)
+    packed = np.zeros((words * 8, width), dtype=np.uint8)
+    packed[:-(-len(blocks) // 8)] = np.packbits(blocks, axis=0, bitorder="little")
+    return np.ascontiguousarray(packed.T).view(np.uint64)
+
+
+def _unslice(planes, blocks):
+    # Inverse of _slice for ``blocks`` blocks
+    bits = np.unpackbits(np.ascontiguousarray(planes.view(np.uint8).T), axis=0, bitorder="little")
+    return bits[:blocks].reshape(-1)
+
+
+class Code:
+    """A systematic ``(n, k)`` block code correcting ``t`` errors per codeword"""
+
+    name = None
+    n = k = t = None
+
+    @property
+    def rate(self):
+        return self.k / self.n
+
+    def encoded_length(self, bits):
+        """Coded bits carrying ``bits`` payload bits (the last block zero-padded)"""
+        return -(-bits // self.k) * self.n
+
+    def encode(self, bits):
+        """Codewords of the 0/1 ``bits``, one after another"""
+        bits = np.asarray(bits, dtype=np.uint8).reshape(-1)
+        blocks = -(-bits.size // self.k)
+        padded = np.zeros(blocks * self.k, dtype=np.uint8)
+        padded[:bits.size] = bits
+        data = _slice(padded, self.k)
+        return _unslice(np.concatenate((data, self._parity(data))), blocks)
+
+    def decode(self, coded, length=None):
+        """Corrected payload bits of the codewords in ``coded`` (the first ``length`` of them)"""
+        coded = np.asarray(coded, dtype=np.uint8).reshape(-1)
+        blocks = coded.size // self.n
+        planes = _slice(coded[:blocks * self.n], self.n)
+        return _unslice(self._correct(planes), blocks)[:length]
+
+    def _parity(self, data):
+        raise NotImplementedError
+
+    def _correct(self, planes):
+        # The k corrected data planes of the n received ones
+        raise NotImplementedError
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.name} ({self.n},{self.k}) t={self.t}>"
+
+
+class Repetition(Code):
+    """Each bit sent ``n`` times (``n`` odd), decoded by majority"""
+
+    k = 1
+
+    def __init__(self, n):
+        if n < 3 or n % 2 == 0:
+            raise ValueError(f"A repetition code needs an odd length of at least 3; got {n}")
+        self.n = n
+        self.t = (n - 1) // 2
+        self.name = f"repetition-{n}"
+
+    def _parity(self, data):
+        return np.repeat(data, self.n - 1, axis=0)
+
+    def _correct(self, planes):
+        if self.n == 3:
+            a, b, c = planes
+            return ((a & b) | (c & (a ^ b)))[None]
+        # Bit-sliced counter of the ones in each codeword (ripple half adders),
+        # then compare it against t + 1 from the top bit down
+        counter = []
+        for plane in planes:
+            carry = plane
+            for i, digit in enumerate(counter):
+                counter[i], carry = digit ^ carry, digit & carry
+            if len(counter) < self.n.bit_length():
+                counter.append(carry)
+        threshold = self.t + 1
+        equal = np.full_like(planes[0], np.uint64(0xFFFFFFFFFFFFFFFF))
+        greater = np.zeros_like(planes[0])
+        for i in reversed(range(len(counter))):
+            if threshold >> i & 1:
+                equal &= counter[i]
+            else:
+                greater |= equal & counter[i]
+                equal &= ~counter[i]
+        return (greater | equal)[None]
+
+
+def _poly_mod(value, generator):
+    # Remainder of the GF(2) polynomial ``value`` divided by ``generator``
+    degree = generator.bit_length() - 1
+    while value.bit_length() > degree:
+        value ^= generator << (value.bit_length() - 1 - degree)
+    return value
+
+
+class CyclicCode(Code):
+    """Systematic cyclic ``(n, k)`` code with generator polynomial ``generator``, syndrome decoded"""
+
+    def __init__(self, name, n, k, generator, t):
+        if generator.bit_length() - 1 != n - k:
+            raise ValueError(f"A generator of degree {n - k} is needed for a ({n},{k}) code")
+        self.name, self.n, self.k, self.t = name, n, k, t
+        # Data bit i is the coefficient of x^(i + n - k); its parity is that monomial mod g
+        columns = [_poly_mod(1 << (i + n - k), generator) for i in range(k)]
+        self.checks = [[i for i in range(k) if columns[i] >> j & 1] for j in range(n - k)]
+        # Coset leaders: every pattern of up to t errors, by the syndrome it gives
+        self.leaders = {}
+        for weight in range(1, t + 1):
+            for positions in itertools.combinations(range(n), weight):
+                syndrome = 0
+                for p in positions:
+                    syndrome ^= columns[p] if p < k else 1 << (p - k)
+                if syndrome in self.leaders:
+                    raise ValueError(f"{name} cannot correct {t} errors: syndromes collide")
+                self.leaders[syndrome] = positions
+
+    def _parity(self, data):
+        parity = np.zeros((self.n - self.k, data.shape[1]), dtype=np.uint64)
+        for j, check in enumerate(self.checks):
+            for i in check:
+                parity[j] ^= data[i]
+        return parity
+
+    def _correct(self, planes):
+        data, received = planes[:self.k], planes[self.k:]
+        syndrome = received ^ self._parity(data)
+        # minterms[s] is set in the codewords whose syndrome is s
+        minterms = [np.full_like(data[0], np.uint64(0xFFFFFFFFFFFFFFFF))]
+        for bit in reversed(syndrome):
+            clear = ~bit
+            minterms = [m & b for m in minterms for b in (clear, bit)]
+        corrected = data.copy()
+        for value, positions in self.leaders.items():
+            for p in positions:
+                if p < self.k:
+                    corrected[p] ^= minterms[value]
+        return corrected
+
+
+CODES = {code.name: code for code in (
+    Repetition(3),
+    Repetition(5),
+    CyclicCode("hamming-7-4", 7, 4, 0b1011, 1),
+    CyclicCode("bch-15-7", 15, 7, 0b111010001, 2),
+)}
+
+
+def as_code(ecc):
+    """``ecc`` (a name from ``CODES`` or a ``Code``) as a ``Code``; None and ``"none"`` stay None"""
+    if ecc is None or isinstance(ecc, Code):
+        return ecc
+    if ecc == "none":
+        return None
+    if ecc not in CODES:
+        raise ValueError(f"Unknown code {ecc!r}; choose from {', '.join(CODES)}")
+    return CODES[ecc]
@@ -0,0 +1,295 @@
+"""Watermarking frame sequences: extracted video frames or raw frame dumps.
+
+Frames come from a generator over a directory of images
+(``directory_frames``, in natural order) or a raw dump (``raw_frames``:
+``gray``, ``rgb24`` or planar ``yuv420p``) and go through a three-stage
+pipeline: a reader thread decodes into a bounded queue, the calling thread
+embeds, and a writer thread encodes from a second bounded queue, in order::
+
+    frames = raw_frames("clip.yuv", 1280, 720, "yuv420p")
+    with RawWriter("marked.yuv") as writer:
+        stats = embed_frames(frames, "logo.png", writer, scheme="waqi")
+    print(stats.summary())
+
+About ``2 * queue_size + 4`` frame buffers are alive at any time (both
+queues, plus the frames being read, marked and written), however long the
+sequence. The watermark is prepared once per frame size (through the
+watermark cache) and one backend, with its simulator, serves every frame.
+For ``yuv420p`` the mark goes into the luma plane; chroma is passed through
+untouched, since converting to RGB and back would not preserve the LSBs.
+``FrameStats`` reports frames/sec and the read-to-written latency per frame.
+"""
+import os
+import queue
+import re
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+from PIL import Image
+
+from .backends import get_backend
+from .diagnostics import get_logger
+from .instrumentation import stage
+from .progress import as_bus
+
+logger = get_logger("frames")
+
+FRAME_EXTENSIONS = (".png", ".bmp", ".tif", ".tiff", ".jpg", ".jpeg")
+# pixel format -> bytes per pixel of the marked plane (yuv420p adds half again of chroma)
+PIXEL_FORMATS = {"gray": 1, "rgb24": 3, "yuv420p": 1}
+DEFAULT_QUEUE_SIZE = 2
+
+
+class Frame(namedtuple("Frame", "index name array passthrough read_start")):
+    """One frame: ``array`` is what gets marked, ``passthrough`` any bytes
+    written after it unchanged (yuv420p chroma), ``read_start`` when reading
+    it began (``time.perf_counter``)"""
+
+    __slots__ = ()
+
+
+def _natural_key(name):
+    # frame_2.png before frame_10.png
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r"(\d+)", name)]
+
+
+def frame_paths(directory):
+    """Image files in ``directory``, in natural order"""
+    names = [name for name in os.listdir(directory) if name.lower().endswith(FRAME_EXTENSIONS)]
+    return [os.path.join(directory, name) for name in sorted(names, key=_natural_key)]
+
+
+def directory_frames(directory):
+    """Frames of the images in ``directory``; modes other than L/RGB/RGBA become RGB"""
+    for index, path in enumerate(frame_paths(directory)):
+        start = time.perf_counter()
+        with stage("decode"):
+            image = Image.open(path)
+            if image.mode not in ("L", "RGB", "RGBA"):
+                image = image.convert("RGB")
+            array = np.array(image)
+        yield Frame(index, os.path.basename(path), array, None, start)
+
+
+def raw_frame_bytes(width, height, pixel_format):
+    """Bytes per frame of a raw dump"""
+    if pixel_format not in PIXEL_FORMATS:
+        raise ValueError(f"Unknown pixel format {pixel_format!r}; choose from {', '.join(PIXEL_FORMATS)}")
+    if pixel_format == "yuv420p":
+        return width * height + 2 * (-(-width // 2) * -(-height // 2))
+    return width * height * PIXEL_FORMATS[pixel_format]
+
+
+def raw_frames(path, width, height, pixel_format="rgb24"):
+    """Frames of a headerless raw dump, read one frame at a time"""
+    frame_bytes = raw_frame_bytes(width, height, pixel_format)
+    plane = width * height * PIXEL_FORMATS[pixel_format]
+    shape = (height, width, 3) if pixel_format == "rgb24" else (height, width)
+    with open(path, "rb") as fh:
+        index = 0
+        while True:
+            start = time.perf_counter()
+            with stage("decode"):
+                data = fh.read(frame_bytes)
+            if not data:
+                return
+            if len(data) < frame_bytes:
+                raise ValueError(f"{path}: trailing {len(data)} bytes are not a whole "
+                                 f"{width}x{height} {pixel_format} frame ({frame_bytes} bytes)")
+            array = np.frombuffer(data, dtype=np.uint8, count=plane).reshape(shape)
+            yield Frame(index, f"frame_{index:06d}", array, data[plane:] or None, start)
+            index += 1
+
+
+def count_frames(source, width=None, height=None, pixel_format=None):
+    """Number of frames in a directory or raw dump, without decoding them"""
+    if os.path.isdir(source):
+        return len(frame_paths(source))
+    return os.path.getsize(source) // raw_frame_bytes(width, height, pixel_format)
+
+
+class DirectoryWriter:
+    """Writes each marked frame as a PNG named after its source frame"""
+
+    def __init__(self, directory, level=None):
+        from . import png_stream
+
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.level = png_stream.DEFAULT_LEVEL if level is None else level
+
+    def write(self, frame, array):
+        from . import png_stream
+
+        path = os.path.join(self.directory, os.path.splitext(frame.name)[0] + ".png")
+        png_stream.save_array(array, path, self.level)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class RawWriter:
+    """Appends marked frames (and their passthrough bytes) to a raw dump"""
+
+    def __init__(self, path):
+        self.path = path
+        self._fh = open(path, "wb")
+
+    def write(self, frame, array):
+        with stage("save"):
+            self._fh.write(np.ascontiguousarray(array).data)
+            if frame.passthrough:
+                self._fh.write(frame.passthrough)
+
+    def close(self):
+        self._fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FrameStats:
+    """Throughput and per-frame latency of one ``embed_frames`` run"""
+
+    def __init__(self):
+        self.frames = 0
+        self.seconds = 0.0
+        self.embed_seconds = 0.0
+        self.latencies = []
+
+    @property
+    def fps(self):
+        return self.frames / self.seconds if self.seconds else 0.0
+
+    def latency_ms(self, percentile):
+        return float(np.percentile(self.latencies, percentile)) * 1e3 if self.latencies else 0.0
+
+    def summary(self):
+        return (f"{self.frames} frames in {self.seconds:.2f} s ({self.fps:.2f} frames/s, "
+                f"embedding {self.embed_seconds / max(self.frames, 1) * 1e3:.1f} ms/frame); latency "
+                f"p50 {self.latency_ms(50):.1f} ms, p99 {self.latency_ms(99):.1f} ms")
+
+
+_DONE = object()
+
+
+def _put(q, item, stop):
+    # A blocking put that gives up once the pipeline is being torn down
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def embed_frames(frames, watermark, writer, scheme="neqr-lsb", backend=None, queue_size=DEFAULT_QUEUE_SIZE,
+                 progress=None, total=None, cache=None):
+    """Embed ``watermark`` into every frame and hand them to ``writer`` in order.
+
+    ``frames`` is a ``Frame`` iterable (``directory_frames``, ``raw_frames``),
+    ``writer`` has ``write(frame, array)``. ``progress`` (a bus or callable)
+    counts frames against ``total``. Returns the run's ``FrameStats``.
+    """
+    from .watermark_cache import default_cache
+
+    if scheme == "neqr-lsb":
+        from .neqr_lsb import embed_watermark
+    elif scheme == "waqi":
+        from .waqi import embed_watermark
+    else:
+        raise ValueError(f"Unknown scheme {scheme!r}")
+    backend = get_backend(backend)
+    cache = cache or default_cache()
+    bus = as_bus(progress)
+    bus.start(total or 0)
+    stats = FrameStats()
+    read_q = queue.Queue(maxsize=queue_size)
+    write_q = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    errors = []
+
+    def read():
+        try:
+            for frame in frames:
+                if not _put(read_q, frame, stop):
+                    return
+        except BaseException as e:
+            errors.append(e)
+        _put(read_q, _DONE, stop)
+
+    def write():
+        while True:
+            item = write_q.get()
+            if item is _DONE:
+                return
+            frame, array = item
+            try:
+                writer.write(frame, array)
+            except BaseException as e:
+                errors.append(e)
+                stop.set()
+                return
+            stats.latencies.append(time.perf_counter() - frame.read_start)
+
+    reader = threading.Thread(target=read, name="qwm-frames-read", daemon=True)
+    writer_thread = threading.Thread(target=write, name="qwm-frames-write", daemon=True)
+    start = time.perf_counter()
+    reader.start()
+    writer_thread.start()
+    completed = False
+    try:
+        while not stop.is_set():
+            # Polled, so a failed writer (which sets stop) is noticed even
+            # while the reader is blocked decoding and never queues _DONE
+            try:
+                frame = read_q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if frame is _DONE:
+                completed = True
+                break
+            height, width = frame.array.shape[:2]
+            prepared = cache.get(watermark, (width, height), scheme)
+            embed_start = time.perf_counter()
+            marked = embed_watermark(frame.array, prepared, backend)
+            stats.embed_seconds += time.perf_counter() - embed_start
+            # The writer only needs the marked array, so the source frame is released here
+            if not _put(write_q, (frame._replace(array=None), marked), stop):
+                break
+            stats.frames += 1
+            bus.advance(1)
+    finally:
+        stop.set()
+        # Unblock the reader, then let the writer drain what was queued
+        while reader.is_alive():
+            try:
+                read_q.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        while writer_thread.is_alive():
+            try:
+                write_q.put(_DONE, timeout=0.1)
+                break
+            except queue.Full:
+                pass
+        writer_thread.join()
+        stats.seconds = time.perf_counter() - start
+    if errors:
+        raise errors[0]
+    if completed:
+        bus.finish()
+    logger.info("%s", stats.summary())
+    return stats
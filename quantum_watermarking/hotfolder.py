@@ -0,0 +1,311 @@
+"""Hot-folder daemon: watermark (or extract from) every image dropped into a directory.
+
+    python -m quantum_watermarking watch --scheme waqi --watermark logo.png inbox/ outbox/
+
+The inbox is polled every ``interval`` seconds (plain ``os.scandir``, no
+OS-specific notification service). A file is picked up once its size and
+mtime have stayed put for ``settle`` seconds, so half-copied files are left
+alone; dotfiles and ``.tmp``/``.part`` files are ignored. Picked-up files go
+through a bounded queue, in batches of up to ``batch_size``, to one
+processing thread. Outputs are written under a temporary name and renamed
+into the outbox, and each original is then renamed into ``done/`` (or
+``failed/``, next to a ``.error.txt``), so nothing is ever seen half-written
+and a restarted daemon simply carries on with what is left in the inbox.
+
+Backpressure: at most ``max_queue`` files are admitted at once. During a
+burst the rest stay in the inbox, untouched, until the queue has room, so
+memory stays flat and files are processed at a steady rate in arrival
+order. ``metrics()`` reports the queue depth, the files still waiting in
+the inbox, the oldest one's age and the lag (arrival to done) at p50/p99;
+they are logged every ``report_interval`` seconds and, with
+``metrics_path``, written there as JSON.
+"""
+import json
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+
+import numpy as np
+from PIL import Image
+
+from .diagnostics import get_logger
+from .instrumentation import stage
+from .service import LatencyWindow
+
+logger = get_logger("hotfolder")
+
+IMAGE_EXTENSIONS = (".png", ".bmp", ".tif", ".tiff", ".jpg", ".jpeg")
+IGNORED_SUFFIXES = (".tmp", ".part", ".crdownload")
+DEFAULT_INTERVAL = 1.0
+DEFAULT_SETTLE = 1.0
+DEFAULT_BATCH_SIZE = 16
+DEFAULT_MAX_QUEUE = 64
+DEFAULT_REPORT_INTERVAL = 30.0
+
+
+def _unique(directory, name):
+    # A name in ``directory`` that is not taken yet
+    stem, ext = os.path.splitext(name)
+    candidate, n = name, 1
+    while os.path.exists(os.path.join(directory, candidate)):
+        candidate = f"{stem}.{n}{ext}"
+        n += 1
+    return os.path.join(directory, candidate)
+
+
+def move(path, directory):
+    """Move ``path`` into ``directory`` atomically (same filesystem) or via a renamed copy"""
+    target = _unique(directory, os.path.basename(path))
+    try:
+        os.replace(path, target)
+    except OSError:
+        # Another filesystem: copy under a temporary name, rename, then remove
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+        os.close(fd)
+        shutil.copy2(path, tmp)
+        os.replace(tmp, target)
+        os.remove(path)
+    return target
+
+
+def save_atomic(array, path, level):
+    """Write ``array`` as a PNG under a temporary name and rename it into place"""
+    from . import png_stream
+
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=".", suffix=".tmp")
+    os.close(fd)
+    try:
+        png_stream.save_array(array, tmp, level)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+class HotFolder:
+    """Polls ``inbox`` and processes what arrives; see the module docstring"""
+
+    def __init__(self, inbox, outbox, operation="embed", scheme="neqr-lsb", watermark=None, backend=None,
+                 done_dir=None, failed_dir=None, interval=DEFAULT_INTERVAL, settle=DEFAULT_SETTLE,
+                 batch_size=DEFAULT_BATCH_SIZE, max_queue=DEFAULT_MAX_QUEUE, png_level=None,
+                 report_interval=DEFAULT_REPORT_INTERVAL, metrics_path=None, cache=None):
+        from . import png_stream
+        from .backends import get_backend
+        from .watermark_cache import default_cache
+
+        if operation not in ("embed", "extract"):
+            raise ValueError(f"Unknown operation {operation!r}; choose from embed, extract")
+        if operation == "embed" and watermark is None:
+            raise ValueError("Embedding needs a watermark")
+        self.inbox = inbox
+        self.outbox = outbox
+        self.done_dir = done_dir or os.path.join(inbox, "done")
+        self.failed_dir = failed_dir or os.path.join(inbox, "failed")
+        for directory in (outbox, self.done_dir, self.failed_dir):
+            os.makedirs(directory, exist_ok=True)
+        self.operation = operation
+        self.scheme = scheme
+        self.watermark = watermark
+        if backend is None and operation == "extract" and scheme == "neqr-lsb":
+            backend = "numpy"  # reading the LSB plane needs no simulator
+        self.backend = get_backend(backend)
+        self.interval = interval
+        self.settle = settle
+        self.batch_size = batch_size
+        self.max_queue = max_queue
+        self.png_level = png_stream.DEFAULT_LEVEL if png_level is None else png_level
+        self.report_interval = report_interval
+        self.metrics_path = metrics_path
+        self.cache = cache or default_cache()
+        # name -> (size, mtime_ns, first seen, stable since) of files not admitted yet
+        self._seen = {}
+        self._admitted = set()
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._worker = None
+        self.queued = 0
+        self.processed = 0
+        self.failed = 0
+        self.lag = LatencyWindow()
+        self.started = time.time()
+        self._last_report = time.monotonic()
+
+    # Scanning
+
+    def _candidates(self):
+        with os.scandir(self.inbox) as entries:
+            for entry in entries:
+                name = entry.name
+                if name.startswith(".") or name.lower().endswith(IGNORED_SUFFIXES):
+                    continue
+                if not name.lower().endswith(IMAGE_EXTENSIONS) or not entry.is_file():
+                    continue
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                yield name, st.st_size, st.st_mtime_ns
+
+    def scan(self):
+        """One poll: admit the settled files the queue has room for; returns how many"""
+        now = time.time()
+        candidates = list(self._candidates())
+        settled = []
+        with self._lock:
+            for name, size, mtime in candidates:
+                if name in self._admitted:
+                    continue
+                previous = self._seen.get(name)
+                if previous is None or previous[:2] != (size, mtime):
+                    first_seen = previous[2] if previous else now
+                    self._seen[name] = (size, mtime, first_seen, now)
+                elif now - previous[3] >= self.settle:
+                    settled.append((previous[2], name))
+            for name in set(self._seen) - {name for name, _, _ in candidates}:
+                del self._seen[name]
+            # Oldest arrivals first; the rest wait in the inbox (backpressure)
+            settled.sort()
+            admitted = [(name, self._seen.pop(name)[2]) for _, name in settled[:max(0, self.max_queue - self.queued)]]
+            self.queued += len(admitted)
+            self._admitted.update(name for name, _ in admitted)
+        for start in range(0, len(admitted), self.batch_size):
+            self._queue.put(admitted[start:start + self.batch_size])
+        return len(admitted)
+
+    # Processing
+
+    def _output_path(self, name):
+        stem = os.path.splitext(name)[0]
+        suffix = "_watermark" if self.operation == "extract" else ""
+        return os.path.join(self.outbox, f"{stem}{suffix}.png")
+
+    def process(self, name):
+        """Embed into (or extract from) one inbox file and write its output"""
+        path = os.path.join(self.inbox, name)
+        with stage("decode"):
+            image = Image.open(path)
+            image.load()
+            array = np.array(image)
+        if self.operation == "embed":
+            prepared = self.cache.get(self.watermark, image.size, self.scheme)
+            if self.scheme == "neqr-lsb":
+                from .neqr_lsb import embed_watermark
+            else:
+                from .waqi import embed_watermark
+            result = embed_watermark(array, prepared, self.backend)
+        elif self.scheme == "neqr-lsb":
+            from .neqr_lsb import extract_watermark
+            result, _ = extract_watermark(array, backend=self.backend)
+        else:
+            from .waqi import extract_watermark
+            result, _ = extract_watermark(array, self.backend)
+        with stage("save"):
+            save_atomic(result, self._output_path(name), self.png_level)
+
+    def _work(self):
+        while True:
+            batch = self._queue.get()
+            if batch is None:
+                return
+            for name, arrived in batch:
+                path = os.path.join(self.inbox, name)
+                try:
+                    self.process(name)
+                    # A failed move (the original gone or renamed, permissions,
+                    # a full disk) counts as a failure too, not a dead worker
+                    move(path, self.done_dir)
+                except Exception as e:
+                    logger.warning("Failed on %s: %s", name, e)
+                    try:
+                        target = move(path, self.failed_dir) if os.path.exists(path) else None
+                        if target is not None:
+                            with open(target + ".error.txt", "w") as fh:
+                                fh.write(f"{type(e).__name__}: {e}\n")
+                    except OSError as move_error:
+                        logger.warning("Could not move %s to %s: %s", name, self.failed_dir, move_error)
+                    with self._lock:
+                        self.failed += 1
+                else:
+                    with self._lock:
+                        self.processed += 1
+                        self.lag.add(time.time() - arrived)
+                finally:
+                    with self._lock:
+                        self.queued -= 1
+                        self._admitted.discard(name)
+
+    # Running
+
+    def metrics(self):
+        now = time.time()
+        with self._lock:
+            return {
+                "queued": self.queued,
+                "waiting": len(self._seen),
+                "oldest_waiting_s": round(max((now - s[2] for s in self._seen.values()), default=0.0), 3),
+                "processed": self.processed,
+                "failed": self.failed,
+                "files_per_s": round(self.processed / max(now - self.started, 1e-9), 3),
+                "lag": self.lag.stats(),
+            }
+
+    def report(self, force=False):
+        if not force and time.monotonic() - self._last_report < self.report_interval:
+            return
+        self._last_report = time.monotonic()
+        metrics = self.metrics()
+        logger.info("Hot folder: %d queued, %d waiting (oldest %.1f s), %d done, %d failed, lag p50 %.0f ms "
+                    "p99 %.0f ms", metrics["queued"], metrics["waiting"], metrics["oldest_waiting_s"],
+                    metrics["processed"], metrics["failed"], metrics["lag"]["p50_ms"], metrics["lag"]["p99_ms"])
+        if self.metrics_path:
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.metrics_path)), suffix=".tmp")
+            with os.fdopen(fd, "w") as fh:
+                json.dump(metrics, fh, indent=2)
+            os.replace(tmp, self.metrics_path)
+
+    def start(self):
+        self._worker = threading.Thread(target=self._work, name="qwm-hotfolder", daemon=True)
+        self._worker.start()
+
+    def idle(self):
+        with self._lock:
+            return self.queued == 0 and not self._seen
+
+    def run(self, once=False):
+        """Poll until ``stop()`` (or, with ``once``, until the inbox is empty)"""
+        logger.info("Watching %s (%s, %s) -> %s", self.inbox, self.operation, self.scheme, self.outbox)
+        self.start()
+        try:
+            while not self._stop.is_set():
+                self.scan()
+                self.report()
+                if once and self.idle() and not any(True for _ in self._candidates()):
+                    break
+                self._stop.wait(self.interval)
+        except KeyboardInterrupt:
+            self.stop()
+            raise
+        finally:
+            self._queue.put(None)
+            self._worker.join()
+            self.report(force=True)
+
+    def stop(self):
+        """Stop polling; the file being processed is finished first, and queued ones stay in the inbox"""
+        self._stop.set()
+        # Drop batches not started yet: their files are still in the inbox
+        while True:
+            try:
+                batch = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if batch is None:
+                self._queue.put(None)
+                return
+            with self._lock:
+                self.queued -= len(batch)
+                self._admitted.difference_update(name for name, _ in batch)
@@ -0,0 +1,256 @@
+"""Per-stage timing, counters and trace export.
+
+Wrap each stage of a run in ``with stage("simulate"):``. While tracing is
+disabled (the default) ``stage`` hands back a shared no-op context manager,
+so the instrumentation can stay in the per-pixel loops permanently.
+
+Tracing is switched on with ``configure_tracing()`` or by setting
+``QWM_TRACE=<path>`` before a script's ``__main__`` calls it. Every span feeds
+the per-stage counters and log2 latency histograms; only every
+``sample_every``-th span per stage is kept as a Chrome-trace event, which
+bounds memory on long runs. At exit the trace is written as Chrome-trace JSON
+(open it in chrome://tracing or Perfetto) next to a plain-text summary.
+
+Stage names used across the tools:
+
+    decode, watermark_resize, circuit_build, transpile, simulate,
+    parse_counts, encode, save
+"""
+import atexit
+import json
+import os
+import threading
+import time
+
+from .diagnostics import get_logger
+
+logger = get_logger("instrumentation")
+
+STAGES = ("decode", "watermark_resize", "circuit_build", "transpile", "simulate", "parse_counts", "encode", "save")
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "start")
+
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.tracer.record(self.name, self.start, time.perf_counter_ns() - self.start)
+        return False
+
+
+class StageStats:
+    """Count, total and a log2 latency histogram for one stage"""
+
+    def __init__(self):
+        self.count = 0
+        self.total_ns = 0
+        self.min_ns = None
+        self.max_ns = 0
+        # buckets[i] counts durations d with d.bit_length() == i, i.e. 2**(i-1) <= d < 2**i ns
+        self.buckets = [0] * 64
+
+    def add(self, duration_ns):
+        self.count += 1
+        self.total_ns += duration_ns
+        if self.min_ns is None or duration_ns < self.min_ns:
+            self.min_ns = duration_ns
+        if duration_ns > self.max_ns:
+            self.max_ns = duration_ns
+        self.buckets[min(duration_ns.bit_length(), 63)] += 1
+
+    def percentile(self, q):
+        """Upper bound (ns) of the histogram bucket holding the q-th percentile"""
+        if not self.count:
+            return 0
+        target = q / 100.0 * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if n and seen >= target:
+                return min(1 << i, self.max_ns)
+        return self.max_ns
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "total_ms": self.total_ns / 1e6,
+            "mean_us": self.total_ns / self.count / 1e3 if self.count else 0.0,
+            "min_us": (self.min_ns or 0) / 1e3,
+            "max_us": self.max_ns / 1e3,
+            "p50_us": self.percentile(50) / 1e3,
+            "p99_us": self.percentile(99) / 1e3,
+            "histogram_log2_ns": {str(i): n for i, n in enumerate(self.buckets) if n},
+        }
+
+
+class Tracer:
+    """Collects stage timings, counters and sampled trace events"""
+
+    def __init__(self, enabled=False, sample_every=1, max_events=200_000):
+        self.enabled = enabled
+        self.sample_every = max(1, int(sample_every))
+        self.max_events = max_events
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.stages = {}
+            self.counters = {}
+            self.events = []
+            self.dropped_events = 0
+            self.origin_ns = time.perf_counter_ns()
+
+    def stage(self, name):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def count(self, name, n=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def record(self, name, start_ns, duration_ns):
+        with self._lock:
+            stats = self.stages.get(name)
+            if stats is None:
+                stats = self.stages[name] = StageStats()
+            stats.add(duration_ns)
+            if (stats.count - 1) % self.sample_every:
+                return
+            if len(self.events) >= self.max_events:
+                self.dropped_events += 1
+                return
+            self.events.append((name, start_ns, duration_ns, threading.get_ident()))
+
+    def snapshot(self):
+        """Stage statistics and counters as plain dicts (JSON friendly)"""
+        with self._lock:
+            return {
+                "stages": {name: stats.to_dict() for name, stats in self.stages.items()},
+                "counters": dict(self.counters),
+            }
+
+    def chrome_trace(self):
+        pid = os.getpid()
+        with self._lock:
+            events = [
+                {
+                    "name": name,
+                    "cat": "stage",
+                    "ph": "X",
+                    "ts": (start - self.origin_ns) / 1e3,
+                    "dur": duration / 1e3,
+                    "pid": pid,
+                    "tid": tid,
+                }
+                for name, start, duration, tid in self.events
+            ]
+            end_us = (time.perf_counter_ns() - self.origin_ns) / 1e3
+            events.extend(
+                {"name": name, "ph": "C", "ts": end_us, "pid": pid, "args": {name: value}}
+                for name, value in self.counters.items()
+            )
+            dropped = self.dropped_events
+        return {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "otherData": {"sample_every": self.sample_every, "dropped_events": dropped},
+        }
+
+    def write_chrome_trace(self, path):
+        with open(path, "w") as fh:
+            json.dump(self.chrome_trace(), fh)
+        return path
+
+    def summary(self):
+        """Plain-text table of per-stage latency plus counters"""
+        snap = self.snapshot()
+        known = [s for s in STAGES if s in snap["stages"]]
+        names = known + sorted(set(snap["stages"]) - set(known))
+        lines = [f"{'stage':<18}{'count':>10}{'total ms':>12}{'mean us':>11}{'p50 us':>11}{'p99 us':>11}{'max us':>11}"]
+        for name in names:
+            s = snap["stages"][name]
+            lines.append(
+                f"{name:<18}{s['count']:>10}{s['total_ms']:>12.1f}{s['mean_us']:>11.1f}"
+                f"{s['p50_us']:>11.1f}{s['p99_us']:>11.1f}{s['max_us']:>11.1f}"
+            )
+        for name, value in sorted(snap["counters"].items()):
+            lines.append(f"{name:<18}{value:>10}")
+        return "\n".join(lines)
+
+
+# --- Process-wide tracer ---
+TRACER = Tracer()
+_export_registered = False
+
+
+def stage(name):
+    """Context manager timing one stage on the process-wide tracer"""
+    return TRACER.stage(name)
+
+
+def count(name, n=1):
+    TRACER.count(name, n)
+
+
+def finish_run(trace_path=None, summary_path=None):
+    """Write the Chrome trace and plain-text summary for the run so far"""
+    if not TRACER.stages and not TRACER.counters:
+        return
+    text = TRACER.summary()
+    logger.info("\nStage timings:\n%s", text)
+    if trace_path:
+        TRACER.write_chrome_trace(trace_path)
+        logger.info("Chrome trace written to %s", trace_path)
+    if summary_path:
+        with open(summary_path, "w") as fh:
+            fh.write(text + "\n")
+
+
+def configure_tracing(trace_path=None, sample_every=None, enabled=None):
+    """Enable tracing for this process and export the results at exit.
+
+    ``trace_path`` defaults to ``$QWM_TRACE``; tracing stays off if neither is
+    set (unless ``enabled=True``). ``sample_every`` defaults to
+    ``$QWM_TRACE_SAMPLE`` or 1. The summary is logged and, when a trace path
+    is given, also written to ``<trace_path>.txt``.
+    """
+    if trace_path is None:
+        trace_path = os.environ.get("QWM_TRACE") or None
+    if enabled is None:
+        enabled = trace_path is not None
+    if not enabled:
+        return TRACER
+    if sample_every is None:
+        sample_every = int(os.environ.get("QWM_TRACE_SAMPLE", "1"))
+    TRACER.sample_every = max(1, int(sample_every))
+    TRACER.enabled = True
+    global _export_registered
+    if not _export_registered:
+        summary_path = f"{trace_path}.txt" if trace_path else None
+        atexit.register(finish_run, trace_path, summary_path)
+        _export_registered = True
+    return TRACER
@@ -0,0 +1,176 @@
+"""Bounded job pool with cooperative cancellation, free of Tk.
+
+The GUI tools hand their heavy work (embed, extract, negate) to a
+``JobPool``: a fixed number of worker threads behind a bounded queue, so
+repeated clicks queue up, and are refused once the queue is full, instead
+of starting more threads that compete for the CPU::
+
+    pool = JobPool(max_workers=1, max_pending=2)
+    job = pool.submit("embed", lambda bus: waqi.embed_watermark(host, bits, progress=bus))
+    ...
+    job.cancel()
+
+Each job gets its own ``ProgressBus``. Cancellation is cooperative:
+``Job.cancel`` drops a job that has not started and cancels the bus of a
+running one, whose loop then stops with ``progress.Cancelled`` at the end of
+its current chunk (a checkpointed embed flushes first and can be resumed).
+Once the pool has nothing left to run it releases the shared simulators,
+and a finished job keeps no reference to its inputs.
+
+``FrameTimer`` measures how regularly the UI thread gets to run while a job
+is busy: the GUI calls ``tick()`` from a periodic ``after`` callback and
+logs ``summary()`` when the pool goes idle.
+"""
+import concurrent.futures
+import threading
+import time
+
+import numpy as np
+
+from .backends import release_simulators
+from .diagnostics import get_logger
+from .progress import Cancelled, ProgressBus
+
+logger = get_logger("jobs")
+
+FRAME_MS = 16
+
+
+class QueueFull(RuntimeError):
+    """Raised by ``JobPool.submit`` when every worker and queue slot is taken"""
+
+
+class Job:
+    """One submitted piece of work: its name, progress bus and future"""
+
+    def __init__(self, name, bus):
+        self.name = name
+        self.bus = bus
+        self.future = None
+        self.submitted = time.perf_counter()
+        self.started = None
+        self.finished = None
+
+    def cancel(self):
+        """Drop the job if it is still queued, otherwise stop it at its next chunk"""
+        if self.future is not None and self.future.cancel():
+            return
+        self.bus.cancel()
+
+    @property
+    def cancelled(self):
+        return self.bus.cancelled or (self.future is not None and self.future.cancelled())
+
+    def done(self):
+        return self.future is not None and self.future.done()
+
+    def __repr__(self):
+        return f"<job {self.name}>"
+
+
+class JobPool:
+    """At most ``max_workers`` jobs running and ``max_pending`` waiting.
+
+    ``on_change(pool)`` is called (from a worker thread, or from ``submit``)
+    whenever a job is submitted or finishes; GUIs use it to enable and
+    disable their buttons.
+    """
+
+    def __init__(self, max_workers=1, max_pending=2, on_change=None, release_when_idle=True):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.on_change = on_change
+        self.release_when_idle = release_when_idle
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers,
+                                                               thread_name_prefix="qwm-job")
+        self._lock = threading.Lock()
+        self._jobs = []
+
+    @property
+    def jobs(self):
+        """Jobs that are queued or running, oldest first"""
+        with self._lock:
+            return list(self._jobs)
+
+    @property
+    def busy(self):
+        return bool(self.jobs)
+
+    def submit(self, name, fn, bus=None):
+        """Queue ``fn(bus)``; returns the ``Job``, or raises ``QueueFull``"""
+        job = Job(name, bus if bus is not None else ProgressBus())
+        with self._lock:
+            if len(self._jobs) >= self.max_workers + self.max_pending:
+                raise QueueFull(f"{len(self._jobs)} jobs already running or queued")
+            self._jobs.append(job)
+            job.future = self._executor.submit(self._run, job, fn)
+        job.future.add_done_callback(lambda future: self._finished(job))
+        self._changed()
+        return job
+
+    def _run(self, job, fn):
+        job.started = time.perf_counter()
+        logger.debug("Job %s started after %.3f s in the queue", job.name, job.started - job.submitted)
+        try:
+            return fn(job.bus)
+        except Cancelled:
+            logger.info("Job %s cancelled after %.3f s", job.name, time.perf_counter() - job.started)
+            raise
+
+    def _finished(self, job):
+        job.finished = time.perf_counter()
+        with self._lock:
+            if job in self._jobs:
+                self._jobs.remove(job)
+            idle = not self._jobs
+        # The future keeps the result (or exception), not the inputs; drop
+        # the simulators too once nothing is left that would use them
+        if idle and self.release_when_idle:
+            release_simulators()
+        self._changed()
+
+    def _changed(self):
+        if self.on_change is not None:
+            self.on_change(self)
+
+    def cancel_all(self):
+        for job in self.jobs:
+            job.cancel()
+
+    def shutdown(self, wait=False):
+        """Cancel everything and stop the workers (``wait`` for the running job)"""
+        self.cancel_all()
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+
+class FrameTimer:
+    """Intervals between UI ticks scheduled every ``interval_ms``"""
+
+    def __init__(self, interval_ms=FRAME_MS):
+        self.interval_ms = interval_ms
+        self.reset()
+
+    def reset(self):
+        self._last = None
+        self.frames_ms = []
+
+    def tick(self, now=None):
+        now = time.perf_counter() if now is None else now
+        if self._last is not None:
+            self.frames_ms.append((now - self._last) * 1e3)
+        self._last = now
+
+    def stats(self):
+        """``{"frames", "p50_ms", "p99_ms", "max_ms"}``, or None before two ticks"""
+        if not self.frames_ms:
+            return None
+        frames = np.array(self.frames_ms)
+        return {"frames": len(frames), "p50_ms": float(np.percentile(frames, 50)),
+                "p99_ms": float(np.percentile(frames, 99)), "max_ms": float(frames.max())}
+
+    def summary(self):
+        stats = self.stats()
+        if stats is None:
+            return "no UI frames measured"
+        return (f"UI frame time over {stats['frames']} frames: p50 {stats['p50_ms']:.1f} ms, "
+                f"p99 {stats['p99_ms']:.1f} ms, max {stats['max_ms']:.1f} ms (target {self.interval_ms} ms)")
@@ -0,0 +1,237 @@
+"""Nearest-Hamming-distance search over reference watermarks.
+
+Extracted watermarks carry bit errors, so identifying which known logo an
+extraction came from is a nearest-neighbour search in Hamming space.
+``MatchIndex`` stores every reference as a packed bit-vector (uint64 words)
+and answers queries in bulk::
+
+    index = MatchIndex.from_watermarks(logo_paths, host_size, scheme="neqr-lsb")
+    ids, distances = index.search(extracted_bits(extracted), max_distance=40)
+
+References are binarised exactly as the embedders see them (see
+``reference_bits``). Search uses multi-index hashing: each code is split
+into 16-bit substrings, one table per substring. A code within distance
+``d`` of the query matches it within ``d // m`` bits on at least one of the
+``m`` substrings, so probing every table at growing radius and verifying
+the candidates with a full popcount gives the exact nearest reference while
+touching only a small part of the index. Queries that would probe too much
+of the index fall back to a vectorised linear scan.
+"""
+import itertools
+
+import numpy as np
+
+from .diagnostics import get_logger
+
+logger = get_logger("match_index")
+
+SUBSTRING_BITS = 16
+MAX_PROBE_RADIUS = 3
+
+_M1 = np.uint64(0x5555555555555555)
+_M2 = np.uint64(0x3333333333333333)
+_M4 = np.uint64(0x0F0F0F0F0F0F0F0F)
+_H01 = np.uint64(0x0101010101010101)
+
+
+def popcount(words):
+    """Set bits per uint64 word"""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(words)
+    # SWAR popcount; uint64 multiplication wraps, which is what we want here
+    words = words - ((words >> np.uint64(1)) & _M1)
+    words = (words & _M2) + ((words >> np.uint64(2)) & _M2)
+    words = (words + (words >> np.uint64(4))) & _M4
+    return (words * _H01) >> np.uint64(56)
+
+
+def pack(bits):
+    """Pack (n, nbits) 0/1 rows into (n, words) uint64, zero-padded"""
+    bits = np.atleast_2d(np.asarray(bits, dtype=np.uint8))
+    packed = np.packbits(bits, axis=1)
+    padded = np.zeros((len(packed), -(-packed.shape[1] // 8) * 8), dtype=np.uint8)
+    padded[:, :packed.shape[1]] = packed
+    return padded.view(np.uint64)
+
+
+def reference_bits(watermark, host_size, scheme="neqr-lsb", cache=None):
+    """Flat 0/1 bits of ``watermark`` as embedded into a host of ``host_size``.
+
+    NEQR-LSB embeds the quarter-size watermark thresholded at 127; WaQI's
+    extracted image holds the first quarter-by-quarter bits of the unpacked
+    watermark. Preparation goes through the watermark cache.
+    """
+    from .watermark_cache import default_cache
+
+    prepared = (cache or default_cache()).get(watermark, host_size, scheme)
+    if scheme == "neqr-lsb":
+        return (prepared.reshape(-1) > 127).astype(np.uint8)
+    return prepared[:(host_size[0] // 4) * (host_size[1] // 4)].astype(np.uint8)
+
+
+def extracted_bits(watermark_image):
+    """Flat 0/1 bits of an extracted watermark (path, PIL image or 0/255 array).
+
+    Colour extractions (NEQR-LSB gives one bit per channel) are reduced by
+    majority vote over the RGB channels.
+    """
+    if isinstance(watermark_image, str):
+        from PIL import Image
+        watermark_image = Image.open(watermark_image)
+    array = np.asarray(watermark_image)
+    if array.ndim == 3:
+        return ((array[..., :3] > 127).sum(axis=2) >= 2).astype(np.uint8).reshape(-1)
+    return (array > 127).astype(np.uint8).reshape(-1)
+
+
+class MatchIndex:
+    """Packed reference watermarks with multi-index Hamming search"""
+
+    def __init__(self, nbits):
+        self.nbits = nbits
+        self.keys = []
+        self._codes = np.zeros((0, -(-nbits // 64)), dtype=np.uint64)
+        self._tables = None
+
+    @classmethod
+    def from_watermarks(cls, watermarks, host_size, scheme="neqr-lsb"):
+        """Index of watermark paths (used as keys) as embedded into hosts of ``host_size``"""
+        bits = [reference_bits(w, host_size, scheme) for w in watermarks]
+        index = cls(len(bits[0]) if bits else 0)
+        index.add([str(w) for w in watermarks], np.array(bits))
+        return index
+
+    def __len__(self):
+        return len(self._codes)
+
+    def add(self, keys, bits):
+        """Add references: ``keys`` and one row of ``nbits`` 0/1 values per key"""
+        bits = np.atleast_2d(bits)
+        if bits.shape != (len(keys), self.nbits):
+            raise ValueError(f"Expected {len(keys)} rows of {self.nbits} bits, got shape {bits.shape}")
+        self.add_packed(keys, pack(bits))
+
+    def add_packed(self, keys, codes):
+        self.keys.extend(keys)
+        self._codes = np.concatenate((self._codes, codes))
+        self._tables = None
+
+    def _substrings(self, codes):
+        # 16-bit substrings that hold at least one real bit (trailing padding is skipped)
+        tables = -(-self.nbits // SUBSTRING_BITS)
+        return codes.view(np.uint8).view(">u2")[:, :tables].astype(np.int64)
+
+    def build(self):
+        """Build the search tables now rather than on the first search"""
+        # One counting-sorted table per substring: ids ordered by substring
+        # value, and offsets[v]:offsets[v + 1] the ids whose substring is v
+        tables = []
+        for column in self._substrings(self._codes).T:
+            order = np.argsort(column, kind="stable").astype(np.int32)
+            offsets = np.zeros((1 << SUBSTRING_BITS) + 1, dtype=np.int64)
+            np.cumsum(np.bincount(column, minlength=1 << SUBSTRING_BITS), out=offsets[1:])
+            tables.append((order, offsets))
+        self._tables = tables
+
+    def search(self, queries, max_distance=None):
+        """Nearest reference to each query row (0/1 bits).
+
+        Returns ``(ids, distances)``; ties go to the earliest added reference.
+        With ``max_distance``, queries with no reference that close get id -1.
+        """
+        packed = pack(queries)
+        if packed.shape[1] != self._codes.shape[1]:
+            raise ValueError(f"Queries must have {self.nbits} bits")
+        n = len(packed)
+        best_ids = np.full(n, -1, dtype=np.int64)
+        best = np.full(n, self.nbits + 1, dtype=np.int64)
+        if not len(self):
+            return best_ids, np.full(n, -1, dtype=np.int64)
+        if self._tables is None:
+            self.build()
+
+        limit = self.nbits if max_distance is None else max_distance
+        m = len(self._tables)
+        substrings = self._substrings(packed)
+        remaining = np.arange(n)
+        for radius in range(MAX_PROBE_RADIUS + 1):
+            if len(remaining) == 0:
+                break
+            # Past half the pairs a linear scan would check, the scan is cheaper
+            candidates = self._probe(substrings[remaining], _masks(radius), len(remaining) * len(self) // 2)
+            if candidates is None:
+                break
+            query, ids = candidates
+            self._update(packed, remaining[query], ids, best, best_ids)
+            # Every reference within m * (radius + 1) - 1 bits has now been seen
+            covered = m * (radius + 1) - 1
+            remaining = remaining[(best[remaining] > covered) & (limit > covered)]
+        if len(remaining):
+            logger.debug("Linear scan for %d of %d queries", len(remaining), n)
+            self._scan(packed, remaining, best, best_ids)
+
+        found = best <= limit
+        return np.where(found, best_ids, -1), np.where(found, best, -1)
+
+    def _probe(self, substrings, masks, budget):
+        # (query, id) candidate pairs from every table at one probe radius,
+        # or None once there are more than ``budget`` of them
+        queries, ids = [], []
+        pairs = 0
+        for table, (order, offsets) in enumerate(self._tables):
+            values = (substrings[:, table, None] ^ masks[None, :]).reshape(-1)
+            lo, hi = offsets[values], offsets[values + 1]
+            counts = hi - lo
+            total = int(counts.sum())
+            pairs += total
+            if pairs > budget:
+                return None
+            if not total:
+                continue
+            owner = np.repeat(np.arange(len(values)) // len(masks), counts)
+            starts = np.repeat(lo - np.cumsum(counts) + counts, counts)
+            queries.append(owner)
+            ids.append(order[np.arange(total) + starts])
+        if not queries:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        return np.concatenate(queries), np.concatenate(ids).astype(np.int64)
+
+    def _update(self, packed, query, ids, best, best_ids):
+        if not len(ids):
+            return
+        distances = popcount(self._codes[ids] ^ packed[query]).sum(axis=1).astype(np.int64)
+        # Closest (then earliest) candidate per query
+        order = np.lexsort((ids, distances, query))
+        query, first = np.unique(query[order], return_index=True)
+        ids, distances = ids[order][first], distances[order][first]
+        better = (distances < best[query]) | ((distances == best[query]) & (ids < best_ids[query]))
+        best[query[better]] = distances[better]
+        best_ids[query[better]] = ids[better]
+
+    def _scan(self, packed, queries, best, best_ids):
+        for q in queries:
+            distances = popcount(self._codes ^ packed[q]).sum(axis=1)
+            best_ids[q] = int(np.argmin(distances))
+            best[q] = int(distances[best_ids[q]])
+
+    def save(self, path):
+        np.savez(path, nbits=self.nbits, codes=self._codes, keys=np.array(self.keys, dtype=str))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            index = cls(int(data["nbits"]))
+            index.add_packed(list(data["keys"]), data["codes"])
+        return index
+
+
+_MASKS = {}
+
+
+def _masks(radius):
+    # Every SUBSTRING_BITS-bit value with exactly ``radius`` bits set
+    if radius not in _MASKS:
+        _MASKS[radius] = np.array([sum(1 << b for b in bits)
+                                   for bits in itertools.combinations(range(SUBSTRING_BITS), radius)],
+                                  dtype=np.int64)
+    return _MASKS[radius]
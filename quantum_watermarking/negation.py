@@ -0,0 +1,121 @@
+"""NEQR image negation for binary (ASCII art) and grayscale text images.
+
+The loops behind ``neqr_image_negation.py`` and ``neqr_image_n.py``. The
+per-pixel operation is ``schemes.NEGATION``, run by whichever backend is
+passed in.
+"""
+import numpy as np
+
+from .backends import get_backend
+from .diagnostics import get_logger, log_matrix
+from .instrumentation import count
+from .progress import as_bus, chunks
+from .schemes import NEGATION
+
+logger = get_logger("negation")
+
+# Constants for image size
+IMAGE_WIDTH = 64
+IMAGE_HEIGHT = 64
+
+
+# --- Text formats ---
+def ascii_art_to_array(text_file_path, height=IMAGE_HEIGHT, width=IMAGE_WIDTH):
+    """Convert ASCII art text file to binary image (space=white, other=black), padding short lines with spaces."""
+    image_array = np.full((height, width), 255, dtype=np.uint8)
+    try:
+        with open(text_file_path, 'r') as f:
+            lines = f.readlines()
+            for i in range(height):
+                if i < len(lines):
+                    line = lines[i].rstrip('\n')
+                    # Pad line to 64 characters with spaces if too short
+                    line = line.ljust(width)
+                    for j in range(width):
+                        image_array[i, j] = 255 if line[j] == ' ' else 0
+    except Exception as e:
+        raise ValueError(f"Error parsing file: {str(e)}. Please ensure the file has at least {height} lines, each with at least {width} characters or is padded.") from e
+    return image_array
+
+
+def grayscale_text_to_array(text_file_path, height=IMAGE_HEIGHT, width=IMAGE_WIDTH):
+    """Load actual grayscale pixel values from .txt file."""
+    try:
+        with open(text_file_path, 'r') as f:
+            lines = f.readlines()
+
+        if len(lines[0].split()) == 2:  # skip dimensions if present
+            lines = lines[1:]
+
+        image_array = np.array([
+            list(map(int, line.strip().split()))
+            for line in lines[:height]
+        ], dtype=np.uint8)
+
+        if image_array.shape != (height, width):
+            raise ValueError(f"Image dimensions do not match expected {height}x{width}")
+
+        return image_array
+
+    except Exception as e:
+        raise ValueError(f"Error parsing grayscale image text: {e}")
+
+
+def character_text_to_array(text_file_path):
+    """Load a character-coded image (one pixel per character, its code point as the value).
+
+    This is the format of ``monalisa_rotated.txt`` and ``lincon_rotated.txt``;
+    rows are cropped to the shortest line.
+    """
+    with open(text_file_path, 'r', encoding='utf-8') as f:
+        lines = [line.rstrip('\n') for line in f if line.strip()]
+    width = min(len(line) for line in lines)
+    return np.array([[ord(char) for char in line[:width]] for line in lines], dtype=np.uint8)
+
+
+def array_to_text(image_array, output_path):
+    """Write an image array as a text file: a "height width" line, then one row of values per line"""
+    with open(output_path, 'w') as f:
+        f.write(f"{image_array.shape[0]} {image_array.shape[1]}\n")
+        for row in image_array:
+            f.write(' '.join(map(str, row)) + '\n')
+
+
+# --- Negation ---
+def negate_image(input_array, backend=None, binary=False, progress=None, circuit_drawings=None):
+    """Negate a 2-D image row by row with ``schemes.NEGATION``.
+
+    ``backend`` is a backend name or instance (default: ``get_backend()``).
+    ``binary`` selects the 0/255 ASCII-art encoding: anything other than 255
+    counts as black. ``progress`` is as for ``progress.as_bus``; rows are
+    processed in chunks tuned to the backend's speed. Circuit drawings (if a
+    ``CircuitDrawings`` is passed) cover the first 5 pixels of the first row.
+    """
+    backend = get_backend(backend)
+    height, width = input_array.shape
+    if binary:
+        # Only two possible values: 0 or 255
+        input_array = np.where(input_array == 255, 255, 0).astype(np.uint8)
+    negated_array = np.zeros((height, width), dtype=np.uint8)
+    log_matrix(logger, input_array, "Initial Input Image Matrix")
+
+    if circuit_drawings is not None:
+        for value in input_array[0, :5]:  # Print for first 5 pixels in first row
+            circuit_drawings.log(int(value), lambda v=int(value): NEGATION.circuit(v),
+                                 "\nQuantum Circuit for pixel value %d:", value)
+
+    logger.info("\nNegating image using NEQR quantum circuits...")
+    bus = as_bus(progress)
+    bus.start(height * width)
+    quarter = 0
+    for top, bottom in chunks(height, item_values=width):
+        negated_array[top:bottom] = backend.run(NEGATION, input_array[top:bottom])
+        count("pixels", (bottom - top) * width)
+        bus.advance((bottom - top) * width)
+        if 4 * bottom // height > quarter:
+            quarter = 4 * bottom // height
+            log_matrix(logger, negated_array, "Intermediate Negated Matrix (Progress: %.0f%%)", 25 * quarter)
+    bus.finish()
+
+    log_matrix(logger, negated_array, "Final Negated Image Matrix")
+    return negated_array
@@ -0,0 +1,320 @@
+"""NEQR-LSB watermark embedding and extraction.
+
+The loops behind ``neqr_lsb_watermarking.py`` and ``neqr_lsb_extractor.py``.
+The per-value operations are ``schemes.NEQR_LSB_EMBED`` /
+``NEQR_LSB_EXTRACT``, run by whichever backend is passed in (see
+``backends.py``).
+
+With ``lsb_bits`` = k > 1 (k-LSB mode, up to ``schemes.MAX_LSB_BITS``)
+each host value carries k watermark bits: host row ``r`` of the payload
+region holds watermark rows ``r*k`` to ``r*k + k - 1``, bit ``j`` of a value
+coming from row ``r*k + j``. The watermark then needs only the top
+``ceil(height/4 / k)`` rows of the quarter.
+
+With a ``key`` the watermark pixels are scattered over the whole host
+instead: watermark (payload) pixel ``i``, in row-major order, goes to host
+pixel ``perm.forward(i)`` of a ``scatter.KeyedPermutation`` of the host's
+pixels, generated chunk by chunk. Extraction needs the same key.
+"""
+import numpy as np
+from PIL import Image
+
+from .backends import get_backend
+from .diagnostics import get_logger, log_matrix
+from .instrumentation import count, stage
+from .progress import as_bus, chunks
+from .scatter import as_permutation
+from .schemes import lsb_schemes, pack_payload, unpack_payload
+
+logger = get_logger("neqr_lsb")
+
+
+def load_watermark(watermark_image, host_size):
+    """Grayscale the watermark and resize it to a quarter of the host (width, height)"""
+    with stage("watermark_resize"):
+        if isinstance(watermark_image, str):
+            watermark_image = Image.open(watermark_image)
+        # Convert watermark to grayscale but keep host image in color
+        watermark_img = watermark_image.convert('L')
+
+        # Calculate appropriate watermark size (1/4 of each host dimension)
+        watermark_width = host_size[0] // 4
+        watermark_height = host_size[1] // 4
+
+        # Resize watermark
+        watermark_img = watermark_img.resize((watermark_width, watermark_height))
+        return np.array(watermark_img)
+
+
+def payload_rows(watermark_height, lsb_bits=1):
+    """Host rows of the top-left quarter that carry a watermark ``watermark_height`` rows tall"""
+    return -(-watermark_height // lsb_bits)
+
+
+def _host_pixels(perm, width, start, end, x, y):
+    # Host (row, column) of payload pixels start..end at payload (x, y)
+    if perm is None:
+        return x, y
+    positions = perm.forward(np.arange(start, end))
+    return positions // width, positions % width
+
+
+def embed_watermark(host_array, watermark_array, backend=None, progress=None, chunk_size=None, checkpoint=None,
+                    lsb_bits=1, key=None):
+    """Embed the thresholded watermark into the top-left quarter of the host.
+
+    ``backend`` is a backend name or instance (default: ``get_backend()``).
+    ``progress`` and ``chunk_size`` (in pixels) are as for
+    ``progress.as_bus``. With a ``checkpoint.Checkpoint`` the output is built
+    in its memory map and the run resumes from its last flush.
+    ``lsb_bits`` selects k-LSB mode and ``key`` scatters the watermark (see the
+    module docstring). Returns the watermarked array.
+    """
+    backend = get_backend(backend)
+    embed_scheme, _ = lsb_schemes("neqr-lsb", lsb_bits)
+    keep = np.uint8(255 ^ embed_scheme.mask)
+    watermark_width = watermark_array.shape[1]
+    # Watermark bits, k rows per host row
+    payload = pack_payload(watermark_array > 127, lsb_bits)
+    perm = as_permutation(key, host_array.shape[0] * host_array.shape[1])
+
+    # Display initial matrices
+    log_matrix(logger, host_array, "Initial Host Image Matrix")
+    log_matrix(logger, watermark_array, "Watermark Matrix")
+
+    # Create output array
+    done = 0
+    if checkpoint is not None:
+        watermarked_array, done = checkpoint.start(host_array)
+    else:
+        watermarked_array = np.copy(host_array)
+
+    # Process in chunks for better performance
+    total_pixels = watermark_width * len(payload)
+    is_color = len(host_array.shape) > 2
+    bus = as_bus(progress)
+    bus.start(total_pixels, done)
+    quarter = 4 * done // max(total_pixels, 1)
+
+    logger.info("\nEmbedding watermark using NEQR-LSB...")
+    for start_idx, end_idx in chunks(total_pixels, chunk_size, done):
+        idx = np.arange(start_idx, end_idx)
+        x = idx // watermark_width
+        y = idx % watermark_width
+
+        # Get watermark bits
+        watermark_bits = payload[x, y]
+
+        # Apply NEQR-LSB embedding to every colour channel of the chunk
+        host_x, host_y = _host_pixels(perm, host_array.shape[1], start_idx, end_idx, x, y)
+        host_pixels = host_array[host_x, host_y]
+        if is_color:
+            watermark_bits = watermark_bits[:, None]
+        new_lsb = backend.run(embed_scheme, host_pixels, watermark_bits)
+        watermarked_array[host_x, host_y] = (host_pixels & keep) | new_lsb
+        if checkpoint is not None:
+            checkpoint.update(end_idx)
+            if bus.cancelled:
+                # Stopping after this chunk: record it so a later run resumes here
+                checkpoint.suspend()
+
+        # Update progress
+        count("pixels", end_idx - start_idx)
+        bus.advance(end_idx - start_idx)
+
+        # Display intermediate matrix values every 25% progress
+        if 4 * end_idx // total_pixels > quarter:
+            quarter = 4 * end_idx // total_pixels
+            log_matrix(logger, watermarked_array, "Watermarked Image Matrix (Progress: %.0f%%)", 25 * quarter)
+    bus.finish()
+
+    if checkpoint is not None:
+        watermarked_array = checkpoint.finish()
+
+    # Display final watermarked matrix
+    log_matrix(logger, watermarked_array, "Final Watermarked Image Matrix")
+    return watermarked_array
+
+
+def extract_watermark(watermarked_array, progress=None, backend="numpy", chunk_size=None, lsb_bits=1, key=None):
+    """Read the LSB plane of the top-left quarter (or the ``key``'s pixels) and clear it.
+
+    ``progress``, ``chunk_size`` (in rows), ``lsb_bits`` and ``key`` are as
+    for ``embed_watermark``. Returns ``(watermark_bits, original_array)`` where
+    ``watermark_bits`` holds 0/255 per RGB channel (or per pixel for
+    grayscale hosts). Reading the LSB needs no simulation, so the NumPy
+    backend is the default.
+    """
+    backend = get_backend(backend)
+    _, extract_scheme = lsb_schemes("neqr-lsb", lsb_bits)
+    keep = np.uint8(255 ^ extract_scheme.mask)
+    is_color = len(watermarked_array.shape) == 3 and watermarked_array.shape[2] >= 3
+    num_channels = watermarked_array.shape[2] if is_color else 1
+    height, width = watermarked_array.shape[:2]
+    watermark_height = height // 4
+    watermark_width = width // 4
+
+    # Display initial watermarked image matrix
+    log_matrix(logger, watermarked_array, "Initial Watermarked Image Matrix")
+
+    # Prepare arrays for extracted watermark and original image
+    if is_color:
+        watermark_bits = np.zeros((watermark_height, watermark_width, 3), dtype=np.uint8)
+    else:
+        watermark_bits = np.zeros((watermark_height, watermark_width), dtype=np.uint8)
+    original_array = np.copy(watermarked_array)
+
+    logger.info("\nExtracting watermark using reverse NEQR-LSB... (is_color=%s, num_channels=%d)", is_color, num_channels)
+    host_rows = payload_rows(watermark_height, lsb_bits)
+    perm = as_permutation(key, height * width)
+    bus = as_bus(progress)
+    bus.start(host_rows * watermark_width)
+    quarter = 0
+    for top, bottom in chunks(host_rows, chunk_size, item_values=watermark_width):
+        # Only use first 3 channels (RGB)
+        if perm is None:
+            region = (slice(top, bottom), slice(0, watermark_width))
+        else:
+            positions = perm.forward(np.arange(top * watermark_width, bottom * watermark_width))
+            region = (positions // width, positions % width)
+        if is_color:
+            region += (slice(0, 3),)
+        block = watermarked_array[region]
+        values = backend.run(extract_scheme, block).reshape((bottom - top, watermark_width) + watermark_bits.shape[2:])
+        bits = unpack_payload(values, lsb_bits)
+        watermark_bits[top * lsb_bits:bottom * lsb_bits] = bits[:watermark_height - top * lsb_bits] * 255
+        original_array[region] = block & keep
+        count("pixels", (bottom - top) * watermark_width)
+        bus.advance((bottom - top) * watermark_width)
+        if 4 * bottom // host_rows > quarter:
+            quarter = 4 * bottom // host_rows
+            log_matrix(logger, watermark_bits, "Intermediate Watermark Matrix (Progress: %.0f%%)", 25 * quarter)
+    bus.finish()
+
+    log_matrix(logger, watermark_bits, "Extracted Watermark Matrix")
+    log_matrix(logger, original_array, "Reconstructed Original Image Matrix")
+    return watermark_bits, original_array
+
+
+def extract_strips(watermarked_array, strip_rows=64, backend="numpy", progress=None, lsb_bits=1, key=None):
+    """Streaming form of ``extract_watermark`` for images too large to copy.
+
+    ``progress``, ``lsb_bits`` and ``key`` are as for ``embed_watermark``.
+    Yields ``(original_rows, watermark_rows)`` for each strip of
+    ``strip_rows`` host rows: the reconstructed original rows, and the
+    extracted watermark rows they contain (none once past the top quarter),
+    with the alpha channel kept as ``extraction_images`` does. Only one strip
+    is held at a time, so ``watermarked_array`` may be a memory map. A
+    scattered watermark is only complete after the last strip, so with a
+    ``key`` all its rows come with that one.
+    """
+    backend = get_backend(backend)
+    height, width = watermarked_array.shape[:2]
+    perm = as_permutation(key, height * width)
+    scattered = _Scattered(watermarked_array, lsb_bits) if perm is not None else None
+    bus = as_bus(progress)
+    bus.start(height * width)
+    for top in range(0, height, strip_rows):
+        original_rows = np.array(watermarked_array[top:top + strip_rows])
+        if scattered is None:
+            watermark_rows, region = _extract_rows(original_rows, top, height, backend, lsb_bits)
+        else:
+            region = scattered.read(original_rows, top, perm, backend)
+            watermark_rows = scattered.rows() if top + strip_rows >= height else scattered.rows(0)
+        original_rows[region] &= np.uint8(255 ^ ((1 << lsb_bits) - 1))
+        bus.advance(len(original_rows) * width)
+        yield original_rows, watermark_rows
+    bus.finish()
+
+
+def extract_region(top_rows, host_height, backend="numpy", lsb_bits=1, key=None):
+    """Extracted watermark from only the leading rows of a host ``host_height`` tall.
+
+    For use with ``roi.decode_rows``; gives the same image as the
+    watermark half of ``extract_strips``. A watermark scattered by ``key``
+    can be anywhere, so then the rows must be the whole host.
+    """
+    if key is None:
+        watermark_rows, _ = _extract_rows(top_rows, 0, host_height, get_backend(backend), lsb_bits)
+        return watermark_rows
+    if len(top_rows) < host_height:
+        raise ValueError(f"A scattered watermark needs all {host_height} rows; got {len(top_rows)}")
+    scattered = _Scattered(top_rows, lsb_bits)
+    scattered.read(top_rows, 0, as_permutation(key, top_rows.shape[0] * top_rows.shape[1]), get_backend(backend))
+    return scattered.rows()
+
+
+class _Scattered:
+    # Payload values of a scattered watermark, collected strip by strip
+
+    def __init__(self, watermarked_array, lsb_bits):
+        height, width = watermarked_array.shape[:2]
+        self.is_color = watermarked_array.ndim == 3 and watermarked_array.shape[2] >= 3
+        self.watermark_height, self.watermark_width = height // 4, width // 4
+        self.lsb_bits = lsb_bits
+        self.total = payload_rows(self.watermark_height, lsb_bits) * self.watermark_width
+        self.values = np.zeros((self.total, 3) if self.is_color else self.total, dtype=np.uint8)
+        # Alpha of the top-left quarter, kept as extraction_images does
+        self.alpha = watermarked_array[:self.watermark_height, :self.watermark_width, 3].copy() \
+            if self.is_color and watermarked_array.shape[2] == 4 else None
+        self.scheme = lsb_schemes("neqr-lsb", lsb_bits)[1]
+
+    def read(self, host_rows, top, perm, backend):
+        """Extract the payload pixels in a strip starting at host row ``top``; returns the region read"""
+        width = host_rows.shape[1]
+        indices = perm.inverse(np.arange(top * width, (top + len(host_rows)) * width))
+        held = np.flatnonzero(indices < self.total)
+        region = (held // width, held % width)
+        if self.is_color:
+            region += (slice(0, 3),)
+        self.values[indices[held]] = backend.run(self.scheme, host_rows[region])
+        count("pixels", len(held))
+        return region
+
+    def rows(self, limit=None):
+        """The watermark rows (0/255), or the first ``limit`` of them"""
+        limit = self.watermark_height if limit is None else limit
+        values = self.values.reshape((-1, self.watermark_width) + self.values.shape[1:])
+        rows = unpack_payload(values[:payload_rows(limit, self.lsb_bits)], self.lsb_bits)[:limit] * np.uint8(255)
+        if self.alpha is not None:
+            rows = np.dstack((rows, self.alpha[:len(rows)]))
+        return rows
+
+
+def _extract_rows(host_rows, top, host_height, backend, lsb_bits=1):
+    # Watermark rows held in a strip starting at host row ``top``, and the
+    # strip region they were read from
+    is_color = host_rows.ndim == 3 and host_rows.shape[2] >= 3
+    watermark_width = host_rows.shape[1] // 4
+    watermark_height = host_height // 4
+    rows = max(0, min(len(host_rows), payload_rows(watermark_height, lsb_bits) - top))
+    region = (slice(0, rows), slice(0, watermark_width), slice(0, 3)) if is_color else \
+        (slice(0, rows), slice(0, watermark_width))
+    _, extract_scheme = lsb_schemes("neqr-lsb", lsb_bits)
+    bits = unpack_payload(backend.run(extract_scheme, host_rows[region]), lsb_bits)
+    watermark_rows = bits[:max(0, watermark_height - top * lsb_bits)] * np.uint8(255)
+    if is_color and host_rows.shape[2] == 4:
+        alpha = np.repeat(host_rows[:rows, :watermark_width, 3], lsb_bits, axis=0)
+        watermark_rows = np.dstack((watermark_rows, alpha[:len(watermark_rows)]))
+    count("pixels", rows * watermark_width)
+    return watermark_rows, region
+
+
+def extraction_images(watermarked_array, watermark_bits, original_array):
+    """Convert extraction results to PIL images, keeping an alpha channel if present"""
+    is_color = watermark_bits.ndim == 3
+    if is_color:
+        extracted_watermark = Image.fromarray(watermark_bits, mode='RGB')
+        # If original image has 4 channels, preserve alpha
+        if watermarked_array.shape[2] == 4:
+            watermark_height, watermark_width = watermark_bits.shape[:2]
+            alpha_channel = watermarked_array[:watermark_height, :watermark_width, 3]
+            rgba = np.dstack((watermark_bits, alpha_channel))
+            extracted_watermark = Image.fromarray(rgba, mode='RGBA')
+            original_image = Image.fromarray(original_array, mode='RGBA')
+        else:
+            original_image = Image.fromarray(original_array, mode='RGB')
+    else:
+        extracted_watermark = Image.fromarray(watermark_bits)
+        original_image = Image.fromarray(original_array)
+    return extracted_watermark, original_image
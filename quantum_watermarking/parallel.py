@@ -0,0 +1,263 @@
+"""Running a backend over tiles in worker processes, without pickling the pixels.
+
+``ProcessBackend`` wraps another backend and splits every ``run`` into
+contiguous tiles, one task per tile, on a pool of worker processes. Each
+worker keeps its own backend (and simulator) warm between tasks. Any
+embed, extract or negate path runs in parallel just by being handed one::
+
+    backend = ProcessBackend("aer", workers=4)
+    host_array = share(host_array)          # optional: the host lives in shared memory
+    marked = waqi.embed_watermark(host_array, bits, backend)
+    backend.close()
+
+Two transports move the tiles:
+
+    shm      inputs and the output live in ``multiprocessing.shared_memory``;
+             a task carries only the segment name, byte offsets and the tile
+             range, and the worker reads and writes the tile in place
+    pickle   each task pickles its input tiles and the worker pickles the
+             result back (what a plain ``ProcessPoolExecutor.map`` does)
+
+With ``shm``, an input that already lies in a ``share``d array (a
+contiguous slice of the host, say) is not copied at all; anything else is
+copied once into a reusable scratch segment. ``ipc_bytes`` counts what went
+through the pool's pipes either way.
+"""
+import atexit
+import concurrent.futures
+import multiprocessing
+import os
+import pickle
+import threading
+import weakref
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .backends import Backend, get_backend
+from .diagnostics import get_logger
+from .instrumentation import stage
+
+logger = get_logger("parallel")
+
+TRANSPORTS = ("shm", "pickle")
+TILES_PER_WORKER = 2
+ALIGN = 64
+
+# name -> (SharedMemory, address, size) of arrays made by ``share``
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def _address(array):
+    return array.__array_interface__["data"][0]
+
+
+def share(array):
+    """Copy of ``array`` in shared memory, which ``ProcessBackend`` passes by reference"""
+    array = np.asarray(array)
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    shared = np.ndarray(array.shape, array.dtype, buffer=shm.buf)
+    shared[...] = array
+    with _shared_lock:
+        _shared[shm.name] = (shm, _address(shared), shm.size)
+    return shared
+
+
+def release(array):
+    """Unlink the shared segment holding ``array`` (it stays mapped until dropped)"""
+    located = _locate(array)
+    if located is not None:
+        with _shared_lock:
+            shm, _, _ = _shared.pop(located[0])
+        shm.unlink()
+
+
+@atexit.register
+def _unlink_shared():
+    with _shared_lock:
+        segments = list(_shared.values())
+        _shared.clear()
+    for shm, _, _ in segments:
+        shm.unlink()
+
+
+def _locate(array):
+    # (segment name, byte offset) of a contiguous array inside a shared segment
+    if not array.flags.c_contiguous:
+        return None
+    start = _address(array)
+    with _shared_lock:
+        segments = [(name, address, size) for name, (_, address, size) in _shared.items()]
+    for name, address, size in segments:
+        if address <= start and start + array.nbytes <= address + size:
+            return name, start - address
+    return None
+
+
+# Worker side: one backend per name, and the segments attached so far
+_worker_backends = {}
+_attached = {}
+MAX_ATTACHED = 8
+
+
+def _attach(name):
+    shm = _attached.get(name)
+    if shm is None:
+        # Spawned workers share the parent's resource tracker, so attaching
+        # does not add a second owner: the parent alone unlinks the segment
+        shm = shared_memory.SharedMemory(name=name)
+        _attached[name] = shm
+        while len(_attached) > MAX_ATTACHED:
+            oldest = next(iter(_attached))
+            _attached.pop(oldest).close()
+    return shm
+
+
+def _worker_backend(name):
+    backend = _worker_backends.get(name)
+    if backend is None:
+        backend = _worker_backends[name] = get_backend(name)
+    return backend
+
+
+def _run_shared(backend_name, scheme_name, inputs, output, start, end):
+    from .schemes import get_scheme
+
+    arrays = [np.ndarray((end - start,), dtype, buffer=_attach(name).buf,
+                         offset=offset + start * np.dtype(dtype).itemsize)
+              for name, offset, dtype in inputs]
+    name, offset = output
+    out = np.ndarray((end - start,), np.uint8, buffer=_attach(name).buf, offset=offset + start)
+    out[:] = _worker_backend(backend_name)._run_flat(get_scheme(scheme_name), arrays)
+    del arrays, out
+    return end - start
+
+
+def _run_pickled(backend_name, scheme_name, arrays):
+    from .schemes import get_scheme
+
+    return _worker_backend(backend_name)._run_flat(get_scheme(scheme_name), arrays)
+
+
+def _call(payload):
+    # The task arrives pickled by the parent and the result leaves pickled,
+    # so both sides can count the bytes that crossed the pipe
+    fn, args = pickle.loads(payload)
+    return pickle.dumps(fn(*args), pickle.HIGHEST_PROTOCOL)
+
+
+def _unlink(shm):
+    shm.close()
+    shm.unlink()
+
+
+def tiles(total, count):
+    """``count`` contiguous ``(start, end)`` ranges covering ``range(total)``"""
+    count = max(1, min(count, total))
+    bounds = np.linspace(0, total, count + 1).astype(int)
+    return list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+
+
+class ProcessBackend(Backend):
+    """Another backend run over tiles on a pool of worker processes"""
+
+    name = "process"
+
+    def __init__(self, inner=None, workers=None, transport="shm"):
+        if transport not in TRANSPORTS:
+            raise ValueError(f"Unknown transport {transport!r}; choose from {', '.join(TRANSPORTS)}")
+        self.inner = get_backend(inner)
+        self.workers = workers or os.cpu_count() or 1
+        self.transport = transport
+        self.ipc_bytes = 0
+        self.tasks = 0
+        self.copied_bytes = 0
+        self._pool = None
+        self._arena = None
+        self._arena_finalizer = None
+        self._lock = threading.Lock()
+
+    def _executor(self):
+        if self._pool is None:
+            # spawn: forking a parent that already runs Aer or Tk threads is not safe
+            self._pool = concurrent.futures.ProcessPoolExecutor(
+                self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    def _scratch(self, size):
+        # The scratch segment only ever grows, so steady-state runs reuse it
+        if self._arena is None or self._arena.size < size:
+            if self._arena_finalizer is not None:
+                self._arena_finalizer()
+            self._arena = shared_memory.SharedMemory(create=True, size=max(size, 1 << 20))
+            self._arena_finalizer = weakref.finalize(self, _unlink, self._arena)
+        return self._arena
+
+    def _map(self, calls):
+        pool = self._executor()
+        payloads = [pickle.dumps(call, pickle.HIGHEST_PROTOCOL) for call in calls]
+        results = [pickle.loads(r) for r in self._count(payloads, pool.map(_call, payloads))]
+        self.tasks += len(calls)
+        return results
+
+    def _count(self, payloads, results):
+        self.ipc_bytes += sum(len(p) for p in payloads)
+        for result in results:
+            self.ipc_bytes += len(result)
+            yield result
+
+    def _run_flat(self, scheme, flat):
+        n = flat[0].size
+        ranges = tiles(n, self.workers * TILES_PER_WORKER)
+        if len(ranges) == 1:
+            return self.inner._run_flat(scheme, flat)
+        with self._lock:
+            if self.transport == "pickle":
+                with stage("process_tiles"):
+                    parts = self._map([(_run_pickled, (self.inner.name, scheme.name, [a[s:e] for a in flat]))
+                                       for s, e in ranges])
+                return np.concatenate(parts)
+            return self._run_shared(scheme, flat, ranges)
+
+    def _run_shared(self, scheme, flat, ranges):
+        n = flat[0].size
+        # Lay out whatever is not shared already, then the output, in the scratch segment
+        placed, layout, size = [], [], 0
+        for a in flat:
+            located = _locate(a)
+            placed.append(located)
+            if located is None:
+                layout.append(size)
+                size += -(-a.nbytes // ALIGN) * ALIGN
+        out_offset = size
+        arena = self._scratch(size + n)
+        inputs = []
+        with stage("share_tiles"):
+            slots = iter(layout)
+            for a, located in zip(flat, placed):
+                if located is None:
+                    offset = next(slots)
+                    np.ndarray(a.shape, a.dtype, buffer=arena.buf, offset=offset)[:] = a
+                    self.copied_bytes += a.nbytes
+                    located = (arena.name, offset)
+                inputs.append(located + (a.dtype.str,))
+        with stage("process_tiles"):
+            self._map([(_run_shared, (self.inner.name, scheme.name, inputs, (arena.name, out_offset), s, e))
+                       for s, e in ranges])
+        return np.ndarray((n,), np.uint8, buffer=arena.buf, offset=out_offset).copy()
+
+    def close(self):
+        """Stop the workers and free the scratch segment"""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        if self._arena_finalizer is not None:
+            self._arena_finalizer()
+            self._arena = self._arena_finalizer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,144 @@
+"""Compressed WaQI watermark payload.
+
+The plain WaQI payload is the 8-bit grayscale watermark unpacked to bits,
+8 host values per watermark pixel. Logos and the ASCII-art images are
+essentially two-tone, so the compressed payload binarises the watermark
+and run-length codes it instead, which usually takes a small fraction of
+the bits. It starts with a fixed header::
+
+    bits  field
+       8  MAGIC, so an extractor can tell a compressed payload from a plain one
+       1  mode: 1 run-length coded body, 0 raw bits (whichever is shorter)
+       1  value of the first pixel
+      16  height
+      16  width
+      32  body length in bits
+
+The run-length body lists the runs of equal pixels in raster order, each
+Elias-gamma coded (``n`` zeros then the run length in ``n + 1`` bits), the
+values alternating from the first pixel's. Encoding is vectorised; decoding
+follows the codeword starts (one list lookup per run) and then expands the
+runs vectorised.
+
+    bits = compress(binarise(image, (64, 64)))
+    image = decompress(bits) * 255
+"""
+import numpy as np
+from PIL import Image
+
+MAGIC = 0xB5
+HEADER_BITS = 8 + 1 + 1 + 16 + 16 + 32
+_FIELDS = ((8, "magic"), (1, "mode"), (1, "first"), (16, "height"), (16, "width"), (32, "length"))
+
+
+class PayloadError(ValueError):
+    """The bits are not a (complete) compressed payload"""
+
+
+def binarise(watermark_image, size, threshold=128):
+    """``watermark_image`` (path or PIL image) grayscaled, resized to ``size`` (width, height) and thresholded"""
+    if isinstance(watermark_image, str):
+        watermark_image = Image.open(watermark_image)
+    gray = np.array(watermark_image.convert('L').resize(size))
+    return (gray >= threshold).astype(np.uint8)
+
+
+def _to_bits(value, width):
+    return (value >> np.arange(width - 1, -1, -1)) & 1
+
+
+def _from_bits(bits):
+    return int("".join("1" if b else "0" for b in bits) or "0", 2)
+
+
+def _gamma_encode(runs):
+    # Elias gamma of each run (>= 1), concatenated
+    n = np.floor(np.log2(runs)).astype(np.int64)
+    lengths = 2 * n + 1
+    out = np.zeros(int(lengths.sum()), dtype=np.uint8)
+    value_starts = np.cumsum(lengths) - lengths + n
+    which = np.repeat(np.arange(len(runs)), n + 1)
+    offset = np.arange(len(which)) - np.repeat(np.cumsum(n + 1) - (n + 1), n + 1)
+    out[value_starts[which] + offset] = (runs[which] >> (n[which] - offset)) & 1
+    return out
+
+
+def _gamma_decode(bits, count):
+    # Runs of the Elias-gamma codes in ``bits``, which must sum to ``count``
+    size = len(bits)
+    ones = np.flatnonzero(bits)
+    # next_one[p]: first 1 at or after p (size if none), so a code starting at p is 2 * (next_one - p) + 1 long
+    next_one = np.full(size + 1, size, dtype=np.int64)
+    next_one[ones] = ones
+    next_one = np.minimum.accumulate(next_one[::-1])[::-1]
+    jump = (2 * next_one[:size] - np.arange(size) + 1).tolist()
+    starts = []
+    position = 0
+    while position < size:
+        starts.append(position)
+        position = jump[position]
+    if position != size:
+        raise PayloadError("Run-length body ends inside a code")
+    starts = np.array(starts, dtype=np.int64)
+    n = next_one[starts] - starts
+    which = np.repeat(np.arange(len(starts)), n + 1)
+    offset = np.arange(len(which)) - np.repeat(np.cumsum(n + 1) - (n + 1), n + 1)
+    weights = np.left_shift(np.int64(1), n[which] - offset)
+    runs = np.bincount(which, weights=bits[starts[which] + n[which] + offset] * weights, minlength=len(starts))
+    runs = runs.astype(np.int64)
+    if runs.sum() != count:
+        raise PayloadError(f"Runs cover {runs.sum()} pixels, the header says {count}")
+    return runs
+
+
+def compress(binary):
+    """Header and body bits (flat 0/1 uint8) of the 2-D 0/1 image ``binary``"""
+    binary = np.asarray(binary, dtype=np.uint8)
+    height, width = binary.shape
+    if not (0 < height < 1 << 16 and 0 < width < 1 << 16):
+        raise ValueError(f"Cannot compress a {width}x{height} watermark")
+    flat = binary.reshape(-1)
+    bounds = np.concatenate(([0], np.flatnonzero(flat[1:] != flat[:-1]) + 1, [flat.size]))
+    body = _gamma_encode(np.diff(bounds))
+    mode = 1
+    if body.size >= flat.size:
+        body, mode = flat, 0
+    header = np.concatenate([_to_bits(value, width_bits) for width_bits, value in
+                             zip((8, 1, 1, 16, 16, 32), (MAGIC, mode, int(flat[0]), height, width, body.size))])
+    return np.concatenate((header, body)).astype(np.uint8)
+
+
+def read_header(bits):
+    """The header fields of ``bits`` (at least ``HEADER_BITS`` long) as a dict; PayloadError if there is none"""
+    bits = np.asarray(bits).reshape(-1)
+    if bits.size < HEADER_BITS:
+        raise PayloadError(f"{bits.size} bits are too few for a header")
+    fields, position = {}, 0
+    for width, name in _FIELDS:
+        fields[name] = _from_bits(bits[position:position + width])
+        position += width
+    if fields["magic"] != MAGIC or not fields["height"] or not fields["width"]:
+        raise PayloadError("Not a compressed watermark payload")
+    if fields["mode"] == 0 and fields["length"] != fields["height"] * fields["width"]:
+        raise PayloadError("Raw body length does not match the watermark size")
+    return fields
+
+
+def payload_length(header):
+    """Total bits of the payload whose header fields (from ``read_header``) are ``header``"""
+    return HEADER_BITS + header["length"]
+
+
+def decompress(bits):
+    """The 0/1 image of a payload from ``compress`` (trailing bits are ignored)"""
+    bits = np.asarray(bits, dtype=np.uint8).reshape(-1)
+    header = read_header(bits)
+    if bits.size < payload_length(header):
+        raise PayloadError(f"Payload is {payload_length(header)} bits, only {bits.size} given")
+    body = bits[HEADER_BITS:payload_length(header)]
+    shape = (header["height"], header["width"])
+    if header["mode"] == 0:
+        return body.reshape(shape).copy()
+    runs = _gamma_decode(body, shape[0] * shape[1])
+    values = (header["first"] ^ (np.arange(len(runs)) & 1)).astype(np.uint8)
+    return np.repeat(values, runs).reshape(shape)
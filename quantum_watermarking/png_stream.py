@@ -0,0 +1,132 @@
+"""Incremental PNG writer fed with row strips.
+
+``PNGStreamWriter`` writes the PNG header up front and then compresses each
+strip of rows into the single zlib stream as it arrives, emitting one IDAT
+chunk per strip, so memory stays at one strip however tall the image is::
+
+    with PNGStreamWriter("out.png", width, height, "RGB", level=FAST) as png:
+        for strip in strips:
+            png.write_rows(strip)
+
+``level`` is the zlib level (``FAST`` for throughput-critical runs, where
+the cheaper "none" row filter is also used). Time spent filtering,
+compressing and writing is kept in ``encode_seconds`` and recorded as the
+``encode`` stage.
+"""
+import os
+import struct
+import time
+import zlib
+
+import numpy as np
+
+from .instrumentation import stage
+
+FAST = 1
+DEFAULT_LEVEL = 6
+
+# PIL-style mode -> (PNG colour type, channels)
+MODES = {"L": (0, 1), "LA": (4, 2), "RGB": (2, 3), "RGBA": (6, 4)}
+
+_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+_FILTERS = {"none": 0, "up": 2}
+
+
+def mode_for(array):
+    """PIL mode matching an 8-bit array's channel count"""
+    channels = 1 if array.ndim == 2 else array.shape[2]
+    for mode, (_, n) in MODES.items():
+        if n == channels:
+            return mode
+    raise ValueError(f"No PNG mode for {channels} channels")
+
+
+class PNGStreamWriter:
+    """Writes an 8-bit PNG from successive strips of rows; see the module docstring"""
+
+    def __init__(self, path, width, height, mode, level=DEFAULT_LEVEL, row_filter=None):
+        if mode not in MODES:
+            raise ValueError(f"Unsupported mode {mode!r}; choose from {', '.join(MODES)}")
+        self.path = path
+        self.width = width
+        self.height = height
+        self.mode = mode
+        self.level = level
+        self.row_filter = row_filter or ("none" if level <= FAST else "up")
+        self.channels = MODES[mode][1]
+        self.rows_written = 0
+        self.encode_seconds = 0.0
+        self._previous = np.zeros(width * self.channels, dtype=np.uint8)
+        self._compressor = zlib.compressobj(level)
+        self._file = open(path, "wb")
+        self._file.write(_SIGNATURE)
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, MODES[mode][0], 0, 0, 0))
+
+    def _chunk(self, tag, data):
+        self._file.write(struct.pack(">I", len(data)) + tag + data
+                         + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF))
+
+    def write_rows(self, rows):
+        """Append rows (height x width [x channels], uint8) below those already written"""
+        rows = np.asarray(rows, dtype=np.uint8)
+        if len(rows) == 0:
+            return
+        rows = rows.reshape(len(rows), -1)
+        if rows.shape[1] != len(self._previous):
+            raise ValueError(f"Expected rows of {self.width} x {self.channels} values, got {rows.shape[1]}")
+        if self.rows_written + len(rows) > self.height:
+            raise ValueError(f"More than {self.height} rows written")
+        start = time.perf_counter()
+        with stage("encode"):
+            filtered = np.empty((len(rows), rows.shape[1] + 1), dtype=np.uint8)
+            filtered[:, 0] = _FILTERS[self.row_filter]
+            if self.row_filter == "up":
+                # Each byte minus the byte above it, mod 256
+                filtered[0, 1:] = rows[0] - self._previous
+                np.subtract(rows[1:], rows[:-1], out=filtered[1:, 1:])
+                self._previous = rows[-1].copy()
+            else:
+                filtered[:, 1:] = rows
+            data = self._compressor.compress(filtered.tobytes())
+            if data:
+                self._chunk(b"IDAT", data)
+        self.encode_seconds += time.perf_counter() - start
+        self.rows_written += len(rows)
+
+    def close(self):
+        if self._file.closed:
+            return
+        if self.rows_written != self.height:
+            self.abort()
+            raise ValueError(f"Only {self.rows_written} of {self.height} rows written to {self.path}")
+        start = time.perf_counter()
+        with stage("encode"):
+            self._chunk(b"IDAT", self._compressor.flush())
+            self._chunk(b"IEND", b"")
+            self._file.close()
+        self.encode_seconds += time.perf_counter() - start
+
+    def abort(self):
+        """Close and delete a partially written file"""
+        self._file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+def save_array(array, path, level=DEFAULT_LEVEL, strip_rows=256):
+    """Write a whole array with the streaming writer; returns the encode time"""
+    height, width = array.shape[:2]
+    with PNGStreamWriter(path, width, height, mode_for(array), level) as png:
+        for top in range(0, height, strip_rows):
+            png.write_rows(array[top:top + strip_rows])
+    return png.encode_seconds
@@ -0,0 +1,175 @@
+"""Decoded images and preview thumbnails, shared by the GUIs' preview and processing.
+
+Loading a host used to decode it three times (preview, matrix log,
+embedding), each on whichever thread asked, and the preview did a full
+resolution LANCZOS resize on the Tk main thread. A ``PreviewCache`` decodes
+each file once, keyed by path, size and mtime, and hands the same image to
+the preview and the processing. Thumbnails are made on a background thread
+and kept in a small LRU::
+
+    previews = default_previews()
+    previews.request(path, (200, 200), lambda thumb: window.after(0, show, thumb), slot=label)
+    ...
+    host_array = np.array(previews.image(path))   # no second decode
+
+Downscaling goes through ``Image.draft`` (JPEG decodes straight at 1/2 to
+1/8 scale when only a preview is wanted) and ``resize(reducing_gap=...)``,
+which box-reduces by an integer factor before the final LANCZOS pass.
+Decoded images are bounded by ``max_bytes``, thumbnails by count.
+"""
+import concurrent.futures
+import os
+import threading
+from collections import OrderedDict
+
+from PIL import Image
+
+from .diagnostics import get_logger
+from .instrumentation import stage
+
+logger = get_logger("previews")
+
+DEFAULT_MAX_BYTES = 256 << 20
+DEFAULT_MAX_THUMBNAILS = 64
+REDUCING_GAP = 2.0
+
+
+def _bytes(image):
+    # PIL stores 1-byte modes one byte per pixel and the rest four
+    return image.width * image.height * (1 if image.mode in ("1", "L", "P") else 4)
+
+
+def fit(image, size):
+    """``image`` resized to ``size`` (width, height), reducing first when much larger"""
+    return image.resize(size, Image.Resampling.LANCZOS, reducing_gap=REDUCING_GAP)
+
+
+class PreviewCache:
+    """LRU of decoded images and thumbnails, with one background preview thread"""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, max_thumbnails=DEFAULT_MAX_THUMBNAILS):
+        self.max_bytes = max_bytes
+        self.max_thumbnails = max_thumbnails
+        self._images = OrderedDict()
+        self._thumbnails = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._slots = {}
+        self._executor = None
+        self.decodes = 0
+        self.draft_decodes = 0
+        self.hits = 0
+
+    @staticmethod
+    def key(path):
+        st = os.stat(path)
+        return os.path.abspath(path), st.st_size, st.st_mtime_ns
+
+    def image(self, path):
+        """Fully decoded image for ``path``, decoded on first use only"""
+        key = self.key(path)
+        with self._lock:
+            image = self._images.get(key)
+            if image is not None:
+                self._images.move_to_end(key)
+                self.hits += 1
+                return image
+        with stage("decode"):
+            image = Image.open(path)
+            image.load()
+        with self._lock:
+            self.decodes += 1
+            if key not in self._images:
+                self._images[key] = image
+                self._bytes += _bytes(image)
+            # Keep at least the newest image, however large
+            while self._bytes > self.max_bytes and len(self._images) > 1:
+                _, evicted = self._images.popitem(last=False)
+                self._bytes -= _bytes(evicted)
+        return image
+
+    def thumbnail(self, source, size):
+        """Thumbnail of a path (cached) or PIL image (not cached) at ``size``"""
+        if not isinstance(source, str):
+            return fit(source, size)
+        key = self.key(source) + (tuple(size),)
+        with self._lock:
+            thumb = self._thumbnails.get(key)
+            if thumb is not None:
+                self._thumbnails.move_to_end(key)
+                self.hits += 1
+                return thumb
+            decoded = self._images.get(key[:3])
+        if decoded is None:
+            image = Image.open(source)
+            if image.format == "JPEG":
+                # Only the preview is wanted so far: let libjpeg decode at a
+                # reduced scale (still at least twice the thumbnail size)
+                image.draft(image.mode, (size[0] * 2, size[1] * 2))
+                with self._lock:
+                    self.draft_decodes += 1
+            else:
+                # Other formats decode at full size anyway; keep the result
+                # for the processing that follows
+                image = self.image(source)
+        else:
+            image = decoded
+        thumb = fit(image, size)
+        with self._lock:
+            self._thumbnails[key] = thumb
+            while len(self._thumbnails) > self.max_thumbnails:
+                self._thumbnails.popitem(last=False)
+        return thumb
+
+    def submit(self, fn, *args):
+        """Run ``fn(*args)`` on the preview thread; returns its future"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1,
+                                                                       thread_name_prefix="qwm-preview")
+        return self._executor.submit(fn, *args)
+
+    def request(self, source, size, callback, slot=None, error=None):
+        """Make a thumbnail in the background and pass it to ``callback``.
+
+        Of several requests for the same ``slot`` (e.g. a label) only the
+        latest is delivered. ``error(exception)`` is called on failure.
+        """
+        token = object()
+        if slot is not None:
+            self._slots[slot] = token
+
+        def make():
+            if slot is not None and self._slots.get(slot) is not token:
+                return
+            try:
+                thumb = self.thumbnail(source, size)
+            except Exception as e:
+                logger.warning("Could not make a preview of %s: %s", source, e)
+                if error is not None:
+                    error(e)
+                return
+            if slot is None or self._slots.get(slot) is token:
+                callback(thumb)
+        return self.submit(make)
+
+    def clear(self):
+        with self._lock:
+            self._images.clear()
+            self._thumbnails.clear()
+            self._bytes = 0
+
+    def stats(self):
+        return {"images": len(self._images), "bytes": self._bytes, "thumbnails": len(self._thumbnails),
+                "decodes": self.decodes, "draft_decodes": self.draft_decodes, "hits": self.hits}
+
+
+_default = None
+
+
+def default_previews():
+    """Process-wide preview cache"""
+    global _default
+    if _default is None:
+        _default = PreviewCache()
+    return _default
@@ -0,0 +1,186 @@
+"""Progress reporting and chunk sizing for the processing loops, free of Tk.
+
+A ``ProgressBus`` is fed by a loop (``start(total)``, ``advance(n)``,
+``finish()``) and hands ``Update`` snapshots (done, total, rate, ETA) to its
+subscribers, coalesced to at most ``max_rate`` per second; the final update
+is always delivered. GUIs subscribe a callback that posts to Tk, the CLI one
+that logs, and library callers may pass a plain ``progress(percent)``
+callable, which ``as_bus`` wraps::
+
+    bus = ProgressBus(max_rate=10)
+    bus.subscribe(lambda update: print(update.describe()))
+    waqi.embed_watermark(host_array, watermark_binary, progress=bus)
+
+A bus also carries cancellation: after ``cancel()`` the next ``start`` or
+``advance`` raises ``Cancelled``, so a loop stops at the end of its current
+chunk (see ``jobs.py``).
+
+``chunks`` yields the (start, end) ranges a loop works through. Given no
+fixed size, a ``ChunkTuner`` resizes them so each chunk takes about
+``TARGET_CHUNK_SECONDS``: large chunks for the vectorised backends, small
+ones where every value is a simulator job, so progress and cancellation
+stay responsive either way.
+"""
+import threading
+import time
+from collections import namedtuple
+
+DEFAULT_MAX_RATE = 10
+TARGET_CHUNK_SECONDS = 0.1
+INITIAL_CHUNK = 256
+MIN_CHUNK = 16
+MAX_CHUNK = 1 << 20
+
+
+class Cancelled(Exception):
+    """Raised in a processing loop whose progress bus was cancelled"""
+
+
+class Update(namedtuple("Update", "done total elapsed rate eta")):
+    """One progress snapshot; ``rate`` in values per second, ``eta`` in seconds (or None)"""
+
+    __slots__ = ()
+
+    @property
+    def percent(self):
+        return 100.0 * self.done / self.total if self.total else 100.0
+
+    def describe(self, unit="px"):
+        eta = "--:--" if self.eta is None else f"{int(self.eta) // 60}:{int(self.eta) % 60:02d}"
+        # Slow rates (frames, per-pixel simulation) need the decimals
+        rate = f"{self.rate:,.0f}" if self.rate >= 10 else f"{self.rate:.2f}"
+        return f"{self.percent:.0f}%  {rate} {unit}/s  ETA {eta}"
+
+
+class ProgressBus:
+    """Coalescing publisher of ``Update`` snapshots; see the module docstring"""
+
+    def __init__(self, max_rate=DEFAULT_MAX_RATE):
+        self.min_interval = 1.0 / max_rate if max_rate else 0.0
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+        self.total = 0
+        self.done = 0
+        self.published = 0
+        self._resumed = 0
+        self._last_done = None
+        self._started = self._last = None
+
+    def subscribe(self, callback):
+        """Call ``callback(update)`` on every published update; returns the callback"""
+        self._subscribers.append(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        self._subscribers.remove(callback)
+
+    def cancel(self):
+        """Ask the loop feeding this bus to stop at its next ``advance``"""
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def start(self, total, done=0):
+        if self._cancel.is_set():
+            raise Cancelled("Cancelled before start")
+        with self._lock:
+            self.total = total
+            self.done = done
+            self._started = time.perf_counter()
+            self._last = self._last_done = None
+            self._resumed = done
+
+    def advance(self, n=1):
+        if self._cancel.is_set():
+            raise Cancelled(f"Cancelled after {self.done + n} of {self.total}")
+        with self._lock:
+            self.done += n
+            now = time.perf_counter()
+            if self._last is not None and now - self._last < self.min_interval and self.done < self.total:
+                return
+            self._last = now
+            update = self._snapshot(now)
+        self._publish(update)
+
+    def finish(self):
+        """Publish the final state (once), whatever the coalescing interval"""
+        with self._lock:
+            if self._last_done == self.total:
+                return
+            self.done = self.total
+            update = self._snapshot(time.perf_counter())
+        self._publish(update)
+
+    def snapshot(self):
+        with self._lock:
+            return self._snapshot(time.perf_counter())
+
+    def _snapshot(self, now):
+        elapsed = now - self._started if self._started is not None else 0.0
+        # Rate over this run only, so a resumed run does not look faster than it is
+        rate = (self.done - self._resumed) / elapsed if elapsed > 0 else 0.0
+        eta = (self.total - self.done) / rate if rate > 0 else None
+        return Update(self.done, self.total, elapsed, rate, eta)
+
+    def _publish(self, update):
+        self._last_done = update.done
+        self.published += 1
+        for callback in list(self._subscribers):
+            callback(update)
+
+
+def as_bus(progress):
+    """A bus for a processing loop: ``progress`` itself, or one wrapping a
+    ``progress(percent)`` callable, or an unsubscribed one for None.
+
+    The processing loops (``waqi``, ``neqr_lsb``, ``negation``) take their
+    ``progress`` argument through this, and hand their ``chunk_size`` to
+    ``chunks``: a fixed number of values (or rows) per chunk, or None to
+    tune it to the backend's speed."""
+    if isinstance(progress, ProgressBus):
+        return progress
+    bus = ProgressBus()
+    if progress is not None:
+        bus.subscribe(lambda update: progress(update.percent))
+    return bus
+
+
+class ChunkTuner:
+    """Chunk size steered towards ``target_seconds`` of work per chunk"""
+
+    def __init__(self, initial=INITIAL_CHUNK, target_seconds=TARGET_CHUNK_SECONDS, minimum=MIN_CHUNK,
+                 maximum=MAX_CHUNK):
+        self.size = initial
+        self.target_seconds = target_seconds
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def record(self, values, seconds):
+        if seconds <= 0:
+            ideal = self.size * 4
+        else:
+            ideal = values * self.target_seconds / seconds
+        # At most a 4x step either way, so one noisy chunk cannot swing it far
+        self.size = int(min(max(ideal, self.size / 4, self.minimum), self.size * 4, self.maximum))
+
+
+def chunks(total, chunk_size=None, start=0, item_values=1):
+    """Yield ``(start, end)`` ranges over ``range(start, total)``; fixed-size
+    for an int ``chunk_size``, tuned by a ``ChunkTuner`` for None. Loops
+    over rows pass the values per row as ``item_values``, which scales the
+    tuner's starting size and bounds."""
+    tuner = None
+    if chunk_size is None:
+        tuner = ChunkTuner(max(1, INITIAL_CHUNK // item_values), minimum=max(1, MIN_CHUNK // item_values),
+                           maximum=max(1, MAX_CHUNK // item_values))
+    while start < total:
+        size = tuner.size if tuner is not None else chunk_size
+        end = min(start + size, total)
+        began = time.perf_counter()
+        yield start, end
+        if tuner is not None:
+            tuner.record(end - start, time.perf_counter() - began)
+        start = end
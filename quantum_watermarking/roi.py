@@ -0,0 +1,115 @@
+"""Region-of-interest decoding for watermark extraction.
+
+The watermark only occupies the top of a watermarked image: the top-left
+``height//4 x width//4`` block for NEQR-LSB and the first
+``(width//4) * (height//4)`` values in flat order for WaQI. ``decode_rows``
+decodes just the leading rows that carry it; for non-interlaced PNGs the
+decoder stops as soon as those rows are filled, other files fall back to a
+full decode. The returned stats give the decoded bytes and time against a
+full decode, for reporting.
+
+Stopping early relies on Pillow internals (``Image._size`` and the
+``tile`` list), verified on Pillow 9.5 to 12.3. If a release changes them,
+the partial decode errors or comes back the wrong shape, and the full decode
+plus crop is used instead.
+
+    rows = payload_rows("waqi", width, height, channels)
+    top, stats = decode_rows("marked.png", rows)
+"""
+import time
+
+import numpy as np
+from PIL import Image
+
+from .diagnostics import get_logger
+from .ecc import as_code
+from .instrumentation import stage
+
+logger = get_logger("roi")
+
+
+def payload_rows(scheme, width, height, channels, lsb_bits=1, scattered=False, ecc=None):
+    """Number of leading host rows the ``scheme`` watermark (``lsb_bits`` per value) is read from.
+
+    A ``scattered`` (keyed) watermark can be in any row. ``ecc`` is the code
+    a WaQI watermark was embedded with.
+    """
+    if scattered:
+        return height
+    if scheme == "neqr-lsb":
+        return -(-(height // 4) // lsb_bits)
+    total_bits = (width // 4) * (height // 4)
+    code = as_code(ecc)
+    if code is not None:
+        total_bits = code.encoded_length(total_bits)
+    total_values = -(-total_bits // lsb_bits)
+    return min(height, -(-total_values // (width * channels)))
+
+
+def channel_count(image):
+    """Channels of ``np.array(image)`` (palette and bilevel images give one)"""
+    return 1 if image.mode in ("1", "L", "P", "I", "F", "I;16") else len(image.getbands())
+
+
+def _truncate(image, rows):
+    # Shrink the single PNG decoder tile to the first rows; the zip decoder
+    # then reports completion once they are filled and the rest of the
+    # stream is never inflated or unfiltered
+    if image.format != "PNG" or image.info.get("interlace") or len(image.tile) != 1:
+        return False
+    decoder, extent, offset, args = image.tile[0]
+    if decoder != "zip" or extent != (0, 0) + image.size:
+        return False
+    image._size = (image.size[0], rows)
+    image.tile = [(decoder, (0, 0, image.size[0], rows), offset, args)]
+    return True
+
+
+def _decode_truncated(image, path, rows, width):
+    # The array of an image _truncate shrank, or None if Pillow did not
+    # decode exactly the ``rows`` x ``width`` it was asked for
+    try:
+        array = np.array(image)
+    except Exception as e:
+        logger.warning("Partial decode of %s failed (%s); decoding it in full", path, e)
+        return None
+    if array.shape[:2] != (rows, width):
+        logger.warning("Partial decode of %s gave %s, not %d rows of %d; decoding it in full",
+                       path, array.shape, rows, width)
+        return None
+    return array
+
+
+def decode_rows(path, rows=None, scheme=None, lsb_bits=1, scattered=False, ecc=None):
+    """Decode the first ``rows`` rows of an image (or those ``scheme`` needs).
+
+    Returns ``(array, stats)`` where ``stats`` holds the decoded and full
+    sizes in bytes, the decode time and whether the decode stopped early.
+    """
+    start = time.perf_counter()
+    with stage("decode"):
+        image = Image.open(path)
+        width, height = image.size
+        channels = channel_count(image)
+        if rows is None:
+            rows = payload_rows(scheme, width, height, channels, lsb_bits, scattered, ecc)
+        rows = min(rows, height)
+        partial = rows < height and _truncate(image, rows)
+        if partial:
+            array = _decode_truncated(image, path, rows, width)
+            partial = array is not None
+            if not partial:
+                image = Image.open(path)
+        if not partial:
+            array = np.array(image)[:rows]
+    stats = {
+        "rows": rows,
+        "height": height,
+        "decoded_bytes": (array.nbytes if partial else width * height * channels * array.itemsize),
+        "full_bytes": width * height * channels * array.itemsize,
+        "seconds": time.perf_counter() - start,
+        "partial": partial,
+    }
+    logger.debug("Decoded %d of %d rows of %s (%d of %d bytes, %.3f s)",
+                 rows, height, path, stats["decoded_bytes"], stats["full_bytes"], stats["seconds"])
+    return array, stats
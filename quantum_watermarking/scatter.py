@@ -0,0 +1,108 @@
+"""Keyed pseudo-random embedding positions.
+
+By default both schemes embed into a fixed region (the top-left quarter for
+NEQR-LSB, the first values in flat order for WaQI). With a key, payload
+value ``i`` goes to host position ``perm[i]`` instead, for a permutation of
+the host's positions that only the key regenerates::
+
+    perm = KeyedPermutation("secret", host_array.size)
+    positions = perm.forward(np.arange(start, end))    # one chunk of payload values
+    indices = perm.inverse(np.arange(top, bottom))     # what a strip of the host holds
+
+The permutation is never materialised: a balanced Feistel network over the
+smallest even-width power of two at or above ``size`` is a bijection on
+that domain, and cycle walking (re-applying it to the few values that land
+past ``size``) restricts it to ``range(size)``. Both directions are plain
+uint64 NumPy arithmetic over whole chunks, so any tile or strip of a
+gigapixel host costs only its own length.
+"""
+import hashlib
+
+import numpy as np
+
+ROUNDS = 4
+
+
+def _mix(values, round_key):
+    # splitmix64 finaliser of the half block and round key (wraps mod 2**64)
+    # in place after the first XOR, so a round allocates two temporaries
+    x = values ^ round_key
+    for shift, multiplier in ((30, 0xBF58476D1CE4E5B9), (27, 0x94D049BB133111EB)):
+        x ^= x >> np.uint64(shift)
+        x *= np.uint64(multiplier)
+    x ^= x >> np.uint64(31)
+    return x
+
+
+def _key_digest(key):
+    if isinstance(key, int):
+        key = key.to_bytes(max(1, (key.bit_length() + 8) // 8), "little", signed=True)
+    elif isinstance(key, str):
+        key = key.encode()
+    return hashlib.blake2b(key, digest_size=8 * ROUNDS, person=b"qwm-scatter").digest()
+
+
+def key_digest(key):
+    """Short hex fingerprint of ``key``, safe to use in file names and logs"""
+    return _key_digest(key)[:8].hex()
+
+
+class KeyedPermutation:
+    """Bijection of ``range(size)`` chosen by ``key`` (a str, bytes or int); see the module docstring"""
+
+    def __init__(self, key, size):
+        if size < 1:
+            raise ValueError(f"Cannot permute {size} positions")
+        self.size = int(size)
+        bits = max(2, (self.size - 1).bit_length())
+        self.half_bits = (bits + 1) // 2
+        self._half_mask = np.uint64((1 << self.half_bits) - 1)
+        digest = _key_digest(key)
+        self._round_keys = [np.uint64(int.from_bytes(digest[8 * i:8 * i + 8], "little")) for i in range(ROUNDS)]
+        self.digest = digest[:8].hex()
+
+    def _rounds(self, x, reverse=False):
+        shift = np.uint64(self.half_bits)
+        left, right = x >> shift, x & self._half_mask
+        with np.errstate(over="ignore"):
+            if reverse:
+                for round_key in reversed(self._round_keys):
+                    left, right = right ^ (_mix(left, round_key) & self._half_mask), left
+            else:
+                for round_key in self._round_keys:
+                    left, right = right, left ^ (_mix(right, round_key) & self._half_mask)
+        return (left << shift) | right
+
+    def _walk(self, values, reverse):
+        x = np.asarray(values, dtype=np.uint64)
+        if x.size and int(x.max()) >= self.size:
+            raise ValueError(f"Indices must be below {self.size}")
+        x = self._rounds(x, reverse)
+        outside = np.flatnonzero(x >= self.size)
+        while outside.size:
+            # Cycle walking: step the stragglers on until they are back in range
+            stepped = self._rounds(x[outside], reverse)
+            x[outside] = stepped
+            outside = outside[stepped >= self.size]
+        return x.astype(np.intp)
+
+    def forward(self, indices):
+        """Host positions of the payload values at ``indices``"""
+        return self._walk(indices, reverse=False)
+
+    def inverse(self, positions):
+        """Payload indices held at host ``positions``"""
+        return self._walk(positions, reverse=True)
+
+    def __repr__(self):
+        return f"<KeyedPermutation of {self.size} ({self.digest})>"
+
+
+def as_permutation(key, size):
+    """``key`` as a permutation of ``range(size)``; None stays None, and a
+    ``KeyedPermutation`` of that size is passed through"""
+    if key is None or isinstance(key, KeyedPermutation) and key.size == size:
+        return key
+    if isinstance(key, KeyedPermutation):
+        raise ValueError(f"Permutation is of {key.size} positions; the host has {size}")
+    return KeyedPermutation(key, size)
@@ -0,0 +1,498 @@
+"""Scheme definitions: every per-value operation the tools perform, defined once.
+
+A scheme describes one operation on integer inputs of fixed bit width in
+three equivalent forms, so that any backend in ``backends.py`` can run it:
+
+* ``circuit(*values)``: the measured quantum circuit for one set of inputs,
+  with ``decode(measured)`` turning the measured register value into the
+  result;
+* ``logic(plane)``: the same function as bitwise operations on bit planes
+  (``plane(input_index, bit)`` returns the packed plane of one input bit),
+  used by the bit-sliced backend;
+* ``reference(*arrays)``: a vectorised NumPy version.
+
+Every circuit here is deterministic after decoding (the Hadamard gates in
+WaQI only randomise qubits that are decoded away), which is what allows the
+batched backends to simulate each distinct input only once. The intensity
+arithmetic schemes (``AddConstant``, ``Threshold``) need multi-controlled X
+gates, so they are the only ones that are not Clifford circuits.
+
+Register convention: bit ``i`` of a value is encoded on qubit ``i`` and the
+measured bitstring is parsed base 2, so a measured register reads back as
+the integer it holds.
+"""
+import re
+
+import numpy as np
+
+
+class Scheme:
+    """One per-value operation; see the module docstring"""
+
+    name = None
+    input_bits = ()     # width of each input
+    output_bits = 1
+    clifford = True     # whether the circuit only uses Clifford gates
+
+    def circuit(self, *values):
+        raise NotImplementedError
+
+    def decode(self, measured):
+        return measured
+
+    def logic(self, plane):
+        """Output bit planes, least significant first"""
+        raise NotImplementedError
+
+    def reference(self, *arrays):
+        raise NotImplementedError
+
+    def __repr__(self):
+        return f"<scheme {self.name}>"
+
+
+def _registers(x_qubits=2, y_qubits=2, intensity_qubits=8, aux_qubits=1, classical_bits=1):
+    from qiskit import QuantumCircuit, QuantumRegister, ClassicalRegister
+
+    pos_reg = QuantumRegister(x_qubits + y_qubits, 'pos')
+    intensity_reg = QuantumRegister(intensity_qubits, 'intensity')
+    aux_reg = QuantumRegister(aux_qubits, 'aux')
+    classical_reg = ClassicalRegister(classical_bits, 'c')
+    qc = QuantumCircuit(pos_reg, intensity_reg, aux_reg, classical_reg)
+    return qc, intensity_reg, aux_reg, classical_reg
+
+
+def _encode_intensity(qc, intensity_reg, value):
+    # Encode pixel intensity, bit i on qubit i
+    for i in range(len(intensity_reg)):
+        if (int(value) >> i) & 1:
+            qc.x(intensity_reg[i])
+
+
+MAX_LSB_BITS = 4
+
+
+class _LSBScheme(Scheme):
+    # The LSB schemes work on the lowest ``lsb_bits`` bits of each value (k-LSB
+    # mode); with the default of 1 they are the original one-bit circuits
+    base_name = None
+    payload_inputs = False
+
+    def __init__(self, lsb_bits=1):
+        if not 1 <= lsb_bits <= MAX_LSB_BITS:
+            raise ValueError(f"lsb_bits must be in 1..{MAX_LSB_BITS}; got {lsb_bits}")
+        self.lsb_bits = lsb_bits
+        self.name = self.base_name if lsb_bits == 1 else f"{self.base_name}_k{lsb_bits}"
+        self.input_bits = (8, lsb_bits) if self.payload_inputs else (8,)
+        self.output_bits = lsb_bits
+        self.mask = (1 << lsb_bits) - 1
+
+
+class NEQRLSBEmbed(_LSBScheme):
+    """NEQR-LSB embedding: the new LSBs are the host LSBs flipped by the watermark bits"""
+
+    base_name = "neqr_lsb_embed"
+    payload_inputs = True
+
+    def circuit(self, host_pixel, watermark_bits):
+        qc, intensity_reg, aux_reg, classical_reg = _registers(aux_qubits=self.lsb_bits,
+                                                                classical_bits=self.lsb_bits)
+        _encode_intensity(qc, intensity_reg, host_pixel)
+
+        for i in range(self.lsb_bits):
+            # Apply LSB modification based on watermark bit
+            if (int(watermark_bits) >> i) & 1:
+                qc.x(intensity_reg[i])  # Flip LSB if watermark bit is 1
+
+            # Copy LSB to auxiliary qubit and measure it
+            qc.cx(intensity_reg[i], aux_reg[i])
+            qc.measure(aux_reg[i], classical_reg[i])
+        return qc
+
+    def logic(self, plane):
+        return [plane(0, i) ^ plane(1, i) for i in range(self.lsb_bits)]
+
+    def reference(self, pixels, bits):
+        return (pixels & self.mask) ^ (bits & self.mask)
+
+
+class NEQRLSBExtract(_LSBScheme):
+    """Reverse NEQR-LSB: read the LSBs back through the auxiliary qubits"""
+
+    base_name = "neqr_lsb_extract"
+
+    def circuit(self, watermarked_pixel):
+        qc, intensity_reg, aux_reg, classical_reg = _registers(aux_qubits=self.lsb_bits,
+                                                                classical_bits=self.lsb_bits)
+        _encode_intensity(qc, intensity_reg, watermarked_pixel)
+
+        # Apply reverse NEQR operations
+        qc.h(0)  # Hadamard on the (unused) position register
+        for i in range(self.lsb_bits):
+            qc.cx(intensity_reg[i], aux_reg[i])  # Copy LSB to auxiliary qubit
+            qc.cx(aux_reg[i], intensity_reg[i])  # Reverse the LSB modification
+            qc.measure(aux_reg[i], classical_reg[i])
+        return qc
+
+    def logic(self, plane):
+        return [plane(0, i) for i in range(self.lsb_bits)]
+
+    def reference(self, pixels):
+        return pixels & self.mask
+
+
+class WaQIEmbed(_LSBScheme):
+    """WaQI embedding: the new LSBs are the watermark bits (one 3-qubit block per bit)"""
+
+    base_name = "waqi_embed"
+    payload_inputs = True
+
+    def circuit(self, host_pixel, watermark_bits):
+        from qiskit import QuantumCircuit, QuantumRegister, ClassicalRegister
+
+        # Create quantum circuit with 3 qubits per bit for WaQI
+        qr = QuantumRegister(3 * self.lsb_bits, 'q')
+        cr = ClassicalRegister(3 * self.lsb_bits, 'c')
+        circuit = QuantumCircuit(qr, cr)
+
+        for i in range(self.lsb_bits):
+            q = 3 * i
+            # Initialize qubits based on host pixel and watermark bit
+            if (int(host_pixel) >> i) & 1:
+                circuit.x(q)
+            if (int(watermark_bits) >> i) & 1:
+                circuit.x(q + 1)
+
+            # Apply WaQI specific gates
+            circuit.h(q)  # Hadamard gate on first qubit
+            circuit.cx(q, q + 1)  # CNOT between first and second qubit
+            circuit.cx(q + 1, q + 2)  # CNOT between second and third qubit
+        circuit.measure(qr, cr)
+        return circuit
+
+    def decode(self, measured):
+        # XOR of the first two bits of each block
+        return sum((((measured >> 3 * i) ^ (measured >> 3 * i + 1)) & 1) << i for i in range(self.lsb_bits))
+
+    def logic(self, plane):
+        return [plane(1, i) for i in range(self.lsb_bits)]
+
+    def reference(self, pixels, bits):
+        return bits & self.mask
+
+
+class WaQIExtract(_LSBScheme):
+    """Reverse WaQI: recover the watermark bits from the LSBs"""
+
+    base_name = "waqi_extract"
+
+    def circuit(self, pixel_value):
+        from qiskit import QuantumCircuit, QuantumRegister, ClassicalRegister
+
+        # Create quantum circuit with 3 qubits per bit for reverse WaQI
+        qr = QuantumRegister(3 * self.lsb_bits, 'q')
+        cr = ClassicalRegister(3 * self.lsb_bits, 'c')
+        circuit = QuantumCircuit(qr, cr)
+
+        for i in range(self.lsb_bits):
+            q = 3 * i
+            # Initialize first qubit with pixel value
+            if (int(pixel_value) >> i) & 1:
+                circuit.x(q)
+
+            # Apply reverse WaQI gates
+            circuit.cx(q + 1, q + 2)  # Reverse CNOT
+            circuit.cx(q, q + 1)  # Reverse CNOT
+            circuit.h(q)      # Hadamard gate
+        circuit.measure(qr, cr)
+        return circuit
+
+    def decode(self, measured):
+        # Extract the watermark bit of each block
+        return sum(((measured >> 3 * i + 1) & 1) << i for i in range(self.lsb_bits))
+
+    def logic(self, plane):
+        return [plane(0, i) for i in range(self.lsb_bits)]
+
+    def reference(self, pixels):
+        return pixels & self.mask
+
+
+def lsb_schemes(scheme, lsb_bits=1):
+    """``(embed, extract)`` schemes of ``"neqr-lsb"`` or ``"waqi"`` in k-LSB mode"""
+    if lsb_bits == 1:
+        return {"neqr-lsb": (NEQR_LSB_EMBED, NEQR_LSB_EXTRACT), "waqi": (WAQI_EMBED, WAQI_EXTRACT)}[scheme]
+    if scheme == "neqr-lsb":
+        return NEQRLSBEmbed(lsb_bits), NEQRLSBExtract(lsb_bits)
+    return WaQIEmbed(lsb_bits), WaQIExtract(lsb_bits)
+
+
+def pack_payload(bits, lsb_bits, axis=0):
+    """Group 0/1 ``bits`` along ``axis`` into ``lsb_bits``-bit values, the first bit of each group lowest.
+
+    The axis is zero-padded to a multiple of ``lsb_bits`` first.
+    """
+    bits = np.moveaxis(np.asarray(bits, dtype=np.uint8), axis, 0)
+    if lsb_bits == 1:
+        return np.moveaxis(bits & 1, 0, axis)
+    pad = -len(bits) % lsb_bits
+    if pad:
+        bits = np.concatenate((bits, np.zeros((pad,) + bits.shape[1:], dtype=np.uint8)))
+    groups = bits.reshape((-1, lsb_bits) + bits.shape[1:]) & 1
+    values = np.zeros(groups.shape[:1] + groups.shape[2:], dtype=np.uint8)
+    for i in range(lsb_bits):
+        values |= groups[:, i] << i
+    return np.moveaxis(values, 0, axis)
+
+
+def unpack_payload(values, lsb_bits, axis=0):
+    """Inverse of ``pack_payload`` (without removing the padding)"""
+    values = np.moveaxis(np.asarray(values, dtype=np.uint8), axis, 0)
+    if lsb_bits == 1:
+        return np.moveaxis(values & 1, 0, axis)
+    bits = np.stack([(values >> i) & 1 for i in range(lsb_bits)], axis=1)
+    return np.moveaxis(bits.reshape((-1,) + values.shape[1:]), 0, axis)
+
+
+class Negation(Scheme):
+    """NEQR negation of one 8-bit intensity: X on every intensity qubit"""
+
+    name = "negation"
+    input_bits = (8,)
+    output_bits = 8
+
+    def circuit(self, pixel_value):
+        from qiskit import QuantumCircuit, QuantumRegister, ClassicalRegister
+
+        intensity_qubits = 8
+        intensity_reg = QuantumRegister(intensity_qubits, 'intensity')
+        classical_reg = ClassicalRegister(intensity_qubits, 'c')
+        qc = QuantumCircuit(intensity_reg, classical_reg)
+        _encode_intensity(qc, intensity_reg, pixel_value)
+
+        # Negate using X gates
+        for i in range(intensity_qubits):
+            qc.x(intensity_reg[i])
+
+        qc.measure(intensity_reg, classical_reg)
+        return qc
+
+    def logic(self, plane):
+        return [~plane(0, i) for i in range(8)]
+
+    def reference(self, pixels):
+        return 255 - pixels
+
+
+def _add_constant(qc, register, constant):
+    """Add ``constant`` to ``register`` (mod 2**len) with increment cascades.
+
+    Adding 2**i increments the register above qubit ``i``: flip each higher
+    qubit when every qubit from ``i`` up to it is 1 (highest first), then
+    flip qubit ``i``. Only X and multi-controlled X gates, so it is
+    reversible (``2**len - constant`` undoes it).
+    """
+    n = len(register)
+    for i in range(n):
+        if (constant >> i) & 1:
+            for j in range(n - 1, i, -1):
+                qc.mcx(list(register[i:j]), register[j])
+            qc.x(register[i])
+
+
+def _add_constant_planes(plane, bits, constant, index=0):
+    # Ripple-carry adder of a constant over bit planes: (sum planes, carry out)
+    sums, carry = [], None
+    for i in range(bits):
+        a = plane(index, i)
+        if (constant >> i) & 1:
+            sums.append(~a if carry is None else ~(a ^ carry))
+            carry = a if carry is None else a | carry
+        else:
+            sums.append(a if carry is None else a ^ carry)
+            carry = None if carry is None else a & carry
+    return sums, carry
+
+
+class AddConstant(Scheme):
+    """NEQR intensity plus a constant, modulo 256 (subtracting ``c`` is adding ``256 - c``)"""
+
+    input_bits = (8,)
+    output_bits = 8
+    clifford = False
+
+    def __init__(self, constant):
+        self.constant = int(constant) % 256
+        self.name = f"add_{self.constant}"
+
+    def circuit(self, pixel_value):
+        from qiskit import QuantumCircuit, QuantumRegister, ClassicalRegister
+
+        intensity_reg = QuantumRegister(8, 'intensity')
+        classical_reg = ClassicalRegister(8, 'c')
+        qc = QuantumCircuit(intensity_reg, classical_reg)
+        _encode_intensity(qc, intensity_reg, pixel_value)
+        _add_constant(qc, intensity_reg, self.constant)
+        qc.measure(intensity_reg, classical_reg)
+        return qc
+
+    def logic(self, plane):
+        return _add_constant_planes(plane, 8, self.constant)[0]
+
+    def reference(self, pixels):
+        return (pixels.astype(np.uint16) + self.constant) & 255
+
+
+class Threshold(Scheme):
+    """Compare the intensity with ``level``: 255 where it is at least ``level``, else 0.
+
+    The circuit adds ``256 - level`` to the intensity extended by one carry
+    qubit, so the carry holds the comparison, then adds ``level`` back to
+    the low eight qubits to restore the intensity.
+    """
+
+    input_bits = (8,)
+    output_bits = 8
+    clifford = False
+
+    def __init__(self, level):
+        if not 0 <= level <= 256:
+            raise ValueError(f"Threshold level must be in 0..256; got {level}")
+        self.level = int(level)
+        self.name = f"threshold_{self.level}"
+
+    def circuit(self, pixel_value):
+        from qiskit import QuantumCircuit, QuantumRegister, ClassicalRegister
+
+        intensity_reg = QuantumRegister(8, 'intensity')
+        carry_reg = QuantumRegister(1, 'carry')
+        classical_reg = ClassicalRegister(1, 'c')
+        qc = QuantumCircuit(intensity_reg, carry_reg, classical_reg)
+        _encode_intensity(qc, intensity_reg, pixel_value)
+        _add_constant(qc, list(intensity_reg) + list(carry_reg), 256 - self.level)
+        _add_constant(qc, intensity_reg, self.level % 256)
+        qc.measure(carry_reg[0], classical_reg[0])
+        return qc
+
+    def decode(self, measured):
+        return 255 if measured & 1 else 0
+
+    def logic(self, plane):
+        a = plane(0, 0)
+        if self.level == 0:
+            return [a | ~a] * 8
+        _, carry = _add_constant_planes(plane, 8, 256 - self.level)
+        if carry is None:
+            carry = a & ~a
+        return [carry] * 8
+
+    def reference(self, pixels):
+        return np.where(pixels >= self.level, 255, 0)
+
+
+class BitPlane(Scheme):
+    """One bit plane of the intensity, as 0/255: CNOT of intensity qubit ``bit`` onto an ancilla"""
+
+    input_bits = (8,)
+    output_bits = 8
+
+    def __init__(self, bit):
+        if not 0 <= bit < 8:
+            raise ValueError(f"Bit plane must be in 0..7; got {bit}")
+        self.bit = int(bit)
+        self.name = f"bit_plane_{self.bit}"
+
+    def circuit(self, pixel_value):
+        qc, intensity_reg, aux_reg, classical_reg = _registers(x_qubits=0, y_qubits=0)
+        _encode_intensity(qc, intensity_reg, pixel_value)
+        qc.cx(intensity_reg[self.bit], aux_reg[0])
+        qc.measure(aux_reg[0], classical_reg[0])
+        return qc
+
+    def decode(self, measured):
+        return 255 if measured & 1 else 0
+
+    def logic(self, plane):
+        return [plane(0, self.bit)] * 8
+
+    def reference(self, pixels):
+        return ((pixels >> self.bit) & 1) * 255
+
+
+class XorKey(Scheme):
+    """Intensity XOR a key pixel: CNOT from each key qubit onto its intensity qubit"""
+
+    name = "xor_key"
+    input_bits = (8, 8)
+    output_bits = 8
+
+    def circuit(self, pixel_value, key_value):
+        from qiskit import QuantumCircuit, QuantumRegister, ClassicalRegister
+
+        intensity_reg = QuantumRegister(8, 'intensity')
+        key_reg = QuantumRegister(8, 'key')
+        classical_reg = ClassicalRegister(8, 'c')
+        qc = QuantumCircuit(intensity_reg, key_reg, classical_reg)
+        _encode_intensity(qc, intensity_reg, pixel_value)
+        _encode_intensity(qc, key_reg, key_value)
+        for i in range(8):
+            qc.cx(key_reg[i], intensity_reg[i])
+        qc.measure(intensity_reg, classical_reg)
+        return qc
+
+    def logic(self, plane):
+        return [plane(0, i) ^ plane(1, i) for i in range(8)]
+
+    def reference(self, pixels, keys):
+        return pixels ^ keys
+
+
+NEQR_LSB_EMBED = NEQRLSBEmbed()
+NEQR_LSB_EXTRACT = NEQRLSBExtract()
+WAQI_EMBED = WaQIEmbed()
+WAQI_EXTRACT = WaQIExtract()
+NEGATION = Negation()
+
+XOR_KEY = XorKey()
+
+SCHEMES = {s.name: s for s in (NEQR_LSB_EMBED, NEQR_LSB_EXTRACT, WAQI_EMBED, WAQI_EXTRACT, NEGATION,
+                               AddConstant(37), Threshold(128), BitPlane(7), XOR_KEY)}
+# Parameterised schemes, by name prefix (``add_200``, ``threshold_64``, ``bit_plane_0``)
+PARAMETERISED = {"add_": AddConstant, "threshold_": Threshold, "bit_plane_": BitPlane,
+                 "neqr_lsb_embed_k": NEQRLSBEmbed, "neqr_lsb_extract_k": NEQRLSBExtract,
+                 "waqi_embed_k": WaQIEmbed, "waqi_extract_k": WaQIExtract}
+
+
+# Position schemes of ``transforms`` (``rot90_y_3x3``: the y coordinate of rot90 on an 8x8 image)
+POSITION_NAME = re.compile(r"([a-z0-9-]+)_([yx])_(\d+)x(\d+)")
+
+
+def get_scheme(name):
+    """The scheme called ``name``: one of ``SCHEMES``, a parameterised one or a position transform"""
+    if name in SCHEMES:
+        return SCHEMES[name]
+    for prefix, cls in PARAMETERISED.items():
+        if name.startswith(prefix) and name[len(prefix):].isdigit():
+            return cls(int(name[len(prefix):]))
+    position = POSITION_NAME.fullmatch(name)
+    if position:
+        from .transforms import TRANSFORMS, PositionTransform
+
+        transform, axis, n_y, n_x = position.groups()
+        if transform in TRANSFORMS:
+            return PositionTransform(transform, int(n_y), int(n_x), axis)
+    raise ValueError(f"Unknown scheme {name!r}")
+
+
+def exhaustive_inputs(scheme, limit=None, seed=0):
+    """Every combination of input values, one array per input.
+
+    With ``limit``, schemes with more combinations than that get ``limit``
+    of them drawn at random (with a fixed ``seed``) instead.
+    """
+    total = 1 << sum(scheme.input_bits)
+    if limit is not None and total > limit:
+        rng = np.random.default_rng(seed)
+        return [rng.integers(0, 1 << bits, limit, dtype=np.uint16).astype(np.uint8) for bits in scheme.input_bits]
+    grids = np.meshgrid(*[np.arange(1 << bits, dtype=np.uint8) for bits in scheme.input_bits], indexing="ij")
+    return [g.reshape(-1) for g in grids]
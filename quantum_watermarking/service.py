@@ -0,0 +1,538 @@
+"""Watermarking as a local HTTP service: an asyncio front end over a process pool.
+
+    python -m quantum_watermarking serve --port 8765 --processes 2
+
+Uploads are ``multipart/form-data``; every POST queues a job and answers
+``202`` with its id (add ``?wait=1`` to get the result in the same response
+instead)::
+
+    POST   /embed?scheme=waqi         fields host, watermark -> marked PNG
+    POST   /extract?scheme=waqi       field image            -> watermark PNG
+    POST   /negate?mode=grayscale     field image (64x64 text) -> negated text
+    GET    /jobs/<id>                 state and progress as JSON
+    GET    /jobs/<id>/events          progress as server-sent events until the job ends
+    GET    /jobs/<id>/result          the output; 409 while the job is unfinished
+    DELETE /jobs/<id>                 cancel a job that has not started
+    GET    /metrics                   queue depth, counters, p50/p99 latencies
+
+Jobs run in ``processes`` spawned workers, each with its own backend and
+watermark cache; their progress buses report back over a queue. At most
+``max_jobs`` jobs are queued or running, beyond that a POST gets ``503``
+with ``Retry-After``, and bodies over ``max_upload`` bytes get ``413``.
+Identical requests (same operation, parameters and file bytes) are
+coalesced onto one job while it is in flight or retained (the last
+``retain`` finished jobs), so a burst of duplicate uploads costs one run.
+``/metrics`` reports queue wait, run time and end-to-end latency per
+operation (p50/p99 over the last ``LATENCY_WINDOW`` jobs) and the latency
+of the HTTP requests themselves.
+
+The service listens on localhost by default and has no authentication.
+"""
+import asyncio
+import concurrent.futures
+import hashlib
+import http
+import io
+import itertools
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+import urllib.parse
+from collections import OrderedDict, deque, namedtuple
+
+from .diagnostics import get_logger
+
+logger = get_logger("service")
+
+DEFAULT_PORT = 8765
+DEFAULT_MAX_JOBS = 16
+DEFAULT_MAX_UPLOAD = 64 << 20
+DEFAULT_RETAIN = 64
+LATENCY_WINDOW = 1024
+PROGRESS_RATE = 4
+MAX_HEADERS = 100
+TERMINAL = ("done", "failed", "cancelled")
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+Request = namedtuple("Request", "method path query headers body")
+
+
+# --- Worker side ---
+
+_progress_queue = None
+
+
+def _init_worker(progress_queue):
+    global _progress_queue
+    _progress_queue = progress_queue
+
+
+def _image(data):
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(data))
+    image.load()
+    return image
+
+
+def _png(array):
+    from PIL import Image
+
+    out = io.BytesIO()
+    Image.fromarray(array).save(out, format="PNG")
+    return out.getvalue()
+
+
+def _embed(params, files, backend, bus):
+    import numpy as np
+
+    from .watermark_cache import default_cache
+
+    scheme = params.get("scheme", "neqr-lsb")
+    host = _image(files["host"])
+    prepared = default_cache().get(_image(files["watermark"]), host.size, scheme)
+    if scheme == "neqr-lsb":
+        from .neqr_lsb import embed_watermark
+    else:
+        from .waqi import embed_watermark
+    return "image/png", _png(embed_watermark(np.array(host), prepared, backend, bus))
+
+
+def _extract(params, files, backend, bus):
+    import numpy as np
+
+    watermarked_array = np.array(_image(files["image"]))
+    if params.get("scheme", "neqr-lsb") == "neqr-lsb":
+        from . import neqr_lsb
+        watermark, _ = neqr_lsb.extract_watermark(watermarked_array, bus, backend or "numpy")
+    else:
+        from . import waqi
+        watermark, _ = waqi.extract_watermark(watermarked_array, backend, bus)
+    return "image/png", _png(watermark)
+
+
+def _negate(params, files, backend, bus):
+    from . import negation
+
+    binary = params.get("mode", "grayscale") == "binary"
+    # The text readers and writer take paths
+    with tempfile.TemporaryDirectory() as workdir:
+        source = os.path.join(workdir, "input.txt")
+        with open(source, "wb") as fh:
+            fh.write(files["image"])
+        input_array = negation.ascii_art_to_array(source) if binary else negation.grayscale_text_to_array(source)
+        output = os.path.join(workdir, "output.txt")
+        negation.array_to_text(negation.negate_image(input_array, backend, binary=binary, progress=bus), output)
+        with open(output, "rb") as fh:
+            return "text/plain", fh.read()
+
+
+# operation -> (worker function, required upload fields, allowed parameter values)
+OPERATIONS = {
+    "embed": (_embed, ("host", "watermark"), {"scheme": ("neqr-lsb", "waqi")}),
+    "extract": (_extract, ("image",), {"scheme": ("neqr-lsb", "waqi")}),
+    "negate": (_negate, ("image",), {"mode": ("grayscale", "binary")}),
+}
+
+
+def run_job(job_id, operation, params, files, backend):
+    """Run one job in a worker process.
+
+    Returns ``(content_type, body, started, finished)``, the times by the
+    wall clock (the only one the parent can compare against).
+    """
+    from .progress import ProgressBus
+
+    started = time.time()
+    bus = ProgressBus(max_rate=PROGRESS_RATE)
+    if _progress_queue is not None:
+        _progress_queue.put((job_id, "started", 0, 0))
+        bus.subscribe(lambda update: _progress_queue.put((job_id, "progress", update.done, update.total)))
+    content_type, body = OPERATIONS[operation][0](params, files, backend, bus)
+    return content_type, body, started, time.time()
+
+
+# --- Front end ---
+
+class LatencyWindow:
+    """p50/p99 over the last ``size`` samples"""
+
+    def __init__(self, size=LATENCY_WINDOW):
+        self.samples = deque(maxlen=size)
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+
+    def percentile(self, p):
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+    def stats(self):
+        return {"count": len(self.samples), "p50_ms": round(self.percentile(50) * 1e3, 2),
+                "p99_ms": round(self.percentile(99) * 1e3, 2)}
+
+
+class Job:
+    """One queued computation, shared by every request coalesced onto it"""
+
+    def __init__(self, job_id, operation, params, key):
+        self.id = job_id
+        self.operation = operation
+        self.params = params
+        self.key = key
+        self.state = "queued"
+        self.done = 0
+        self.total = 0
+        self.error = None
+        self.result = None
+        self.requests = 1
+        self.submitted = time.perf_counter()
+        self.submitted_wall = time.time()
+        self.finished = None
+        self.future = None
+        self._changed = asyncio.Event()
+
+    def notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def changed(self):
+        await self._changed.wait()
+
+    def status(self):
+        return {"id": self.id, "operation": self.operation, "params": self.params, "state": self.state,
+                "done": self.done, "total": self.total, "requests": self.requests, "error": self.error}
+
+
+class Service:
+    """Job table, process pool and HTTP routing; see the module docstring"""
+
+    def __init__(self, processes=1, max_jobs=DEFAULT_MAX_JOBS, max_upload=DEFAULT_MAX_UPLOAD,
+                 retain=DEFAULT_RETAIN, backend=None, coalesce=True):
+        self.processes = processes
+        self.max_jobs = max_jobs
+        self.max_upload = max_upload
+        self.retain = retain
+        self.backend = backend
+        self.coalesce = coalesce
+        self._jobs = OrderedDict()
+        self._by_key = {}
+        self._ids = itertools.count(1)
+        self._pool = None
+        self._progress = None
+        self._drain = None
+        self._loop = None
+        self.counters = dict.fromkeys(("submitted", "coalesced", "rejected", "done", "failed", "cancelled"), 0)
+        self.latency = {}
+        self.http_latency = LatencyWindow()
+
+    # Lifecycle
+
+    def start(self):
+        """Start the workers; call from the event loop that will serve requests"""
+        self._loop = asyncio.get_running_loop()
+        context = multiprocessing.get_context("spawn")
+        self._progress = context.Queue()
+        self._pool = concurrent.futures.ProcessPoolExecutor(
+            self.processes, mp_context=context, initializer=_init_worker, initargs=(self._progress,))
+        self._drain = threading.Thread(target=self._drain_progress, name="qwm-service-progress", daemon=True)
+        self._drain.start()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._progress.put(None)
+            self._drain.join()
+            self._pool = None
+
+    def _drain_progress(self):
+        # Worker progress arrives on a multiprocessing queue; hand it to the loop
+        while True:
+            message = self._progress.get()
+            if message is None:
+                return
+            try:
+                self._loop.call_soon_threadsafe(self._on_progress, *message)
+            except RuntimeError:
+                return  # loop closed
+
+    def _on_progress(self, job_id, kind, done, total):
+        job = self._jobs.get(job_id)
+        if job is None or job.state in TERMINAL:
+            return
+        if kind == "started":
+            job.state = "running"
+        else:
+            job.done, job.total = done, total
+        job.notify()
+
+    # Jobs
+
+    def _key(self, operation, params, files):
+        h = hashlib.sha256(operation.encode())
+        for name, value in sorted(params.items()):
+            h.update(f"\0{name}={value}".encode())
+        for name in sorted(files):
+            h.update(f"\0{name}:{len(files[name])}\0".encode())
+            h.update(files[name])
+        return h.hexdigest()
+
+    def in_flight(self):
+        return sum(job.state not in TERMINAL for job in self._jobs.values())
+
+    def submit(self, operation, params, files):
+        """The job for this request: an existing identical one, or a new one"""
+        key = self._key(operation, params, files)
+        job = self._by_key.get(key) if self.coalesce else None
+        if job is not None and job.state not in ("failed", "cancelled"):
+            job.requests += 1
+            self.counters["coalesced"] += 1
+            return job
+        if self.in_flight() >= self.max_jobs:
+            self.counters["rejected"] += 1
+            raise HTTPError(503, f"{self.max_jobs} jobs already queued or running", {"Retry-After": "1"})
+        job = Job(str(next(self._ids)), operation, params, key)
+        self._jobs[job.id] = job
+        self._by_key[key] = job
+        self.counters["submitted"] += 1
+        job.future = self._pool.submit(run_job, job.id, operation, params, files, self.backend)
+        asyncio.wrap_future(job.future).add_done_callback(lambda _: self._finish(job))
+        self._evict()
+        return job
+
+    def _finish(self, job):
+        job.finished = time.perf_counter()
+        if job.future.cancelled():
+            job.state = "cancelled"
+        elif job.future.exception() is not None:
+            job.state = "failed"
+            job.error = str(job.future.exception())
+            logger.warning("Job %s (%s) failed: %s", job.id, job.operation, job.error)
+        else:
+            job.state = "done"
+            content_type, body, started, finished = job.future.result()
+            job.result = content_type, body
+            job.done = job.total
+            latency = self.latency.setdefault(job.operation, {"queue": LatencyWindow(), "run": LatencyWindow(),
+                                                              "total": LatencyWindow()})
+            latency["queue"].add(max(0.0, started - job.submitted_wall))
+            latency["run"].add(finished - started)
+            latency["total"].add(job.finished - job.submitted)
+        self.counters[job.state] += 1
+        job.future = None
+        job.notify()
+        self._evict()
+
+    def _evict(self):
+        # Keep every unfinished job and the last ``retain`` finished ones
+        finished = [job for job in self._jobs.values() if job.state in TERMINAL]
+        for job in finished[:max(0, len(finished) - self.retain)]:
+            del self._jobs[job.id]
+            if self._by_key.get(job.key) is job:
+                del self._by_key[job.key]
+
+    def cancel(self, job):
+        if job.state in TERMINAL:
+            return
+        if job.future is None or not job.future.cancel():
+            raise HTTPError(409, f"Job {job.id} is already running")
+
+    def metrics(self):
+        return {
+            "queued": sum(job.state == "queued" for job in self._jobs.values()),
+            "running": sum(job.state == "running" for job in self._jobs.values()),
+            "retained": len(self._jobs),
+            "processes": self.processes,
+            "max_jobs": self.max_jobs,
+            "counters": dict(self.counters),
+            "latency": {operation: {name: window.stats() for name, window in windows.items()}
+                        for operation, windows in self.latency.items()},
+            "http": self.http_latency.stats(),
+        }
+
+    # HTTP
+
+    async def handle(self, reader, writer):
+        """``asyncio.start_server`` callback: serves one keep-alive connection"""
+        try:
+            while True:
+                try:
+                    request = await _read_request(reader, self.max_upload)
+                except HTTPError as e:
+                    await _respond(writer, e.status, _json({"error": str(e)}), "application/json", e.headers,
+                                   keep_alive=False)
+                    return
+                if request is None:
+                    return
+                start = time.perf_counter()
+                keep_alive = request.headers.get("connection", "").lower() != "close"
+                try:
+                    response = await self.route(request, writer)
+                except HTTPError as e:
+                    response = e.status, _json({"error": str(e)}), "application/json", e.headers
+                except Exception as e:
+                    logger.exception("Error handling %s %s", request.method, request.path)
+                    response = 500, _json({"error": str(e)}), "application/json", {}
+                if response is None:
+                    return  # streamed; the stream closed the connection
+                await _respond(writer, *response, keep_alive=keep_alive)
+                self.http_latency.add(time.perf_counter() - start)
+                if not keep_alive:
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def route(self, request, writer):
+        """``(status, body, content_type, headers)``, or None once a stream has been written"""
+        parts = [part for part in request.path.split("/") if part]
+        if request.method == "POST" and len(parts) == 1 and parts[0] in OPERATIONS:
+            return await self._post(parts[0], request)
+        if request.method == "GET" and parts == ["metrics"]:
+            return 200, _json(self.metrics()), "application/json", {}
+        if len(parts) >= 2 and parts[0] == "jobs":
+            job = self._jobs.get(parts[1])
+            if job is None:
+                raise HTTPError(404, f"No job {parts[1]}")
+            if request.method == "GET" and len(parts) == 2:
+                return 200, _json(job.status()), "application/json", {}
+            if request.method == "GET" and parts[2:] == ["result"]:
+                return _result(job)
+            if request.method == "GET" and parts[2:] == ["events"]:
+                await self._events(job, writer)
+                return None
+            if request.method == "DELETE" and len(parts) == 2:
+                self.cancel(job)
+                return 200, _json(job.status()), "application/json", {}
+        raise HTTPError(404, f"No route for {request.method} {request.path}")
+
+    async def _post(self, operation, request):
+        _, fields, allowed = OPERATIONS[operation]
+        params = {}
+        for name, choices in allowed.items():
+            value = request.query.get(name, choices[0])
+            if value not in choices:
+                raise HTTPError(400, f"{name} must be one of {', '.join(choices)}")
+            params[name] = value
+        files = parse_form(request.headers.get("content-type", ""), request.body)
+        missing = [name for name in fields if name not in files]
+        if missing:
+            raise HTTPError(400, f"Missing upload field(s): {', '.join(missing)}")
+        job = self.submit(operation, params, {name: files[name] for name in fields})
+        if request.query.get("wait") in ("1", "true"):
+            while job.state not in TERMINAL:
+                await job.changed()
+            return _result(job)
+        return 202, _json(job.status()), "application/json", {"Location": f"/jobs/{job.id}"}
+
+    async def _events(self, job, writer):
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n"
+                     b"Connection: close\r\n\r\n")
+        while True:
+            writer.write(b"data: " + _json(job.status()) + b"\n\n")
+            await writer.drain()
+            if job.state in TERMINAL:
+                return
+            await job.changed()
+
+
+def _json(value):
+    return json.dumps(value).encode()
+
+
+def _result(job):
+    if job.state == "done":
+        content_type, body = job.result
+        return 200, body, content_type, {}
+    if job.state in ("failed", "cancelled"):
+        raise HTTPError(422 if job.state == "failed" else 410, job.error or f"Job {job.id} was {job.state}")
+    raise HTTPError(409, f"Job {job.id} is {job.state}")
+
+
+def parse_form(content_type, body):
+    """``{field name: bytes}`` of a multipart/form-data body"""
+    import email.parser
+    import email.policy
+
+    if not content_type.startswith("multipart/form-data"):
+        raise HTTPError(415, "Uploads must be multipart/form-data")
+    message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+        b"Content-Type: " + content_type.encode("latin-1") + b"\r\n\r\n" + body)
+    if not message.is_multipart():
+        raise HTTPError(400, "Malformed multipart body")
+    files = {}
+    for part in message.iter_parts():
+        name = part.get_param("name", header="content-disposition")
+        if name:
+            files[name] = part.get_payload(decode=True) or b""
+    return files
+
+
+async def _read_request(reader, max_upload):
+    line = await reader.readline()
+    if not line.strip():
+        return None
+    try:
+        method, target, _ = line.decode("latin-1").split()
+    except ValueError:
+        raise HTTPError(400, "Malformed request line") from None
+    headers = {}
+    for _ in range(MAX_HEADERS):
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    else:
+        raise HTTPError(431, "Too many headers")
+    if "chunked" in headers.get("transfer-encoding", ""):
+        raise HTTPError(411, "Send a Content-Length")
+    try:
+        length = int(headers.get("content-length") or 0)
+    except ValueError:
+        length = -1
+    if length < 0:
+        raise HTTPError(400, "Bad Content-Length")
+    if length > max_upload:
+        raise HTTPError(413, f"Upload of {length} bytes is over the {max_upload} byte limit")
+    body = await reader.readexactly(length) if length else b""
+    url = urllib.parse.urlsplit(target)
+    query = dict(urllib.parse.parse_qsl(url.query))
+    return Request(method.upper(), url.path, query, headers, body)
+
+
+async def _respond(writer, status, body, content_type, headers, keep_alive=True):
+    lines = [f"HTTP/1.1 {status} {http.HTTPStatus(status).phrase}", f"Content-Type: {content_type}",
+             f"Content-Length: {len(body)}", f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+    lines += [f"{name}: {value}" for name, value in headers.items()]
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+    await writer.drain()
+
+
+async def serve(service, host="127.0.0.1", port=DEFAULT_PORT, started=None):
+    """Serve until cancelled; ``started(port)`` is called once listening"""
+    service.start()
+    server = await asyncio.start_server(service.handle, host, port)
+    try:
+        bound = server.sockets[0].getsockname()[1]
+        logger.info("Serving on http://%s:%d (%d processes, at most %d jobs)", host, bound, service.processes,
+                    service.max_jobs)
+        if started is not None:
+            started(bound)
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
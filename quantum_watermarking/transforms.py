@@ -0,0 +1,164 @@
+"""Geometric NEQR transforms: rotations, flips and transpose.
+
+In NEQR a 2^n x 2^n image is ``sum |c(y, x)> |y> |x>`` and every one of
+these transforms only permutes the position register, leaving the
+intensities alone (``y`` on the upper ``n`` position qubits, ``x`` on the
+lower ones, bit ``i`` on qubit ``i`` of each)::
+
+    flip-v     y' = ~y             X on every y qubit
+    flip-h     x' = ~x             X on every x qubit
+    transpose  (y', x') = (x, y)   SWAP y_i, x_i
+    rot90      (y', x') = (~x, y)  SWAP, then X on y (counter-clockwise, as ``np.rot90``)
+    rot180     (y', x') = (~y, ~x) X on every position qubit
+    rot270     (y', x') = (x, ~y)  X on y, then SWAP
+
+``position_schemes(name, n_y, n_x)`` gives the transform as a pair of
+schemes (one per output coordinate) that any backend can run over every
+position; ``apply_circuit`` moves the pixels to where they say. The fast
+path, ``view``, is the same permutation as a zero-copy NumPy strided view,
+works on any size and on colour images, and composes::
+
+    rotated = view(image, "rot90", "flip-h")      # no pixels copied
+    negated = negation.negate_image(rotated)      # read through the view, in one pass
+
+The two paths are checked against each other on the bundled text images by
+``benchmarks/bench_transforms.py``.
+"""
+import numpy as np
+
+from .schemes import Scheme
+
+# name -> (swap the registers first, X on y after, X on x after)
+TRANSFORMS = {
+    "flip-v": (False, True, False),
+    "flip-h": (False, False, True),
+    "transpose": (True, False, False),
+    "rot90": (True, True, False),
+    "rot180": (False, True, True),
+    "rot270": (True, False, True),
+}
+MAX_AXIS_BITS = 8  # the backends return 8-bit results
+
+
+def _check(name):
+    if name not in TRANSFORMS:
+        raise ValueError(f"Unknown transform {name!r}; choose from {', '.join(TRANSFORMS)}")
+
+
+# --- Fast path ---
+
+def view(array, *names):
+    """``array`` with the transforms applied in order, as a strided view (no copy)"""
+    for name in names:
+        _check(name)
+        swap, flip_y, flip_x = TRANSFORMS[name]
+        if swap:
+            array = array.swapaxes(0, 1)
+        if flip_y:
+            array = array[::-1]
+        if flip_x:
+            array = array[:, ::-1]
+    return array
+
+
+# --- Circuit path ---
+
+class PositionTransform(Scheme):
+    """One output coordinate of a transform, as a circuit on the NEQR position register"""
+
+    def __init__(self, transform, n_y, n_x, axis):
+        _check(transform)
+        self.transform = transform
+        self.n_y = n_y
+        self.n_x = n_x
+        self.axis = axis
+        self.name = f"{transform}_{axis}_{n_y}x{n_x}"
+        self.input_bits = (n_y, n_x)
+        self.output_bits = n_y if axis == "y" else n_x
+
+    def circuit(self, y, x):
+        from qiskit import ClassicalRegister, QuantumCircuit, QuantumRegister
+
+        n_y, n_x = self.n_y, self.n_x
+        pos_reg = QuantumRegister(n_y + n_x, 'pos')
+        classical_reg = ClassicalRegister(self.output_bits, 'c')
+        qc = QuantumCircuit(pos_reg, classical_reg)
+        # Encode the position: x on qubits 0..n_x-1, y above it
+        for i in range(n_x):
+            if (int(x) >> i) & 1:
+                qc.x(pos_reg[i])
+        for i in range(n_y):
+            if (int(y) >> i) & 1:
+                qc.x(pos_reg[n_x + i])
+
+        swap, flip_y, flip_x = TRANSFORMS[self.transform]
+        if swap:
+            for i in range(n_x):
+                qc.swap(pos_reg[i], pos_reg[n_x + i])
+        if flip_y:
+            for i in range(n_y):
+                qc.x(pos_reg[n_x + i])
+        if flip_x:
+            for i in range(n_x):
+                qc.x(pos_reg[i])
+
+        if self.axis == "y":
+            qc.measure(pos_reg[n_x:], classical_reg)
+        else:
+            qc.measure(pos_reg[:n_x], classical_reg)
+        return qc
+
+    def _sources(self):
+        # (input index, inverted) for each output bit
+        swap, flip_y, flip_x = TRANSFORMS[self.transform]
+        source = (1 if swap else 0) if self.axis == "y" else (0 if swap else 1)
+        invert = flip_y if self.axis == "y" else flip_x
+        return source, invert
+
+    def logic(self, plane):
+        source, invert = self._sources()
+        return [~plane(source, i) if invert else plane(source, i) for i in range(self.output_bits)]
+
+    def reference(self, ys, xs):
+        source, invert = self._sources()
+        values = (ys, xs)[source]
+        return values ^ ((1 << self.output_bits) - 1) if invert else values
+
+
+def _axis_bits(size):
+    bits = max(size - 1, 0).bit_length()
+    if size != 1 << bits:
+        raise ValueError(f"NEQR needs power-of-two sides; got {size}")
+    if bits > MAX_AXIS_BITS:
+        raise ValueError(f"Sides over {1 << MAX_AXIS_BITS} are not supported by the circuit path; got {size}")
+    return bits
+
+
+def position_schemes(name, n_y, n_x):
+    """``(y scheme, x scheme)`` for a 2^n_y x 2^n_x image"""
+    _check(name)
+    if TRANSFORMS[name][0] and n_y != n_x:
+        raise ValueError(f"{name} swaps the position registers, so it needs a square image")
+    return PositionTransform(name, n_y, n_x, "y"), PositionTransform(name, n_y, n_x, "x")
+
+
+def destinations(shape, name, backend=None):
+    """Where each pixel of an image of ``shape`` goes: ``(y', x')`` arrays from the circuits"""
+    from .backends import get_backend
+
+    backend = get_backend(backend)
+    n_y, n_x = _axis_bits(shape[0]), _axis_bits(shape[1])
+    y_scheme, x_scheme = position_schemes(name, n_y, n_x)
+    ys, xs = np.indices(shape[:2])
+    return backend.run(y_scheme, ys, xs).astype(np.intp), backend.run(x_scheme, ys, xs).astype(np.intp)
+
+
+def apply_circuit(array, *names, backend=None):
+    """``array`` with the transforms applied in order, each by running its position circuits"""
+    for name in names:
+        new_y, new_x = destinations(array.shape, name, backend)
+        out_shape = (array.shape[1], array.shape[0]) + array.shape[2:] if TRANSFORMS[name][0] else array.shape
+        out = np.empty(out_shape, dtype=array.dtype)
+        out[new_y, new_x] = array
+        array = out
+    return array
@@ -0,0 +1,364 @@
+"""WaQI watermark embedding and extraction.
+
+The loops behind ``waqi_watermarking.py`` and ``watermark_extractor.py``.
+The per-value operations are ``schemes.WAQI_EMBED`` / ``WAQI_EXTRACT``, run
+by whichever backend is passed in (see ``backends.py``).
+
+With ``lsb_bits`` = k > 1 (k-LSB mode, up to ``schemes.MAX_LSB_BITS``)
+each host value carries the next k bits of the flat watermark stream, the
+first in its LSB, so the watermark needs 1/k as many host values.
+
+With a ``key`` the payload values are scattered over the whole host
+instead: value ``i`` goes to flat position ``perm.forward(i)`` of a
+``scatter.KeyedPermutation`` of the host's values, generated chunk by
+chunk. Extraction needs the same key.
+
+With ``ecc`` (a code from ``ecc.CODES``) the watermark bits are embedded as
+codewords, so flipped LSBs are corrected on extraction; the extractor must
+be given the same code.
+
+``load_watermark(..., compress=True)`` gives the compressed payload of
+``payload.py`` instead (binarised and run-length coded behind a header
+with its shape and length), usually far fewer bits than the 8 per
+watermark pixel of the plain one; ``extract_compressed`` reads it back.
+"""
+import numpy as np
+from PIL import Image
+
+from .backends import get_backend
+from .diagnostics import get_logger, log_matrix
+from .ecc import as_code
+from .instrumentation import count, stage
+from .payload import HEADER_BITS, PayloadError, decompress, payload_length, read_header
+from .progress import as_bus, chunks
+from .scatter import as_permutation
+from .schemes import lsb_schemes, pack_payload, unpack_payload
+
+logger = get_logger("waqi")
+
+
+class CapacityError(ValueError):
+    """The host image has fewer LSBs than the watermark has bits"""
+
+
+def payload_values(total_bits, lsb_bits=1):
+    """Host values, in flat order, that carry ``total_bits`` watermark bits"""
+    return -(-total_bits // lsb_bits)
+
+
+def coded_bits(total_bits, ecc=None):
+    """Bits embedded for ``total_bits`` watermark bits with the code ``ecc``"""
+    code = as_code(ecc)
+    return total_bits if code is None else code.encoded_length(total_bits)
+
+
+def load_watermark(watermark_image, host_size, compress=False):
+    """Grayscale the watermark, resize it to a quarter of the host and unpack it to bits.
+
+    With ``compress`` it is binarised and compressed instead (``payload.compress``).
+    """
+    with stage("watermark_resize"):
+        if isinstance(watermark_image, str):
+            watermark_image = Image.open(watermark_image)
+        if compress:
+            from .payload import binarise, compress as compress_payload
+            return compress_payload(binarise(watermark_image, (host_size[0] // 4, host_size[1] // 4)))
+        # Convert watermark to binary
+        watermark_img = watermark_image.convert('L')
+
+        # Calculate appropriate watermark size (1/4 of each host dimension)
+        watermark_width = host_size[0] // 4
+        watermark_height = host_size[1] // 4
+
+        # Resize watermark
+        watermark_img = watermark_img.resize((watermark_width, watermark_height))
+        watermark_array = np.array(watermark_img)
+        return np.unpackbits(watermark_array)
+
+
+def _positions(perm, start, end):
+    # Flat host positions of payload values start..end
+    if perm is None:
+        return slice(start, end)
+    return perm.forward(np.arange(start, end))
+
+
+def embed_watermark(host_array, watermark_binary, backend=None, progress=None, chunk_size=None, checkpoint=None,
+                    lsb_bits=1, key=None, ecc=None):
+    """Embed ``lsb_bits`` watermark bits per host value, in flat order (or scattered by ``key``).
+
+    With ``ecc`` (an ``ecc.CODES`` name or ``ecc.Code``) the bits are encoded by
+    that code first. Raises ``CapacityError`` if the host is too small.
+    ``backend`` is a backend name or instance (default: ``get_backend()``).
+    ``progress`` and ``chunk_size`` (in values) are as for
+    ``progress.as_bus``. With a ``checkpoint.Checkpoint`` the output is built
+    in its memory map and the run resumes from its last flush.
+    """
+    backend = get_backend(backend)
+    embed_scheme, _ = lsb_schemes("waqi", lsb_bits)
+    keep = np.uint8(255 ^ embed_scheme.mask)
+    log_matrix(logger, host_array, "Original Image Matrix Values")
+    code = as_code(ecc)
+    if code is not None:
+        watermark_binary = code.encode(watermark_binary)
+        logger.debug("%s: %d coded bits", code.name, watermark_binary.size)
+
+    # Calculate total bits needed
+    total_bits_needed = watermark_binary.size
+    total_bits_available = host_array.size * lsb_bits
+
+    if total_bits_available < total_bits_needed:
+        raise CapacityError(f"Host image is too small for the watermark.\n"
+                            f"Required bits: {total_bits_needed}\n"
+                            f"Available bits: {total_bits_available}")
+
+    # Create output array
+    done = 0
+    if checkpoint is not None:
+        watermarked_array, done = checkpoint.start(host_array)
+    else:
+        # C order, so the flat view below writes into it (a transformed view would not)
+        watermarked_array = np.copy(host_array, order="C")
+    host_flat = host_array.reshape(-1)
+    watermarked_flat = watermarked_array.reshape(-1)
+    payload = pack_payload(watermark_binary.reshape(-1), lsb_bits)
+    total_values = len(payload)
+    perm = as_permutation(key, host_array.size)
+
+    # Process in chunks for better performance
+    bus = as_bus(progress)
+    bus.start(total_values, done)
+    quarter = 4 * done // max(total_values, 1)
+
+    logger.info("\nEmbedding watermark...")
+    for start_idx, end_idx in chunks(total_values, chunk_size, done):
+        positions = _positions(perm, start_idx, end_idx)
+        pixel_values = host_flat[positions]
+        new_lsb = backend.run(embed_scheme, pixel_values, payload[start_idx:end_idx])
+        watermarked_flat[positions] = (pixel_values & keep) | new_lsb
+        if checkpoint is not None:
+            checkpoint.update(end_idx)
+            if bus.cancelled:
+                # Stopping after this chunk: record it so a later run resumes here
+                checkpoint.suspend()
+
+        # Update progress
+        count("pixels", end_idx - start_idx)
+        bus.advance(end_idx - start_idx)
+
+        # Display intermediate matrix values every 25% progress
+        if 4 * end_idx // total_values > quarter:
+            quarter = 4 * end_idx // total_values
+            log_matrix(logger, watermarked_array, "Watermarked Image Matrix Values (Progress: %.0f%%)", 25 * quarter)
+    bus.finish()
+
+    if checkpoint is not None:
+        watermarked_array = checkpoint.finish()
+
+    # Display final watermarked matrix
+    log_matrix(logger, watermarked_array, "Final Watermarked Image Matrix Values")
+    return watermarked_array
+
+
+def _read_bits(watermarked_flat, original_flat, out, backend, extract_scheme, progress, chunk_size, perm):
+    # Fill ``out`` with the payload bits in order, clearing them in ``original_flat``
+    lsb_bits = extract_scheme.lsb_bits
+    keep = np.uint8(255 ^ extract_scheme.mask)
+    total_values = payload_values(len(out), lsb_bits)
+    bus = as_bus(progress)
+    bus.start(total_values)
+    quarter = 0
+
+    # Process in chunks for better performance
+    logger.info("\nExtracting watermark...")
+    for start_idx, end_idx in chunks(total_values, chunk_size):
+        positions = _positions(perm, start_idx, end_idx)
+        values = watermarked_flat[positions]
+        bits = unpack_payload(backend.run(extract_scheme, values), lsb_bits)
+        original_flat[positions] = values & keep  # Clear LSBs
+        out[start_idx * lsb_bits:end_idx * lsb_bits] = bits[:len(out) - start_idx * lsb_bits]
+
+        # Update progress
+        count("pixels", end_idx - start_idx)
+        bus.advance(end_idx - start_idx)
+
+        # Display intermediate matrix values every 25% progress
+        if 4 * end_idx // total_values > quarter:
+            quarter = 4 * end_idx // total_values
+            logger.info("\nExtraction Progress: %.0f%%", 25 * quarter)
+    bus.finish()
+
+
+def extract_watermark(watermarked_array, backend=None, progress=None, chunk_size=None, lsb_bits=1, key=None,
+                      ecc=None):
+    """Recover the first quarter-by-quarter watermark bits, ``lsb_bits`` per value.
+
+    ``progress``, ``chunk_size``, ``key`` and ``ecc`` are as for ``embed_watermark``.
+    Returns ``(watermark_image, original_array)``: the bits as a 0/255 image
+    of a quarter of the host size, and the host with those LSBs cleared.
+    """
+    backend = get_backend(backend)
+    _, extract_scheme = lsb_schemes("waqi", lsb_bits)
+    log_matrix(logger, watermarked_array, "Initial Watermarked Image Matrix")
+
+    # Calculate watermark size (1/4 of each watermarked image dimension)
+    watermark_width = watermarked_array.shape[1] // 4
+    watermark_height = watermarked_array.shape[0] // 4
+
+    # Create array for extracted watermark (coded, with ecc), and the original to reconstruct
+    total_bits = watermark_width * watermark_height  # 1 bit per pixel
+    embedded_bits = coded_bits(total_bits, ecc)
+    watermark_bits = np.zeros(embedded_bits, dtype=np.uint8)
+    watermarked_flat = watermarked_array.reshape(-1)
+    original_array = np.copy(watermarked_array, order="C")
+    original_flat = original_array.reshape(-1)
+
+    _read_bits(watermarked_flat, original_flat, watermark_bits, backend, extract_scheme, progress, chunk_size,
+               as_permutation(key, watermarked_array.size))
+    if ecc is not None:
+        watermark_bits = as_code(ecc).decode(watermark_bits, total_bits)
+
+    # Convert bits to image (binary)
+    watermark_image = (watermark_bits.reshape((watermark_height, watermark_width)) * 255).astype(np.uint8)
+    log_matrix(logger, watermark_image, "Extracted Watermark Matrix")
+
+    log_matrix(logger, original_array, "Reconstructed Original Image Matrix")
+    return watermark_image, original_array
+
+
+def extract_compressed(watermarked_array, backend=None, progress=None, chunk_size=None, lsb_bits=1, key=None,
+                       ecc=None):
+    """Recover a compressed payload (``load_watermark(..., compress=True)``).
+
+    Reads the header first, then only as many bits as it says the payload
+    has. Returns ``(watermark_image, original_array)`` as ``extract_watermark``
+    does, the image (0/255) at the size recorded in the header. Raises
+    ``payload.PayloadError`` if the host does not carry a compressed payload.
+    """
+    backend = get_backend(backend)
+    _, extract_scheme = lsb_schemes("waqi", lsb_bits)
+    code = as_code(ecc)
+    watermarked_flat = watermarked_array.reshape(-1)
+    perm = as_permutation(key, watermarked_array.size)
+
+    # The header gives the payload's length
+    header_bits = coded_bits(HEADER_BITS, code)
+    values = min(payload_values(header_bits, lsb_bits), watermarked_flat.size)
+    positions = _positions(perm, 0, values)
+    bits = unpack_payload(backend.run(extract_scheme, watermarked_flat[positions]), lsb_bits)[:header_bits]
+    if code is not None:
+        bits = code.decode(bits, HEADER_BITS)
+    total_bits = payload_length(read_header(bits))
+    embedded_bits = coded_bits(total_bits, code)
+    if payload_values(embedded_bits, lsb_bits) > watermarked_flat.size:
+        raise PayloadError(f"The header gives {embedded_bits} bits, more than the host holds")
+
+    payload_bits = np.zeros(embedded_bits, dtype=np.uint8)
+    original_array = np.copy(watermarked_array, order="C")
+    _read_bits(watermarked_flat, original_array.reshape(-1), payload_bits, backend, extract_scheme, progress,
+               chunk_size, perm)
+    if code is not None:
+        payload_bits = code.decode(payload_bits, total_bits)
+    watermark_image = decompress(payload_bits) * np.uint8(255)
+    log_matrix(logger, watermark_image, "Extracted Watermark Matrix")
+
+    log_matrix(logger, original_array, "Reconstructed Original Image Matrix")
+    return watermark_image, original_array
+
+
+def extract_strips(watermarked_array, strip_rows=64, backend=None, progress=None, lsb_bits=1, key=None, ecc=None):
+    """Streaming form of ``extract_watermark`` for images too large to copy.
+
+    ``progress``, ``lsb_bits``, ``key`` and ``ecc`` are as for ``embed_watermark``.
+    Yields ``(original_rows, watermark_rows)`` for each strip of
+    ``strip_rows`` host rows: the reconstructed original rows and the
+    watermark image rows (0/255) completed by them. Only one strip is held
+    at a time, so ``watermarked_array`` may be a memory map. A scattered
+    watermark is only complete after the last strip, so with a ``key`` all
+    its rows come with that one (the bits are collected as the strips go,
+    through ``perm.inverse`` of each strip's positions). With ``ecc`` each
+    codeword is decoded as soon as its strip has been read.
+    """
+    backend = get_backend(backend)
+    _, extract_scheme = lsb_schemes("waqi", lsb_bits)
+    keep = np.uint8(255 ^ extract_scheme.mask)
+    height, width = watermarked_array.shape[:2]
+    watermark_width = width // 4
+    total_bits = watermark_width * (height // 4)
+    embedded_bits = coded_bits(total_bits, ecc)
+    total_values = payload_values(embedded_bits, lsb_bits)
+    values_per_row = watermarked_array[:1].size
+    perm = as_permutation(key, watermarked_array.size)
+    code = as_code(ecc)
+    if perm is not None:
+        scattered = np.zeros(total_values * lsb_bits, dtype=np.uint8)
+    pending = np.zeros(0, dtype=np.uint8)
+    coded = np.zeros(0, dtype=np.uint8)  # read but not yet decoded (whole codewords only)
+    emitted = 0
+    bus = as_bus(progress)
+    bus.start(height * width)
+
+    for top in range(0, height, strip_rows):
+        original_rows = np.array(watermarked_array[top:top + strip_rows], order="C")
+        flat = original_rows.reshape(-1)
+        start = top * values_per_row
+        if perm is not None:
+            # The payload indices this strip holds, wherever they fall
+            indices = perm.inverse(np.arange(start, start + flat.size))
+            held = np.flatnonzero(indices < total_values)
+            bits = unpack_payload(backend.run(extract_scheme, flat[held]), lsb_bits).reshape(-1, lsb_bits)
+            scattered[(indices[held, None] * lsb_bits + np.arange(lsb_bits)).reshape(-1)] = bits.reshape(-1)
+            flat[held] &= keep  # Clear LSBs
+            count("pixels", len(held))
+            if top + strip_rows >= height:
+                bits = scattered[:embedded_bits]
+                if code is not None:
+                    bits = code.decode(bits)
+                pending = bits[:total_bits] * np.uint8(255)
+        elif start < total_values:
+            # Watermark bits are in the first total_values values in flat order
+            end = min(start + flat.size, total_values)
+            bits = unpack_payload(backend.run(extract_scheme, flat[:end - start]), lsb_bits)
+            flat[:end - start] &= keep  # Clear LSBs
+            bits = bits[:embedded_bits - start * lsb_bits]
+            if code is not None:
+                coded = np.concatenate((coded, bits))
+                whole = len(coded) // code.n * code.n
+                bits, coded = code.decode(coded[:whole]), coded[whole:]
+                bits = bits[:total_bits - emitted]
+            emitted += len(bits)
+            pending = np.concatenate((pending, bits * np.uint8(255)))
+            count("pixels", end - start)
+        done = len(pending) // watermark_width if watermark_width else 0
+        watermark_rows = pending[:done * watermark_width].reshape(done, watermark_width)
+        pending = pending[done * watermark_width:]
+        bus.advance(len(original_rows) * width)
+        yield original_rows, watermark_rows
+    bus.finish()
+
+
+def extract_region(top_rows, host_height, backend=None, lsb_bits=1, key=None, ecc=None):
+    """Extracted watermark (0/255) from only the leading rows of a host ``host_height`` tall.
+
+    For use with ``roi.decode_rows``; the rows must cover the first
+    ``(width//4) * (host_height//4)`` bits (coded by ``ecc``), ``lsb_bits`` per value. A
+    watermark scattered by ``key`` can be anywhere, so then they must be
+    the whole host.
+    """
+    watermark_width = top_rows.shape[1] // 4
+    watermark_height = host_height // 4
+    total_bits = watermark_width * watermark_height
+    embedded_bits = coded_bits(total_bits, ecc)
+    total_values = payload_values(embedded_bits, lsb_bits)
+    flat = np.ascontiguousarray(top_rows).reshape(-1)
+    if flat.size < total_values:
+        raise ValueError(f"{len(top_rows)} rows hold {flat.size} values, the watermark needs {total_values}")
+    if key is not None and len(top_rows) < host_height:
+        raise ValueError(f"A scattered watermark needs all {host_height} rows; got {len(top_rows)}")
+    _, extract_scheme = lsb_schemes("waqi", lsb_bits)
+    positions = _positions(as_permutation(key, flat.size), 0, total_values)
+    bits = unpack_payload(get_backend(backend).run(extract_scheme, flat[positions]), lsb_bits)[:embedded_bits]
+    count("pixels", total_values)
+    if ecc is not None:
+        bits = as_code(ecc).decode(bits, total_bits)
+    return (bits.reshape((watermark_height, watermark_width)) * 255).astype(np.uint8)
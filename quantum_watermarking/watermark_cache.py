@@ -0,0 +1,160 @@
+"""Cache of ready-to-embed watermark bits for batch runs.
+
+Preparing a watermark (open, convert to 'L', resize to a quarter of the host,
+threshold or unpack to bits) depends only on the watermark, the host size and
+the scheme, so a batch that stamps one logo onto thousands of hosts only has
+to do it once per distinct host size::
+
+    cache = default_cache()
+    bits = cache.get("logo.png", host_img.size, "waqi")
+
+Entries are keyed by (SHA-256 of the watermark, host size, scheme), held as
+packed bits in an LRU of ``max_entries`` and, if a ``directory`` is given (or
+``$QWM_WATERMARK_CACHE_DIR`` is set for the default cache), also persisted
+there as ``.npz`` files shared between processes and runs.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from .diagnostics import get_logger
+
+logger = get_logger("watermark_cache")
+
+# Prepared formats: one per scheme, plus the compressed WaQI payload
+SCHEMES = ("neqr-lsb", "waqi", "waqi-compressed")
+
+
+def _prepare(watermark, host_size, scheme):
+    """(packed bits, unpacked shape) for one watermark / host size / scheme"""
+    if scheme == "neqr-lsb":
+        from . import neqr_lsb
+        bits = (neqr_lsb.load_watermark(watermark, host_size) > 127).astype(np.uint8)
+    elif scheme == "waqi":
+        from . import waqi
+        bits = waqi.load_watermark(watermark, host_size)
+    elif scheme == "waqi-compressed":
+        from . import waqi
+        bits = waqi.load_watermark(watermark, host_size, compress=True)
+    else:
+        raise ValueError(f"Unknown scheme {scheme!r}; choose from {', '.join(SCHEMES)}")
+    return np.packbits(bits.reshape(-1)), bits.shape
+
+
+def _ready(packed, shape, scheme):
+    bits = np.unpackbits(packed, count=int(np.prod(shape))).reshape(shape)
+    if scheme == "neqr-lsb":
+        # Binarised watermark image: embedding thresholds at 127, so 0/255 is exact
+        return bits * np.uint8(255)
+    return bits
+
+
+class WatermarkCache:
+    """LRU of prepared watermarks with optional on-disk persistence"""
+
+    def __init__(self, max_entries=32, directory=None):
+        self.max_entries = max_entries
+        self.directory = directory
+        self._entries = OrderedDict()
+        self._digests = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def digest(self, watermark):
+        """SHA-256 of a watermark path (memoised per size and mtime) or PIL image"""
+        if isinstance(watermark, str):
+            st = os.stat(watermark)
+            key = (os.path.abspath(watermark), st.st_size, st.st_mtime_ns)
+            digest = self._digests.get(key)
+            if digest is None:
+                h = hashlib.sha256()
+                with open(watermark, "rb") as fh:
+                    for block in iter(lambda: fh.read(1 << 20), b""):
+                        h.update(block)
+                digest = self._digests[key] = h.hexdigest()
+            return digest
+        h = hashlib.sha256(f"{watermark.mode}:{watermark.size}".encode())
+        h.update(watermark.tobytes())
+        return h.hexdigest()
+
+    def _path(self, key):
+        digest, (width, height), scheme = key
+        return os.path.join(self.directory, f"{digest}-{width}x{height}-{scheme}.npz")
+
+    def _load(self, key):
+        if not self.directory:
+            return None
+        try:
+            with np.load(self._path(key)) as data:
+                return data["packed"], tuple(int(n) for n in data["shape"])
+        except (OSError, KeyError, ValueError):
+            return None
+
+    def _store(self, key, entry):
+        if not self.directory:
+            return
+        # Write to a temporary file and rename, so readers never see a partial file
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                np.savez(fh, packed=entry[0], shape=np.array(entry[1]))
+            os.replace(tmp, self._path(key))
+        except OSError as e:
+            logger.warning("Could not persist watermark cache entry: %s", e)
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def get(self, watermark, host_size, scheme):
+        """Ready-to-embed watermark for ``scheme`` and a host of ``host_size`` (width, height).
+
+        ``neqr-lsb`` gives the binarised quarter-size watermark (0/255),
+        ``waqi`` the flat bit array and ``waqi-compressed`` the compressed
+        payload's bits, exactly as the uncached preparation would.
+        """
+        key = (self.digest(watermark), tuple(host_size), scheme)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return _ready(*entry, scheme)
+        entry = self._load(key)
+        if entry is not None:
+            self.disk_hits += 1
+        else:
+            self.misses += 1
+            entry = _prepare(watermark, host_size, scheme)
+            self._store(key, entry)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return _ready(*entry, scheme)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._digests.clear()
+
+    def stats(self):
+        return {"entries": len(self._entries), "hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses}
+
+
+_default = None
+
+
+def default_cache():
+    """Process-wide cache; persisted to ``$QWM_WATERMARK_CACHE_DIR`` if set"""
+    global _default
+    if _default is None:
+        _default = WatermarkCache(directory=os.environ.get("QWM_WATERMARK_CACHE_DIR") or None)
+    return _default
@@ -1,12 +1,22 @@
+import time
 import tkinter as tk
 from tkinter import ttk
 from tkinter import filedialog, messagebox
 from PIL import Image, ImageTk
 import numpy as np
-from qiskit import QuantumCircuit, QuantumRegister, ClassicalRegister
-from qiskit_aer import AerSimulator
-import threading
-import os
+
+from quantum_watermarking import waqi
+from quantum_watermarking.backends import get_backend
+from quantum_watermarking.checkpoint import Checkpoint, default_directory
+from quantum_watermarking.detect import PreCheck
+from quantum_watermarking.diagnostics import clear_terminal, configure_logging, get_logger
+from quantum_watermarking.instrumentation import configure_tracing, stage
+from quantum_watermarking.jobs import FRAME_MS, FrameTimer, JobPool, QueueFull
+from quantum_watermarking.previews import default_previews
+from quantum_watermarking.progress import Cancelled, ProgressBus
+from quantum_watermarking.watermark_cache import default_cache
+
+logger = get_logger("waqi_watermarking")
 
 class WaQIWatermarking:
     def __init__(self):
@@ -19,15 +29,29 @@ class WaQIWatermarking:
         self.watermark_image_path = None
         self.watermarked_image = None
         
-        # Initialize quantum simulator
-        self.simulator = AerSimulator()
+        # Decoded images and thumbnails, shared by preview and processing
+        self.previews = default_previews()
+
+        # Skips hosts already carrying the mark; the skip count and time saved are reported on close
+        self.precheck = PreCheck()
         
         # Progress tracking
         self.progress_var = tk.DoubleVar()
         self.progress_var.set(0)
+
+        # Embed the binarised, run-length coded watermark (far fewer bits)
+        self.compress_var = tk.BooleanVar(value=True)
+        
+        # Jobs run one at a time on a worker thread and up to two more can
+        # wait, instead of one thread per click competing for the CPU
+        self.jobs = JobPool(max_workers=1, max_pending=2,
+                            on_change=lambda pool: self.window.after(0, self.update_job_controls))
+        self.frames = FrameTimer()
+        self.frames_ticking = False
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
         
         # Clear terminal
-        os.system('cls' if os.name == 'nt' else 'clear')
+        clear_terminal()
         
         self.setup_ui()
         
@@ -47,12 +71,21 @@ class WaQIWatermarking:
         self.upload_watermark_btn = tk.Button(left_frame, text="Upload Watermark Image", command=self.upload_watermark_image)
         self.upload_watermark_btn.pack(pady=10)
         
+        tk.Checkbutton(left_frame, text="Compress watermark", variable=self.compress_var).pack(pady=5)
+
         self.embed_btn = tk.Button(left_frame, text="Embed Watermark", command=self.start_embedding)
         self.embed_btn.pack(pady=10)
+
+        self.cancel_btn = tk.Button(left_frame, text="Cancel", command=self.jobs.cancel_all, state='disabled')
+        self.cancel_btn.pack(pady=10)
         
         # Create progress bar
         self.progress_bar = ttk.Progressbar(left_frame, variable=self.progress_var, maximum=100)
         self.progress_bar.pack(pady=10, fill=tk.X)
+
+        # Percentage, pixels/sec and ETA of the running job
+        self.status_var = tk.StringVar()
+        tk.Label(left_frame, textvariable=self.status_var).pack(pady=5)
         
         # Create right frame for images
         right_frame = tk.Frame(main_frame)
@@ -106,141 +139,88 @@ class WaQIWatermarking:
             self.display_image(file_path, self.watermark_label)
             
     def display_image(self, image_path, label, size=(200, 200)):
-        # Load and resize image for preview
-        if isinstance(image_path, str):
-            image = Image.open(image_path)
-        else:
-            image = image_path
-        image = image.resize(size, Image.Resampling.LANCZOS)
-        photo = ImageTk.PhotoImage(image)
+        # Decoded (once) and downscaled on the preview thread; only the
+        # PhotoImage is made on the Tk thread
+        self.previews.request(
+            image_path, size,
+            lambda thumb: self.window.after(0, lambda: self.show_thumbnail(thumb, label)),
+            slot=label,
+            error=lambda e: self.window.after(0, lambda: messagebox.showerror("Error", f"Could not load image: {e}")))
+
+    def show_thumbnail(self, thumb, label):
+        photo = ImageTk.PhotoImage(thumb)
         label.configure(image=photo)
         label.image = photo
 
-    def apply_waqi_embedding(self, host_pixel, watermark_bit):
-        # Create quantum circuit with 3 qubits for WaQI
-        qr = QuantumRegister(3, 'q')
-        cr = ClassicalRegister(3, 'c')
-        circuit = QuantumCircuit(qr, cr)
-        
-        # Initialize qubits based on host pixel and watermark bit
-        if host_pixel & 1:
-            circuit.x(0)
-        if watermark_bit:
-            circuit.x(1)
-            
-        # Apply WaQI specific gates
-        circuit.h(0)  # Hadamard gate on first qubit
-        circuit.cx(0, 1)  # CNOT between first and second qubit
-        circuit.cx(1, 2)  # CNOT between second and third qubit
-        
-        # Measure the qubits
-        circuit.measure(qr, cr)
-        
-        # Execute the circuit
-        job = self.simulator.run(circuit, shots=1)
-        result = job.result()
-        counts = result.get_counts()
-        
-        # Get the measured value and apply WaQI transformation
-        measured_value = int(list(counts.keys())[0], 2)
-        return (measured_value & 1) ^ ((measured_value >> 1) & 1)  # XOR of first two bits
+    def progress_bus(self):
+        # Coalesced to a few updates a second, so the Tk event queue is not flooded
+        bus = ProgressBus(max_rate=10)
+        bus.subscribe(lambda update: self.window.after(0, lambda: self.show_progress(update)))
+        return bus
 
-    def display_matrix_values(self, array, title, max_rows=5, max_cols=5):
-        """Display matrix values in a formatted way"""
-        print(f"\n{title}")
-        print("-" * 50)
-        
-        # Get dimensions
-        if len(array.shape) == 3:  # Color image
-            height, width, channels = array.shape
-            print(f"Shape: {height}x{width}x{channels}")
-            
-            # Display a portion of the matrix
-            for i in range(min(max_rows, height)):
-                for j in range(min(max_cols, width)):
-                    pixel = array[i, j]
-                    print(f"Pixel[{i},{j}]: R={pixel[0]}, G={pixel[1]}, B={pixel[2]}")
-                if j < width - 1:
-                    print("...")
-                print()
-            if i < height - 1:
-                print("...")
-        else:  # Grayscale image
-            height, width = array.shape
-            print(f"Shape: {height}x{width}")
-            
-            # Display a portion of the matrix
-            for i in range(min(max_rows, height)):
-                for j in range(min(max_cols, width)):
-                    print(f"{array[i,j]:3d}", end=" ")
-                if j < width - 1:
-                    print("...", end="")
-                print()
-            if i < height - 1:
-                print("...")
-        print("-" * 50)
+    def show_progress(self, update):
+        self.progress_var.set(update.percent)
+        queued = len(self.jobs.jobs) - 1
+        self.status_var.set(update.describe() + (f"  (+{queued} queued)" if queued > 0 else ""))
+
+    def update_job_controls(self):
+        # Cancel is offered while a job runs or waits, and the UI frame
+        # time is measured for as long as one does
+        busy = self.jobs.busy
+        self.cancel_btn.config(state='normal' if busy else 'disabled')
+        if busy and not self.frames_ticking:
+            self.frames_ticking = True
+            self.tick_frames()
+
+    def tick_frames(self):
+        self.frames.tick()
+        if self.jobs.busy:
+            self.window.after(FRAME_MS, self.tick_frames)
+        else:
+            logger.info(self.frames.summary())
+            self.frames.reset()
+            self.frames_ticking = False
 
-    def embed_watermark_thread(self):
+    def close(self):
+        # Stop the running job at its next chunk and drop the queued ones
+        self.jobs.on_change = None
+        self.jobs.shutdown()
+        if self.precheck.checked or self.precheck.embedded_values:
+            logger.info("%s", self.precheck.summary())
+        self.window.destroy()
+
+    def embed_watermark_thread(self, bus, host_path, watermark_path, compress=True):
         try:
-            # Load images
-            host_img = Image.open(self.host_image_path)
-            watermark_img = Image.open(self.watermark_image_path)
-            
-            # Convert host image to array and display original matrix
+            # Load images: decoded once, for the preview, and shared with the processing
+            host_img = self.previews.image(host_path)
             host_array = np.array(host_img)
-            self.display_matrix_values(host_array, "Original Image Matrix Values")
-            
-            # Convert watermark to binary
-            watermark_img = watermark_img.convert('L')
-            
-            # Calculate appropriate watermark size (1/8 of host image)
-            watermark_width = host_img.width // 4
-            watermark_height = host_img.height // 4
-            
-            # Resize watermark
-            watermark_img = watermark_img.resize((watermark_width, watermark_height))
-            watermark_array = np.array(watermark_img)
-            watermark_binary = np.unpackbits(watermark_array)
-            
-            # Calculate total bits needed
-            total_bits_needed = watermark_binary.size
-            total_bits_available = host_array.size
-            
-            if total_bits_available < total_bits_needed:
-                self.window.after(0, lambda: messagebox.showerror("Error", 
-                    f"Host image is too small for the watermark.\n"
-                    f"Required bits: {total_bits_needed}\n"
-                    f"Available bits: {total_bits_available}"))
+            # Prepared once per watermark and host size, then served from the cache
+            payload_format = "waqi-compressed" if compress else "waqi"
+            watermark_binary = default_cache().get(watermark_path, host_img.size, payload_format)
+            logger.info("Embedding %d payload bits (%s)", watermark_binary.size, payload_format)
+
+            # Embedding again would cost a full run (for an identical result)
+            if self.precheck.already_marked(host_array, watermark_binary, "waqi"):
+                self.window.after(0, lambda: messagebox.showinfo("Already watermarked",
+                    "The host image already carries this watermark; embedding was skipped."))
                 return
             
-            # Create output array
-            watermarked_array = np.copy(host_array)
-            
-            # Process in chunks for better performance
-            chunk_size = 1000
-            total_chunks = (total_bits_needed + chunk_size - 1) // chunk_size
-            
-            print("\nEmbedding watermark...")
-            for chunk in range(total_chunks):
-                start_idx = chunk * chunk_size
-                end_idx = min(start_idx + chunk_size, total_bits_needed)
-                
-                for i in range(start_idx, end_idx):
-                    pixel_value = host_array.flat[i]
-                    watermark_bit = watermark_binary[i]
-                    new_lsb = self.apply_waqi_embedding(pixel_value, watermark_bit)
-                    watermarked_array.flat[i] = (pixel_value & 254) | new_lsb
-                
-                # Update progress
-                progress = (chunk + 1) / total_chunks * 100
-                self.window.after(0, lambda p=progress: self.progress_var.set(p))
-                
-                # Display intermediate matrix values every 25% progress
-                if progress % 25 == 0:
-                    self.display_matrix_values(watermarked_array, f"Watermarked Image Matrix Values (Progress: {progress:.0f}%)")
-            
-            # Display final watermarked matrix
-            self.display_matrix_values(watermarked_array, "Final Watermarked Image Matrix Values")
+            # Embed the watermark, with coalesced progress updates; an
+            # interrupted run (crash, closed window) resumes from its checkpoint
+            checkpoint = Checkpoint(default_directory(), payload_format, host_array, watermark_binary)
+            start = time.perf_counter()
+            try:
+                watermarked_array = waqi.embed_watermark(
+                    host_array, watermark_binary, get_backend(),
+                    progress=bus,
+                    checkpoint=checkpoint)
+            except waqi.CapacityError as e:
+                message = str(e)
+                self.window.after(0, lambda: messagebox.showerror("Error", message))
+                return
+            self.precheck.record_embed(time.perf_counter() - start)
+            # The output is in memory now; only a cancelled or crashed run keeps its checkpoint
+            checkpoint.discard()
             
             # Convert back to image
             watermarked_img = Image.fromarray(watermarked_array)
@@ -252,10 +232,13 @@ class WaQIWatermarking:
             save_path = filedialog.asksaveasfilename(defaultextension=".png",
                                                     filetypes=[("PNG files", "*.png")])
             if save_path:
-                watermarked_img.save(save_path)
+                with stage("save"):
+                    watermarked_img.save(save_path)
                 self.window.after(0, lambda: messagebox.showinfo("Success", 
                     "Watermark embedded successfully using WaQI!"))
                 
+        except Cancelled:
+            self.window.after(0, lambda: self.status_var.set("Cancelled; embedding again resumes from the checkpoint"))
         except Exception as e:
             self.window.after(0, lambda: messagebox.showerror("Error", f"An error occurred: {str(e)}"))
         finally:
@@ -265,28 +248,22 @@ class WaQIWatermarking:
         if not self.host_image_path or not self.watermark_image_path:
             messagebox.showerror("Error", "Please upload both host and watermark images")
             return
-            
-        # Disable buttons during processing
-        self.embed_btn.config(state='disabled')
-        self.upload_host_btn.config(state='disabled')
-        self.upload_watermark_btn.config(state='disabled')
-        
-        # Start embedding in a separate thread
-        thread = threading.Thread(target=self.embed_watermark_thread)
-        thread.daemon = True
-        thread.start()
-        
-        # Re-enable buttons after processing
-        def reenable_buttons():
-            self.embed_btn.config(state='normal')
-            self.upload_host_btn.config(state='normal')
-            self.upload_watermark_btn.config(state='normal')
-        
-        self.window.after(100, reenable_buttons)
+
+        # Queue the job with the inputs as they are now
+        host_path = self.host_image_path
+        watermark_path = self.watermark_image_path
+        compress = self.compress_var.get()
+        try:
+            self.jobs.submit("embed", lambda bus: self.embed_watermark_thread(bus, host_path, watermark_path, compress),
+                             self.progress_bus())
+        except QueueFull:
+            messagebox.showwarning("Busy", "Two jobs are already waiting; try again when one has finished")
             
     def run(self):
         self.window.mainloop()
 
 if __name__ == "__main__":
+    configure_logging()
+    configure_tracing()
     app = WaQIWatermarking()
     app.run() 
\ No newline at end of file
@@ -3,10 +3,17 @@ from tkinter import ttk
 from tkinter import filedialog, messagebox
 from PIL import Image, ImageTk
 import numpy as np
-from qiskit import QuantumCircuit, QuantumRegister, ClassicalRegister
-from qiskit_aer import AerSimulator
-import threading
-import os
+
+from quantum_watermarking import png_stream, waqi
+from quantum_watermarking.backends import get_backend
+from quantum_watermarking.diagnostics import MATRIX, clear_terminal, configure_logging, get_logger, log_matrix
+from quantum_watermarking.instrumentation import configure_tracing, stage
+from quantum_watermarking.jobs import FRAME_MS, FrameTimer, JobPool, QueueFull
+from quantum_watermarking.payload import PayloadError
+from quantum_watermarking.previews import default_previews
+from quantum_watermarking.progress import Cancelled, ProgressBus
+
+logger = get_logger("watermark_extractor")
 
 class WaQIExtractor:
     def __init__(self):
@@ -19,15 +26,23 @@ class WaQIExtractor:
         self.extracted_watermark = None
         self.original_image = None
         
-        # Initialize quantum simulator
-        self.simulator = AerSimulator()
+        # Decoded images and thumbnails, shared by preview and processing
+        self.previews = default_previews()
         
         # Progress tracking
         self.progress_var = tk.DoubleVar()
         self.progress_var.set(0)
         
+        # Jobs run one at a time on a worker thread and up to two more can
+        # wait, instead of one thread per click competing for the CPU
+        self.jobs = JobPool(max_workers=1, max_pending=2,
+                            on_change=lambda pool: self.window.after(0, self.update_job_controls))
+        self.frames = FrameTimer()
+        self.frames_ticking = False
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+        
         # Clear terminal
-        os.system('cls' if os.name == 'nt' else 'clear')
+        clear_terminal()
         
         self.setup_ui()
         
@@ -46,10 +61,17 @@ class WaQIExtractor:
         
         self.extract_btn = tk.Button(left_frame, text="Extract Watermark", command=self.start_extraction)
         self.extract_btn.pack(pady=10)
+
+        self.cancel_btn = tk.Button(left_frame, text="Cancel", command=self.jobs.cancel_all, state='disabled')
+        self.cancel_btn.pack(pady=10)
         
         # Create progress bar
         self.progress_bar = ttk.Progressbar(left_frame, variable=self.progress_var, maximum=100)
         self.progress_bar.pack(pady=10, fill=tk.X)
+
+        # Percentage, pixels/sec and ETA of the running job
+        self.status_var = tk.StringVar()
+        tk.Label(left_frame, textvariable=self.status_var).pack(pady=5)
         
         # Create right frame for images
         right_frame = tk.Frame(main_frame)
@@ -90,147 +112,86 @@ class WaQIExtractor:
         self.original_label = tk.Label(original_frame)
         self.original_label.pack(expand=True)
         
-    def display_matrix_values(self, array, title, max_rows=5, max_cols=5):
-        """Display matrix values in a formatted way"""
-        print(f"\n{title}")
-        print("-" * 50)
-        
-        # Get dimensions
-        if len(array.shape) == 3:  # Color image
-            height, width, channels = array.shape
-            print(f"Shape: {height}x{width}x{channels}")
-            
-            # Display a portion of the matrix
-            for i in range(min(max_rows, height)):
-                for j in range(min(max_cols, width)):
-                    pixel = array[i, j]
-                    print(f"Pixel[{i},{j}]: R={pixel[0]}, G={pixel[1]}, B={pixel[2]}")
-                if j < width - 1:
-                    print("...")
-                print()
-            if i < height - 1:
-                print("...")
-        else:  # Grayscale image
-            height, width = array.shape
-            print(f"Shape: {height}x{width}")
-            
-            # Display a portion of the matrix
-            for i in range(min(max_rows, height)):
-                for j in range(min(max_cols, width)):
-                    print(f"{array[i,j]:3d}", end=" ")
-                if j < width - 1:
-                    print("...", end="")
-                print()
-            if i < height - 1:
-                print("...")
-        print("-" * 50)
-        
     def upload_image(self):
         file_path = filedialog.askopenfilename(filetypes=[("Image files", "*.png *.jpg *.jpeg *.bmp")])
         if file_path:
             self.watermarked_image_path = file_path
             self.display_image(file_path, self.watermarked_label)
             
-            # Display matrix values of watermarked image
-            watermarked_array = np.array(Image.open(file_path))
-            self.display_matrix_values(watermarked_array, "Watermarked Image Matrix Values")
+            # Display matrix values of watermarked image, from the preview's decode
+            if logger.isEnabledFor(MATRIX):
+                self.previews.submit(lambda: log_matrix(
+                    logger, np.array(self.previews.image(file_path)), "Watermarked Image Matrix Values"))
             
     def display_image(self, image_path, label, size=(200, 200)):
-        # Load and resize image for preview
-        if isinstance(image_path, str):
-            image = Image.open(image_path)
-        else:
-            image = image_path
-        image = image.resize(size, Image.Resampling.LANCZOS)
-        photo = ImageTk.PhotoImage(image)
+        # Decoded (once) and downscaled on the preview thread; only the
+        # PhotoImage is made on the Tk thread
+        self.previews.request(
+            image_path, size,
+            lambda thumb: self.window.after(0, lambda: self.show_thumbnail(thumb, label)),
+            slot=label,
+            error=lambda e: self.window.after(0, lambda: messagebox.showerror("Error", f"Could not load image: {e}")))
+
+    def show_thumbnail(self, thumb, label):
+        photo = ImageTk.PhotoImage(thumb)
         label.configure(image=photo)
         label.image = photo
 
-    def apply_reverse_waqi(self, pixel_value):
-        # Create quantum circuit with 3 qubits for reverse WaQI
-        qr = QuantumRegister(3, 'q')
-        cr = ClassicalRegister(3, 'c')
-        circuit = QuantumCircuit(qr, cr)
-        
-        # Initialize first qubit with pixel value
-        if pixel_value & 1:
-            circuit.x(0)
-            
-        # Apply reverse WaQI gates
-        circuit.cx(1, 2)  # Reverse CNOT
-        circuit.cx(0, 1)  # Reverse CNOT
-        circuit.h(0)      # Hadamard gate
-        
-        # Measure the qubits
-        circuit.measure(qr, cr)
-        
-        # Execute the circuit
-        job = self.simulator.run(circuit, shots=1)
-        result = job.result()
-        counts = result.get_counts()
-        
-        # Get the measured value and apply reverse transformation
-        measured_value = int(list(counts.keys())[0], 2)
-        return (measured_value >> 1) & 1  # Extract the watermark bit
+    def progress_bus(self):
+        # Coalesced to a few updates a second, so the Tk event queue is not flooded
+        bus = ProgressBus(max_rate=10)
+        bus.subscribe(lambda update: self.window.after(0, lambda: self.show_progress(update)))
+        return bus
+
+    def show_progress(self, update):
+        self.progress_var.set(update.percent)
+        queued = len(self.jobs.jobs) - 1
+        self.status_var.set(update.describe() + (f"  (+{queued} queued)" if queued > 0 else ""))
+
+    def update_job_controls(self):
+        # Cancel is offered while a job runs or waits, and the UI frame
+        # time is measured for as long as one does
+        busy = self.jobs.busy
+        self.cancel_btn.config(state='normal' if busy else 'disabled')
+        if busy and not self.frames_ticking:
+            self.frames_ticking = True
+            self.tick_frames()
+
+    def tick_frames(self):
+        self.frames.tick()
+        if self.jobs.busy:
+            self.window.after(FRAME_MS, self.tick_frames)
+        else:
+            logger.info(self.frames.summary())
+            self.frames.reset()
+            self.frames_ticking = False
+
+    def close(self):
+        # Stop the running job at its next chunk and drop the queued ones
+        self.jobs.on_change = None
+        self.jobs.shutdown()
+        self.window.destroy()
 
-    def extract_watermark_thread(self):
+    def extract_watermark_thread(self, bus, image_path):
         try:
-            # Load watermarked image
-            watermarked_img = Image.open(self.watermarked_image_path)
+            # Load watermarked image: decoded once, for the preview, and shared with the processing
+            watermarked_img = self.previews.image(image_path)
             watermarked_array = np.array(watermarked_img)
             
-            # Display initial watermarked image matrix
-            self.display_matrix_values(watermarked_array, "Initial Watermarked Image Matrix")
-            
-            # Calculate watermark size (1/8 of watermarked image)
-            watermark_width = watermarked_img.width // 4
-            watermark_height = watermarked_img.height // 4
-            
-            # Create array for extracted watermark
-            watermark_bits = []
-            
-            # Process in chunks for better performance
-            chunk_size = 1000
-            total_bits = watermark_width * watermark_height  # 1 bit per pixel
-            total_chunks = (total_bits + chunk_size - 1) // chunk_size
-            
-            print("\nExtracting watermark...")
-            for chunk in range(total_chunks):
-                start_idx = chunk * chunk_size
-                end_idx = min(start_idx + chunk_size, total_bits)
-                
-                for i in range(start_idx, end_idx):
-                    pixel_value = watermarked_array.flat[i]
-                    watermark_bit = self.apply_reverse_waqi(pixel_value)
-                    watermark_bits.append(watermark_bit)
-                
-                # Update progress
-                progress = (chunk + 1) / total_chunks * 100
-                self.window.after(0, lambda p=progress: self.progress_var.set(p))
-                
-                # Display intermediate matrix values every 25% progress
-                if progress % 25 == 0:
-                    print(f"\nExtraction Progress: {progress:.0f}%")
-            
-            # Convert bits to image (binary)
-            watermark_bits = np.array(watermark_bits, dtype=np.uint8)
-            watermark_image = watermark_bits.reshape((watermark_height, watermark_width)) * 255
-            extracted_watermark = Image.fromarray(watermark_image.astype(np.uint8), mode='L')
-            
-            # Display extracted watermark matrix
-            self.display_matrix_values(np.array(extracted_watermark), "Extracted Watermark Matrix")
+            # Recover the watermark bits, with coalesced progress updates: a
+            # compressed payload if the image starts with its header, else the plain one
+            try:
+                watermark_image, original_array = waqi.extract_compressed(watermarked_array, get_backend(),
+                                                                          progress=bus)
+            except PayloadError:
+                watermark_image, original_array = waqi.extract_watermark(
+                    watermarked_array, get_backend(),
+                    progress=bus)
+            extracted_watermark = Image.fromarray(watermark_image, mode='L')
             
             # Display extracted watermark
             self.window.after(0, lambda: self.display_image(extracted_watermark, self.extracted_label))
             
-            # Reconstruct original image
-            original_array = np.copy(watermarked_array)
-            for i in range(total_bits):
-                original_array.flat[i] = (original_array.flat[i] & 254)  # Clear LSB
-            
-            # Display original image matrix
-            self.display_matrix_values(original_array, "Reconstructed Original Image Matrix")
-            
             original_image = Image.fromarray(original_array)
             
             # Display original image
@@ -240,12 +201,16 @@ class WaQIExtractor:
             save_path = filedialog.asksaveasfilename(defaultextension=".png",
                                                     filetypes=[("PNG files", "*.png")])
             if save_path:
-                extracted_watermark.save(save_path)
-                original_path = save_path.replace('.png', '_original.png')
-                original_image.save(original_path)
+                with stage("save"):
+                    original_path = save_path.replace('.png', '_original.png')
+                    encode_seconds = png_stream.save_array(watermark_image, save_path)
+                    encode_seconds += png_stream.save_array(original_array, original_path)
+                logger.info("Saved %s and %s (PNG encode %.3f s)", save_path, original_path, encode_seconds)
                 self.window.after(0, lambda: messagebox.showinfo("Success", 
                     "Watermark extracted and original image reconstructed successfully!"))
                 
+        except Cancelled:
+            self.window.after(0, lambda: self.status_var.set("Cancelled"))
         except Exception as e:
             error_msg = str(e)
             self.window.after(0, lambda: messagebox.showerror("Error", f"An error occurred: {error_msg}"))
@@ -256,26 +221,20 @@ class WaQIExtractor:
         if not self.watermarked_image_path:
             messagebox.showerror("Error", "Please upload a watermarked image")
             return
-            
-        # Disable buttons during processing
-        self.extract_btn.config(state='disabled')
-        self.upload_btn.config(state='disabled')
-        
-        # Start extraction in a separate thread
-        thread = threading.Thread(target=self.extract_watermark_thread)
-        thread.daemon = True
-        thread.start()
-        
-        # Re-enable buttons after processing
-        def reenable_buttons():
-            self.extract_btn.config(state='normal')
-            self.upload_btn.config(state='normal')
-        
-        self.window.after(100, reenable_buttons)
+
+        # Queue the job with the inputs as they are now
+        image_path = self.watermarked_image_path
+        try:
+            self.jobs.submit("extract", lambda bus: self.extract_watermark_thread(bus, image_path),
+                             self.progress_bus())
+        except QueueFull:
+            messagebox.showwarning("Busy", "Two jobs are already waiting; try again when one has finished")
             
     def run(self):
         self.window.mainloop()
 
 if __name__ == "__main__":
+    configure_logging()
+    configure_tracing()
     app = WaQIExtractor()
     app.run() 
\ No newline at end of file